@@ -44,6 +44,7 @@ class CoreConfig(AppConfig):
         """
         # Importa os sinais definidos no módulo de sinais
         import cgbookstore.apps.core.signals
+        import cgbookstore.apps.core.recommendations.signals
 
         # Registra a inicialização
         import logging
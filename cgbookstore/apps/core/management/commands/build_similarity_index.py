@@ -0,0 +1,47 @@
+# cgbookstore/apps/core/management/commands/build_similarity_index.py
+
+from django.core.management.base import BaseCommand
+from cgbookstore.apps.core.recommendations.services.similarity_index import SimilarityIndex
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Constrói o índice item-item de similaridade usado pelas recomendações'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Recalcula o catálogo inteiro em vez de apenas os livros alterados'
+        )
+        parser.add_argument(
+            '--top-n',
+            type=int,
+            default=SimilarityIndex.TOP_N,
+            help='Quantidade de vizinhos armazenados por livro'
+        )
+
+    def handle(self, *args, **options):
+        index = SimilarityIndex(top_n=options['top_n'])
+        full = options['full']
+
+        if not full:
+            last_build = index.last_build()
+            if last_build:
+                self.stdout.write(f"Atualização incremental desde {last_build:%d/%m/%Y %H:%M}")
+            else:
+                self.stdout.write("Nenhum índice encontrado, construindo do zero")
+
+        try:
+            stats = index.rebuild(full=full)
+        except Exception as e:
+            logger.error(f"Erro ao construir índice de similaridade: {str(e)}")
+            self.stdout.write(self.style.ERROR(f"Erro ao construir índice: {str(e)}"))
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Índice atualizado: {stats['updated']} livros recalculados "
+            f"({stats['catalog']} no catálogo, {stats['removed']} removidos)"
+        ))
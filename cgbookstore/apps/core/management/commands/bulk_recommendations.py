@@ -0,0 +1,86 @@
+# cgbookstore/apps/core/management/commands/bulk_recommendations.py
+
+import sys
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from cgbookstore.apps.core.recommendations.api.serializers import recommendations_ndjson_line
+from cgbookstore.apps.core.recommendations.engine import RecommendationEngine
+from cgbookstore.apps.core.recommendations.services.similarity_index import SimilarityIndex
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Gera recomendações de muitos usuários em uma passada e grava em NDJSON (e-mails, push)'
+
+    # A partir deste número de usuários, o índice de similaridade é
+    # carregado em memória uma única vez para a execução do comando
+    PRELOAD_THRESHOLD = 1000
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users',
+            help='IDs de usuários separados por vírgula'
+        )
+        parser.add_argument(
+            '--active-days',
+            type=int,
+            help='Usuários com atividade na estante nos últimos X dias'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=10,
+            help='Quantidade de recomendações por usuário'
+        )
+        parser.add_argument(
+            '--output',
+            default='-',
+            help='Arquivo de saída (padrão: saída padrão)'
+        )
+        parser.add_argument(
+            '--include-external',
+            action='store_true',
+            help='Consulta a API externa para usuários sem recomendações em cache'
+        )
+
+    def handle(self, *args, **options):
+        if options.get('users'):
+            try:
+                user_ids = [int(user_id) for user_id in options['users'].split(',') if user_id.strip()]
+            except ValueError:
+                raise CommandError('--users deve conter apenas IDs numéricos')
+        elif options.get('active_days'):
+            cutoff_date = timezone.now() - timedelta(days=options['active_days'])
+            user_ids = list(
+                User.objects.filter(bookshelves__updated_at__gte=cutoff_date)
+                .distinct().order_by('id').values_list('id', flat=True)
+            )
+        else:
+            raise CommandError('Informe --users ou --active-days')
+
+        results = RecommendationEngine().get_recommendations_bulk(
+            user_ids, limit=options['limit'], include_external=options['include_external']
+        )
+
+        output = options['output']
+        stream = sys.stdout if output == '-' else open(output, 'w', encoding='utf-8')
+        count = 0
+        preload = len(user_ids) >= self.PRELOAD_THRESHOLD and SimilarityIndex._preloaded is None
+        try:
+            if preload:
+                SimilarityIndex.preload()
+            for user_id, items in results:
+                stream.write(recommendations_ndjson_line(user_id, items))
+                count += 1
+        finally:
+            if stream is not sys.stdout:
+                stream.close()
+            if preload:
+                SimilarityIndex.clear_preloaded()
+
+        self.stderr.write(f"{count} usuários processados")
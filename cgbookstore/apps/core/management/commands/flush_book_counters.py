@@ -0,0 +1,29 @@
+# cgbookstore/apps/core/management/commands/flush_book_counters.py
+
+from django.core.management.base import BaseCommand
+from cgbookstore.apps.core.services.book_counters import BookCounters
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        'Grava em Book os acessos e vendas acumulados no buffer do Redis '
+        '(agendar a cada minuto)'
+    )
+
+    def handle(self, *args, **options):
+        try:
+            stats = BookCounters().flush()
+        except Exception as e:
+            logger.error(f"Erro ao gravar contadores de livros: {str(e)}")
+            self.stdout.write(self.style.ERROR(f"Erro ao gravar contadores: {str(e)}"))
+            return
+
+        if not stats:
+            self.stdout.write("Outro flush está em andamento; nada a fazer")
+            return
+
+        for field, count in stats.items():
+            self.stdout.write(self.style.SUCCESS(f"{field}: {count} livros atualizados"))
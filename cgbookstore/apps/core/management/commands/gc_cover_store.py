@@ -0,0 +1,42 @@
+# cgbookstore/apps/core/management/commands/gc_cover_store.py
+
+from django.core.management.base import BaseCommand
+from cgbookstore.apps.core.services.cover_store import CoverStore
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        'Remove as capas menos acessadas do armazém em disco do proxy de imagens '
+        'até caber em IMAGE_PROXY_STORE_MAX_BYTES (agendar a cada hora)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--max-bytes',
+            type=int,
+            help='Limite de tamanho do armazém (padrão: IMAGE_PROXY_STORE_MAX_BYTES)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Apenas mostra o que seria removido'
+        )
+
+    def handle(self, *args, **options):
+        store = CoverStore()
+        try:
+            stats = store.gc(max_bytes=options['max_bytes'], dry_run=options['dry_run'])
+        except Exception as e:
+            logger.error(f"Erro na coleta de lixo do armazém de capas: {str(e)}")
+            self.stdout.write(self.style.ERROR(f"Erro na coleta de lixo: {str(e)}"))
+            return
+
+        prefix = '[dry-run] ' if options['dry_run'] else ''
+        self.stdout.write(f"Armazém: {store.root} ({stats['files']} arquivos, {stats['bytes']} bytes)")
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}{stats['removed']} capas removidas ({stats['freed']} bytes liberados), "
+            f"{stats['temp_removed']} temporários abandonados"
+        ))
@@ -0,0 +1,43 @@
+# cgbookstore/apps/core/management/commands/maintain_trending_index.py
+
+from django.core.management.base import BaseCommand
+from cgbookstore.apps.core.recommendations.services.trending_index import TrendingIndex
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        'Manutenção do índice de tendências: reescala os scores, poda os rankings e grava o '
+        'snapshot em BookTrendingScore (agendar a cada 10-15 minutos)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--restore',
+            action='store_true',
+            help='Recarrega todos os rankings a partir do último snapshot do banco'
+        )
+
+    def handle(self, *args, **options):
+        index = TrendingIndex()
+
+        try:
+            if options['restore']:
+                for board in index.BOARDS:
+                    restored = index.restore(board)
+                    self.stdout.write(f"{board}: {restored} livros restaurados do snapshot")
+                return
+
+            stats = index.maintain()
+        except Exception as e:
+            logger.error(f"Erro na manutenção do índice de tendências: {str(e)}")
+            self.stdout.write(self.style.ERROR(f"Erro na manutenção do índice: {str(e)}"))
+            return
+
+        for board, board_stats in stats.items():
+            self.stdout.write(self.style.SUCCESS(
+                f"{board}: {board_stats['size']} livros no ranking, {board_stats['snapshot']} no snapshot"
+                + (f", {board_stats['restored']} restaurados" if board_stats['restored'] else '')
+            ))
@@ -0,0 +1,22 @@
+# cgbookstore/apps/core/management/commands/reshuffle_book_sample_keys.py
+
+from django.core.management.base import BaseCommand
+from cgbookstore.apps.core.models import Book
+from cgbookstore.apps.core.recommendations.utils.sampling import BookSampler
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Sorteia novas chaves de amostragem dos livros usadas pelas recomendações'
+
+    def handle(self, *args, **options):
+        try:
+            updated = BookSampler.reshuffle(Book.objects.all())
+        except Exception as e:
+            logger.error(f"Erro ao reembaralhar chaves de amostragem: {str(e)}")
+            self.stdout.write(self.style.ERROR(f"Erro ao reembaralhar chaves: {str(e)}"))
+            return
+
+        self.stdout.write(self.style.SUCCESS(f"Chaves de amostragem atualizadas para {updated} livros"))
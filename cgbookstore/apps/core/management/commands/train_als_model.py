@@ -0,0 +1,63 @@
+# cgbookstore/apps/core/management/commands/train_als_model.py
+
+from django.core.management.base import BaseCommand
+from cgbookstore.apps.core.recommendations.services.als_model import ALSTrainer, get_model_dir
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Treina o modelo de filtragem colaborativa (ALS com feedback implícito das estantes)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--factors',
+            type=int,
+            default=ALSTrainer.DEFAULT_FACTORS,
+            help='Dimensão dos fatores latentes'
+        )
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=ALSTrainer.DEFAULT_ITERATIONS,
+            help='Iterações de mínimos quadrados alternados'
+        )
+        parser.add_argument(
+            '--regularization',
+            type=float,
+            default=ALSTrainer.DEFAULT_REGULARIZATION,
+            help='Regularização L2 dos fatores'
+        )
+        parser.add_argument(
+            '--alpha',
+            type=float,
+            default=ALSTrainer.DEFAULT_ALPHA,
+            help='Escala da confiança (c = 1 + alpha * peso da estante)'
+        )
+        parser.add_argument(
+            '--output',
+            default=None,
+            help='Pasta do modelo (padrão: settings.RECOMMENDATION_ALS_DIR)'
+        )
+
+    def handle(self, *args, **options):
+        trainer = ALSTrainer(
+            factors=options['factors'],
+            regularization=options['regularization'],
+            alpha=options['alpha'],
+            iterations=options['iterations']
+        )
+        directory = options['output'] or get_model_dir()
+
+        try:
+            stats = trainer.train(directory)
+        except Exception as e:
+            logger.error(f"Erro ao treinar modelo ALS: {str(e)}")
+            self.stdout.write(self.style.ERROR(f"Erro ao treinar modelo: {str(e)}"))
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Modelo {stats['version']} publicado em {directory}: {stats['users']} usuários, "
+            f"{stats['books']} livros, {stats['interactions']} interações em {stats['elapsed']:.1f}s"
+        ))
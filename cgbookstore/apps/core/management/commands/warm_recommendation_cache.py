@@ -2,8 +2,14 @@
 
 from django.core.management.base import BaseCommand
 from django.contrib.auth import get_user_model
+from django.conf import settings
 from cgbookstore.apps.core.recommendations.utils.cache_manager import RecommendationCache
+from cgbookstore.apps.core.recommendations.services.batch_precompute import (
+    BatchPrecompute, PrecomputeCheckpoint
+)
 import logging
+import os
+import tempfile
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
@@ -24,6 +30,39 @@ class Command(BaseCommand):
             default=30,
             help='Considerar usuários ativos nos últimos X dias'
         )
+        parser.add_argument(
+            '--batch',
+            action='store_true',
+            help='Pré-calcula as recomendações em lote com um pool de processos'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=getattr(settings, 'RECOMMENDATION_BATCH_WORKERS', 4),
+            help='Número de processos do modo --batch'
+        )
+        parser.add_argument(
+            '--shard-size',
+            type=int,
+            default=BatchPrecompute.DEFAULT_SHARD_SIZE,
+            help='Usuários por shard no modo --batch'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=20,
+            help='Quantidade de recomendações pré-calculadas por usuário'
+        )
+        parser.add_argument(
+            '--checkpoint',
+            default=os.path.join(tempfile.gettempdir(), 'warm_recommendation_cache.checkpoint.json'),
+            help='Arquivo de checkpoint do modo --batch'
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Ignora o checkpoint existente e processa todos os usuários'
+        )
 
     def handle(self, *args, **options):
         user_id = options.get('user_id')
@@ -50,6 +89,10 @@ class Command(BaseCommand):
                 bookshelves__updated_at__gte=cutoff_date
             ).distinct()
 
+            if options.get('batch'):
+                self._run_batch(active_users, options)
+                return
+
             self.stdout.write(f"Encontrados {active_users.count()} usuários ativos")
 
             for user in active_users:
@@ -60,4 +103,44 @@ class Command(BaseCommand):
                 except Exception as e:
                     self.stdout.write(self.style.ERROR(f"✗ {user.username}: {str(e)}"))
 
-            self.stdout.write(self.style.SUCCESS("\nCache aquecido para todos os usuários ativos!"))
\ No newline at end of file
+            self.stdout.write(self.style.SUCCESS("\nCache aquecido para todos os usuários ativos!"))
+
+    def _run_batch(self, active_users, options):
+        """Pré-cálculo em lote, retomando do checkpoint"""
+        checkpoint = PrecomputeCheckpoint(options['checkpoint'])
+        if options.get('restart'):
+            checkpoint.reset()
+        else:
+            checkpoint.load()
+
+        user_ids = list(active_users.values_list('id', flat=True))
+        batch = BatchPrecompute(
+            workers=options['workers'],
+            shard_size=options['shard_size'],
+            limit=options['limit'],
+            checkpoint=checkpoint
+        )
+
+        self.stdout.write(
+            f"Encontrados {len(user_ids)} usuários ativos "
+            f"({options['workers']} processos, shards de {options['shard_size']})"
+        )
+
+        def report(summary):
+            self.stdout.write(
+                f"Shard {summary['shards']}/{summary['total_shards']}: "
+                f"{summary['users']} usuários, {summary['users_per_second']:.1f} usuários/s"
+            )
+
+        summary = batch.run(user_ids, progress=report)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"\n{summary['users']} usuários pré-calculados em {summary['elapsed']:.1f}s "
+            f"({summary['users_per_second']:.1f} usuários/s, {summary['errors']} erros)"
+        ))
+        for stage, elapsed in summary['timings'].items():
+            per_user = elapsed / summary['users'] * 1000 if summary['users'] else 0.0
+            self.stdout.write(f"  {stage:<10} {elapsed:8.2f}s  ({per_user:.1f} ms/usuário)")
+
+        if summary['shards'] == summary['total_shards']:
+            checkpoint.reset()
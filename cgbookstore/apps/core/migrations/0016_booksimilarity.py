@@ -0,0 +1,26 @@
+# Generated by Django 5.1.8 on 2026-10-18 03:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_alter_bookauthor_role'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookSimilarity',
+            fields=[
+                ('book', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='similarity_index', serialize=False, to='core.book', verbose_name='Livro')),
+                ('neighbors', models.JSONField(blank=True, default=list, verbose_name='Vizinhos')),
+                ('computed_at', models.DateTimeField(db_index=True, verbose_name='Calculado em')),
+            ],
+            options={
+                'verbose_name': 'Similaridade de Livro',
+                'verbose_name_plural': 'Similaridades de Livros',
+            },
+        ),
+    ]
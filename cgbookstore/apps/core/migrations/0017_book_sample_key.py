@@ -0,0 +1,28 @@
+# Generated by Django 5.1.8 on 2026-10-18 09:00
+
+import cgbookstore.apps.core.models.book
+from django.db import migrations, models
+from django.db.models.functions import Random
+
+
+def shuffle_sample_keys(apps, schema_editor):
+    # AddField aplica o default uma única vez para as linhas existentes;
+    # cada livro precisa de uma chave própria.
+    Book = apps.get_model('core', 'Book')
+    Book.objects.update(sample_key=Random())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_booksimilarity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='sample_key',
+            field=models.FloatField(db_index=True, default=cgbookstore.apps.core.models.book.generate_sample_key, editable=False, help_text='Valor aleatório usado na amostragem das recomendações, reembaralhado periodicamente.', verbose_name='Chave de Amostragem'),
+        ),
+        migrations.RunPython(shuffle_sample_keys, migrations.RunPython.noop),
+    ]
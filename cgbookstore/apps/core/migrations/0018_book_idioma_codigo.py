@@ -0,0 +1,29 @@
+# Generated by Django 5.1.8 on 2026-10-18 10:00
+
+from django.db import migrations, models
+
+from cgbookstore.apps.core.models.book import normalize_language_code
+
+
+def fill_language_codes(apps, schema_editor):
+    # Um UPDATE por valor distinto de idioma, em vez de salvar livro a livro
+    Book = apps.get_model('core', 'Book')
+    languages = Book.objects.order_by().values_list('idioma', flat=True).distinct()
+    for language in list(languages):
+        Book.objects.filter(idioma=language).update(idioma_codigo=normalize_language_code(language))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_book_sample_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='idioma_codigo',
+            field=models.CharField(blank=True, db_index=True, editable=False, help_text='Idioma normalizado, calculado a partir do campo idioma ao salvar.', max_length=10, verbose_name='Código do Idioma'),
+        ),
+        migrations.RunPython(fill_language_codes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.8 on 2026-10-18 04:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_book_idioma_codigo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookTrendingScore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('board', models.CharField(max_length=20, verbose_name='Ranking')),
+                ('score', models.FloatField(verbose_name='Score')),
+                ('computed_at', models.DateTimeField(verbose_name='Calculado em')),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trending_scores', to='core.book', verbose_name='Livro')),
+            ],
+            options={
+                'verbose_name': 'Tendência de Livro',
+                'verbose_name_plural': 'Tendências de Livros',
+                'indexes': [models.Index(fields=['board', '-score'], name='trending_board_score_idx')],
+                'constraints': [models.UniqueConstraint(fields=('board', 'book'), name='unique_trending_board_book')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.8 on 2026-10-18 14:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_booktrendingscore'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='counters_updated_at',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, help_text='Último flush de acessos/vendas; separado de updated_at para não marcar o livro como editado.', null=True, verbose_name='Contadores atualizados em'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.8 on 2026-10-18 15:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_book_counters_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booksimilarity',
+            name='shelf_count',
+            field=models.PositiveIntegerField(default=0, help_text='Usuários com o livro na estante no cálculo; detecta estantes removidas na atualização incremental.', verbose_name='Leitores'),
+        ),
+    ]
@@ -19,6 +19,12 @@ from .home_content import (
 # Do book.py
 from .book import Book, BookAuthor, UserBookShelf
 
+# Do similarity.py
+from .similarity import BookSimilarity
+
+# Do trending.py
+from .trending import BookTrendingScore
+
 # Do author.py
 from .author import Author, AuthorSection, AuthorSectionItem
 
@@ -38,6 +44,6 @@ __all__ = [
     'HomeSection', 'HomeSectionBookItem', 'VideoItem', 'VideoSection',
     'VideoSectionItem', 'Advertisement', 'LinkGridItem', 'CustomSectionType',
     'CustomSectionLayout', 'CustomSection', 'EventItem', 'BackgroundSettings',
-    'Book', 'BookAuthor', 'UserBookShelf', 'Author', 'AuthorSection',
+    'Book', 'BookAuthor', 'UserBookShelf', 'BookSimilarity', 'BookTrendingScore', 'Author', 'AuthorSection',
     'AuthorSectionItem', 'Banner', 'Profile', 'ReadingProgress', 'ReadingStats', 'User',
 ]
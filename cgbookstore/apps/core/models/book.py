@@ -1,6 +1,7 @@
 # Arquivo: cgbookstore/apps/core/models/book.py
 
 import logging
+import random
 from django.db import models
 from django.conf import settings
 from django.core.cache import cache
@@ -13,6 +14,27 @@ from ..recommendations.utils.cache_manager import RecommendationCache
 logger = logging.getLogger(__name__)
 
 
+def generate_sample_key():
+    """Chave aleatória em [0, 1) usada para amostragem indexada de livros"""
+    return random.random()
+
+
+PORTUGUESE_LANGUAGE_VARIANTS = {
+    'pt', 'pt-br', 'pt-pt', 'por', 'portuguese',
+    'português', 'portugues', 'brazil', 'brasil'
+}
+
+
+def normalize_language_code(language):
+    """Código normalizado do idioma: 'pt' para variantes de português, senão as duas primeiras letras"""
+    if not language:
+        return ''
+    normalized = language.lower().strip()
+    if any(variant in normalized for variant in PORTUGUESE_LANGUAGE_VARIANTS):
+        return 'pt'
+    return normalized[:2] if len(normalized) >= 2 else normalized
+
+
 class Book(models.Model):
     # --- Visibilidade e Sugestão de Usuários ---
     class Visibility(models.TextChoices):
@@ -48,6 +70,14 @@ class Book(models.Model):
     data_publicacao = models.DateField(_('Data de Publicação'), null=True, blank=True)
     numero_paginas = models.IntegerField(_('Número de Páginas'), null=True, blank=True)
     idioma = models.CharField(_('Idioma'), max_length=50, blank=True)
+    idioma_codigo = models.CharField(
+        _('Código do Idioma'),
+        max_length=10,
+        blank=True,
+        db_index=True,
+        editable=False,
+        help_text=_('Idioma normalizado, calculado a partir do campo idioma ao salvar.')
+    )
     formato = models.CharField(_('Formato'), max_length=50, blank=True)
     dimensoes = models.CharField(_('Dimensões'), max_length=50, blank=True)
     peso = models.CharField(_('Peso'), max_length=20, blank=True)
@@ -95,6 +125,13 @@ class Book(models.Model):
     created_at = models.DateTimeField(_('Criado em'), auto_now_add=True)
     updated_at = models.DateTimeField(_('Atualizado em'), auto_now=True)
     ativo = models.BooleanField(_('Ativo'), default=True, help_text=_('Indica se o livro está disponível no site.'))
+    sample_key = models.FloatField(
+        _('Chave de Amostragem'),
+        default=generate_sample_key,
+        db_index=True,
+        editable=False,
+        help_text=_('Valor aleatório usado na amostragem das recomendações, reembaralhado periodicamente.')
+    )
 
     # --- Exibição na Home e Métricas ---
     e_lancamento = models.BooleanField(_('É lançamento'), default=False)
@@ -117,6 +154,14 @@ class Book(models.Model):
     tipo_shelf_especial = models.CharField(_('Prateleira'), max_length=50, blank=True)
     quantidade_vendida = models.IntegerField(_('Quantidade vendida'), default=0)
     quantidade_acessos = models.IntegerField(_('Quantidade de acessos'), default=0)
+    counters_updated_at = models.DateTimeField(
+        _('Contadores atualizados em'),
+        null=True,
+        blank=True,
+        db_index=True,
+        editable=False,
+        help_text=_('Último flush de acessos/vendas; separado de updated_at para não marcar o livro como editado.')
+    )
 
     # --- Manager ---
     objects = BookManager()
@@ -242,6 +287,10 @@ class Book(models.Model):
         logger.info("Cache de opções de prateleiras ('shelf_special_choices_v2') limpo.")
 
     def save(self, *args, **kwargs):
+        self.idioma_codigo = normalize_language_code(self.idioma)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'idioma' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'idioma_codigo'}
         super().save(*args, **kwargs)
 
 
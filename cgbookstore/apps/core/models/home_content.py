@@ -95,6 +95,12 @@ class HomeSection(models.Model):
     def __str__(self):
         return f"{self.ordem}: {self.titulo} ({self.get_tipo_display()})"
 
+    # Filtros que leem o índice de tendências: (ranking, contador acumulado usado para completar)
+    TRENDING_BOARDS = {
+        'bestsellers': ('sales', 'quantidade_vendida'),
+        'most_viewed': ('views', 'quantidade_acessos'),
+    }
+
     def get_books(self) -> QuerySet:
         """
         Lógica centralizada para buscar os livros de uma prateleira.
@@ -115,16 +121,35 @@ class HomeSection(models.Model):
             if campo in boolean_fields:
                 return Book.objects.filter(ativo=True, **{campo: True})[:self.max_books]
 
-            if campo == 'bestsellers':
-                return Book.objects.filter(ativo=True, quantidade_vendida__gt=0).order_by('-quantidade_vendida')[:self.max_books]
-            if campo == 'most_viewed':
-                return Book.objects.filter(ativo=True, quantidade_acessos__gt=0).order_by('-quantidade_acessos')[:self.max_books]
+            if campo in self.TRENDING_BOARDS:
+                return self._get_trending_books(campo)
 
             if valor:
                 return Book.objects.filter(ativo=True, **{campo: valor})[:self.max_books]
 
         return Book.objects.none()
 
+    def _get_trending_books(self, campo: str) -> QuerySet:
+        """
+        Livros em alta na última semana (índice com decaimento exponencial),
+        completados pelo contador acumulado quando o índice tem poucos livros.
+        """
+        from .book import Book
+        from ..recommendations.services.trending_index import TrendingIndex
+
+        board, lifetime_field = self.TRENDING_BOARDS[campo]
+        ids = TrendingIndex().top_ids(board, self.max_books)
+
+        if len(ids) < self.max_books:
+            ids += list(
+                Book.objects.filter(ativo=True, **{f'{lifetime_field}__gt': 0})
+                .exclude(id__in=ids)
+                .order_by(f'-{lifetime_field}')
+                .values_list('id', flat=True)[:self.max_books - len(ids)]
+            )
+
+        return TrendingIndex.ordered_queryset(ids)
+
 
 class HomeSectionBookItem(models.Model):
     """
@@ -0,0 +1,38 @@
+# Arquivo: cgbookstore/apps/core/models/similarity.py
+
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+
+from .book import Book
+
+
+class BookSimilarity(models.Model):
+    """
+    Índice item-item pré-calculado de similaridade entre livros.
+
+    Cada registro guarda a lista compacta dos vizinhos mais próximos de um
+    livro no formato [[book_id, score], ...], ordenada do mais similar para
+    o menos similar. O índice é gerado offline pelo comando
+    build_similarity_index e lido pelo SimilarityBasedProvider.
+    """
+    book = models.OneToOneField(
+        Book,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='similarity_index',
+        verbose_name=_('Livro')
+    )
+    neighbors = models.JSONField(_('Vizinhos'), default=list, blank=True)
+    computed_at = models.DateTimeField(_('Calculado em'), db_index=True)
+    shelf_count = models.PositiveIntegerField(
+        _('Leitores'),
+        default=0,
+        help_text=_('Usuários com o livro na estante no cálculo; detecta estantes removidas na atualização incremental.')
+    )
+
+    class Meta:
+        verbose_name = _('Similaridade de Livro')
+        verbose_name_plural = _('Similaridades de Livros')
+
+    def __str__(self):
+        return f"{self.book_id} ({len(self.neighbors)} vizinhos)"
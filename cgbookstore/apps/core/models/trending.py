@@ -0,0 +1,39 @@
+# Arquivo: cgbookstore/apps/core/models/trending.py
+
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+
+from .book import Book
+
+
+class BookTrendingScore(models.Model):
+    """
+    Snapshot do índice de tendências (popularidade com decaimento exponencial).
+
+    O índice vivo fica em sorted sets do Redis (TrendingIndex); o comando
+    maintain_trending_index copia periodicamente o top de cada ranking para
+    cá, com o score já decaído até computed_at. O snapshot é lido quando o
+    Redis está indisponível e usado para repovoá-lo após uma limpeza.
+    """
+    board = models.CharField(_('Ranking'), max_length=20)
+    book = models.ForeignKey(
+        Book,
+        on_delete=models.CASCADE,
+        related_name='trending_scores',
+        verbose_name=_('Livro')
+    )
+    score = models.FloatField(_('Score'))
+    computed_at = models.DateTimeField(_('Calculado em'))
+
+    class Meta:
+        verbose_name = _('Tendência de Livro')
+        verbose_name_plural = _('Tendências de Livros')
+        constraints = [
+            models.UniqueConstraint(fields=['board', 'book'], name='unique_trending_board_book')
+        ]
+        indexes = [
+            models.Index(fields=['board', '-score'], name='trending_board_score_idx')
+        ]
+
+    def __str__(self):
+        return f"{self.board}: {self.book_id} ({self.score:.2f})"
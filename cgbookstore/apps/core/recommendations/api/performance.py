@@ -27,6 +27,7 @@ def get_performance_metrics(request):
 
     # Coleta estatísticas
     metrics['total_recommendations'] = len(recommendations)
+    metrics['provider_metrics'] = engine.get_provider_metrics()
     metrics['cache_stats'] = engine.get_cache_stats()
 
     return Response(metrics)
\ No newline at end of file
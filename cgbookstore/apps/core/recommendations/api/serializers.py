@@ -1,3 +1,7 @@
+import json
+from typing import Any, Dict, List
+
+from django.core.serializers.json import DjangoJSONEncoder
 from rest_framework import serializers
 from cgbookstore.apps.core.models import Book
 
@@ -31,9 +35,42 @@ class PersonalizedShelfSerializer(serializers.Serializer):
     """Serializer para prateleira personalizada"""
     destaques = serializers.ListField(child=serializers.DictField(), required=False)
     seu_idioma = serializers.ListField(child=serializers.DictField(), required=False)
+    based_on_history = serializers.ListField(child=serializers.DictField(), required=False)
     por_genero = serializers.DictField(required=False)
     por_autor = serializers.DictField(required=False)
     descobertas = serializers.ListField(child=serializers.DictField(), required=False)
     has_external = serializers.BooleanField()
     total = serializers.IntegerField()
-    language_preference = serializers.FloatField(required=False)
\ No newline at end of file
+    language_preference = serializers.FloatField(required=False)
+
+
+def serialize_recommendations(items: List[Any]) -> List[Dict]:
+    """Serializa uma lista mista de recomendações (Book e livros externos)"""
+    data = []
+    for item in items:
+        if isinstance(item, Book):
+            data.append(BookRecommendationSerializer(item).data)
+        elif isinstance(item, dict) and 'volumeInfo' in item:
+            data.append(ExternalBookSerializer(item).data)
+    return data
+
+
+def recommendations_ndjson_line(user_id: int, items: List[Any]) -> str:
+    """Uma linha NDJSON com as recomendações de um usuário (saída em lote)"""
+    return json.dumps(
+        {'user_id': user_id, 'recommendations': serialize_recommendations(items)},
+        cls=DjangoJSONEncoder, ensure_ascii=False
+    ) + '\n'
+
+
+def serialize_personalized_shelf(shelf: Dict[str, Any]) -> Dict:
+    """Serializa a prateleira do engine (listas e grupos de Book/externos) para a API"""
+    data = {}
+    for key, value in shelf.items():
+        if isinstance(value, list):
+            data[key] = serialize_recommendations(value)
+        elif key in ('por_genero', 'por_autor') and isinstance(value, dict):
+            data[key] = {group: serialize_recommendations(items) for group, items in value.items()}
+        else:
+            data[key] = value
+    return dict(PersonalizedShelfSerializer(data).data)
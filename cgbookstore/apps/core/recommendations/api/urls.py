@@ -8,4 +8,6 @@ app_name = 'recommendations'  # Alterado para corresponder ao namespace
 urlpatterns = [
     path('', endpoints.get_recommendations, name='recommendations'),
     path('personalized-shelf/', endpoints.get_personalized_shelf, name='personalized-shelf'),
+    path('external/', endpoints.get_external_recommendations, name='external'),
+    path('bulk/', endpoints.get_bulk_recommendations, name='bulk'),
 ]
\ No newline at end of file
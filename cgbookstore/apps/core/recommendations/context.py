@@ -0,0 +1,154 @@
+# cgbookstore/apps/core/recommendations/context.py
+
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+from django.contrib.auth import get_user_model
+
+from ..models import Book, UserBookShelf
+from .providers.mapping import CategoryMapping
+
+User = get_user_model()
+
+
+class UserReadingContext:
+    """
+    Contexto de leitura do usuário compartilhado pelos providers.
+
+    Carrega as prateleiras do usuário (com os livros) uma única vez por
+    requisição e expõe os dados derivados que cada provider precisa:
+    livros excluídos, valores de gênero/autor/categoria normalizados e o
+    perfil de idioma. Os providers aceitam o contexto como parâmetro
+    opcional e criam um próprio quando chamados isoladamente.
+
+    Em lote (for_users), as prateleiras de todos os usuários são carregadas
+    com uma consulta e os contextos compartilham `shared_pools`: conjuntos
+    de candidatos que não dependem do usuário (ex.: livros em alta),
+    calculados uma única vez para o lote.
+    """
+
+    NORMALIZED_FIELDS = ('genero', 'categoria', 'autor')
+
+    def __init__(self, user: Optional[User], shared_pools: Optional[Dict[str, Any]] = None):
+        self.user = user
+        self.shared_pools = shared_pools
+        self._shelves: Optional[List[UserBookShelf]] = None
+        self._normalized: Dict[tuple, List[str]] = {}
+        self._memo: Dict[str, Any] = {}
+        self._mapping = CategoryMapping()
+        # Saída de cada provider no último pipeline executado com este contexto
+        self.provider_results: Dict[str, List[Book]] = {}
+
+    @classmethod
+    def for_user(cls, user: Optional[User], context: Optional['UserReadingContext'] = None) -> 'UserReadingContext':
+        """Reutiliza o contexto recebido ou cria um novo para o usuário"""
+        if context is not None and context.user == user:
+            return context
+        return cls(user)
+
+    @classmethod
+    def for_users(
+            cls, users: Iterable[User], shared_pools: Optional[Dict[str, Any]] = None
+    ) -> Dict[int, 'UserReadingContext']:
+        """Contextos de vários usuários com as prateleiras carregadas em uma única consulta"""
+        shared_pools = {} if shared_pools is None else shared_pools
+        contexts = {user.pk: cls(user, shared_pools=shared_pools) for user in users}
+        for context in contexts.values():
+            context._shelves = []
+
+        if contexts:
+            shelves = UserBookShelf.objects.filter(
+                user_id__in=list(contexts)
+            ).select_related('book').order_by('user_id', '-added_at')
+            for shelf in shelves.iterator(chunk_size=2000):
+                contexts[shelf.user_id]._shelves.append(shelf)
+        return contexts
+
+    @property
+    def shelves(self) -> List[UserBookShelf]:
+        """Todas as prateleiras do usuário, da mais recente para a mais antiga"""
+        if self._shelves is None:
+            if not self.user or not getattr(self.user, 'pk', None):
+                self._shelves = []
+            else:
+                self._shelves = list(
+                    UserBookShelf.objects.filter(
+                        user=self.user
+                    ).select_related('book').order_by('-added_at')
+                )
+        return self._shelves
+
+    def shelves_of(self, *shelf_types: str) -> List[UserBookShelf]:
+        """Prateleiras filtradas por tipo, preservando a ordem por data"""
+        if not shelf_types:
+            return list(self.shelves)
+        wanted = set(shelf_types)
+        return [shelf for shelf in self.shelves if shelf.shelf_type in wanted]
+
+    def books_of(self, *shelf_types: str) -> List[Book]:
+        """Livros das prateleiras informadas, sem repetição"""
+        books = []
+        seen = set()
+        for shelf in self.shelves_of(*shelf_types):
+            if shelf.book_id not in seen:
+                seen.add(shelf.book_id)
+                books.append(shelf.book)
+        return books
+
+    @property
+    def book_ids(self) -> Set[int]:
+        """IDs de todos os livros nas prateleiras (excluídos das recomendações)"""
+        if 'book_ids' not in self._memo:
+            self._memo['book_ids'] = {shelf.book_id for shelf in self.shelves}
+        return self._memo['book_ids']
+
+    @property
+    def total_books(self) -> int:
+        return len(self.shelves)
+
+    def raw_values(self, field: str, shelf_types: Iterable[str] = ()) -> Set[str]:
+        """Valores originais de um campo do livro (ex.: genero) nas prateleiras informadas"""
+        return {
+            getattr(shelf.book, field)
+            for shelf in self.shelves_of(*shelf_types)
+            if getattr(shelf.book, field, None)
+        }
+
+    def normalized_values(self, book: Book, field: str) -> List[str]:
+        """
+        Valores normalizados de gênero, categoria ou autor de um livro.
+
+        Gênero e categoria passam pelo CategoryMapping; autor é apenas
+        separado por vírgula e aparado. O resultado é memorizado por livro.
+        """
+        key = (book.id, field)
+        if key not in self._normalized:
+            raw = getattr(book, field, '') or ''
+            values = []
+            for part in raw.split(','):
+                if field == 'autor':
+                    value = part.strip()
+                else:
+                    value = self._mapping.normalize_category(part.strip())
+                if value:
+                    values.append(value)
+            self._normalized[key] = values
+        return self._normalized[key]
+
+    def memoize(self, key: str, factory: Callable[[], Any]) -> Any:
+        """Calcula um valor derivado apenas uma vez durante a requisição"""
+        if key not in self._memo:
+            self._memo[key] = factory()
+        return self._memo[key]
+
+    def memoize_shared(self, key: str, factory: Callable[[], Any]) -> Any:
+        """Valor independente do usuário, calculado uma vez por lote (ou a cada chamada, fora de lote)"""
+        if self.shared_pools is None:
+            return factory()
+        if key not in self.shared_pools:
+            self.shared_pools[key] = factory()
+        return self.shared_pools[key]
+
+    @property
+    def language_profile(self) -> Dict:
+        """Afinidade de idioma do usuário, calculada sobre as prateleiras já carregadas"""
+        from .providers.language_preference import LanguagePreferenceProvider
+        return LanguagePreferenceProvider().get_language_affinity(self.user, context=self)
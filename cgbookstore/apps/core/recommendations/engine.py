@@ -1,6 +1,10 @@
 # cgbookstore/apps/core/recommendations/engine.py
 
-from typing import List, Set, Dict, Any, Union
+from typing import List, Set, Dict, Any, Union, Optional, Iterable, Iterator, Tuple
+import time
+import uuid
+import numpy as np
+from django.conf import settings
 from django.core.cache import caches
 from django.contrib.auth import get_user_model
 from django.db.models import Q
@@ -9,11 +13,20 @@ from django.utils import timezone
 from .providers.history import HistoryBasedProvider
 from .providers.category import CategoryBasedProvider
 from .providers.similarity import SimilarityBasedProvider
+from .providers.collaborative import CollaborativeFilteringProvider
 from .providers.exclusion import ExclusionProvider
 from .providers.temporal import TemporalProvider
 from .providers.external_api import ExternalApiProvider
 from .providers.language_preference import LanguagePreferenceProvider
 from .services.calculator import RecommendationCalculator
+from .services.catalog_snapshot import CatalogSnapshot
+from .services.trending_index import TrendingIndex
+from .services.diversity import DiversityReranker
+from .services.exclusion_set import UserExclusionSet
+from .context import UserReadingContext
+from .executor import ProviderExecutor, BackgroundTasks
+from .utils.cache_manager import RecommendationCache
+from .utils.sampling import BookSampler
 from ..models import Book, UserBookShelf
 
 import logging
@@ -21,6 +34,17 @@ import logging
 logger = logging.getLogger(__name__)
 User = get_user_model()
 
+# Retorno de _acquire_refresh_lock quando o cache falha: o lock conta como ocupado
+LOCK_UNAVAILABLE = ''
+
+# Libera o lock de recálculo apenas se ele ainda pertence ao token do chamador
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
 
 class RecommendationEngine:
     """Motor de recomendações com priorização local e análise de idioma"""
@@ -35,6 +59,11 @@ class RecommendationEngine:
         self._temporal_provider = TemporalProvider()
         self._language_provider = LanguagePreferenceProvider()
         self._exclusion_provider = ExclusionProvider()
+        # Fatores ALS treinados offline; só participa quando há modelo publicado
+        self._collaborative_provider = CollaborativeFilteringProvider()
+        self._trending_index = TrendingIndex()
+        # Etapa de re-ranking após a geração de candidatos (None desativa)
+        self._reranker = DiversityReranker()
 
         # Provider externo (usado apenas quando necessário)
         self._external_provider = ExternalApiProvider()
@@ -43,65 +72,257 @@ class RecommendationEngine:
         self.DEFAULT_LIMIT = 20
         self.MIN_LOCAL_RECOMMENDATIONS = 15  # Aumentado para priorizar local
         self.EXTERNAL_THRESHOLD = 0.3  # Máximo 30% de recomendações externas
+        self.CANDIDATE_POOL_FACTOR = 2  # Candidatos locais por vaga, para o re-ranking por diversidade
+
+        # Prateleira personalizada: limite de livros por seção
+        self.SHELF_LIMITS = {
+            'destaques': 5,
+            'seu_idioma': 8,
+            'based_on_history': 8,
+            'por_genero': 5,
+            'por_autor': 3,
+            'descobertas': 5,
+        }
+        self.HIGHLIGHT_MIN_SALES = 10
+
+        # Recomendações em lote (get_recommendations_bulk)
+        self.BULK_CHUNK_SIZE = 500
+
+        # Orçamento de tempo (segundos) de cada provider local executado em paralelo
+        self.PROVIDER_TIMEOUTS = {
+            'history': 1.5,
+            'category': 2.0,
+            'similarity': 1.0,
+            'temporal': 1.5,
+            'language': 2.0,
+            'collaborative': 1.0,
+        }
+        self._executor = ProviderExecutor(timeouts=self.PROVIDER_TIMEOUTS)
+
+        # Stale-while-revalidate: a última lista calculada é servida imediatamente
+        # e recalculada em segundo plano quando passa do TTL "soft"
+        self.CACHE_SOFT_TTL = RecommendationCache.CACHE_TTL['recommendations']
+        self.CACHE_HARD_TTL = 60 * 60 * 24
+        self.REFRESH_LOCK_TTL = 60
+        self.REFRESH_WAIT = 2.0
+
+        # Complemento externo assíncrono: na requisição, a parte do Google Books é
+        # calculada em segundo plano e buscada depois (get_external_recommendations)
+        self.ASYNC_EXTERNAL = getattr(settings, 'RECOMMENDATION_ASYNC_EXTERNAL', True)
+        self.EXTERNAL_PENDING_TTL = 60
+
+    def get_recommendations(
+            self,
+            user: User,
+            limit: int = None,
+            context: Optional[UserReadingContext] = None,
+            surface: Optional[str] = None
+    ) -> List[Union[Book, Dict]]:
+        """
+        Obtém recomendações priorizando resultados locais e preferências de idioma.
 
-    def get_recommendations(self, user: User, limit: int = None) -> List[Union[Book, Dict]]:
-        """Obtém recomendações priorizando resultados locais e preferências de idioma"""
+        Serve a última lista calculada do cache (stale-while-revalidate): se ela
+        passou do TTL soft, agenda o recálculo em segundo plano. Sem cache, o
+        cálculo é feito por apenas uma requisição por usuário (single-flight).
+
+        O cache guarda o conjunto de candidatos locais (CANDIDATE_POOL_FACTOR
+        vezes o limite); `surface` ('home', 'shelf', 'widget') escolhe o λ de
+        diversidade com que o MMR seleciona os livros servidos desse conjunto.
+        """
         if limit is None:
             limit = self.DEFAULT_LIMIT
 
-        try:
-            logger.info("\n=== Iniciando recomendações com prioridade local ===")
+        return self._get_recommendations(user, limit, context=context, surface=surface)
 
-            # 1. Primeiro, busca recomendações locais
-            excluded_books = self._exclusion_provider.get_excluded_books(user)
+    def _select_recommendations(
+            self,
+            local_books: List[Book],
+            external_books: List[Dict],
+            limit: int,
+            surface: Optional[str] = None
+    ) -> List[Union[Book, Dict]]:
+        """Escolhe os livros locais do conjunto de candidatos com o λ da superfície e completa com os externos"""
+        return self._merge_recommendations(self._rerank(local_books, limit, surface), external_books, limit)
 
-            # Obtém perfil de idioma do usuário
-            language_profile = self._language_provider.get_language_affinity(user)
-            logger.info(f"Perfil de idioma: {language_profile}")
+    def _rerank(self, books: List[Book], limit: int, surface: Optional[str] = None) -> List[Book]:
+        if self._reranker is None:
+            return books[:limit]
+        return self._reranker.rerank(books, limit, surface)
 
-            # Calcula pesos adaptativos baseados no perfil do usuário
-            adaptive_weights = self._calculate_adaptive_weights(user, language_profile)
-            logger.info(f"Pesos adaptativos: {adaptive_weights}")
+    def get_recommendations_bulk(
+            self,
+            user_ids: Iterable[int],
+            limit: int = None,
+            include_external: bool = False
+    ) -> Iterator[Tuple[int, List[Union[Book, Dict]]]]:
+        """
+        Recomendações de muitos usuários (ex.: e-mails e push), em blocos.
+
+        Para cada bloco de BULK_CHUNK_SIZE usuários: uma consulta de
+        usuários, uma de prateleiras (UserReadingContext.for_users), um
+        MGET de gerações e um de entradas de cache, e uma consulta para os
+        livros de todas as entradas encontradas. Só os usuários sem cache
+        passam pelo pipeline, compartilhando entre si o CatalogSnapshot e os
+        conjuntos de candidatos independentes do usuário.
+
+        É um gerador de (user_id, recomendações), na ordem de `user_ids`;
+        ids inexistentes são ignorados. Sem include_external, usuários sem
+        cache recebem apenas recomendações locais (e o cache não é gravado).
+        """
+        if limit is None:
+            limit = self.DEFAULT_LIMIT
+        user_ids = list(dict.fromkeys(int(user_id) for user_id in user_ids))
 
-            # Obtém recomendações locais com pesos adaptativos
-            local_books = self._get_local_recommendations(
-                user,
-                excluded_books,
-                limit,
-                adaptive_weights
-            )
-            local_count = len(local_books)
-            logger.info(f"Recomendações locais encontradas: {local_count}")
+        shared_pools: Dict[str, Any] = {}
+        for start in range(0, len(user_ids), self.BULK_CHUNK_SIZE):
+            chunk = user_ids[start:start + self.BULK_CHUNK_SIZE]
+            yield from self._get_recommendations_chunk(chunk, limit, include_external, shared_pools)
 
-            # 2. Decide se precisa de recomendações externas
-            external_books = []
-            max_external = int(limit * self.EXTERNAL_THRESHOLD)
+    def _get_recommendations_chunk(
+            self,
+            user_ids: List[int],
+            limit: int,
+            include_external: bool,
+            shared_pools: Dict[str, Any]
+    ) -> Iterator[Tuple[int, List[Union[Book, Dict]]]]:
+        users = User.objects.in_bulk(user_ids)
+        contexts = UserReadingContext.for_users(users.values(), shared_pools=shared_pools)
+
+        generations = RecommendationCache.get_generations(list(users))
+        keys = {user_id: self._format_cache_key(user_id) for user_id in users}
+        try:
+            found = self._cache.get_many(list(keys.values()))
+        except Exception as e:
+            logger.error(f"Erro ao ler cache de recomendações em lote: {str(e)}")
+            found = {}
 
-            if local_count < self.MIN_LOCAL_RECOMMENDATIONS and max_external > 0:
-                logger.info(f"Buscando até {max_external} recomendações externas complementares")
+        cached = {
+            user_id: found[key] for user_id, key in keys.items()
+            if self._is_usable_entry(found.get(key), generations.get(user_id), limit)
+        }
+        books = Book.objects.in_bulk({book_id for entry in cached.values() for book_id in entry.get('local', [])})
+
+        for user_id in user_ids:
+            user = users.get(user_id)
+            if user is None:
+                continue
+            try:
+                if user_id in cached:
+                    recommendations = self._load_cached_recommendations(cached[user_id], limit, books=books)
+                else:
+                    recommendations = self._compute_recommendations(
+                        user, limit, context=contexts[user_id],
+                        update_cache=include_external, include_external=include_external
+                    )
+            except Exception as e:
+                logger.error(f"Erro nas recomendações em lote do usuário {user_id}: {str(e)}")
+                recommendations = []
+            yield user_id, recommendations
 
-                # Busca recomendações externas focadas no idioma preferido
-                external_books = self._get_filtered_external_recommendations(
-                    user,
-                    language_profile,
-                    min(max_external, limit - local_count)
+    def _get_recommendations(
+            self,
+            user: User,
+            limit: int,
+            context: Optional[UserReadingContext] = None,
+            surface: Optional[str] = None
+    ) -> List[Union[Book, Dict]]:
+        context = UserReadingContext.for_user(user, context)
+        if not user or not getattr(user, 'pk', None):
+            return self._get_anonymous_recommendations(user, limit, context=context, surface=surface)
+
+        defer_external = self.ASYNC_EXTERNAL
+
+        cached = self._get_cached_entry(user, limit)
+        if cached is not None:
+            if time.time() - cached.get('computed_at', 0) > self.CACHE_SOFT_TTL:
+                self._schedule_refresh(user, limit)
+            return self._load_cached_recommendations(cached, limit, surface=surface)
+
+        token = self._acquire_refresh_lock(user)
+        if token:
+            try:
+                return self._compute_recommendations(
+                    user, limit, context=context, defer_external=defer_external, surface=surface
                 )
-                logger.info(f"Recomendações externas obtidas: {len(external_books)}")
+            finally:
+                self._release_refresh_lock(user, token)
+
+        if token is None:
+            # Outra requisição já está calculando para este usuário: aguarda o resultado
+            cached = self._wait_for_cached_entry(user, limit)
+            if cached is not None:
+                return self._load_cached_recommendations(cached, limit, surface=surface)
+
+        # Sem resultado no prazo (ou sem cache): responde só com as locais, sem gravar
+        # o cache nem consultar a API externa, para não disputar o recálculo com o dono do lock
+        return self._compute_recommendations(
+            user, limit, context=context, update_cache=False, include_external=False, surface=surface
+        )
+
+    def _get_anonymous_recommendations(
+            self,
+            user: User,
+            limit: int,
+            context: Optional[UserReadingContext] = None,
+            surface: Optional[str] = None
+    ) -> List[Union[Book, Dict]]:
+        """
+        Visitantes sem histórico recebem os livros em alta (índice de tendências);
+        o pipeline completo só é executado para completar a lista, sem gravar
+        no cache (a chave de visitantes sem id seria compartilhada por todos).
+        """
+        trending = self._trending_index.top_books('trending', limit)
+        if len(trending) >= limit:
+            return trending
+
+        seen = {book.id for book in trending}
+        computed = self._compute_recommendations(
+            user, limit, context=context, update_cache=False, surface=surface
+        )
+        return (trending + [
+            book for book in computed
+            if self._is_external(book) or book.id not in seen
+        ])[:limit]
+
+    def _compute_recommendations(
+            self,
+            user: User,
+            limit: int,
+            context: Optional[UserReadingContext] = None,
+            update_cache: bool = True,
+            defer_external: bool = False,
+            include_external: bool = True,
+            surface: Optional[str] = None
+    ) -> List[Union[Book, Dict]]:
+        """
+        Executa o pipeline completo de recomendações e atualiza o cache.
+        Com update_cache=False o resultado não é gravado.
+        Com defer_external=True o complemento externo é calculado em segundo
+        plano e a lista retornada contém apenas o que já estiver pronto.
+        Com include_external=False a API externa não é consultada.
+        """
+        try:
+            # Carrega as prateleiras do usuário uma única vez para todos os providers
+            context = UserReadingContext.for_user(user, context)
 
-            # 3. Combina resultados mantendo prioridade local
-            all_recommendations = self._merge_recommendations(
-                local_books,
-                external_books,
-                limit
+            local_books, external_books, external_pending = self._compute_candidates(
+                user, limit, context=context, defer_external=defer_external, include_external=include_external
             )
 
+            # Armazena no cache o conjunto de candidatos; o MMR roda ao servir
+            if update_cache:
+                self._update_cache(
+                    user, local_books + external_books, context=context, limit=limit,
+                    external_key=self._get_external_key(user) if external_pending else None
+                )
+
+            # 3. Combina resultados mantendo prioridade local
+            all_recommendations = self._select_recommendations(local_books, external_books, limit, surface)
+
             logger.info(f"\nTotal de recomendações: {len(all_recommendations)}")
             logger.info(f"- Locais: {len([r for r in all_recommendations if not self._is_external(r)])}")
             logger.info(f"- Externas: {len([r for r in all_recommendations if self._is_external(r)])}")
 
-            # Armazena no cache
-            self._update_cache(user, all_recommendations)
-
             return all_recommendations
 
         except Exception as e:
@@ -110,7 +331,77 @@ class RecommendationEngine:
             logger.error(traceback.format_exc())
             return self._get_fallback_recommendations(user, [], limit)
 
-    def _calculate_adaptive_weights(self, user: User, language_profile: Dict) -> Dict:
+    def _compute_candidates(
+            self,
+            user: User,
+            limit: int,
+            context: Optional[UserReadingContext] = None,
+            defer_external: bool = False,
+            include_external: bool = True
+    ) -> Tuple[List[Book], List[Dict], bool]:
+        """
+        Candidatos do usuário: (conjunto local ordenado por relevância, itens
+        externos, complemento externo pendente). É o que vai para o cache;
+        a seleção final dos livros locais é feita por _select_recommendations.
+        """
+        logger.info("\n=== Iniciando recomendações com prioridade local ===")
+        context = UserReadingContext.for_user(user, context)
+
+        # 1. Primeiro, busca recomendações locais
+        excluded_books = set(self._exclusion_provider.get_excluded_books(user, context=context))
+
+        # Obtém perfil de idioma do usuário
+        language_profile = self._language_provider.get_language_affinity(user, context=context)
+        logger.info(f"Perfil de idioma: {language_profile}")
+
+        # Calcula pesos adaptativos baseados no perfil do usuário
+        adaptive_weights = self._calculate_adaptive_weights(user, language_profile, context=context)
+        logger.info(f"Pesos adaptativos: {adaptive_weights}")
+
+        # Obtém recomendações locais com pesos adaptativos
+        local_books = self._get_local_recommendations(
+            user,
+            excluded_books,
+            limit,
+            adaptive_weights,
+            context=context
+        )
+        # Livros locais que serão servidos (o conjunto tem mais candidatos que o limite)
+        local_count = min(len(local_books), limit)
+        logger.info(f"Recomendações locais encontradas: {local_count}")
+
+        # 2. Decide se precisa de recomendações externas
+        external_books = []
+        external_pending = False
+        max_external = int(limit * self.EXTERNAL_THRESHOLD)
+
+        if include_external and local_count < self.MIN_LOCAL_RECOMMENDATIONS and max_external > 0:
+            logger.info(f"Buscando até {max_external} recomendações externas complementares")
+            external_limit = min(max_external, limit - local_count)
+
+            if defer_external and user and getattr(user, 'pk', None):
+                # Não bloqueia a requisição na API externa
+                external_books, external_pending = self._schedule_external_fill(
+                    user, language_profile, external_limit, context=context
+                )
+            else:
+                # Busca recomendações externas focadas no idioma preferido
+                external_books = self._get_filtered_external_recommendations(
+                    user,
+                    language_profile,
+                    external_limit,
+                    context=context
+                )
+            logger.info(f"Recomendações externas obtidas: {len(external_books)}")
+
+        return local_books, external_books, external_pending
+
+    def _calculate_adaptive_weights(
+            self,
+            user: User,
+            language_profile: Dict,
+            context: Optional[UserReadingContext] = None
+    ) -> Dict:
         """Calcula pesos adaptativos baseados no perfil do usuário"""
         # Pesos base
         base_weights = {
@@ -122,7 +413,7 @@ class RecommendationEngine:
         }
 
         # Analisa padrões do usuário
-        user_stats = self._analyze_user_behavior(user)
+        user_stats = self._analyze_user_behavior(user, context=context)
 
         # Ajusta pesos baseado no comportamento
         if user_stats['is_eclectic']:
@@ -147,11 +438,14 @@ class RecommendationEngine:
             base_weights['temporal'] += 0.10
             base_weights['category'] -= 0.10
 
+        if self._collaborative_provider.is_available():
+            base_weights['collaborative'] = 0.20
+
         # Normaliza pesos para somar 1.0
         total = sum(base_weights.values())
         return {k: v / total for k, v in base_weights.items()}
 
-    def _analyze_user_behavior(self, user: User) -> Dict:
+    def _analyze_user_behavior(self, user: User, context: Optional[UserReadingContext] = None) -> Dict:
         """Analisa comportamento de leitura do usuário"""
         stats = {
             'is_eclectic': False,
@@ -161,12 +455,10 @@ class RecommendationEngine:
         }
 
         try:
-            user_books = UserBookShelf.objects.filter(
-                user=user,
-                shelf_type__in=['lido', 'lendo', 'favorito']
-            ).select_related('book')
+            context = UserReadingContext.for_user(user, context)
+            user_books = context.shelves_of('lido', 'lendo', 'favorito')
 
-            if user_books.count() < 3: # <--- Linha alterada (era 5)
+            if len(user_books) < 3: # <--- Linha alterada (era 5)
                 return stats
 
             # Verifica ecletismo (variedade de gêneros)
@@ -190,11 +482,10 @@ class RecommendationEngine:
             from django.utils import timezone # Importação movida para dentro do try para escopo local se necessário
             from datetime import timedelta
 
-            recent_books = user_books.filter(
-                added_at__gte=timezone.now() - timedelta(days=365)
-            )
+            cutoff = timezone.now() - timedelta(days=365)
+            recent_books = [shelf for shelf in user_books if shelf.added_at >= cutoff]
 
-            if recent_books.count() >= 12:
+            if len(recent_books) >= 12:
                 # Agrupa por mês
                 books_by_month = {}
                 for shelf in recent_books:
@@ -217,9 +508,14 @@ class RecommendationEngine:
             user: User,
             excluded_books: Set[int],
             limit: int,
-            weights: Dict
+            weights: Dict,
+            context: Optional[UserReadingContext] = None
     ) -> List[Book]:
-        """Obtém recomendações locais com pesos adaptativos"""
+        """
+        Conjunto de candidatos locais com pesos adaptativos: até
+        limit × CANDIDATE_POOL_FACTOR livros, ordenados por relevância, dos
+        quais o MMR escolhe os servidos.
+        """
         try:
             # Providers locais
             providers = [
@@ -229,32 +525,41 @@ class RecommendationEngine:
                 (self._temporal_provider, 'temporal'),
                 (self._language_provider, 'language')
             ]
+            if self._collaborative_provider.is_available():
+                providers.append((self._collaborative_provider, 'collaborative'))
 
             all_recommendations = []
-            recommendations_by_provider = {}
-
-            for provider, name in providers:
-                try:
-                    # Calcula limite baseado no peso
-                    provider_limit = max(1, int(limit * weights.get(name, 0.2) * 1.5))
-
-                    # Obtém recomendações
-                    provider_recommendations = provider.get_recommendations(
-                        user=user,
-                        limit=provider_limit
-                    )
-
-                    # Armazena para análise
-                    recommendations_by_provider[name] = list(provider_recommendations)
 
-                    logger.info(f"Provider {name}: {len(recommendations_by_provider[name])} recomendações")
+            # Carrega os dados compartilhados antes de distribuir entre as threads
+            context = UserReadingContext.for_user(user, context)
+            _ = context.book_ids
+            _ = context.language_profile
+
+            def make_task(provider, name):
+                # Calcula limite baseado no peso
+                provider_limit = max(1, int(limit * weights.get(name, 0.2) * 1.5))
+                return lambda: list(provider.get_recommendations(
+                    user=user,
+                    limit=provider_limit,
+                    context=context
+                ))
+
+            # Executa os providers em paralelo; os que estouram o orçamento são descartados
+            recommendations_by_provider = self._executor.run(
+                [(name, make_task(provider, name)) for provider, name in providers]
+            )
+            for name, books in recommendations_by_provider.items():
+                logger.info(f"Provider {name}: {len(books)} recomendações")
+            # Reaproveitada pela prateleira personalizada (ex.: 'based_on_history')
+            context.provider_results = dict(recommendations_by_provider)
 
-                except Exception as e:
-                    logger.error(f"Erro no provider {name}: {str(e)}")
-                    recommendations_by_provider[name] = []
+            # Redistribui o peso dos providers descartados entre os que responderam
+            weights = self._reweight(weights, recommendations_by_provider.keys())
 
-            # Combina recomendações com deduplicação inteligente
+            # Combina recomendações com deduplicação inteligente, em um conjunto
+            # de candidatos maior que o limite para a etapa de diversidade
             seen_books = set()
+            pool_size = limit * self.CANDIDATE_POOL_FACTOR
 
             # Primeira passada: adiciona top recomendações de cada provider
             for provider_name, books in recommendations_by_provider.items():
@@ -272,33 +577,51 @@ class RecommendationEngine:
                 top_count = max(1, int(len(books) * weight))
 
                 for book in books[top_count:]:
-                    if len(all_recommendations) >= limit:
+                    if len(all_recommendations) >= pool_size:
                         break
                     if book.id not in seen_books and book.id not in excluded_books:
                         all_recommendations.append(book)
                         seen_books.add(book.id)
 
-            # Ordena por relevância combinada
-            all_recommendations = self._sort_by_relevance(all_recommendations, user)
-
-            return all_recommendations[:limit]
+            # Ordena por relevância combinada; a seleção por diversidade é feita ao servir
+            return self._sort_by_relevance(all_recommendations, user, context=context)[:pool_size]
 
         except Exception as e:
             logger.error(f"Erro em _get_local_recommendations: {str(e)}")
-            return list(Book.objects.exclude(
-                id__in=excluded_books
-            ).order_by('-quantidade_acessos', '?')[:limit])
+            return UserExclusionSet.take(
+                Book.objects.order_by('-quantidade_acessos', *BookSampler.TIEBREAK), set(excluded_books), limit
+            )
+
+    def _reweight(self, weights: Dict, available: Any) -> Dict:
+        """Redistribui proporcionalmente o peso dos providers ausentes entre os disponíveis"""
+        available = set(available)
+        total = sum(weights.get(name, 0.2) for name in weights)
+        kept = sum(weights.get(name, 0.2) for name in available)
+
+        if not available or kept <= 0:
+            return dict(weights)
+
+        scale = total / kept
+        return {
+            name: (weight * scale if name in available else 0.0)
+            for name, weight in weights.items()
+        }
+
+    def get_provider_metrics(self) -> Dict[str, Dict[str, float]]:
+        """Métricas de execução dos providers locais (incluindo descartes por timeout)"""
+        return ProviderExecutor.get_metrics()
 
     def _get_filtered_external_recommendations(
             self,
             user: User,
             language_profile: Dict,
-            limit: int
+            limit: int,
+            context: Optional[UserReadingContext] = None
     ) -> List[Dict]:
         """Obtém recomendações externas filtradas por idioma"""
         try:
             # Modifica os padrões de busca para incluir idioma
-            original_patterns = self._external_provider._get_user_patterns(user)
+            original_patterns = self._external_provider._get_user_patterns(user, context=context)
 
             # Se usuário prefere português, adiciona filtros de idioma
             if language_profile['portuguese_preference'] > 0.5:
@@ -325,7 +648,8 @@ class RecommendationEngine:
             # Busca recomendações
             external_books = self._external_provider.get_recommendations(
                 user=user,
-                limit=limit
+                limit=limit,
+                context=context
             )
 
             # Restaura configuração original
@@ -356,42 +680,45 @@ class RecommendationEngine:
 
         return merged[:limit]
 
-    def _sort_by_relevance(self, books: List[Book], user: User) -> List[Book]:
-        """Ordena livros por relevância combinada"""
-        try:
-            # Obtém preferências do usuário
-            language_profile = self._language_provider.get_language_affinity(user)
-
-            scored_books = []
-            for book in books:
-                score = 0.0
+    def _sort_by_relevance(
+            self,
+            books: List[Book],
+            user: User,
+            context: Optional[UserReadingContext] = None
+    ) -> List[Book]:
+        """
+        Ordena livros por relevância combinada.
 
-                # Pontuação por popularidade
-                score += book.quantidade_acessos * 0.001
-                score += book.quantidade_vendida * 0.01
+        O score é calculado em uma única passada vetorizada sobre as features
+        do CatalogSnapshot: popularidade, destaque, bônus para português e
+        penalidade para idiomas evitados (códigos já normalizados na escrita).
+        """
+        try:
+            if not books:
+                return books
 
-                # Boost para livros em destaque
-                if book.e_destaque:
-                    score *= 1.5
+            # Perfil de idioma memoizado no contexto de leitura
+            language_profile = UserReadingContext.for_user(user, context).language_profile
 
-                # Boost para idioma preferido
-                if book.idioma and language_profile['portuguese_preference'] > 0.5:
-                    if self._language_provider._is_portuguese(book.idioma):
-                        score *= 1.3
+            snapshot = CatalogSnapshot.current()
+            features = snapshot.features(book.id for book in books)
+            languages = features['idioma']
 
-                # Penalidade para idiomas evitados
-                if book.idioma:
-                    normalized_lang = self._language_provider._normalize_language(book.idioma)
-                    if normalized_lang in language_profile.get('avoided_languages', {}):
-                        score *= 0.5
+            # Popularidade, com boost para livros em destaque
+            scores = CatalogSnapshot.popularity(features)
 
-                scored_books.append((book, score))
+            # Boost para idioma preferido
+            if language_profile['portuguese_preference'] > 0.5:
+                scores = np.where(languages == snapshot.term_id('idioma', 'pt'), scores * 1.3, scores)
 
-            # Ordena por score
-            scored_books.sort(key=lambda x: x[1], reverse=True)
+            # Penalidade para idiomas evitados
+            avoided = [snapshot.term_id('idioma', code) for code in language_profile.get('avoided_languages', {})]
+            if avoided:
+                scores = np.where(np.isin(languages, avoided), scores * 0.5, scores)
 
-            # Retorna livros ordenados
-            return [book for book, _ in scored_books]
+            # Ordena por score, mantendo a ordem original nos empates
+            order = np.argsort(-scores, kind='stable')
+            return [books[i] for i in order]
 
         except Exception as e:
             logger.error(f"Erro ao ordenar por relevância: {str(e)}")
@@ -403,42 +730,74 @@ class RecommendationEngine:
             return True
         return hasattr(book, 'is_temporary') and book.is_temporary
 
-    def _update_cache(self, user: User, recommendations: List) -> None:
+    def _update_cache(
+            self,
+            user: User,
+            recommendations: List,
+            context: Optional[UserReadingContext] = None,
+            limit: Optional[int] = None,
+            external_key: Optional[str] = None
+    ) -> None:
         """Atualiza cache com nova estrutura"""
         try:
-            cache_key = self._get_cache_key(user)
-
-            # Separa recomendações por tipo
-            local_ids = []
-            external_ids = []
-
-            for book in recommendations:
-                if self._is_external(book):
-                    if isinstance(book, dict):
-                        external_ids.append(book.get('id', ''))
-                    else:
-                        external_ids.append(book.external_id or f"temp_{book.id}")
-                else:
-                    local_ids.append(book.id)
-
-            cache_data = {
-                'local': local_ids,
-                'external': external_ids,
-                'has_external': bool(external_ids),
-                'total': len(recommendations),
-                'timestamp': timezone.now().isoformat()
-            }
-
-            self._cache.set(cache_key, cache_data)
+            cache_key = self._get_cache_key(user, context=context)
+            entry = self._build_cache_entry(
+                recommendations, RecommendationCache.get_generation(user.id), limit, external_key
+            )
+            self._cache.set(cache_key, entry, self.CACHE_HARD_TTL)
 
         except Exception as e:
             logger.error(f"Erro ao atualizar cache: {str(e)}")
 
-    def get_mixed_recommendations(self, user: User, limit: int = 20) -> Dict[str, Any]:
+    def _build_cache_entry(
+            self,
+            recommendations: List,
+            generation: int,
+            limit: Optional[int] = None,
+            external_key: Optional[str] = None
+    ) -> Dict:
+        """
+        Entrada de cache: ids do conjunto de candidatos locais e itens
+        externos já serializados. `generation` é a geração do cache do
+        usuário na gravação; `external_key` indica um complemento externo
+        ainda em cálculo.
+        """
+        # Separa recomendações por tipo
+        local_ids = []
+        external_items = []
+
+        for book in recommendations:
+            if self._is_external(book):
+                if isinstance(book, dict):
+                    external_items.append(book)
+            else:
+                local_ids.append(book.id)
+
+        return {
+            'local': local_ids,
+            'external': external_items,
+            'has_external': bool(external_items),
+            'external_key': external_key,
+            'total': min(len(local_ids), limit or len(local_ids)) + len(external_items),
+            'limit': limit,
+            'generation': generation,
+            'computed_at': time.time(),
+            'timestamp': timezone.now().isoformat()
+        }
+
+    def get_mixed_recommendations(
+            self,
+            user: User,
+            limit: int = 20,
+            context: Optional[UserReadingContext] = None,
+            surface: Optional[str] = None
+    ) -> Dict[str, Any]:
         """Obtém recomendações mistas com nova priorização"""
         try:
+            context = UserReadingContext.for_user(user, context)
+
             # Usa o método principal que já retorna recomendações mistas
-            recommendations = self.get_recommendations(user, limit)
+            recommendations = self.get_recommendations(user, limit, context=context, surface=surface)
 
             # Separa por tipo
             local_books = []
@@ -450,12 +809,16 @@ class RecommendationEngine:
                 else:
                     local_books.append(book)
 
+            # Complemento externo ainda em cálculo: a interface consulta depois
+            external_pending = not external_books and self.get_external_recommendations(user)['status'] == 'pending'
+
             return {
                 'local': local_books,
                 'external': external_books,
                 'has_external': bool(external_books),
+                'external_pending': external_pending,
                 'total': len(recommendations),
-                'language_profile': self._language_provider.get_language_affinity(user)
+                'language_profile': context.language_profile
             }
 
         except Exception as e:
@@ -464,76 +827,39 @@ class RecommendationEngine:
                 'local': [],
                 'external': [],
                 'has_external': False,
+                'external_pending': False,
                 'total': 0,
                 'language_profile': {}
             }
 
-    def get_personalized_shelf(self, user: User, shelf_size: int = 20) -> Dict[str, Any]:
-        """Gera prateleira personalizada com foco em preferências de idioma"""
+    def get_personalized_shelf(
+            self, user: User, shelf_size: int = 20, context: Optional[UserReadingContext] = None
+    ) -> Dict[str, Any]:
+        """
+        Gera prateleira personalizada com foco em preferências de idioma.
+
+        Uma única passada pelo pipeline: as seções são distribuídas a partir
+        da lista principal (superfície 'shelf') e 'based_on_history' reusa a
+        saída do provider de histórico já calculada para ela.
+        """
         try:
-            # Obtém recomendações mistas
-            mixed_data = self.get_mixed_recommendations(user, limit=shelf_size)
-            local_books = mixed_data.get('local', [])
-            external_books = mixed_data.get('external', [])
-            language_profile = mixed_data.get('language_profile', {})
-
-            # Seções da prateleira
-            sections = {
-                'destaques': [],
-                'seu_idioma': [],  # Nova seção para idioma preferido
-                'based_on_history': [],  # Seção baseada no histórico
-                'por_genero': {},
-                'por_autor': {},
-                'descobertas': []  # Nova seção para descobertas
-            }
+            context = UserReadingContext.for_user(user, context)
+
+            recommendations = self.get_recommendations(user, shelf_size, context=context, surface='shelf')
+            local_books = [book for book in recommendations if not self._is_external(book)]
+            external_books = [book for book in recommendations if self._is_external(book)]
+            language_profile = context.language_profile
+
+            # Lista principal vinda do cache: o provider de histórico ainda não rodou
+            history_books = context.provider_results.get('history')
+            if history_books is None:
+                history_books = self._history_provider.get_recommendations(
+                    user, limit=self.SHELF_LIMITS['based_on_history'], context=context
+                )
 
-            # Obtém recomendações baseadas no histórico
-            history_books = self._history_provider.get_recommendations(user, limit=8)
-            sections['based_on_history'] = list(history_books)
-
-            # Processa livros locais
-            for book in local_books:
-                # Destaques
-                if len(sections['destaques']) < 5:
-                    if book.e_destaque or book.quantidade_vendida > 10:
-                        sections['destaques'].append(book)
-                        continue
-
-                # Seção de idioma preferido
-                if (len(sections['seu_idioma']) < 8 and
-                        language_profile.get('portuguese_preference', 0) > 0.5 and
-                        book.idioma and self._language_provider._is_portuguese(book.idioma)):
-                    sections['seu_idioma'].append(book)
-                    continue
-
-                # Por gênero
-                if book.categoria:
-                    categoria_principal = book.categoria.split(',')[0].strip()
-                    if categoria_principal not in sections['por_genero']:
-                        sections['por_genero'][categoria_principal] = []
-                    if len(sections['por_genero'][categoria_principal]) < 5:
-                        sections['por_genero'][categoria_principal].append(book)
-
-                # Por autor
-                if book.autor:
-                    autor_principal = book.autor.split(',')[0].strip()
-                    if autor_principal not in sections['por_autor']:
-                        sections['por_autor'][autor_principal] = []
-                    if len(sections['por_autor'][autor_principal]) < 3:
-                        sections['por_autor'][autor_principal].append(book)
-
-            # Adiciona descobertas (externos)
-            sections['descobertas'] = external_books[:5]
-
-            # Filtra seções vazias ou com poucos itens
-            sections['por_genero'] = {
-                k: v for k, v in sections['por_genero'].items()
-                if len(v) > 1
-            }
-            sections['por_autor'] = {
-                k: v for k, v in sections['por_autor'].items()
-                if len(v) > 1
-            }
+            sections = self._bucket_shelf(local_books, language_profile)
+            sections['based_on_history'] = list(history_books)[:self.SHELF_LIMITS['based_on_history']]
+            sections['descobertas'] = external_books[:self.SHELF_LIMITS['descobertas']]
 
             return {
                 **sections,
@@ -556,33 +882,330 @@ class RecommendationEngine:
                 'language_preference': 0
             }
 
-    def _get_cache_key(self, user: User) -> str:
-        """Gera chave de cache única incluindo preferências de idioma"""
+    def get_personalized_shelf_data(self, user: User, shelf_size: int = 20) -> Dict[str, Any]:
+        """
+        Prateleira já serializada (PersonalizedShelfSerializer), guardada no
+        cache como um único blob; a geração do cache de prateleira invalida
+        o blob quando a estante muda.
+        """
+        from .api.serializers import serialize_personalized_shelf
+
+        cached = RecommendationCache.get_shelf(user)
+        if isinstance(cached, dict) and cached.get('shelf_size') == shelf_size and 'shelf' in cached:
+            return cached['shelf']
+
+        shelf = serialize_personalized_shelf(self.get_personalized_shelf(user, shelf_size=shelf_size))
+        RecommendationCache.set_shelf(user, {'shelf_size': shelf_size, 'shelf': shelf})
+        return shelf
+
+    def _bucket_shelf(self, books: List[Book], language_profile: Dict) -> Dict[str, Any]:
+        """
+        Distribui os livros locais entre as seções em um único passo
+        vetorizado sobre as features do CatalogSnapshot. As regras são as da
+        prateleira: destaque (ou mais de HIGHLIGHT_MIN_SALES vendas) vai para
+        'destaques'; senão, português (para quem prefere) vai para
+        'seu_idioma'; o restante é agrupado pela categoria e pelo autor
+        principais. Cada seção respeita seu limite em SHELF_LIMITS.
+        """
+        sections = {'destaques': [], 'seu_idioma': [], 'por_genero': {}, 'por_autor': {}}
+        if not books:
+            return sections
+
+        snapshot = CatalogSnapshot.current()
+        features = snapshot.features(book.id for book in books)
+
+        highlight = features['e_destaque'] | (features['quantidade_vendida'] > self.HIGHLIGHT_MIN_SALES)
+        destaque = highlight & (np.cumsum(highlight) <= self.SHELF_LIMITS['destaques'])
+
+        portuguese = np.zeros(len(books), dtype=bool)
+        if language_profile.get('portuguese_preference', 0) > 0.5:
+            portuguese = (features['idioma'] == snapshot.term_id('idioma', 'pt')) & ~destaque
+        seu_idioma = portuguese & (np.cumsum(portuguese) <= self.SHELF_LIMITS['seu_idioma'])
+
+        remaining = ~(destaque | seu_idioma)
+        for position in np.flatnonzero(destaque):
+            sections['destaques'].append(books[position])
+        for position in np.flatnonzero(seu_idioma):
+            sections['seu_idioma'].append(books[position])
+
+        for section, field in (('por_genero', 'categoria'), ('por_autor', 'autor')):
+            keys, labels = self._primary_term_groups(books, features[field], field)
+            if not labels:
+                continue
+            keys = np.where(remaining, keys, -1)
+            member = (keys >= 0) & (self._rank_within_groups(keys) < self.SHELF_LIMITS[section])
+            sizes = np.bincount(keys[member], minlength=len(labels))
+
+            groups = sections[section]
+            for position in np.flatnonzero(member & (sizes[np.maximum(keys, 0)] > 1)):
+                groups.setdefault(labels[keys[position]], []).append(books[position])
+
+        return sections
+
+    @staticmethod
+    def _primary_term_groups(books: List[Book], terms: np.ndarray, field: str) -> tuple:
+        """
+        Grupo de cada livro pelo primeiro termo do campo ('A, B' -> 'A').
+        O texto é separado uma vez por termo distinto do vocabulário, não
+        por livro. Livros sem o campo recebem -1.
+        """
+        unique_terms, first_positions, inverse = np.unique(terms, return_index=True, return_inverse=True)
+        labels: List[str] = []
+        label_ids: Dict[str, int] = {}
+        unique_keys = np.full(len(unique_terms), -1, dtype=np.int64)
+        for index, (term, position) in enumerate(zip(unique_terms, first_positions)):
+            label = (getattr(books[position], field) or '').split(',')[0].strip() if term else ''
+            if not label:
+                continue
+            if label not in label_ids:
+                label_ids[label] = len(labels)
+                labels.append(label)
+            unique_keys[index] = label_ids[label]
+        return unique_keys[inverse.reshape(-1)], labels
+
+    @staticmethod
+    def _rank_within_groups(keys: np.ndarray) -> np.ndarray:
+        """Posição de cada elemento dentro do seu grupo, preservando a ordem da lista"""
+        count = len(keys)
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+        starts = np.r_[True, sorted_keys[1:] != sorted_keys[:-1]]
+        group_start = np.maximum.accumulate(np.where(starts, np.arange(count), 0))
+        ranks = np.empty(count, dtype=np.int64)
+        ranks[order] = np.arange(count) - group_start
+        return ranks
+
+    def _get_cache_key(self, user: User, context: Optional[UserReadingContext] = None) -> str:
+        """
+        Chave de cache do usuário. A entrada guarda a geração com que foi
+        gravada; a geração é incrementada pelos signals quando estante ou
+        preferências mudam, e entradas de outra geração são ignoradas.
+        """
+        return self._format_cache_key(user.id)
+
+    @staticmethod
+    def _format_cache_key(user_id: int) -> str:
+        return f'recommendations:v2:{user_id}'
+
+    @staticmethod
+    def _is_usable_entry(cached: Any, generation: Optional[int], limit: int) -> bool:
+        """Entrada da geração atual que atende ao limite pedido"""
+        return (
+            isinstance(cached, dict)
+            and 'computed_at' in cached
+            and cached.get('generation') == generation
+            and (cached.get('limit') or 0) >= limit
+        )
+
+    def _get_cached_entry(self, user: User, limit: int) -> Optional[Dict]:
+        """
+        Entrada de cache utilizável para o limite pedido, ou None. Entrada e
+        geração são lidas juntas, em uma única ida ao cache.
+        """
+        try:
+            cached, generation = RecommendationCache.get_with_generation(self._get_cache_key(user), user.id)
+        except Exception as e:
+            logger.error(f"Erro ao ler cache de recomendações: {str(e)}")
+            return None
+
+        return cached if self._is_usable_entry(cached, generation, limit) else None
+
+    def _wait_for_cached_entry(self, user: User, limit: int) -> Optional[Dict]:
+        """Aguarda brevemente a entrada calculada por outra requisição"""
+        deadline = time.monotonic() + self.REFRESH_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(0.1)
+            cached = self._get_cached_entry(user, limit)
+            if cached is not None:
+                return cached
+        return None
+
+    def _load_cached_recommendations(
+            self,
+            cached: Dict,
+            limit: int,
+            books: Optional[Dict[int, Book]] = None,
+            surface: Optional[str] = None
+    ) -> List[Union[Book, Dict]]:
+        """
+        Reconstrói a lista do cache com uma única consulta pelos IDs locais
+        (ou com os livros já carregados pelo chamador, em lote) e escolhe os
+        livros servidos do conjunto de candidatos com o λ da superfície.
+        """
+        local_ids = cached.get('local', [])
+        if books is None:
+            books = Book.objects.in_bulk(local_ids)
+        local_books = [books[book_id] for book_id in local_ids if book_id in books]
+
+        external_books = cached.get('external', [])
+        if cached.get('external_key') and not external_books:
+            # Complemento externo pendente quando a entrada foi gravada
+            external_books = self._get_external_slice(cached['external_key']).get('items', [])
+        return self._select_recommendations(local_books, external_books, limit, surface)
+
+    def _get_refresh_lock_key(self, user: User) -> str:
+        return f'recommendations:refresh_lock:{user.id}'
+
+    def _get_redis_client(self):
+        cache = self._cache
+        if hasattr(cache, 'client') and hasattr(cache.client, 'get_client'):
+            return cache.client.get_client(write=True)
+        return None
+
+    def _acquire_refresh_lock(self, user: User) -> Optional[str]:
+        """
+        Lock por usuário (SET NX) para que apenas um processo recalcule por vez.
+
+        Retorna o token do dono, ou None se o lock já tem dono. Se o cache
+        falhar, retorna LOCK_UNAVAILABLE e o lock é tratado como ocupado
+        (falha fechada): com o Redis instável as requisições não recalculam
+        e gravam todas ao mesmo tempo, nem esperam por uma entrada que não
+        poderá ser lida.
+        """
+        key = self._get_refresh_lock_key(user)
+        token = uuid.uuid4().hex
+        try:
+            client = self._get_redis_client()
+            if client is not None:
+                acquired = client.set(self._cache.make_key(key), token, nx=True, ex=self.REFRESH_LOCK_TTL)
+            else:
+                acquired = self._cache.add(key, token, self.REFRESH_LOCK_TTL)
+        except Exception as e:
+            logger.error(f"Erro ao obter lock de recálculo: {str(e)}")
+            return LOCK_UNAVAILABLE
+        return token if acquired else None
+
+    def _release_refresh_lock(self, user: User, token: Optional[str]) -> None:
+        """Libera o lock apenas se ele ainda pertence a `token` (não apaga o de outro dono após o TTL)"""
+        if not token:
+            return
+
+        key = self._get_refresh_lock_key(user)
         try:
-            # from django.utils import timezone # Removida pois já está importada no topo do módulo
+            client = self._get_redis_client()
+            if client is not None:
+                client.register_script(RELEASE_LOCK_SCRIPT)(keys=[self._cache.make_key(key)], args=[token])
+            elif self._cache.get(key) == token:
+                self._cache.delete(key)
+        except Exception as e:
+            logger.error(f"Erro ao liberar lock de recálculo: {str(e)}")
+
+    def _schedule_refresh(self, user: User, limit: int) -> None:
+        """Agenda o recálculo em segundo plano, se ninguém já estiver recalculando"""
+        token = self._acquire_refresh_lock(user)
+        if not token:
+            return
+
+        engine_class = type(self)
 
-            shelf_books = self._get_user_shelf_books(user)
-            language_profile = self._language_provider.get_language_affinity(user)
+        def refresh():
+            engine = engine_class()
+            try:
+                engine._compute_recommendations(user, limit)
+            finally:
+                engine._release_refresh_lock(user, token)
 
-            # Inclui preferência de idioma na chave
-            language_hash = hash(str(language_profile.get('preferred_languages', {})))
-            shelf_hash = hash(tuple(sorted(shelf_books)))
+        BackgroundTasks.submit(refresh)
 
-            # Adiciona timestamp para rotação de cache
-            current_hour = timezone.now().hour
+    def _get_external_key(self, user: User) -> str:
+        generation = RecommendationCache.get_generation(user.id)
+        return f'recommendations:external:{user.id}:g{generation}'
 
-            cache_key = f'recommendations:v2:{user.id}:{shelf_hash}:{language_hash}:{current_hour}'
-            return cache_key
+    def _get_external_slice(self, external_key: str) -> Dict:
+        try:
+            return self._cache.get(external_key) or {}
+        except Exception as e:
+            logger.error(f"Erro ao ler complemento externo: {str(e)}")
+            return {}
 
+    def _schedule_external_fill(
+            self,
+            user: User,
+            language_profile: Dict,
+            limit: int,
+            context: Optional[UserReadingContext] = None
+    ) -> tuple:
+        """
+        Agenda o cálculo do complemento externo em segundo plano.
+
+        Retorna (itens já disponíveis, pendente). O resultado é gravado sob a
+        chave externa do usuário e incorporado à entrada principal do cache;
+        a marca 'pending' (SET NX) evita agendar o mesmo cálculo duas vezes.
+        """
+        external_key = self._get_external_key(user)
+        try:
+            scheduled = self._cache.add(
+                external_key, {'status': 'pending', 'limit': limit}, self.EXTERNAL_PENDING_TTL
+            )
         except Exception as e:
-            logger.error(f"Erro ao gerar chave de cache: {str(e)}")
-            return f'recommendations:v2:{user.id}:fallback'
+            logger.error(f"Erro ao agendar complemento externo: {str(e)}")
+            return [], False
+
+        if scheduled:
+            engine_class = type(self)
+            cache_key = self._get_cache_key(user, context=context)
+
+            def fill():
+                # Contexto próprio: o da requisição não é compartilhado com a outra thread
+                engine = engine_class()
+                items = engine._get_filtered_external_recommendations(
+                    user, language_profile, limit, context=UserReadingContext.for_user(user)
+                )
+                engine._store_external_slice(cache_key, external_key, items)
+
+            BackgroundTasks.submit(fill)
+
+        # Dentro de uma transação a tarefa roda na hora e o resultado já está disponível
+        external_slice = self._get_external_slice(external_key)
+        if external_slice.get('status') == 'ready':
+            return external_slice.get('items', [])[:limit], False
+        return [], True
 
-    def _get_user_shelf_books(self, user: User) -> List[int]:
+    def _store_external_slice(self, cache_key: str, external_key: str, items: List[Dict]) -> None:
+        """Grava o complemento externo e o incorpora à entrada principal, se ela ainda o aguarda"""
+        try:
+            self._cache.set(external_key, {
+                'status': 'ready',
+                'items': items,
+                'computed_at': time.time(),
+            }, self.CACHE_HARD_TTL)
+
+            entry = self._cache.get(cache_key)
+            if isinstance(entry, dict) and entry.get('external_key') == external_key:
+                # 'local' é o conjunto de candidatos: só `limit` deles são servidos
+                limit = entry.get('limit') or len(items)
+                local_count = min(len(entry.get('local', [])), limit)
+                entry['external'] = items[:max(0, limit - local_count)]
+                entry['has_external'] = bool(entry['external'])
+                entry['total'] = local_count + len(entry['external'])
+                entry['external_key'] = None
+                self._cache.set(cache_key, entry, self.CACHE_HARD_TTL)
+        except Exception as e:
+            logger.error(f"Erro ao gravar complemento externo: {str(e)}")
+
+    def get_external_recommendations(self, user: User, limit: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Estado do complemento externo do usuário, para consulta periódica
+        pela interface: 'ready' com os itens, 'pending' enquanto é calculado
+        ou 'none' se nenhum cálculo foi pedido para a estante atual.
+        """
+        if not user or not getattr(user, 'pk', None):
+            return {'status': 'none', 'external': []}
+
+        external_slice = self._get_external_slice(self._get_external_key(user))
+        status = external_slice.get('status', 'none')
+        items = external_slice.get('items', []) if status == 'ready' else []
+        if limit is not None:
+            items = items[:limit]
+        return {'status': status, 'external': items}
+
+    def _get_user_shelf_books(self, user: User, context: Optional[UserReadingContext] = None) -> List[int]:
         """Obtém IDs dos livros nas prateleiras do usuário"""
         try:
             if not user:
                 return []
+            if context is not None and context.user == user:
+                return list(context.book_ids)
             return list(UserBookShelf.objects.filter(
                 user=user
             ).values_list('book_id', flat=True))
@@ -594,25 +1217,27 @@ class RecommendationEngine:
         """Recomendações de fallback priorizando português"""
         logger.warning("Usando recomendações de fallback")
         try:
+            # Livros da estante são descartados em memória, sem NOT IN na consulta
+            excluded = set(excluded_books)
+
             # Tenta primeiro livros em português
-            portuguese_books = Book.objects.filter(
+            portuguese_books = UserExclusionSet.take(Book.objects.filter(
                 Q(idioma__icontains='pt') |
                 Q(idioma__icontains='por') |
                 Q(idioma__icontains='brasil')
-            ).exclude(
-                id__in=excluded_books
-            ).order_by('-quantidade_acessos', '?')[:limit]
+            ).order_by('-quantidade_acessos', *BookSampler.TIEBREAK), excluded, limit)
 
-            if portuguese_books.count() >= limit:
-                return list(portuguese_books)
+            if len(portuguese_books) >= limit:
+                return portuguese_books
 
             # Complementa com outros livros
-            remaining = limit - portuguese_books.count()
-            other_books = Book.objects.exclude(
-                id__in=excluded_books + list(portuguese_books.values_list('id', flat=True))
-            ).order_by('-quantidade_vendida', '?')[:remaining]
+            other_books = UserExclusionSet.take(
+                Book.objects.order_by('-quantidade_vendida', *BookSampler.TIEBREAK),
+                excluded | {book.id for book in portuguese_books},
+                limit - len(portuguese_books)
+            )
 
-            return list(portuguese_books) + list(other_books)
+            return portuguese_books + other_books
 
         except Exception as e:
             logger.error(f"Erro em recomendações fallback: {str(e)}")
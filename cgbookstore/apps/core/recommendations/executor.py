@@ -0,0 +1,389 @@
+# cgbookstore/apps/core/recommendations/executor.py
+
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+
+class ProviderExecutor:
+    """
+    Executa providers de recomendação em paralelo com orçamento de tempo.
+
+    Usa um pool de threads compartilhado pelo processo, limitado por
+    RECOMMENDATION_PROVIDER_WORKERS (dimensionado para as requisições
+    simultâneas esperadas vezes o número de providers), para que o número
+    de conexões extras com o banco seja previsível. Cada worker mantém a
+    sua conexão entre tarefas, em vez de abrir uma nova por provider; antes
+    e depois de cada tarefa ela passa por close_if_unusable_or_obsolete,
+    como nas requisições do Django (inclusive CONN_HEALTH_CHECKS), com a
+    idade máxima dada por RECOMMENDATION_PROVIDER_CONN_MAX_AGE.
+
+    O orçamento de cada provider conta a partir do início da execução no
+    worker, não do tempo na fila. Uma tarefa que não consegue um worker
+    dentro do próprio orçamento (pool ocupado por outras requisições) é
+    cancelada. Providers que estouram o orçamento, na fila ou rodando, são
+    descartados do resultado (a thread termina em segundo plano) e
+    contabilizados como timeout nas métricas.
+    """
+
+    DEFAULT_WORKERS = 24
+    DEFAULT_TIMEOUT = 2.0
+    DEFAULT_CONN_MAX_AGE = 300
+
+    _pool: Optional[ThreadPoolExecutor] = None
+    _pool_lock = threading.Lock()
+    _worker_state = threading.local()
+
+    _metrics: Dict[str, Dict[str, float]] = {}
+    _metrics_lock = threading.Lock()
+
+    def __init__(self, timeouts: Optional[Dict[str, float]] = None, default_timeout: Optional[float] = None):
+        self.timeouts = timeouts or {}
+        self.default_timeout = default_timeout or self.DEFAULT_TIMEOUT
+
+    @classmethod
+    def get_pool(cls) -> ThreadPoolExecutor:
+        """Pool compartilhado, criado sob demanda"""
+        if cls._pool is None:
+            with cls._pool_lock:
+                if cls._pool is None:
+                    workers = getattr(settings, 'RECOMMENDATION_PROVIDER_WORKERS', cls.DEFAULT_WORKERS)
+                    cls._pool = ThreadPoolExecutor(
+                        max_workers=max(1, workers),
+                        thread_name_prefix='recommendation-provider'
+                    )
+        return cls._pool
+
+    def timeout_for(self, name: str) -> float:
+        return self.timeouts.get(name, self.default_timeout)
+
+    def can_run_concurrently(self) -> bool:
+        """
+        Threads usam outra conexão e não enxergam escritas ainda não
+        confirmadas: dentro de uma transação aberta a execução é sequencial.
+        """
+        return not connection.in_atomic_block
+
+    def run(self, tasks: List[Tuple[str, Callable[[], Any]]]) -> Dict[str, Any]:
+        """
+        Executa as tarefas nomeadas e retorna os resultados das que
+        terminaram dentro do orçamento. Tarefas ausentes no retorno foram
+        descartadas por timeout ou erro.
+        """
+        if len(tasks) <= 1 or not self.can_run_concurrently():
+            return self._run_sequentially(tasks)
+
+        pool = self.get_pool()
+        progress = threading.Event()
+        submitted_at = time.monotonic()
+        started_at: Dict[str, float] = {}
+        pending: Dict[str, Future] = {}
+        for name, func in tasks:
+            future = pool.submit(self._call_in_worker, self._track(name, func, started_at, progress))
+            future.add_done_callback(lambda _: progress.set())
+            pending[name] = future
+
+        results = {}
+        while pending:
+            progress.clear()
+            now = time.monotonic()
+            for name, future in list(pending.items()):
+                budget = self.timeout_for(name)
+                if future.done():
+                    del pending[name]
+                    self._collect(name, future, now - started_at.get(name, now), results)
+                elif name in started_at and now - started_at[name] >= budget:
+                    del pending[name]
+                    self._record(name, 'timeouts')
+                    logger.warning(f"Provider {name} descartado: excedeu {budget:.2f}s")
+                elif name not in started_at and now - submitted_at >= budget and future.cancel():
+                    # Pool ocupado por outras requisições: não roda na thread da requisição
+                    del pending[name]
+                    self._record(name, 'timeouts')
+                    logger.warning(f"Provider {name} descartado: sem worker livre em {budget:.2f}s")
+
+            if pending:
+                deadline = min(
+                    started_at.get(name, submitted_at) + self.timeout_for(name) for name in pending
+                )
+                progress.wait(max(0.0, deadline - now))
+
+        return results
+
+    @staticmethod
+    def _track(
+            name: str, func: Callable[[], Any], started_at: Dict[str, float], progress: threading.Event
+    ) -> Callable[[], Any]:
+        """Registra quando a tarefa sai da fila e começa a rodar no worker"""
+        def task():
+            started_at[name] = time.monotonic()
+            progress.set()
+            return func()
+        return task
+
+    def _collect(self, name: str, future: Future, elapsed: float, results: Dict[str, Any]) -> None:
+        try:
+            results[name] = future.result()
+            self._record(name, 'completed', elapsed)
+        except Exception as e:
+            self._record(name, 'errors')
+            logger.error(f"Erro no provider {name}: {str(e)}")
+
+    def _run_sequentially(self, tasks: List[Tuple[str, Callable[[], Any]]]) -> Dict[str, Any]:
+        results = {}
+        for name, func in tasks:
+            started = time.monotonic()
+            try:
+                results[name] = func()
+                self._record(name, 'completed', time.monotonic() - started)
+            except Exception as e:
+                self._record(name, 'errors')
+                logger.error(f"Erro no provider {name}: {str(e)}")
+        return results
+
+    @classmethod
+    def _call_in_worker(cls, func: Callable[[], Any]) -> Any:
+        cls._check_connection()
+        try:
+            return func()
+        finally:
+            cls._recycle_connection()
+
+    @classmethod
+    def _check_connection(cls) -> None:
+        """Descarta a conexão guardada se ela caiu ou expirou enquanto o worker esperava"""
+        try:
+            connection.close_if_unusable_or_obsolete()
+        except Exception as e:
+            logger.error(f"Erro ao verificar conexão do worker: {str(e)}")
+
+    @classmethod
+    def _recycle_connection(cls) -> None:
+        """
+        Mantém a conexão da thread para a próxima tarefa. Uma conexão nova
+        recebe a idade máxima dos workers (o CONN_MAX_AGE do banco vale para
+        as requisições); erros, autocommit alterado e idade ficam a cargo de
+        close_if_unusable_or_obsolete.
+        """
+        try:
+            raw = connection.connection
+            if raw is None:
+                return
+            state = cls._worker_state
+            if getattr(state, 'connection_id', None) != id(raw):
+                state.connection_id = id(raw)
+                max_age = getattr(settings, 'RECOMMENDATION_PROVIDER_CONN_MAX_AGE', cls.DEFAULT_CONN_MAX_AGE)
+                connection.close_at = time.monotonic() + max_age
+            connection.close_if_unusable_or_obsolete()
+        except Exception as e:
+            logger.error(f"Erro ao reciclar conexão do worker: {str(e)}")
+
+    @classmethod
+    def _record(cls, name: str, event: str, elapsed: float = 0.0):
+        with cls._metrics_lock:
+            stats = cls._metrics.setdefault(
+                name, {'calls': 0, 'completed': 0, 'timeouts': 0, 'errors': 0, 'total_time': 0.0}
+            )
+            stats['calls'] += 1
+            stats[event] += 1
+            stats['total_time'] += elapsed
+
+    @classmethod
+    def get_metrics(cls) -> Dict[str, Dict[str, float]]:
+        """Contadores por provider: chamadas, concluídas, descartadas por timeout, erros e tempo médio"""
+        with cls._metrics_lock:
+            metrics = {}
+            for name, stats in cls._metrics.items():
+                metrics[name] = dict(stats)
+                metrics[name]['dropped'] = stats['timeouts'] + stats['errors']
+                metrics[name]['avg_time'] = stats['total_time'] / stats['completed'] if stats['completed'] else 0.0
+            return metrics
+
+    @classmethod
+    def reset_metrics(cls):
+        with cls._metrics_lock:
+            cls._metrics = {}
+
+
+class BackgroundTasks:
+    """
+    Execução de tarefas em segundo plano (ex.: recálculo de recomendações).
+
+    Usa um pool pequeno e separado do ProviderExecutor, para que uma tarefa
+    que dispara providers não dispute os mesmos workers. Dentro de uma
+    transação aberta a tarefa roda na própria thread, pelo mesmo motivo do
+    ProviderExecutor.
+    """
+
+    DEFAULT_WORKERS = 2
+
+    _pool: Optional[ThreadPoolExecutor] = None
+    _pool_lock = threading.Lock()
+
+    @classmethod
+    def get_pool(cls) -> ThreadPoolExecutor:
+        if cls._pool is None:
+            with cls._pool_lock:
+                if cls._pool is None:
+                    workers = getattr(settings, 'RECOMMENDATION_REFRESH_WORKERS', cls.DEFAULT_WORKERS)
+                    cls._pool = ThreadPoolExecutor(
+                        max_workers=max(1, workers),
+                        thread_name_prefix='recommendation-refresh'
+                    )
+        return cls._pool
+
+    @classmethod
+    def submit(cls, func: Callable[[], Any]) -> None:
+        if connection.in_atomic_block:
+            cls._run(func)
+        else:
+            cls.get_pool().submit(ProviderExecutor._call_in_worker, lambda: cls._run(func))
+
+    @staticmethod
+    def _run(func: Callable[[], Any]) -> None:
+        try:
+            func()
+        except Exception as e:
+            logger.error(f"Erro em tarefa de segundo plano: {str(e)}")
+
+
+class SingleFlight:
+    """
+    Agrupa chamadas concorrentes com a mesma chave no processo.
+
+    A primeira chamada (líder) executa a função; as que chegam enquanto ela
+    está em andamento aguardam o mesmo resultado em vez de repetir o
+    trabalho. Erros do líder são propagados a todos os que aguardavam.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self._stats = {'calls': 0, 'coalesced': 0}
+
+    def do(self, key: Hashable, func: Callable[[], Any], timeout: Optional[float] = None) -> Any:
+        with self._lock:
+            self._stats['calls'] += 1
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+            else:
+                self._stats['coalesced'] += 1
+
+        if not leader:
+            return future.result(timeout=timeout)
+
+        try:
+            result = func()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats)
+
+
+class ExternalSearchExecutor:
+    """
+    Dispara buscas em APIs externas em paralelo com prazo total.
+
+    As buscas só fazem I/O de rede e cache (não usam o banco), por isso
+    rodam em um pool próprio, limitado por RECOMMENDATION_EXTERNAL_SEARCH_WORKERS,
+    inclusive dentro de transações abertas. Cada chamada a map() ocupa no
+    máximo RECOMMENDATION_EXTERNAL_SEARCH_MAX_IN_FLIGHT workers ao mesmo
+    tempo, para que uma requisição não tome o pool inteiro; as buscas
+    seguintes só são enviadas quando uma termina, e nenhuma é enviada depois
+    do prazo. Buscas que não terminam dentro do prazo são descartadas do
+    resultado (o timeout HTTP do chamador deve ser limitado ao prazo, para
+    que o worker seja liberado logo depois).
+    """
+
+    DEFAULT_WORKERS = 16
+    DEFAULT_MAX_IN_FLIGHT = 4
+    DEFAULT_DEADLINE = 3.0
+
+    _pool: Optional[ThreadPoolExecutor] = None
+    _pool_lock = threading.Lock()
+
+    def __init__(self, deadline: Optional[float] = None, max_in_flight: Optional[int] = None):
+        self.deadline = deadline or getattr(
+            settings, 'RECOMMENDATION_EXTERNAL_SEARCH_DEADLINE', self.DEFAULT_DEADLINE
+        )
+        self.max_in_flight = max(1, max_in_flight or getattr(
+            settings, 'RECOMMENDATION_EXTERNAL_SEARCH_MAX_IN_FLIGHT', self.DEFAULT_MAX_IN_FLIGHT
+        ))
+
+    @classmethod
+    def get_pool(cls) -> ThreadPoolExecutor:
+        if cls._pool is None:
+            with cls._pool_lock:
+                if cls._pool is None:
+                    workers = getattr(settings, 'RECOMMENDATION_EXTERNAL_SEARCH_WORKERS', cls.DEFAULT_WORKERS)
+                    cls._pool = ThreadPoolExecutor(
+                        max_workers=max(1, workers),
+                        thread_name_prefix='recommendation-external'
+                    )
+        return cls._pool
+
+    def map(self, func: Callable[[Any], Any], items: Iterable[Any]) -> List[Tuple[Any, Any]]:
+        """
+        Aplica `func` a cada item e retorna pares (item, resultado), na
+        ordem dos itens, apenas para as chamadas concluídas sem erro
+        dentro do prazo.
+        """
+        items = list(items)
+        if not items:
+            return []
+
+        pool = self.get_pool()
+        deadline_at = time.monotonic() + self.deadline
+        queued = iter(range(len(items)))
+        running: Dict[Future, int] = {}
+        finished: Dict[int, Any] = {}
+        attempted = 0
+
+        while True:
+            now = time.monotonic()
+            while len(running) < self.max_in_flight and now < deadline_at:
+                index = next(queued, None)
+                if index is None:
+                    break
+                running[pool.submit(func, items[index])] = index
+            if not running or now >= deadline_at:
+                break
+
+            done, _ = wait(list(running), timeout=deadline_at - now, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = running.pop(future)
+                attempted += 1
+                try:
+                    finished[index] = future.result()
+                except Exception as e:
+                    logger.error(f"Erro na busca externa {items[index]!r}: {str(e)}")
+
+        dropped = len(items) - attempted
+        if dropped:
+            logger.warning(
+                f"{dropped} de {len(items)} buscas externas descartadas: excederam {self.deadline:.2f}s"
+            )
+        return [(items[index], finished[index]) for index in sorted(finished)]
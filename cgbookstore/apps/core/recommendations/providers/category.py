@@ -1,13 +1,17 @@
-from django.db.models import Count, Q, F, Value, FloatField, Case, When
-from typing import Dict, Set, List
+from django.db.models import Count, Q, F, Value, FloatField, Case, When, QuerySet
+from typing import Dict, Set, List, Optional
 from collections import Counter
-import random
+import numpy as np
 from ...models import Book, User, UserBookShelf
 from .mapping import CategoryMapping
+from ..services.catalog_snapshot import CatalogSnapshot
+from ..utils.sampling import BookSampler
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 from ...models import Book, UserBookShelf
 from ..providers.exclusion import ExclusionProvider
+from ..services.exclusion_set import UserExclusionSet
+from ..context import UserReadingContext
 
 User = get_user_model()
 
@@ -172,28 +176,32 @@ class CategoryBasedProvider:
         'vou_ler': 0.5
     }
 
+    # Populares lidos uma vez por lote (get_recommendations_bulk)
+    SHARED_POPULAR_POOL = 200
+
     def __init__(self):
         self._mapping = CategoryMapping()
 
-    def get_recommendations(self, user: User, limit: int = 20) -> List[Book]:
+    def get_recommendations(
+            self, user: User, limit: int = 20, context: Optional[UserReadingContext] = None
+    ) -> List[Book]:
         """
         Gera recomendações baseadas nas categorias preferidas
         """
         print("\n=== Iniciando recomendações por categoria ===")
-        excluded_books = set(UserBookShelf.objects.filter(
-            user=user
-        ).values_list('book_id', flat=True))
+        context = UserReadingContext.for_user(user, context)
+        excluded_books = set(context.book_ids)
         print(f"Livros excluídos: {excluded_books}")
 
         # Obtém preferências
-        preferences = self._analyze_user_preferences(user)
+        preferences = self._analyze_user_preferences(user, context=context)
         print("\nPreferências do usuário:")
         print(f"Gêneros: {dict(preferences['genres'])}")
         print(f"Categorias: {dict(preferences['categories'])}")
         print(f"Temas: {dict(preferences['themes'])}")
 
         # Obtém recomendações primárias
-        primary_recs = self._get_primary_recommendations(preferences, excluded_books)
+        primary_recs = self._get_primary_recommendations(preferences, excluded_books, limit=limit)
         print(f"\nRecomendações primárias: {[book.id for book in primary_recs]}")
 
         if len(primary_recs) >= limit:
@@ -213,7 +221,7 @@ class CategoryBasedProvider:
             # Adiciona fallback se ainda precisar
             needed = limit - len(recommendations)
             fallback_excluded = secondary_excluded | {book.id for book in secondary_recs}
-            fallback_recs = self._get_fallback_recommendations(fallback_excluded, needed)
+            fallback_recs = self._get_fallback_recommendations(fallback_excluded, needed, context=context)
             recommendations.extend(fallback_recs)
             print(f"\nRecomendações fallback: {[book.id for book in fallback_recs]}")
 
@@ -222,7 +230,7 @@ class CategoryBasedProvider:
         print("=====================================")
         return final_recs
 
-    def _analyze_user_preferences(self, user: User) -> Dict:
+    def _analyze_user_preferences(self, user: User, context: Optional[UserReadingContext] = None) -> Dict:
         """Analisa preferências do usuário"""
         preferences = {
             'genres': Counter(),
@@ -230,8 +238,9 @@ class CategoryBasedProvider:
             'themes': Counter()
         }
 
-        shelves = UserBookShelf.objects.filter(user=user).select_related('book')
-        print(f"\nAnalisando {shelves.count()} livros do usuário")
+        context = UserReadingContext.for_user(user, context)
+        shelves = context.shelves
+        print(f"\nAnalisando {len(shelves)} livros do usuário")
 
         for shelf in shelves:
             weight = self.SHELF_WEIGHTS.get(shelf.shelf_type, 0.5)
@@ -240,22 +249,14 @@ class CategoryBasedProvider:
             print(f"Tipo prateleira: {shelf.shelf_type}, Peso: {weight}")
 
             # Processa gênero
-            if book.genero:
-                genres = [g.strip() for g in book.genero.split(',')]
-                for genre in genres:
-                    normalized_genre = self._mapping.normalize_category(genre)
-                    if normalized_genre:
-                        preferences['genres'][normalized_genre] += weight
-                        print(f"Gênero: {genre} -> {normalized_genre}")
+            for normalized_genre in context.normalized_values(book, 'genero'):
+                preferences['genres'][normalized_genre] += weight
+                print(f"Gênero: {normalized_genre}")
 
             # Processa categoria
-            if book.categoria:
-                categories = [c.strip() for c in book.categoria.split(',')]
-                for category in categories:
-                    normalized_category = self._mapping.normalize_category(category)
-                    if normalized_category:
-                        preferences['categories'][normalized_category] += weight
-                        print(f"Categoria: {category} -> {normalized_category}")
+            for normalized_category in context.normalized_values(book, 'categoria'):
+                preferences['categories'][normalized_category] += weight
+                print(f"Categoria: {normalized_category}")
 
             # Processa temas
             if book.temas:
@@ -267,8 +268,16 @@ class CategoryBasedProvider:
 
         return preferences
 
-    def _get_primary_recommendations(self, preferences: Dict, excluded_books: Set[int]) -> List[Book]:
-        """Obtém recomendações primárias baseadas nas preferências principais"""
+    def _get_primary_recommendations(
+            self, preferences: Dict, excluded_books: Set[int], limit: Optional[int] = None
+    ) -> List[Book]:
+        """
+        Obtém recomendações primárias baseadas nas preferências principais.
+
+        Os candidatos são carregados apenas com os campos de texto usados
+        nas condições; popularidade e ordenação vêm do CatalogSnapshot, e
+        somente os `limit` melhores são hidratados como Book.
+        """
         base_query = Q()
         boost_conditions = []
 
@@ -276,87 +285,77 @@ class CategoryBasedProvider:
         for genre, weight in preferences['genres'].items():
             # Condição exata e variações
             genre_variants = self._get_query_variants(genre)
-            genre_condition = self._build_variant_query('genero', genre_variants)
-            base_query |= genre_condition
-            boost_conditions.append((genre_condition, weight))
+            base_query |= self._build_variant_query('genero', genre_variants)
+            boost_conditions.append(('genero', genre_variants, weight))
 
             # Gêneros relacionados
             related_genres = self._mapping.get_related_categories(genre)
             if related_genres:
                 for related in related_genres:
                     related_variants = self._get_query_variants(related)
-                    related_condition = self._build_variant_query('genero', related_variants)
-                    base_query |= related_condition
-                    boost_conditions.append((related_condition, weight * 0.7))
+                    base_query |= self._build_variant_query('genero', related_variants)
+                    boost_conditions.append(('genero', related_variants, weight * 0.7))
 
         # Processa categorias
         for category, weight in preferences['categories'].items():
             # Condição exata e variações
             category_variants = self._get_query_variants(category)
-            category_condition = self._build_variant_query('categoria', category_variants)
-            base_query |= category_condition
-            boost_conditions.append((category_condition, weight))
+            base_query |= self._build_variant_query('categoria', category_variants)
+            boost_conditions.append(('categoria', category_variants, weight))
 
             # Categorias relacionadas
             related_categories = self._mapping.get_related_categories(category)
             if related_categories:
                 for related in related_categories:
                     related_variants = self._get_query_variants(related)
-                    related_condition = self._build_variant_query('categoria', related_variants)
-                    base_query |= related_condition
-                    boost_conditions.append((related_condition, weight * 0.7))
+                    base_query |= self._build_variant_query('categoria', related_variants)
+                    boost_conditions.append(('categoria', related_variants, weight * 0.7))
 
         # Processa temas
         for theme, weight in preferences['themes'].items():
-            theme_condition = Q(temas__icontains=theme)
-            base_query |= theme_condition
-            boost_conditions.append((theme_condition, weight * 0.5))
+            base_query |= Q(temas__icontains=theme)
+            boost_conditions.append(('temas', [theme.lower()], weight * 0.5))
 
         if not base_query:
             return []
 
-            # Obtém livros base excluindo os que já estão na estante
-        base_books = Book.objects.exclude(
-            id__in=excluded_books
-        ).filter(base_query).distinct()
-
-        # Aplica boost baseado nas condições
-        scored_books = []
-        for book in base_books:
-            # Calcula score base
-            score = 0
-            for condition, weight in boost_conditions:
-                if Book.objects.filter(condition, id=book.id).exists():
-                    score += weight
-
-            # Adiciona componentes de popularidade ao score
-            popularity_score = (
-                    book.quantidade_acessos * 0.001 +  # Peso menor para acessos
-                    book.quantidade_vendida * 0.01  # Peso maior para vendas
+        # Obtém livros base; os que já estão na estante são descartados em memória
+        candidates = [
+            row for row in Book.objects.filter(base_query).order_by().distinct().values_list(
+                'id', 'genero', 'categoria', 'temas'
             )
+            if row[0] not in excluded_books
+        ]
 
-            # Adiciona boost para livros em destaque
-            if book.e_destaque:
-                popularity_score *= 1.5
-
-            # Score final combina relevância e popularidade
-            final_score = score + popularity_score
-
-            # Adiciona componente aleatório menor
-            random_boost = random.uniform(0, 0.1)  # Reduzido de 0.2 para 0.1
-            final_score += random_boost
-
-            scored_books.append((book, final_score))
+        if not candidates:
+            return []
 
-        # Ordena por score e outros critérios
-        scored_books.sort(key=lambda x: (
-            -x[1],  # Score final reverso
-            -x[0].quantidade_vendida,  # Vendas em ordem decrescente
-            -x[0].quantidade_acessos,  # Acessos em ordem decrescente
-            x[0].ordem_exibicao  # Ordem de exibição original
+        # Aplica boost baseado nas condições, avaliadas em memória sobre os
+        # campos carregados (equivalente às condições iexact/icontains)
+        relevance = np.zeros(len(candidates))
+        for i, (_, *values) in enumerate(candidates):
+            fields = dict(zip(('genero', 'categoria', 'temas'), ((value or '').lower() for value in values)))
+            for field, variants, weight in boost_conditions:
+                if self._matches_variants(fields[field], variants):
+                    relevance[i] += weight
+
+        # Popularidade (acessos, vendas e destaque) lida do snapshot do catálogo
+        features = CatalogSnapshot.current().features(book_id for book_id, *_ in candidates)
+
+        # Score final combina relevância, popularidade e um componente aleatório menor
+        final_score = relevance + CatalogSnapshot.popularity(features) + np.random.uniform(0, 0.1, len(candidates))
+
+        # Ordena por score, vendas e acessos decrescentes e ordem de exibição
+        order = np.lexsort((
+            features['ordem_exibicao'],
+            -features['quantidade_acessos'],
+            -features['quantidade_vendida'],
+            -final_score
         ))
+        ranked_ids = [int(features['id'][i]) for i in order[:limit]]
 
-        return [book for book, _ in scored_books]
+        books = Book.objects.in_bulk(ranked_ids)
+        return [books[book_id] for book_id in ranked_ids if book_id in books]
 
     def _get_secondary_recommendations(self, preferences: Dict, excluded_books: Set[int]) -> List[Book]:
         """Obtém recomendações secundárias mais abrangentes"""
@@ -402,23 +401,39 @@ class CategoryBasedProvider:
         if not base_query:
             return []
 
-        # Retorna recomendações com ordenação personalizada
-        return list(Book.objects.exclude(
-            id__in=excluded_books
-        ).filter(
-            base_query
-        ).order_by(
-            '-quantidade_acessos',
-            '-quantidade_vendida',
-            'ordem_exibicao',
-            '?'
-        ).distinct())
-
-    def _get_fallback_recommendations(self, excluded_books: Set[int], limit: int) -> List[Book]:
-        """Recomendações fallback baseadas em popularidade"""
-        return list(Book.objects.exclude(
-            id__in=excluded_books
-        ).filter(
+        # Retorna recomendações com ordenação personalizada, sem os livros da estante
+        return [
+            book for book in Book.objects.filter(
+                base_query
+            ).order_by(
+                '-quantidade_acessos',
+                '-quantidade_vendida',
+                'ordem_exibicao',
+                *BookSampler.TIEBREAK
+            ).distinct()
+            if book.id not in excluded_books
+        ]
+
+    def _get_fallback_recommendations(
+            self, excluded_books: Set[int], limit: int, context: Optional[UserReadingContext] = None
+    ) -> List[Book]:
+        """
+        Recomendações fallback baseadas em popularidade. Em lote, a lista de
+        populares é lida uma vez e filtrada em memória para cada usuário.
+        """
+        if context is not None and context.shared_pools is not None:
+            pool = context.memoize_shared(
+                'category:popular',
+                lambda: list(self._popular_books()[:self.SHARED_POPULAR_POOL])
+            )
+            picked = [book for book in pool if book.id not in excluded_books][:limit]
+            if len(picked) == limit:
+                return picked
+
+        return UserExclusionSet.take(self._popular_books(), excluded_books, limit)
+
+    def _popular_books(self) -> QuerySet:
+        return Book.objects.filter(
             Q(quantidade_vendida__gt=0) |
             Q(quantidade_acessos__gt=0) |
             Q(e_destaque=True)
@@ -427,7 +442,7 @@ class CategoryBasedProvider:
             '-quantidade_acessos',
             'ordem_exibicao',
             '-created_at'
-        )[:limit])
+        )
 
     def _get_query_variants(self, term: str) -> List[str]:
         """Gera variações de um termo para busca"""
@@ -445,6 +460,10 @@ class CategoryBasedProvider:
             q |= Q(**{f"{field}__icontains": variant})
         return q
 
+    def _matches_variants(self, value: str, variants: List[str]) -> bool:
+        """Versão em memória de _build_variant_query para um valor já em minúsculas"""
+        return any(variant in value for variant in variants)
+
     def _extract_keywords(self, text: str) -> Set[str]:
         """Extrai palavras-chave de um texto"""
         if not text:
@@ -454,7 +473,7 @@ class CategoryBasedProvider:
         words = words.replace("'", '').replace(',', ' ').split()
         return {w.strip() for w in words if len(w.strip()) > 3}
 
-    def get_category_affinity(self, user: User) -> dict:
+    def get_category_affinity(self, user: User, context: Optional[UserReadingContext] = None) -> dict:
         """Retorna afinidade do usuário com diferentes categorias"""
         preferences = {
             'genres': Counter(),
@@ -462,7 +481,7 @@ class CategoryBasedProvider:
             'themes': Counter()
         }
 
-        shelves = UserBookShelf.objects.filter(user=user).select_related('book')
+        shelves = UserReadingContext.for_user(user, context).shelves
 
         for shelf in shelves:
             weight = self.SHELF_WEIGHTS.get(shelf.shelf_type, 0.5)
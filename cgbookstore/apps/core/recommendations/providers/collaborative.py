@@ -0,0 +1,43 @@
+from typing import List, Optional
+
+from django.contrib.auth import get_user_model
+
+from ...models import Book
+from ..context import UserReadingContext
+from ..services.als_model import ALSModel
+
+User = get_user_model()
+
+
+class CollaborativeFilteringProvider:
+    """
+    Provider de filtragem colaborativa com fatores ALS treinados offline
+    (comando train_als_model).
+
+    Diferente dos demais providers, não compara gênero/autor/categoria: os
+    scores vêm do produto entre os fatores do usuário e os de todos os
+    livros, aprendidos das estantes de todos os leitores.
+    """
+
+    @staticmethod
+    def is_available() -> bool:
+        return ALSModel.current() is not None
+
+    def get_recommendations(
+            self, user: User, limit: int = 20, context: Optional[UserReadingContext] = None
+    ) -> List[Book]:
+        model = ALSModel.current()
+        if model is None or not user or not getattr(user, 'pk', None):
+            return []
+
+        context = UserReadingContext.for_user(user, context)
+        user_vector = model.user_vector(
+            user.id, ((shelf.book_id, shelf.shelf_type) for shelf in context.shelves)
+        )
+        if user_vector is None:
+            return []
+
+        # Pede uma folga para compensar livros que deixaram de ser públicos desde o treino
+        ranked = model.recommend(user_vector, excluded=context.book_ids, limit=limit * 2)
+        books = Book.objects.public().in_bulk([book_id for book_id, _ in ranked])
+        return [books[book_id] for book_id, _ in ranked if book_id in books][:limit]
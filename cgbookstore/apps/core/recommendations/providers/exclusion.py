@@ -1,7 +1,9 @@
-from typing import List, Dict
-from django.db.models import QuerySet, Q, Count
+from typing import List, Dict, Optional
+from django.db.models import QuerySet, Q, Count, Exists, OuterRef
 from django.contrib.auth import get_user_model
 from ...models import Book, UserBookShelf
+from ..context import UserReadingContext
+from ..services.exclusion_set import UserExclusionSet
 
 User = get_user_model()
 
@@ -10,20 +12,22 @@ class ExclusionProvider:
     """Provider responsável por gerenciar exclusões de livros nas recomendações"""
 
     @staticmethod
-    def get_excluded_books(user: User) -> List[int]:
+    def get_excluded_books(user: User, context: Optional[UserReadingContext] = None) -> List[int]:
         """
         Obtém lista de IDs de livros que devem ser excluídos das recomendações
 
         Args:
             user: Usuário alvo
+            context: Contexto de leitura já carregado (evita nova consulta)
 
         Returns:
             Lista de IDs de livros que não devem ser recomendados
         """
-        # Retorna apenas os IDs dos livros excluídos
-        return list(UserBookShelf.objects.filter(
-            user=user
-        ).values_list('book_id', flat=True).distinct())
+        if context is not None and context.user == user:
+            return list(context.book_ids)
+
+        # Conjunto por usuário no Redis, mantido pelos signals da estante
+        return list(UserExclusionSet().get(getattr(user, 'pk', None)))
 
     @staticmethod
     def _get_user_preferences(user: User) -> Dict:
@@ -64,12 +68,23 @@ class ExclusionProvider:
 
         return preferences
 
+    @staticmethod
+    def exclude_shelf_books(queryset: QuerySet, user: User) -> QuerySet:
+        """
+        Remove do queryset os livros da estante do usuário com um anti-join
+        (NOT EXISTS) correlacionado, em vez de uma lista de IDs no NOT IN.
+        Para querysets devolvidos sem limite, em que não há como filtrar
+        os candidatos em memória.
+        """
+        return queryset.exclude(Exists(
+            UserBookShelf.objects.filter(user_id=getattr(user, 'pk', None), book_id=OuterRef('pk'))
+        ))
+
     @staticmethod
     def apply_exclusions(queryset: QuerySet, user: User) -> QuerySet:
         """Aplica exclusões e filtragem por preferências"""
         # Remove livros da estante
-        excluded_ids = ExclusionProvider.get_excluded_books(user)
-        filtered_qs = queryset.exclude(id__in=excluded_ids)
+        filtered_qs = ExclusionProvider.exclude_shelf_books(queryset, user)
 
         # Obtém preferências e aplica filtros se houver
         preferences = ExclusionProvider._get_user_preferences(user)
@@ -97,13 +112,12 @@ class ExclusionProvider:
     @staticmethod
     def get_available_recommendations(recommendations: dict, user: User) -> dict:
         """Filtra e prioriza recomendações baseado no perfil"""
-        excluded_ids = ExclusionProvider.get_excluded_books(user)
         preferences = ExclusionProvider._get_user_preferences(user)
 
         filtered_recommendations = {}
         for key, queryset in recommendations.items():
             # Aplica exclusões básicas
-            filtered_qs = queryset.exclude(id__in=excluded_ids)
+            filtered_qs = ExclusionProvider.exclude_shelf_books(queryset, user)
 
             # Ordena por relevância se houver preferências
             if preferences['generos'] or preferences['categorias']:
@@ -116,7 +130,7 @@ class ExclusionProvider:
     @staticmethod
     def verify_exclusions(recommended_books: List[Book], user: User) -> List[Book]:
         """Verificação final com priorização por relevância"""
-        excluded_ids = ExclusionProvider.get_excluded_books(user)
+        excluded_ids = UserExclusionSet().get(getattr(user, 'pk', None))
         preferences = ExclusionProvider._get_user_preferences(user)
 
         # Remove livros da estante
@@ -12,6 +12,10 @@ import logging
 from cgbookstore.apps.core.services.google_books_service import GoogleBooksClient
 from cgbookstore.apps.core.models.book import Book, UserBookShelf
 from cgbookstore.apps.core.recommendations.providers.mapping import CategoryMapping
+from cgbookstore.apps.core.recommendations.context import UserReadingContext
+from cgbookstore.apps.core.recommendations.executor import ExternalSearchExecutor, SingleFlight
+from cgbookstore.apps.core.recommendations.utils.cache_manager import RecommendationCache
+from cgbookstore.apps.core.utils.tiered_cache import TieredCache
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
@@ -22,6 +26,14 @@ class ExternalApiProvider:
     Complementa as recomendações locais quando necessário.
     """
 
+    # Validade dos resultados no cache compartilhado (o LRU local expira antes)
+    USER_RESULTS_TTL = RecommendationCache.CACHE_TTL['recommendations']
+    PATTERN_RESULTS_TTL = 60 * 60 * 24
+
+    # Buscas idênticas em andamento no processo (ex.: vários usuários com o
+    # mesmo padrão ao mesmo tempo) geram uma única chamada à API
+    _in_flight = SingleFlight()
+
     def __init__(self):
         """Inicializa o provedor externo"""
         # Use o cliente centralizado com namespace específico
@@ -29,43 +41,41 @@ class ExternalApiProvider:
             cache_namespace="books_recommendations",
             context="recommendations"
         )
+        # A busca não segura o worker do pool muito além do prazo das buscas externas
+        self.client.default_timeout = min(self.client.default_timeout, ExternalSearchExecutor().deadline)
         self.max_patterns = 5
         self.category_mapping = CategoryMapping()
         self.max_results_per_query = 10
         self.last_external_recommendations = []
-        # Cache de resultados para reduzir chamadas API repetidas
-        self._results_cache = {}
+        # Cache de resultados (LRU do processo + Redis) para reduzir chamadas API repetidas
+        self._results_cache = TieredCache.for_namespace('external_recommendations')
 
-    def get_recommendations(self, user: User, limit: int = 8) -> List[Dict]:
+    def get_recommendations(
+            self, user: User, limit: int = 8, context: Optional[UserReadingContext] = None
+    ) -> List[Dict]:
         """
         Obtém recomendações externas baseadas nas preferências do usuário.
         Retorna lista de dicionários no formato da API Google Books.
         """
         try:
             # Verificar se já temos recomendações em cache para este usuário
-            user_id = user.id if user else 'anonymous'
-            user_cache_key = f"ext_recommendations:{user_id}"
-            if user_cache_key in self._results_cache:
-                cached_results = self._results_cache[user_cache_key]
-                logger.info(f"Usando cache de recomendações externas para usuário {user.id}")
+            user_cache_key = self._get_user_cache_key(user)
+            cached_results = self._results_cache.get(user_cache_key)
+            if cached_results is not None:
+                logger.info(f"Usando cache de recomendações externas para usuário {user.id if user else 'anonymous'}")
                 return cached_results[:limit]
 
             logger.info("=== Buscando recomendações externas ===")
 
             # Obtém padrões de interesse do usuário
-            user_patterns = self._get_user_patterns(user)
+            user_patterns = self._get_user_patterns(user, context=context)
             if not user_patterns:
                 logger.info("Nenhum padrão encontrado para busca externa")
                 return []
 
-            # Busca livros por cada padrão
+            # Busca os padrões em paralelo, dentro do prazo total
             all_results = []
-            for pattern in user_patterns:
-                # Log para depuração
-                logger.info(f"[recommendations] Iniciando busca com: {pattern}, tipo: None, max_results: {self.max_results_per_query}")
-
-                # Busca com query específica
-                results = self._search_with_pattern(pattern)
+            for pattern, results in ExternalSearchExecutor().map(self._search_with_pattern, user_patterns):
                 if results:
                     all_results.extend(results)
                     logger.info(f"Encontrados {len(results)} livros para o padrão '{pattern}'")
@@ -75,7 +85,7 @@ class ExternalApiProvider:
                 return []
 
             # Filtra livros já existentes
-            filtered_books = self._filter_existing_books(all_results, user)
+            filtered_books = self._filter_existing_books(all_results, user, context=context)
             logger.info(f"Livros filtrados (removendo existentes): {len(filtered_books)}")
 
             # Limita o número de resultados
@@ -83,7 +93,7 @@ class ExternalApiProvider:
             logger.info(f"Recomendações externas finais: {len(final_results)}")
 
             # Armazena em cache para reduzir chamadas repetidas
-            self._results_cache[user_cache_key] = filtered_books
+            self._results_cache.set(user_cache_key, filtered_books, self.USER_RESULTS_TTL)
 
             # Garante formato consistente
             self.last_external_recommendations = final_results
@@ -96,7 +106,14 @@ class ExternalApiProvider:
             logger.error(traceback.format_exc())
             return []
 
-    def _get_user_patterns(self, user: User) -> List[str]:
+    def _get_user_cache_key(self, user: User) -> str:
+        """Chave dos resultados do usuário; a geração muda quando a estante muda"""
+        if not user or not getattr(user, 'pk', None):
+            return "ext_recommendations:anonymous"
+        generation = RecommendationCache.get_generation(user.id)
+        return f"ext_recommendations:{user.id}:g{generation}"
+
+    def _get_user_patterns(self, user: User, context: Optional[UserReadingContext] = None) -> List[str]:
         """Extrai padrões de interesse do usuário"""
         patterns = set()
         weights = {'favorito': 3, 'lido': 2, 'lendo': 2, 'vou_ler': 1}
@@ -106,11 +123,9 @@ class ExternalApiProvider:
                 # Se não há usuário, retorna categorias padrão
                 return ['fiction', 'fantasy', 'thriller', 'romance'][:self.max_patterns]
 
-            # Consulta otimizada para prateleiras do usuário
-            shelves = UserBookShelf.objects.filter(
-                user=user,
-                shelf_type__in=weights.keys()
-            ).select_related('book').order_by('-added_at')[:50]  # Limita para evitar sobrecarga
+            # Prateleiras do usuário a partir do contexto compartilhado
+            context = UserReadingContext.for_user(user, context)
+            shelves = context.shelves_of(*weights.keys())[:50]  # Limita para evitar sobrecarga
 
             # Conjunto de categorias já processadas para evitar duplicatas
             processed_categories = set()
@@ -180,29 +195,12 @@ class ExternalApiProvider:
         try:
             # Verifica se já temos este padrão em cache
             cache_key = f"pattern_search:{pattern}"
-            if cache_key in self._results_cache:
+            cached_books = self._results_cache.get(cache_key)
+            if cached_books is not None:
                 # Usar cache para evitar chamadas API desnecessárias
-                return self._results_cache[cache_key]
-
-            # Ajusta query baseado no tipo de padrão
-            if pattern.startswith('inauthor:'):
-                query = pattern
-            else:
-                query = f'subject:"{pattern}"'
+                return cached_books
 
-            # Chama a API
-            results = self.client.search_books(
-                query=query,
-                max_results=self.max_results_per_query
-            )
-
-            # Processar resultado da API
-            formatted_books = self._process_api_results(results)
-
-            # Armazena em cache
-            self._results_cache[cache_key] = formatted_books
-
-            return formatted_books
+            return self._in_flight.do(cache_key, lambda: self._fetch_pattern(pattern, cache_key))
 
         except Exception as e:
             logger.error(f"Erro na busca com padrão '{pattern}': {str(e)}")
@@ -210,6 +208,28 @@ class ExternalApiProvider:
             logger.debug(traceback.format_exc())
             return []
 
+    def _fetch_pattern(self, pattern: str, cache_key: str) -> List[Dict[str, Any]]:
+        """Consulta a API para um padrão e grava o resultado no cache"""
+        # Ajusta query baseado no tipo de padrão
+        if pattern.startswith('inauthor:'):
+            query = pattern
+        else:
+            query = f'subject:"{pattern}"'
+
+        logger.info(f"[recommendations] Iniciando busca com: {pattern}, max_results: {self.max_results_per_query}")
+        results = self.client.search_books(
+            query=query,
+            max_results=self.max_results_per_query
+        )
+
+        # Processar resultado da API
+        formatted_books = self._process_api_results(results)
+
+        # Armazena em cache
+        self._results_cache.set(cache_key, formatted_books, self.PATTERN_RESULTS_TTL)
+
+        return formatted_books
+
     def _process_api_results(self, results: Union[Dict, List]) -> List[Dict]:
         """Processa resultados da API em um formato consistente"""
         try:
@@ -286,30 +306,18 @@ class ExternalApiProvider:
             logger.error(f"Erro ao processar resultados da API: {str(e)}")
             return []
 
-    def _filter_existing_books(self, external_books: List[Dict], user: User) -> List[Dict]:
+    def _filter_existing_books(
+            self, external_books: List[Dict], user: User, context: Optional[UserReadingContext] = None
+    ) -> List[Dict]:
         """Filtra livros que já existem nas prateleiras do usuário"""
-        # Obtém títulos e autores dos livros do usuário
-        user_books = set()
-
+        # Títulos e autores da estante, montados uma vez por contexto a partir
+        # das prateleiras já carregadas e consultados em memória
         try:
-            if user:
-                user_shelves = UserBookShelf.objects.filter(user=user).select_related('book')
-            else:
-                user_shelves = UserBookShelf.objects.none()
-
-            for shelf in user_shelves:
-                try:
-                    if hasattr(shelf, 'book') and shelf.book:
-                        title = shelf.book.titulo.lower() if hasattr(shelf.book, 'titulo') and shelf.book.titulo else ''
-                        author = shelf.book.autor.lower() if hasattr(shelf.book, 'autor') and shelf.book.autor else ''
-
-                        if title or author:
-                            user_books.add((title, author))
-                except Exception as book_error:
-                    logger.warning(f"Erro ao processar livro do usuário para filtragem: {str(book_error)}")
-                    continue
+            context = UserReadingContext.for_user(user, context)
+            user_books = context.memoize('external:shelf_titles', lambda: self._shelf_titles(context))
         except Exception as e:
             logger.error(f"Erro ao obter livros do usuário: {str(e)}")
+            user_books = set()
 
         # Filtra livros únicos
         filtered = []
@@ -355,6 +363,23 @@ class ExternalApiProvider:
 
         return filtered
 
+    @staticmethod
+    def _shelf_titles(context: UserReadingContext) -> Set[tuple]:
+        """Pares (título, autor) em minúsculas dos livros da estante"""
+        user_books = set()
+        for shelf in context.shelves:
+            try:
+                if hasattr(shelf, 'book') and shelf.book:
+                    title = shelf.book.titulo.lower() if hasattr(shelf.book, 'titulo') and shelf.book.titulo else ''
+                    author = shelf.book.autor.lower() if hasattr(shelf.book, 'autor') and shelf.book.autor else ''
+
+                    if title or author:
+                        user_books.add((title, author))
+            except Exception as book_error:
+                logger.warning(f"Erro ao processar livro do usuário para filtragem: {str(book_error)}")
+                continue
+        return user_books
+
     def _convert_to_temp_books(self, external_books: List[Dict]) -> List[Book]:
         """Converte livros da API externa em objetos Book temporários"""
         temp_books = []
@@ -1,10 +1,12 @@
-from typing import List, Dict
+from typing import List, Dict, Optional
 from django.db.models import QuerySet, Count, Q, F, Value, FloatField
 from django.db.models.functions import Cast
 from django.utils import timezone
 from ...models import Book, User, UserBookShelf
 from django.contrib.auth import get_user_model
 from ..providers.exclusion import ExclusionProvider
+from ..context import UserReadingContext
+from ..utils.sampling import BookSampler
 
 User = get_user_model()
 
@@ -20,12 +22,15 @@ class HistoryBasedProvider:
         'abandonei': 0.5
     }
 
-    def get_recommendations(self, user: User, limit: int = 20) -> QuerySet:
+    def get_recommendations(
+            self, user: User, limit: int = 20, context: Optional[UserReadingContext] = None
+    ) -> QuerySet:
         """
         Gera recomendações baseadas no histórico de leitura do usuário
         """
-        excluded_books = ExclusionProvider.get_excluded_books(user)
-        reading_history = self._get_reading_history(user)
+        context = UserReadingContext.for_user(user, context)
+        excluded_books = ExclusionProvider.get_excluded_books(user, context=context)
+        reading_history = self._get_reading_history(user, context=context)
 
         if not reading_history:
             return Book.objects.none()
@@ -36,15 +41,17 @@ class HistoryBasedProvider:
         if not query:
             return Book.objects.none()
 
-        recommendations = self._apply_recommendation_filters(query, excluded_books, limit)
+        recommendations = self._apply_recommendation_filters(
+            query, excluded_books, limit, seed=BookSampler.seed_for(user, 'history')
+        )
         return recommendations
 
-    def _get_reading_history(self, user: User) -> List[UserBookShelf]:
+    def _get_reading_history(
+            self, user: User, context: Optional[UserReadingContext] = None
+    ) -> List[UserBookShelf]:
         """Obtém histórico de leitura com pesos por tipo de prateleira"""
-        history = list(UserBookShelf.objects.filter(
-            user=user,
-            shelf_type__in=self.SHELF_WEIGHTS.keys()
-        ).select_related('book').order_by('-added_at'))
+        context = UserReadingContext.for_user(user, context)
+        history = context.shelves_of(*self.SHELF_WEIGHTS.keys())
 
         # Adiciona pesos manualmente após a query
         for item in history:
@@ -128,16 +135,15 @@ class HistoryBasedProvider:
         return query
 
     def _apply_recommendation_filters(
-            self, query: Q, excluded_books: set, limit: int
+            self, query: Q, excluded_books: set, limit: int, seed: float = 0.0
     ) -> QuerySet:
-        """Aplica filtros finais e retorna recomendações"""
-        return Book.objects.filter(query).exclude(
-            id__in=excluded_books
-        ).distinct().order_by('?')[:limit]
+        """Aplica filtros finais e retorna uma amostra aleatória estável das recomendações"""
+        # Os livros da estante são descartados em memória, sem NOT IN na consulta
+        return BookSampler.sample(Book.objects.filter(query), limit, seed, exclude=set(excluded_books))
 
-    def get_reading_patterns(self, user: User) -> Dict:
+    def get_reading_patterns(self, user: User, context: Optional[UserReadingContext] = None) -> Dict:
         """Retorna padrões de leitura para análise externa"""
-        reading_history = self._get_reading_history(user)
+        reading_history = self._get_reading_history(user, context=context)
         patterns = self._analyze_reading_patterns(reading_history)
 
         # Adiciona total de livros no histórico
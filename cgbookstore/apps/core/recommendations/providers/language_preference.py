@@ -1,13 +1,17 @@
 # cgbookstore/apps/core/recommendations/providers/language_preference.py
 
-from typing import List, Dict, Set, Tuple
+from typing import List, Dict, Set, Tuple, Optional
 from collections import Counter
 from django.db.models import QuerySet, Q, Count, F
 from django.contrib.auth import get_user_model
 import logging
 
 from ...models import Book, UserBookShelf, Profile
+from ...models.book import PORTUGUESE_LANGUAGE_VARIANTS, normalize_language_code
 from .exclusion import ExclusionProvider
+from ..context import UserReadingContext
+from ..utils.sampling import BookSampler
+from ..services.exclusion_set import UserExclusionSet
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
@@ -28,19 +32,19 @@ class LanguagePreferenceProvider:
         'abandonei': -1.0
     }
 
-    PORTUGUESE_VARIANTS = {
-        'pt', 'pt-br', 'pt-pt', 'por', 'portuguese',
-        'português', 'portugues', 'brazil', 'brasil'
-    }
+    PORTUGUESE_VARIANTS = PORTUGUESE_LANGUAGE_VARIANTS
 
     def __init__(self):
         self.min_confidence_threshold = 0.7
 
-    def get_recommendations(self, user: User, limit: int = 20) -> QuerySet:
+    def get_recommendations(
+            self, user: User, limit: int = 20, context: Optional[UserReadingContext] = None
+    ) -> QuerySet:
         try:
             logger.info(f"=== Iniciando recomendações por idioma para usuário {user.id} ===")
-            excluded_books = ExclusionProvider.get_excluded_books(user)
-            language_profile = self._analyze_language_preferences(user)
+            context = UserReadingContext.for_user(user, context)
+            excluded_books = ExclusionProvider.get_excluded_books(user, context=context)
+            language_profile = self._analyze_language_preferences(user, context=context)
 
             profile_preferences = {'interests_keywords': [], 'preferred_languages': []}
             if hasattr(user, 'profile'):
@@ -68,7 +72,7 @@ class LanguagePreferenceProvider:
             logger.error(f"Erro ao gerar recomendações por idioma: {str(e)}")
             return Book.objects.none()
 
-    def _analyze_language_preferences(self, user: User) -> Dict:
+    def _analyze_language_preferences(self, user: User, context: Optional[UserReadingContext] = None) -> Dict:
         language_stats = {
             'languages': Counter(),
             'portuguese_preference': 0.0,
@@ -76,7 +80,7 @@ class LanguagePreferenceProvider:
             'abandoned_languages': Counter(),
             'total_books': 0
         }
-        user_shelves = UserBookShelf.objects.filter(user=user).select_related('book')
+        user_shelves = UserReadingContext.for_user(user, context).shelves
 
         for shelf in user_shelves:
             book = shelf.book
@@ -103,12 +107,7 @@ class LanguagePreferenceProvider:
         return language_stats
 
     def _normalize_language(self, language: str) -> str:
-        if not language:
-            return 'unknown'
-        normalized = language.lower().strip()
-        if any(variant in normalized for variant in self.PORTUGUESE_VARIANTS):
-            return 'pt'
-        return normalized[:2] if len(normalized) >= 2 else normalized
+        return normalize_language_code(language) or 'unknown'
 
     def _is_portuguese(self, language: str) -> bool:
         return self._normalize_language(language) == 'pt'
@@ -180,21 +179,21 @@ class LanguagePreferenceProvider:
             if count > 2:
                 query &= ~Q(idioma__icontains=abandoned_lang)
 
-        recommendations = Book.objects.filter(query).exclude(id__in=excluded_books).distinct()
+        # Os livros da estante são descartados em memória, sem NOT IN na consulta
+        ordering = ('-quantidade_acessos', *BookSampler.TIEBREAK)
+        book_ids = UserExclusionSet.take(
+            Book.objects.filter(query).distinct().order_by(*ordering).values_list('id', flat=True),
+            set(excluded_books), limit
+        )
 
-        if recommendations.count() < limit:
-            current_ids = list(recommendations.values_list('id', flat=True))
-            excluded_list_for_portuguese = list(excluded_books) + current_ids
+        if len(book_ids) < limit:
             portuguese_books = self._get_portuguese_recommendations(
-                set(excluded_list_for_portuguese),
-                limit - recommendations.count()
+                set(excluded_books) | set(book_ids),
+                limit - len(book_ids)
             )
-            if portuguese_books.exists():
-                portuguese_ids = list(portuguese_books.values_list('id', flat=True))
-                all_book_ids = current_ids + portuguese_ids
-                recommendations = Book.objects.filter(id__in=all_book_ids).distinct()
+            book_ids += list(portuguese_books.values_list('id', flat=True))
 
-        return recommendations.order_by('-quantidade_acessos', '?')[:limit]
+        return Book.objects.filter(id__in=book_ids).order_by(*ordering)
 
     def _get_portuguese_recommendations(self, excluded_books: Set[int], limit: int) -> QuerySet:
         portuguese_query = Q()
@@ -205,12 +204,23 @@ class LanguagePreferenceProvider:
         portuguese_query |= Q(autor__icontains='Jorge') & Q(autor__icontains='Amado')
         portuguese_query |= Q(autor__icontains='Paulo') & Q(autor__icontains='Coelho')
 
-        return Book.objects.filter(portuguese_query).exclude(
-            id__in=excluded_books
-        ).distinct().order_by('-quantidade_vendida', '-quantidade_acessos', '?')[:limit]
+        ordering = ('-quantidade_vendida', '-quantidade_acessos', *BookSampler.TIEBREAK)
+        book_ids = UserExclusionSet.take(
+            Book.objects.filter(portuguese_query).distinct().order_by(*ordering).values_list('id', flat=True),
+            set(excluded_books), limit
+        )
+        return Book.objects.filter(id__in=book_ids).order_by(*ordering)
+
+    def get_language_affinity(self, user: User, context: Optional[UserReadingContext] = None) -> Dict:
+        if context is not None and context.user == user:
+            return context.memoize(
+                'language_affinity',
+                lambda: self._build_language_affinity(user, context)
+            )
+        return self._build_language_affinity(user)
 
-    def get_language_affinity(self, user: User) -> Dict:
-        profile_data = self._analyze_language_preferences(user)
+    def _build_language_affinity(self, user: User, context: Optional[UserReadingContext] = None) -> Dict:
+        profile_data = self._analyze_language_preferences(user, context=context)
         preferred_languages = dict(profile_data['languages']) if profile_data['languages'] else {}
         if not preferred_languages:
             preferred_languages = {'pt': 1.0}
@@ -1,14 +1,16 @@
 import random
 from random import random, sample
-from django.db.models import Q, Count, Case, When, Value, FloatField
+from django.db.models import Q, Count, Case, When, Value, FloatField, IntegerField
 from django.db.models.functions import Coalesce
-from typing import List, Dict, Set
-from django.forms import IntegerField
+from typing import List, Dict, Set, Optional
 from ...models import Book, User, UserBookShelf
 from typing import List, Set
 from django.db.models import QuerySet, Q
 from django.contrib.auth import get_user_model
 from ...models import Book, UserBookShelf
+from ..context import UserReadingContext
+from ..services.similarity_index import SimilarityIndex
+from ..utils.sampling import BookSampler
 
 User = get_user_model()
 
@@ -24,24 +26,38 @@ class SimilarityBasedProvider:
         'temas': 0.15
     }
 
-    def get_recommendations(self, user: User, limit: int = 20) -> QuerySet:
+    def get_recommendations(
+            self, user: User, limit: int = 20, context: Optional[UserReadingContext] = None
+    ) -> QuerySet:
         """
         Gera recomendações baseadas em similaridade com livros favoritos
         """
+        context = UserReadingContext.for_user(user, context)
+
         # Obtém TODOS os livros que devem ser excluídos (incluindo favoritos)
-        excluded_books = UserBookShelf.objects.filter(
-            user=user
-        ).values_list('book_id', flat=True).distinct()
+        excluded_books = context.book_ids
 
         # Obtém apenas livros favoritos para base de similaridade
-        user_books = UserBookShelf.objects.filter(
-            user=user,
-            shelf_type__in=['favorito', 'lido']
-        ).select_related('book')
+        user_books = context.shelves_of('favorito', 'lido')
 
-        if not user_books.exists():
+        if not user_books:
             return Book.objects.none()
 
+        # Funde as listas de vizinhos pré-calculadas dos livros base
+        neighbors = SimilarityIndex.merge_neighbors(
+            (shelf.book_id for shelf in user_books),
+            excluded=excluded_books,
+            limit=limit
+        )
+        if neighbors:
+            ranked_ids = [book_id for book_id, _ in neighbors]
+            preserved_order = Case(
+                *[When(id=book_id, then=Value(pos)) for pos, book_id in enumerate(ranked_ids)],
+                output_field=IntegerField()
+            )
+            return Book.objects.public().filter(id__in=ranked_ids).order_by(preserved_order)
+
+        # Sem índice construído: cai na busca por atributos em comum
         # Obtém padrões dos livros do usuário
         patterns = {
             'genres': set(),
@@ -77,14 +93,12 @@ class SimilarityBasedProvider:
         if not similarity_query:
             return Book.objects.none()
 
-        # Aplica a query excluindo todos os livros na estante do usuário
-        recommendations = Book.objects.filter(
-            similarity_query
-        ).exclude(
-            id__in=excluded_books
-        ).distinct()
+        # Amostra os candidatos descartando em memória os livros da estante do usuário
+        recommendations = Book.objects.filter(similarity_query)
 
-        return recommendations.order_by('?')[:limit]
+        return BookSampler.sample(
+            recommendations, limit, BookSampler.seed_for(user, 'similarity'), exclude=excluded_books
+        )
 
     def _get_user_patterns(self, user_books: QuerySet) -> dict:
         """Extrai padrões dos livros do usuário"""
@@ -1,10 +1,13 @@
-from typing import Dict, List, Set
+from typing import Dict, List, Set, Optional, Tuple
 from django.db.models import QuerySet, Count, Q, F
 from django.utils import timezone
 from django.contrib.auth import get_user_model
 from datetime import datetime, timedelta
 from ...models import Book, UserBookShelf
 from ..providers.exclusion import ExclusionProvider
+from ..context import UserReadingContext
+from ..utils.sampling import BookSampler
+from ..services.trending_index import TrendingIndex
 
 User = get_user_model()
 
@@ -108,17 +111,29 @@ class RollingAnalyzer:
 
 
 class TemporalProvider:
-    """Provider de recomendações baseadas em análise temporal"""
+    """
+    Provider de recomendações baseadas em análise temporal.
+
+    Os padrões sazonais e recentes do usuário definem os candidatos; entre
+    eles, os livros em alta no índice de tendências vêm primeiro, e o
+    restante é completado com uma amostra aleatória estável.
+    """
+
+    # Quantos livros do topo do índice de tendências são considerados
+    TRENDING_POOL = 500
 
     def __init__(self):
         self.seasonal_analyzer = SeasonalAnalyzer()
         self.rolling_analyzer = RollingAnalyzer()
 
-    def get_recommendations(self, user: User, limit: int = 20) -> QuerySet:
-        excluded_books = ExclusionProvider.get_excluded_books(user)
-        reading_history = self._get_reading_history(user)
+    def get_recommendations(
+            self, user: User, limit: int = 20, context: Optional[UserReadingContext] = None
+    ) -> QuerySet:
+        context = UserReadingContext.for_user(user, context)
+        excluded_books = ExclusionProvider.get_excluded_books(user, context=context)
+        reading_history = self._get_reading_history(user, context=context)
 
-        if not reading_history.exists():
+        if not reading_history:
             return Book.objects.none()
 
         query = self._build_temporal_query(reading_history)
@@ -126,14 +141,19 @@ class TemporalProvider:
         if not query:
             return Book.objects.none()
 
-        return self._apply_recommendation_filters(query, excluded_books, limit)
+        trending = context.memoize_shared(
+            'temporal:trending', lambda: TrendingIndex().top('trending', self.TRENDING_POOL)
+        )
+        return self._apply_recommendation_filters(
+            query, excluded_books, limit, seed=BookSampler.seed_for(user, 'temporal'), trending=trending
+        )
 
-    def _get_reading_history(self, user: User) -> QuerySet:
+    def _get_reading_history(
+            self, user: User, context: Optional[UserReadingContext] = None
+    ) -> List[UserBookShelf]:
         """Obtém histórico de leitura para análise temporal"""
-        return UserBookShelf.objects.filter(
-            user=user,
-            shelf_type__in=['lido', 'lendo', 'favorito']
-        ).select_related('book').order_by('-added_at')
+        context = UserReadingContext.for_user(user, context)
+        return context.shelves_of('lido', 'lendo', 'favorito')
 
     def _build_temporal_query(self, reading_history: QuerySet) -> Q:
         """Constrói query combinando padrões sazonais e móveis"""
@@ -186,16 +206,32 @@ class TemporalProvider:
         return query
 
     def _apply_recommendation_filters(
-            self, query: Q, excluded_books: set, limit: int
+            self, query: Q, excluded_books: set, limit: int, seed: float = 0.0,
+            trending: Optional[List[Tuple[int, float]]] = None
     ) -> QuerySet:
-        """Aplica filtros finais e retorna recomendações"""
-        return Book.objects.filter(query).exclude(
-            id__in=excluded_books
-        ).distinct().order_by('?')[:limit]
-
-    def get_temporal_patterns(self, user: User) -> Dict:
+        """Aplica filtros finais: livros em alta primeiro, depois amostra aleatória estável"""
+        # Os livros da estante são descartados em memória, sem NOT IN na consulta
+        excluded_books = set(excluded_books)
+        candidates = Book.objects.filter(query)
+
+        if trending is None:
+            trending = TrendingIndex().top('trending', self.TRENDING_POOL)
+        trending_ids = [book_id for book_id, _ in trending if book_id not in excluded_books]
+        hot_ids = set(candidates.filter(id__in=trending_ids).values_list('id', flat=True)) if trending_ids else set()
+        ids = [book_id for book_id in trending_ids if book_id in hot_ids][:limit]
+
+        if not ids:
+            return BookSampler.sample(candidates, limit, seed, exclude=excluded_books)
+
+        if len(ids) < limit:
+            ids += list(BookSampler.sample(
+                candidates, limit - len(ids), seed, exclude=excluded_books | set(ids)
+            ).values_list('id', flat=True))
+        return TrendingIndex.ordered_queryset(ids)
+
+    def get_temporal_patterns(self, user: User, context: Optional[UserReadingContext] = None) -> Dict:
         """Retorna padrões temporais para análise externa"""
-        reading_history = self._get_reading_history(user)
+        reading_history = self._get_reading_history(user, context=context)
 
         return {
             'seasonal': self.seasonal_analyzer.analyze_seasonal_patterns(reading_history),
@@ -0,0 +1,337 @@
+# cgbookstore/apps/core/recommendations/services/als_model.py
+
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+from django.conf import settings
+from django.utils import timezone
+
+from ...models import Book, UserBookShelf
+
+logger = logging.getLogger(__name__)
+
+# Peso de cada tipo de estante como feedback implícito
+SHELF_WEIGHTS = {
+    'favorito': 4.0,
+    'lido': 3.0,
+    'lendo': 2.0,
+    'vou_ler': 1.0,
+}
+
+POINTER_FILE = 'current.json'
+ARRAYS = ('user_ids', 'book_ids', 'user_factors', 'item_factors', 'item_gram')
+
+
+def get_model_dir() -> str:
+    return getattr(settings, 'RECOMMENDATION_ALS_DIR', os.path.join(settings.BASE_DIR, 'recommendation_models'))
+
+
+class ALSTrainer:
+    """
+    Treino offline de fatoração de matrizes com feedback implícito (ALS).
+
+    Segue Hu, Koren e Volinsky (2008): a matriz usuário x livro das
+    estantes vira preferência binária p = 1 com confiança c = 1 + alpha * peso,
+    onde o peso depende do tipo de estante (SHELF_WEIGHTS). Cada iteração
+    resolve exatamente os fatores de usuários com os de livros fixos e
+    vice-versa, usando a identidade YᵀCᵤY = YᵀY + Yᵀ(Cᵤ - I)Y para tocar
+    apenas as interações observadas.
+    """
+
+    DEFAULT_FACTORS = 32
+    DEFAULT_REGULARIZATION = 0.1
+    DEFAULT_ALPHA = 10.0
+    DEFAULT_ITERATIONS = 15
+    KEEP_VERSIONS = 2
+
+    def __init__(
+            self,
+            factors: int = DEFAULT_FACTORS,
+            regularization: float = DEFAULT_REGULARIZATION,
+            alpha: float = DEFAULT_ALPHA,
+            iterations: int = DEFAULT_ITERATIONS,
+            seed: int = 42
+    ):
+        self.factors = factors
+        self.regularization = regularization
+        self.alpha = alpha
+        self.iterations = iterations
+        self.seed = seed
+
+    def interactions(self) -> Tuple[sparse.csr_matrix, np.ndarray, np.ndarray]:
+        """
+        Matriz usuário x livro com os pesos das estantes (o maior peso quando
+        o livro está em mais de uma estante do usuário), restrita ao catálogo
+        público. Retorna (matriz, ids de usuários, ids de livros), ordenados.
+        """
+        book_ids = np.fromiter(
+            Book.objects.public().order_by('id').values_list('id', flat=True), dtype=np.int64
+        )
+        rows = list(
+            UserBookShelf.objects.order_by()
+            .filter(shelf_type__in=SHELF_WEIGHTS.keys(), book_id__in=Book.objects.public().values('id'))
+            .values_list('user_id', 'book_id', 'shelf_type')
+            .iterator()
+        )
+        users = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+        books = np.fromiter((row[1] for row in rows), dtype=np.int64, count=len(rows))
+        weights = np.fromiter((SHELF_WEIGHTS[row[2]] for row in rows), dtype=np.float32, count=len(rows))
+
+        user_ids = np.unique(users)
+        user_positions = np.searchsorted(user_ids, users)
+        book_positions = np.searchsorted(book_ids, books)
+
+        # Livro em mais de uma estante do usuário: fica o maior peso
+        order = np.lexsort((-weights, book_positions, user_positions))
+        keys = user_positions[order] * len(book_ids) + book_positions[order]
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = keys[1:] != keys[:-1]
+        keep = order[first]
+
+        matrix = sparse.csr_matrix(
+            (weights[keep], (user_positions[keep], book_positions[keep])),
+            shape=(len(user_ids), len(book_ids))
+        )
+        return matrix, user_ids, book_ids
+
+    def fit(self, matrix: sparse.csr_matrix) -> Tuple[np.ndarray, np.ndarray]:
+        """Fatores (usuários, livros) para a matriz de pesos"""
+        rng = np.random.default_rng(self.seed)
+        n_users, n_items = matrix.shape
+        user_factors = (rng.standard_normal((n_users, self.factors)) * 0.01).astype(np.float32)
+        item_factors = (rng.standard_normal((n_items, self.factors)) * 0.01).astype(np.float32)
+
+        confidence = matrix.astype(np.float32) * self.alpha
+        confidence_t = confidence.T.tocsr()
+
+        for iteration in range(self.iterations):
+            user_factors = self._solve(confidence, item_factors)
+            item_factors = self._solve(confidence_t, user_factors)
+            logger.debug(f"ALS: iteração {iteration + 1}/{self.iterations}")
+
+        return user_factors, item_factors
+
+    def _solve(self, confidence: sparse.csr_matrix, fixed: np.ndarray) -> np.ndarray:
+        """Resolve os fatores de cada linha com os fatores da outra dimensão fixos"""
+        gram = fixed.T.astype(np.float64) @ fixed.astype(np.float64)
+        factors = np.zeros((confidence.shape[0], fixed.shape[1]), dtype=np.float32)
+        for row in range(confidence.shape[0]):
+            start, end = confidence.indptr[row], confidence.indptr[row + 1]
+            factors[row] = solve_row(
+                fixed, gram, self.regularization, confidence.indices[start:end], confidence.data[start:end]
+            )
+        return factors
+
+    def train(self, directory: Optional[str] = None) -> Dict:
+        """Treina com as estantes atuais e publica uma nova versão do modelo"""
+        started = time.monotonic()
+        matrix, user_ids, book_ids = self.interactions()
+        user_factors, item_factors = self.fit(matrix)
+        item_gram = (item_factors.T.astype(np.float64) @ item_factors.astype(np.float64))
+
+        version = self.save(directory or get_model_dir(), {
+            'user_ids': user_ids,
+            'book_ids': book_ids,
+            'user_factors': user_factors,
+            'item_factors': item_factors,
+            'item_gram': item_gram,
+        })
+
+        return {
+            'version': version,
+            'users': len(user_ids),
+            'books': len(book_ids),
+            'interactions': int(matrix.nnz),
+            'factors': self.factors,
+            'elapsed': time.monotonic() - started,
+        }
+
+    def save(self, directory: str, arrays: Dict[str, np.ndarray]) -> str:
+        """
+        Grava os arrays em uma pasta versionada e troca o ponteiro
+        current.json de forma atômica. Processos com a versão anterior
+        mapeada continuam lendo os arquivos até recarregar.
+        """
+        os.makedirs(directory, exist_ok=True)
+        version = timezone.now().strftime('model-%Y%m%d%H%M%S%f')
+        path = os.path.join(directory, version)
+        os.makedirs(path)
+
+        for name in ARRAYS:
+            np.save(os.path.join(path, f'{name}.npy'), np.ascontiguousarray(arrays[name]))
+        with open(os.path.join(path, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump({
+                'factors': self.factors,
+                'regularization': self.regularization,
+                'alpha': self.alpha,
+                'iterations': self.iterations,
+                'trained_at': timezone.now().isoformat(),
+            }, f)
+
+        tmp_pointer = os.path.join(directory, f'{POINTER_FILE}.tmp')
+        with open(tmp_pointer, 'w', encoding='utf-8') as f:
+            json.dump({'version': version}, f)
+        os.replace(tmp_pointer, os.path.join(directory, POINTER_FILE))
+
+        self._prune(directory)
+        return version
+
+    def _prune(self, directory: str):
+        versions = sorted(name for name in os.listdir(directory) if name.startswith('model-'))
+        for name in versions[:-self.KEEP_VERSIONS]:
+            shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+
+def solve_row(
+        fixed: np.ndarray,
+        gram: np.ndarray,
+        regularization: float,
+        indices: np.ndarray,
+        confidence: np.ndarray
+) -> np.ndarray:
+    """
+    Fatores de uma linha: (YᵀY + Yᵀ(Cᵤ - I)Y + λI)⁻¹ YᵀCᵤp, com
+    `confidence` = alpha * peso das interações observadas.
+    """
+    if not len(indices):
+        return np.zeros(fixed.shape[1], dtype=np.float32)
+    observed = fixed[indices].astype(np.float64)
+    a = gram + (observed.T * confidence) @ observed + regularization * np.eye(fixed.shape[1])
+    b = observed.T @ (confidence + 1.0)
+    return np.linalg.solve(a, b).astype(np.float32)
+
+
+class ALSModel:
+    """
+    Modelo treinado, com os arrays mapeados em memória (np.load mmap_mode='r').
+
+    Todos os workers que carregam a mesma versão compartilham as páginas
+    do page cache do sistema. Uma instância por processo (current), que
+    verifica o ponteiro da versão no máximo a cada RELOAD_INTERVAL segundos.
+    """
+
+    RELOAD_INTERVAL = 60
+    REGULARIZATION = ALSTrainer.DEFAULT_REGULARIZATION
+
+    _current: Optional['ALSModel'] = None
+    _checked_at = 0.0
+    _lock = threading.Lock()
+
+    def __init__(self, version: str, arrays: Dict[str, np.ndarray], meta: Dict):
+        self.version = version
+        self.user_ids = arrays['user_ids']
+        self.book_ids = arrays['book_ids']
+        self.user_factors = arrays['user_factors']
+        self.item_factors = arrays['item_factors']
+        self.item_gram = arrays['item_gram']
+        self.meta = meta
+
+    @classmethod
+    def load(cls, directory: Optional[str] = None) -> Optional['ALSModel']:
+        """Carrega a versão apontada por current.json, ou None se não houver modelo"""
+        directory = directory or get_model_dir()
+        try:
+            with open(os.path.join(directory, POINTER_FILE), encoding='utf-8') as f:
+                version = json.load(f)['version']
+        except FileNotFoundError:
+            return None
+
+        path = os.path.join(directory, version)
+        arrays = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r') for name in ARRAYS}
+        with open(os.path.join(path, 'meta.json'), encoding='utf-8') as f:
+            meta = json.load(f)
+        return cls(version, arrays, meta)
+
+    @classmethod
+    def current(cls) -> Optional['ALSModel']:
+        now = time.monotonic()
+        if now - cls._checked_at > cls.RELOAD_INTERVAL:
+            with cls._lock:
+                if now - cls._checked_at > cls.RELOAD_INTERVAL:
+                    try:
+                        cls._reload()
+                    except Exception as e:
+                        logger.error(f"Erro ao carregar modelo ALS: {str(e)}")
+                    cls._checked_at = now
+        return cls._current
+
+    @classmethod
+    def _reload(cls):
+        directory = get_model_dir()
+        try:
+            with open(os.path.join(directory, POINTER_FILE), encoding='utf-8') as f:
+                version = json.load(f)['version']
+        except FileNotFoundError:
+            cls._current = None
+            return
+        if cls._current is None or cls._current.version != version:
+            cls._current = cls.load(directory)
+            logger.info(f"Modelo ALS carregado: {version}")
+
+    @classmethod
+    def reset(cls):
+        with cls._lock:
+            cls._current = None
+            cls._checked_at = 0.0
+
+    def user_vector(self, user_id: int, shelves: Iterable[Tuple[int, str]]) -> Optional[np.ndarray]:
+        """
+        Fatores do usuário: os treinados ou, para usuários novos, calculados
+        na hora a partir das estantes atuais (fold-in) com os livros fixos.
+        """
+        position = np.searchsorted(self.user_ids, user_id)
+        if position < len(self.user_ids) and self.user_ids[position] == user_id:
+            return np.asarray(self.user_factors[position])
+
+        weights: Dict[int, float] = {}
+        for book_id, shelf_type in shelves:
+            weight = SHELF_WEIGHTS.get(shelf_type)
+            if weight and weight > weights.get(book_id, 0.0):
+                weights[book_id] = weight
+        if not weights:
+            return None
+
+        ids = np.fromiter(weights.keys(), dtype=np.int64)
+        positions = self._positions(ids)
+        known = positions >= 0
+        if not known.any():
+            return None
+
+        confidence = np.fromiter(weights.values(), dtype=np.float64)[known] * self.meta.get('alpha', 1.0)
+        return solve_row(self.item_factors, self.item_gram, self.meta.get('regularization', self.REGULARIZATION),
+                         positions[known], confidence)
+
+    def recommend(
+            self, user_vector: np.ndarray, excluded: Iterable[int] = (), limit: int = 20
+    ) -> List[Tuple[int, float]]:
+        """Top-`limit` livros por score (um produto matriz-vetor + argpartition)"""
+        scores = self.item_factors @ user_vector
+
+        excluded_positions = self._positions(np.fromiter(excluded, dtype=np.int64))
+        excluded_positions = excluded_positions[excluded_positions >= 0]
+        if len(excluded_positions):
+            scores = np.array(scores, copy=True)
+            scores[excluded_positions] = -np.inf
+
+        candidates = len(scores) - len(excluded_positions)
+        limit = min(limit, candidates)
+        if limit <= 0:
+            return []
+
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(int(self.book_ids[i]), float(scores[i])) for i in top]
+
+    def _positions(self, book_ids: np.ndarray) -> np.ndarray:
+        if not len(self.book_ids):
+            return np.full(len(book_ids), -1, dtype=np.int64)
+        positions = np.searchsorted(self.book_ids, book_ids)
+        clipped = np.minimum(positions, len(self.book_ids) - 1)
+        return np.where(self.book_ids[clipped] == book_ids, clipped, -1)
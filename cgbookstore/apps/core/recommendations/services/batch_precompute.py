@@ -0,0 +1,275 @@
+# cgbookstore/apps/core/recommendations/services/batch_precompute.py
+
+import json
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from django.contrib.auth import get_user_model
+from django.db import close_old_connections, connection, connections
+
+from ..context import UserReadingContext
+from ..utils.cache_manager import RecommendationCache
+from .similarity_index import SimilarityIndex
+
+logger = logging.getLogger(__name__)
+User = get_user_model()
+
+STAGES = ('load', 'compute', 'profile', 'write')
+
+
+class PrecomputeCheckpoint:
+    """
+    Progresso do pré-cálculo em um arquivo JSON.
+
+    Guarda as faixas [primeiro_id, último_id] dos shards concluídos; uma
+    execução interrompida retoma ignorando os usuários dessas faixas.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.completed: List[Tuple[int, int]] = []
+
+    def load(self) -> 'PrecomputeCheckpoint':
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                self.completed = [tuple(item) for item in json.load(f).get('completed', [])]
+        except FileNotFoundError:
+            self.completed = []
+        except Exception as e:
+            logger.error(f"Erro ao ler checkpoint {self.path}: {str(e)}")
+            self.completed = []
+        return self
+
+    def is_done(self, user_id: int) -> bool:
+        return any(first <= user_id <= last for first, last in self.completed)
+
+    def mark(self, first_id: int, last_id: int):
+        self.completed.append((first_id, last_id))
+        self.save()
+
+    def save(self):
+        # Escrita atômica: um processo interrompido nunca deixa o arquivo pela metade
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'completed': self.completed}, f)
+        os.replace(tmp_path, self.path)
+
+    def reset(self):
+        self.completed = []
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def _init_worker(neighbors: Optional[Dict[int, List]]):
+    """Inicializa um processo do pool"""
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        # Start method 'spawn': o processo filho não herda o Django configurado
+        django.setup()
+
+    # Pools de threads herdados via fork não têm threads vivas no processo filho
+    from ..executor import ProviderExecutor, BackgroundTasks, ExternalSearchExecutor
+    ProviderExecutor._pool = None
+    BackgroundTasks._pool = None
+    ExternalSearchExecutor._pool = None
+
+    SimilarityIndex._preloaded = neighbors
+
+    # Conexões herdadas do processo pai não são reaproveitadas no filho
+    close_old_connections()
+
+
+def _precompute_shard_in_worker(user_ids: List[int], limit: int) -> Dict:
+    """precompute_shard em um processo do pool, liberando a conexão do shard ao final"""
+    try:
+        return precompute_shard(user_ids, limit)
+    finally:
+        close_old_connections()
+
+
+def precompute_shard(user_ids: List[int], limit: int) -> Dict:
+    """
+    Calcula e grava as recomendações de um shard de usuários.
+
+    Os resultados são acumulados e gravados com set_many por TTL, que o
+    django-redis envia em um único pipeline. Não mexe na conexão com o
+    banco: no caminho em processo ela é a do chamador.
+    """
+    from ..engine import RecommendationEngine
+
+    engine = RecommendationEngine()
+    timings = dict.fromkeys(STAGES, 0.0)
+    entries: Dict[str, Dict] = {}
+    language_profiles: Dict[str, Dict] = {}
+    behaviors: Dict[str, Dict] = {}
+    errors = 0
+    written = False
+
+    started = time.monotonic()
+    users = User.objects.in_bulk(user_ids)
+    generations = RecommendationCache.get_generations(list(users))
+    language_generations = RecommendationCache.get_generations(list(users), 'language_profile')
+    behavior_generations = RecommendationCache.get_generations(list(users), 'behavior')
+    timings['load'] += time.monotonic() - started
+
+    for user_id in user_ids:
+        user = users.get(user_id)
+        if user is None:
+            continue
+        try:
+            started = time.monotonic()
+            context = UserReadingContext.for_user(user)
+            _ = context.book_ids
+            timings['load'] += time.monotonic() - started
+
+            started = time.monotonic()
+            local_books, external_books, _ = engine._compute_candidates(user, limit, context=context)
+            entries[engine._get_cache_key(user, context=context)] = engine._build_cache_entry(
+                local_books + external_books, generations[user_id], limit
+            )
+            timings['compute'] += time.monotonic() - started
+
+            started = time.monotonic()
+            language_profile = engine._language_provider.get_language_affinity(user, context=context)
+            if language_profile:
+                language_profiles[RecommendationCache._get_language_key(user.id)] = RecommendationCache.build_entry(
+                    language_profile, language_generations[user_id]
+                )
+            behavior = engine._analyze_user_behavior(user, context=context)
+            if behavior:
+                behaviors[RecommendationCache._get_behavior_key(user.id)] = RecommendationCache.build_entry(
+                    behavior, behavior_generations[user_id]
+                )
+            timings['profile'] += time.monotonic() - started
+        except Exception as e:
+            errors += 1
+            logger.error(f"Erro no pré-cálculo do usuário {user_id}: {str(e)}")
+
+    started = time.monotonic()
+    try:
+        engine._cache.set_many(entries, engine.CACHE_HARD_TTL)
+        RecommendationCache.get_cache().set_many(
+            language_profiles, RecommendationCache.CACHE_TTL['language_profile']
+        )
+        RecommendationCache.get_cache().set_many(behaviors, RecommendationCache.CACHE_TTL['behavior'])
+        written = True
+    except Exception as e:
+        logger.error(f"Erro ao gravar shard no cache: {str(e)}")
+    timings['write'] += time.monotonic() - started
+
+    return {
+        'first_id': user_ids[0],
+        'last_id': user_ids[-1],
+        'users': len(entries) if written else 0,
+        'errors': errors if written else len(user_ids),
+        'written': written,
+        'timings': timings,
+    }
+
+
+class BatchPrecompute:
+    """
+    Pré-cálculo offline de recomendações em lote.
+
+    Os usuários são divididos em shards de ids contíguos e distribuídos
+    entre processos, cada um com sua própria conexão com o banco. O índice
+    de similaridade é carregado uma vez no processo pai e herdado pelos
+    workers. O progresso é registrado em um checkpoint após cada shard.
+    """
+
+    DEFAULT_SHARD_SIZE = 200
+
+    def __init__(
+            self,
+            workers: int = 1,
+            shard_size: Optional[int] = None,
+            limit: int = 20,
+            checkpoint: Optional[PrecomputeCheckpoint] = None
+    ):
+        self.workers = max(1, workers)
+        self.shard_size = max(1, shard_size or self.DEFAULT_SHARD_SIZE)
+        self.limit = limit
+        self.checkpoint = checkpoint
+
+    def shards(self, user_ids: Iterable[int]) -> List[List[int]]:
+        """Shards de ids ordenados, sem os usuários já concluídos no checkpoint"""
+        pending = sorted(
+            user_id for user_id in user_ids
+            if not (self.checkpoint and self.checkpoint.is_done(user_id))
+        )
+        return [pending[i:i + self.shard_size] for i in range(0, len(pending), self.shard_size)]
+
+    def run(self, user_ids: Iterable[int], progress: Optional[Callable[[Dict], None]] = None) -> Dict:
+        """
+        Executa o pré-cálculo e retorna o resumo: usuários processados,
+        erros, tempo total, usuários/segundo e tempo acumulado por etapa.
+        """
+        started = time.monotonic()
+        summary = {
+            'users': 0,
+            'errors': 0,
+            'shards': 0,
+            'timings': dict.fromkeys(('snapshot',) + STAGES, 0.0),
+        }
+
+        shards = self.shards(user_ids)
+        summary['total_shards'] = len(shards)
+
+        snapshot_started = time.monotonic()
+        SimilarityIndex.preload()
+        summary['timings']['snapshot'] = time.monotonic() - snapshot_started
+
+        try:
+            for result in self._execute(shards):
+                summary['users'] += result['users']
+                summary['errors'] += result['errors']
+                summary['shards'] += 1
+                for stage, elapsed in result['timings'].items():
+                    summary['timings'][stage] += elapsed
+                if self.checkpoint is not None and result['written']:
+                    self.checkpoint.mark(result['first_id'], result['last_id'])
+
+                summary['elapsed'] = time.monotonic() - started
+                summary['users_per_second'] = summary['users'] / summary['elapsed'] if summary['elapsed'] else 0.0
+                if progress:
+                    progress(summary)
+        finally:
+            SimilarityIndex.clear_preloaded()
+
+        summary['elapsed'] = time.monotonic() - started
+        summary['users_per_second'] = summary['users'] / summary['elapsed'] if summary['elapsed'] else 0.0
+        return summary
+
+    def _execute(self, shards: List[List[int]]):
+        # Dentro de uma transação aberta (ex.: testes) os processos não
+        # enxergariam os dados: executa no próprio processo
+        if self.workers == 1 or connection.in_atomic_block:
+            for shard in shards:
+                yield precompute_shard(shard, self.limit)
+            return
+
+        # Conexões abertas não podem ser compartilhadas com os processos filhos
+        connections.close_all()
+
+        methods = multiprocessing.get_all_start_methods()
+        mp_context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+
+        with ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=mp_context,
+                initializer=_init_worker,
+                initargs=(SimilarityIndex._preloaded,)
+        ) as pool:
+            futures = [pool.submit(_precompute_shard_in_worker, shard, self.limit) for shard in shards]
+            for future in as_completed(futures):
+                try:
+                    yield future.result()
+                except Exception as e:
+                    logger.error(f"Erro em shard do pré-cálculo: {str(e)}")
@@ -0,0 +1,260 @@
+# cgbookstore/apps/core/recommendations/services/catalog_snapshot.py
+
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from django.db.models import Q
+
+from ...models import Book
+from ...services.book_counters import BookCounters
+
+logger = logging.getLogger(__name__)
+
+
+class CatalogSnapshot:
+    """
+    Snapshot somente leitura das features de ranking do catálogo.
+
+    Mantém, por processo, apenas as colunas usadas pelo scoring em arrays
+    NumPy ordenados por id (gênero, categoria e autor normalizados viram ids
+    de vocabulário). Os caminhos de scoring leem estes arrays em vez de
+    hidratar instâncias de Book com todos os campos de texto.
+
+    Os contadores de acessos e vendas somam os incrementos ainda no buffer
+    do BookCounters. A atualização é incremental pelo `updated_at` dos
+    livros (e pelo `counters_updated_at` gravado no flush dos contadores),
+    no máximo a cada REFRESH_INTERVAL segundos; uma reconstrução completa a cada
+    FULL_REBUILD_INTERVAL remove livros apagados e captura alterações
+    feitas com QuerySet.update(), que não tocam `updated_at`.
+    """
+
+    REFRESH_INTERVAL = 60
+    FULL_REBUILD_INTERVAL = 60 * 60
+    CHUNK_SIZE = 2000
+
+    # Colunas cujo valor atual inclui os incrementos ainda no buffer (BookCounters)
+    BUFFERED_COUNTERS = ('quantidade_acessos', 'quantidade_vendida')
+
+    FIELDS = (
+        'id', 'genero', 'categoria', 'autor', 'idioma_codigo', 'quantidade_acessos',
+        'quantidade_vendida', 'e_destaque', 'avaliacao_media', 'ordem_exibicao',
+        'counters_updated_at', 'updated_at'
+    )
+    # Colunas de data que avançam a marca d'água (sempre as últimas de FIELDS)
+    WATERMARK_FIELDS = ('counters_updated_at', 'updated_at')
+    VOCABULARIES = ('genero', 'categoria', 'autor', 'idioma')
+
+    _instance: Optional['CatalogSnapshot'] = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._vocab: Dict[str, Dict[str, int]] = {name: {'': 0} for name in self.VOCABULARIES}
+        self._data: Dict[str, np.ndarray] = self._empty()
+        self.watermark: Optional[datetime] = None
+        self.checked_at = 0.0
+        self.built_at = 0.0
+
+    @classmethod
+    def current(cls) -> 'CatalogSnapshot':
+        """Snapshot do processo, carregado sob demanda e atualizado se necessário"""
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    snapshot = cls()
+                    snapshot.load()
+                    cls._instance = snapshot
+        cls._instance.maybe_refresh()
+        return cls._instance
+
+    @classmethod
+    def mark_stale(cls):
+        """Força a atualização incremental na próxima leitura (livro salvo neste processo)"""
+        if cls._instance is not None:
+            cls._instance.checked_at = 0.0
+
+    @classmethod
+    def reset(cls):
+        with cls._instance_lock:
+            cls._instance = None
+
+    def __len__(self) -> int:
+        return len(self._data['id'])
+
+    # ------------------------------------------------------------------
+    # Carga e atualização
+    # ------------------------------------------------------------------
+
+    def load(self):
+        """Reconstrução completa"""
+        with self._lock:
+            vocab = {name: {'': 0} for name in self.VOCABULARIES}
+            rows = list(Book.objects.order_by().values_list(*self.FIELDS).iterator(chunk_size=self.CHUNK_SIZE))
+            data = self._columns(rows, vocab)
+            order = np.argsort(data['id'], kind='stable')
+            self._data = {name: column[order] for name, column in data.items()}
+            self._vocab = vocab
+            self.watermark = self._max_updated_at(rows)
+            self.checked_at = self.built_at = time.monotonic()
+
+    def refresh(self):
+        """Aplica os livros alterados desde a última carga"""
+        with self._lock:
+            queryset = Book.objects.order_by()
+            if self.watermark is not None:
+                queryset = queryset.filter(
+                    Q(updated_at__gte=self.watermark) | Q(counters_updated_at__gte=self.watermark)
+                )
+            rows = list(queryset.values_list(*self.FIELDS))
+            self.checked_at = time.monotonic()
+            if not rows:
+                return
+
+            changes = self._columns(rows, self._vocab)
+            positions = self._positions(self._data['id'], changes['id'])
+            existing = positions >= 0
+
+            data = {name: column.copy() for name, column in self._data.items()}
+            for name, column in changes.items():
+                data[name][positions[existing]] = column[existing]
+
+            if not existing.all():
+                data = {
+                    name: np.concatenate([column, changes[name][~existing]])
+                    for name, column in data.items()
+                }
+                order = np.argsort(data['id'], kind='stable')
+                data = {name: column[order] for name, column in data.items()}
+
+            # Troca atômica: leitores concorrentes veem o snapshot antigo ou o novo
+            self._data = data
+            self.watermark = max(filter(None, [self.watermark, self._max_updated_at(rows)]), default=None)
+
+    def maybe_refresh(self):
+        now = time.monotonic()
+        try:
+            if now - self.built_at > self.FULL_REBUILD_INTERVAL:
+                self.load()
+            elif now - self.checked_at > self.REFRESH_INTERVAL:
+                self.refresh()
+        except Exception as e:
+            logger.error(f"Erro ao atualizar snapshot do catálogo: {str(e)}")
+
+    def _empty(self) -> Dict[str, np.ndarray]:
+        return self._columns([], self._vocab)
+
+    def _columns(self, rows: List[tuple], vocab: Dict[str, Dict[str, int]]) -> Dict[str, np.ndarray]:
+        count = len(rows)
+        columns = list(zip(*rows)) if rows else [()] * len(self.FIELDS)
+        values = dict(zip(self.FIELDS, columns))
+
+        data = {
+            'id': np.fromiter(values['id'], dtype=np.int64, count=count),
+            'quantidade_acessos': np.fromiter(values['quantidade_acessos'], dtype=np.int64, count=count),
+            'quantidade_vendida': np.fromiter(values['quantidade_vendida'], dtype=np.int64, count=count),
+            'e_destaque': np.fromiter(values['e_destaque'], dtype=bool, count=count),
+            'avaliacao_media': np.fromiter(
+                (float(value or 0) for value in values['avaliacao_media']), dtype=np.float32, count=count
+            ),
+            'ordem_exibicao': np.fromiter(values['ordem_exibicao'], dtype=np.int32, count=count),
+        }
+        for name in ('genero', 'categoria', 'autor'):
+            data[name] = np.fromiter(
+                (self._term_id(vocab[name], self.normalize_term(value)) for value in values[name]),
+                dtype=np.int32, count=count
+            )
+        # Código de idioma já normalizado por Book.save()
+        data['idioma'] = np.fromiter(
+            (self._term_id(vocab['idioma'], value or '') for value in values['idioma_codigo']),
+            dtype=np.int32, count=count
+        )
+        return data
+
+    @staticmethod
+    def _term_id(terms: Dict[str, int], term: str) -> int:
+        if term not in terms:
+            terms[term] = len(terms)
+        return terms[term]
+
+    @classmethod
+    def _max_updated_at(cls, rows: List[tuple]) -> Optional[datetime]:
+        count = len(cls.WATERMARK_FIELDS)
+        values = [value for row in rows for value in row[-count:] if value is not None]
+        return max(values) if values else None
+
+    @staticmethod
+    def normalize_term(value: Optional[str]) -> str:
+        if not value:
+            return ''
+        return value.replace('[', '').replace(']', '').replace('"', '').replace("'", '').strip().lower()
+
+    # ------------------------------------------------------------------
+    # Leitura
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _positions(ids: np.ndarray, book_ids: np.ndarray) -> np.ndarray:
+        """Posição de cada id no array ordenado, ou -1 se ausente"""
+        if not len(ids):
+            return np.full(len(book_ids), -1, dtype=np.int64)
+        positions = np.searchsorted(ids, book_ids)
+        clipped = np.minimum(positions, len(ids) - 1)
+        return np.where(ids[clipped] == book_ids, clipped, -1)
+
+    def features(self, book_ids: Iterable[int]) -> Dict[str, np.ndarray]:
+        """
+        Features alinhadas com `book_ids`. Livros ausentes do snapshot
+        (criados após a última atualização) disparam uma atualização; se
+        continuarem ausentes, ou se a atualização falhar, recebem valores
+        zerados.
+        """
+        book_ids = np.fromiter(book_ids, dtype=np.int64)
+        data = self._data
+        positions = self._positions(data['id'], book_ids)
+
+        if (positions < 0).any():
+            try:
+                self.refresh()
+                data = self._data
+                positions = self._positions(data['id'], book_ids)
+            except Exception as e:
+                logger.error(f"Erro ao atualizar snapshot do catálogo: {str(e)}")
+
+        present = positions >= 0
+        rows = np.where(present, positions, 0)
+        features = {'present': present}
+        for name, column in data.items():
+            if name == 'id':
+                continue
+            values = column[rows] if len(column) else np.zeros(len(book_ids), dtype=column.dtype)
+            features[name] = np.where(present, values, np.zeros(1, dtype=column.dtype))
+        for name in self.BUFFERED_COUNTERS:
+            features[name] = features[name] + self._pending_counts(name, book_ids)
+        features['id'] = book_ids
+        return features
+
+    def _pending_counts(self, field: str, book_ids: np.ndarray) -> np.ndarray:
+        """Incrementos ainda não gravados no banco, alinhados com `book_ids`"""
+        pending = BookCounters().pending(field)
+        if not pending:
+            return np.zeros(len(book_ids), dtype=np.int64)
+
+        ids = np.fromiter(pending.keys(), dtype=np.int64, count=len(pending))
+        deltas = np.fromiter(pending.values(), dtype=np.int64, count=len(pending))
+        order = np.argsort(ids)
+        positions = self._positions(ids[order], book_ids)
+        return np.where(positions >= 0, deltas[order][positions], 0)
+
+    @staticmethod
+    def popularity(features: Dict[str, np.ndarray]) -> np.ndarray:
+        """Score de popularidade (acessos, vendas e destaque) usado pelos providers"""
+        score = features['quantidade_acessos'] * 0.001 + features['quantidade_vendida'] * 0.01
+        return np.where(features['e_destaque'], score * 1.5, score)
+
+    def term_id(self, vocabulary: str, term: str) -> int:
+        """Id de um termo já normalizado no vocabulário, ou -1 se desconhecido"""
+        return self._vocab[vocabulary].get(term, -1)
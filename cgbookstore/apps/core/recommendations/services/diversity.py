@@ -0,0 +1,110 @@
+# cgbookstore/apps/core/recommendations/services/diversity.py
+
+import logging
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from django.conf import settings
+
+from ...models import Book
+from .catalog_snapshot import CatalogSnapshot
+
+logger = logging.getLogger(__name__)
+
+
+class DiversityReranker:
+    """
+    Etapa de re-ranking por Maximal Marginal Relevance (MMR).
+
+    A cada passo escolhe o candidato que maximiza
+        λ · relevância - (1 - λ) · max(similaridade com os já escolhidos)
+    e mantém o vetor de similaridade máxima atualizado com um único
+    np.maximum por passo, sobre a matriz de similaridade pré-calculada.
+
+    A relevância vem da posição na lista recebida (já ordenada pelo
+    engine). A similaridade usa gênero, autor e categoria do
+    CatalogSnapshot como one-hot ponderado, ou vetores fornecidos pelo
+    chamador (ex.: embeddings). λ = 1 devolve a ordem original.
+    """
+
+    # Pesos das features na similaridade entre livros
+    FEATURE_WEIGHTS = {
+        'autor': 0.5,
+        'genero': 0.3,
+        'categoria': 0.2,
+    }
+
+    def __init__(self, lambdas: Optional[Dict[str, float]] = None):
+        # λ por superfície em settings.RECOMMENDATION_DIVERSITY_LAMBDA; sem 'default', λ = 1
+        if lambdas is None:
+            lambdas = dict(getattr(settings, 'RECOMMENDATION_DIVERSITY_LAMBDA', {}))
+        self.lambdas = lambdas
+
+    def lambda_for(self, surface: Optional[str] = None) -> float:
+        return float(self.lambdas.get(surface or 'default', self.lambdas.get('default', 1.0)))
+
+    def rerank(
+            self,
+            books: List[Book],
+            limit: Optional[int] = None,
+            surface: Optional[str] = None,
+            vectors: Optional[np.ndarray] = None
+    ) -> List[Book]:
+        """Seleciona até `limit` livros equilibrando relevância e diversidade"""
+        limit = len(books) if limit is None else min(limit, len(books))
+        diversity_lambda = self.lambda_for(surface)
+
+        if limit <= 0:
+            return []
+        if diversity_lambda >= 1.0 or len(books) < 3:
+            return books[:limit]
+
+        try:
+            if vectors is None:
+                similarity = self.feature_similarity([book.id for book in books])
+            else:
+                similarity = self.vector_similarity(vectors)
+            relevance = 1.0 - np.arange(len(books), dtype=np.float32) / len(books)
+
+            order = self.mmr(relevance, similarity, limit, diversity_lambda)
+            return [books[i] for i in order]
+
+        except Exception as e:
+            logger.error(f"Erro no re-ranking por diversidade: {str(e)}")
+            return books[:limit]
+
+    @staticmethod
+    def mmr(relevance: np.ndarray, similarity: np.ndarray, limit: int, diversity_lambda: float) -> np.ndarray:
+        """Índices escolhidos, em ordem, pelo MMR guloso"""
+        count = len(relevance)
+        weighted_relevance = diversity_lambda * relevance
+        max_similarity = np.zeros(count, dtype=np.float32)
+        available = np.ones(count, dtype=bool)
+        selected = np.empty(limit, dtype=np.int64)
+
+        for step in range(limit):
+            scores = np.where(available, weighted_relevance - (1.0 - diversity_lambda) * max_similarity, -np.inf)
+            chosen = int(np.argmax(scores))
+            selected[step] = chosen
+            available[chosen] = False
+            np.maximum(max_similarity, similarity[chosen], out=max_similarity)
+
+        return selected
+
+    def feature_similarity(self, book_ids: Sequence[int]) -> np.ndarray:
+        """Similaridade ponderada: soma dos pesos das features iguais (termo vazio não conta)"""
+        features = CatalogSnapshot.current().features(book_ids)
+        similarity = np.zeros((len(book_ids), len(book_ids)), dtype=np.float32)
+
+        for name, weight in self.FEATURE_WEIGHTS.items():
+            terms = features[name]
+            similarity += weight * ((terms[:, None] == terms[None, :]) & (terms[:, None] != 0))
+        return similarity
+
+    @staticmethod
+    def vector_similarity(vectors: np.ndarray) -> np.ndarray:
+        """Similaridade de cosseno entre vetores arbitrários (ex.: embeddings)"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        normalized = vectors / np.where(norms > 0, norms, 1.0)
+        return normalized @ normalized.T
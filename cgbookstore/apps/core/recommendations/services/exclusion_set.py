@@ -0,0 +1,262 @@
+# cgbookstore/apps/core/recommendations/services/exclusion_set.py
+
+import logging
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from django.core.cache import caches
+from django.db.models import QuerySet
+
+from ...models import UserBookShelf
+
+logger = logging.getLogger(__name__)
+
+# Adiciona membros apenas a um conjunto já carregado: um conjunto ausente é
+# reconstruído do banco na próxima leitura, já com o livro novo. Toda
+# alteração avança a versão, que invalida reconstruções já em andamento.
+# KEYS: conjunto, versão | ARGV: ttl, livros...
+ADD_SCRIPT = """
+redis.call('INCR', KEYS[2])
+redis.call('EXPIRE', KEYS[2], ARGV[1])
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+redis.call('SADD', KEYS[1], unpack(ARGV, 2))
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return 1
+"""
+
+# KEYS: conjunto, versão | ARGV: ttl, livros...
+DISCARD_SCRIPT = """
+redis.call('INCR', KEYS[2])
+redis.call('EXPIRE', KEYS[2], ARGV[1])
+return redis.call('SREM', KEYS[1], unpack(ARGV, 2))
+"""
+
+# Grava o conjunto lido do banco só se ninguém o criou nem o alterou desde
+# a leitura da versão (sem DELETE: nunca sobrescreve um conjunto existente).
+# KEYS: conjunto, versão | ARGV: ttl, versão lida, livros...
+POPULATE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return 0
+end
+if (redis.call('GET', KEYS[2]) or '0') ~= ARGV[2] then
+    return 0
+end
+redis.call('SADD', KEYS[1], unpack(ARGV, 3))
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return 1
+"""
+
+
+class _RedisSets:
+    """Conjuntos de exclusão em SETs do Redis"""
+
+    def __init__(self, cache):
+        self.cache = cache
+        self.client = cache.client.get_client(write=True)
+        self._add = self.client.register_script(ADD_SCRIPT)
+        self._discard = self.client.register_script(DISCARD_SCRIPT)
+        self._populate = self.client.register_script(POPULATE_SCRIPT)
+
+    def key(self, user_id: int) -> str:
+        return self.cache.make_key(f'recommendations:excluded:{user_id}')
+
+    def version_key(self, user_id: int) -> str:
+        return self.cache.make_key(f'recommendations:excluded:{user_id}:version')
+
+    def members(self, user_id: int) -> Optional[Set[int]]:
+        members = self.client.smembers(self.key(user_id))
+        return {int(member) for member in members} if members else None
+
+    def version(self, user_id: int) -> int:
+        return int(self.client.get(self.version_key(user_id)) or 0)
+
+    def populate(self, user_id: int, members: Set[int], version: int, ttl: int) -> bool:
+        keys = [self.key(user_id), self.version_key(user_id)]
+        return bool(self._populate(keys=keys, args=[ttl, version, *members]))
+
+    def add(self, user_id: int, book_ids: List[int], ttl: int) -> None:
+        self._add(keys=[self.key(user_id), self.version_key(user_id)], args=[ttl, *book_ids])
+
+    def discard(self, user_id: int, book_ids: List[int], ttl: int) -> None:
+        self._discard(keys=[self.key(user_id), self.version_key(user_id)], args=[ttl, *book_ids])
+
+    def invalidate(self, user_id: int) -> None:
+        pipe = self.client.pipeline(transaction=True)
+        pipe.incr(self.version_key(user_id))
+        pipe.delete(self.key(user_id))
+        pipe.execute()
+
+
+class _MemorySets:
+    """Conjuntos de exclusão no processo (alias de cache que não é Redis)"""
+
+    def __init__(self):
+        self._sets: Dict[int, Tuple[float, Set[int]]] = {}
+        self._versions: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def _current(self, user_id: int) -> Optional[Set[int]]:
+        entry = self._sets.get(user_id)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del self._sets[user_id]
+            return None
+        return entry[1]
+
+    def members(self, user_id: int) -> Optional[Set[int]]:
+        with self._lock:
+            members = self._current(user_id)
+            return set(members) if members is not None else None
+
+    def version(self, user_id: int) -> int:
+        with self._lock:
+            return self._versions.get(user_id, 0)
+
+    def populate(self, user_id: int, members: Set[int], version: int, ttl: int) -> bool:
+        with self._lock:
+            if self._current(user_id) is not None or self._versions.get(user_id, 0) != version:
+                return False
+            self._sets[user_id] = (time.monotonic() + ttl, set(members))
+            return True
+
+    def add(self, user_id: int, book_ids: List[int], ttl: int) -> None:
+        with self._lock:
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+            members = self._current(user_id)
+            if members is not None:
+                members.update(book_ids)
+                self._sets[user_id] = (time.monotonic() + ttl, members)
+
+    def discard(self, user_id: int, book_ids: List[int], ttl: int) -> None:
+        with self._lock:
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+            members = self._current(user_id)
+            if members is not None:
+                members.difference_update(book_ids)
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+            self._sets.pop(user_id, None)
+
+
+class UserExclusionSet:
+    """
+    Conjunto de livros que não devem ser recomendados ao usuário (os livros
+    de todas as suas prateleiras), mantido em um SET do Redis por usuário.
+
+    O conjunto é montado do banco na primeira leitura e depois mantido pelos
+    signals de UserBookShelf (post_save/post_delete, após o commit). A
+    reconstrução só grava o conjunto se ele continua ausente e nenhuma
+    alteração chegou desde o início da leitura (versão por usuário); assim
+    uma adição concorrente nunca é sobrescrita por uma leitura antiga do
+    banco. Os providers filtram os candidatos contra ele em memória, em vez
+    de enviar a lista inteira como NOT IN na consulta. O membro SENTINEL
+    mantém existente o conjunto de quem ainda não tem livros na estante.
+    """
+
+    TTL = 24 * 60 * 60
+    SENTINEL = 0
+    SCAN_CHUNK = 100
+
+    _memory_sets: Optional[_MemorySets] = None
+    _sets_lock = threading.Lock()
+
+    def __init__(self, alias: str = 'recommendations'):
+        self.alias = alias
+
+    def _get_sets(self):
+        cache = caches[self.alias]
+        if hasattr(cache, 'client') and hasattr(cache.client, 'get_client'):
+            return _RedisSets(cache)
+
+        if UserExclusionSet._memory_sets is None:
+            with UserExclusionSet._sets_lock:
+                if UserExclusionSet._memory_sets is None:
+                    UserExclusionSet._memory_sets = _MemorySets()
+        return UserExclusionSet._memory_sets
+
+    @classmethod
+    def reset(cls) -> None:
+        cls._memory_sets = None
+
+    # ------------------------------------------------------------------
+    # Leitura
+    # ------------------------------------------------------------------
+
+    def get(self, user_id: Optional[int]) -> Set[int]:
+        """IDs excluídos do usuário; o conjunto é reconstruído do banco se ausente"""
+        if not user_id:
+            return set()
+
+        try:
+            sets = self._get_sets()
+            members = sets.members(user_id)
+            if members is None:
+                # A versão é lida antes do banco: alterações depois dela descartam esta carga
+                version = sets.version(user_id)
+                members = self._load(user_id)
+                sets.populate(user_id, members | {self.SENTINEL}, version, self.TTL)
+            members.discard(self.SENTINEL)
+            return members
+        except Exception as e:
+            logger.error(f"Erro ao ler conjunto de exclusão do usuário {user_id}: {str(e)}")
+            return self._load(user_id)
+
+    @staticmethod
+    def _load(user_id: int) -> Set[int]:
+        return set(UserBookShelf.objects.filter(user_id=user_id).values_list('book_id', flat=True))
+
+    @classmethod
+    def take(cls, queryset: QuerySet, excluded: Set[int], limit: int) -> List:
+        """
+        Primeiros `limit` itens do queryset (já ordenado) fora de `excluded`,
+        lidos em fatias e filtrados em memória, sem NOT IN na consulta.
+        """
+        picked = []
+        if limit <= 0:
+            return picked
+
+        chunk = max(limit * 2, cls.SCAN_CHUNK)
+        offset = 0
+        while len(picked) < limit:
+            rows = list(queryset[offset:offset + chunk])
+            picked.extend(row for row in rows if getattr(row, 'pk', row) not in excluded)
+            if len(rows) < chunk:
+                break
+            offset += chunk
+        return picked[:limit]
+
+    # ------------------------------------------------------------------
+    # Manutenção (signals de UserBookShelf)
+    # ------------------------------------------------------------------
+
+    def add(self, user_id: int, book_ids: Iterable[int]) -> None:
+        book_ids = [book_id for book_id in book_ids if book_id]
+        if not user_id or not book_ids:
+            return
+        try:
+            self._get_sets().add(user_id, book_ids, self.TTL)
+        except Exception as e:
+            logger.error(f"Erro ao atualizar conjunto de exclusão do usuário {user_id}: {str(e)}")
+            self.invalidate(user_id)
+
+    def discard(self, user_id: int, book_ids: Iterable[int]) -> None:
+        book_ids = [book_id for book_id in book_ids if book_id]
+        if not user_id or not book_ids:
+            return
+        try:
+            self._get_sets().discard(user_id, book_ids, self.TTL)
+        except Exception as e:
+            logger.error(f"Erro ao atualizar conjunto de exclusão do usuário {user_id}: {str(e)}")
+            self.invalidate(user_id)
+
+    def invalidate(self, user_id: int) -> None:
+        try:
+            self._get_sets().invalidate(user_id)
+        except Exception as e:
+            logger.error(f"Erro ao invalidar conjunto de exclusão do usuário {user_id}: {str(e)}")
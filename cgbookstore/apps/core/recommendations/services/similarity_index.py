@@ -0,0 +1,387 @@
+# cgbookstore/apps/core/recommendations/services/similarity_index.py
+
+import heapq
+import logging
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+from scipy import sparse
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from ...models import Book, BookSimilarity, UserBookShelf
+
+logger = logging.getLogger(__name__)
+
+
+class SimilarityIndex:
+    """
+    Índice esparso de similaridade item-item calculado offline.
+
+    Combina dois sinais para cada par de livros:
+    - co-ocorrência em estantes (UserBookShelf), normalizada por cosseno;
+    - similaridade de conteúdo com os pesos de SimilarityBasedProvider.WEIGHTS
+      (gênero, autor e categoria por igualdade; temas por sobreposição).
+
+    O cálculo é feito em lotes de linhas com matrizes esparsas, e apenas os
+    TOP_N vizinhos de cada livro são persistidos em BookSimilarity. Na
+    requisição, as recomendações são a fusão das listas de vizinhos dos
+    livros base do usuário.
+    """
+
+    TOP_N = 50
+    COOCCURRENCE_WEIGHT = 0.4
+    MIN_SCORE = 0.01
+    MAX_CELLS_PER_BATCH = 2_000_000
+    CONTENT_FIELDS = ('genero', 'autor', 'categoria')
+
+    # Listas de vizinhos carregadas em memória (ex.: pré-cálculo em lote)
+    _preloaded: Optional[Dict[int, List]] = None
+
+    def __init__(
+            self,
+            weights: Optional[Dict[str, float]] = None,
+            top_n: Optional[int] = None,
+            cooccurrence_weight: Optional[float] = None
+    ):
+        if weights is None:
+            from ..providers.similarity import SimilarityBasedProvider
+            weights = SimilarityBasedProvider.WEIGHTS
+        self.weights = weights
+        self.top_n = top_n or self.TOP_N
+        self.cooccurrence_weight = self.COOCCURRENCE_WEIGHT if cooccurrence_weight is None else cooccurrence_weight
+
+    # ------------------------------------------------------------------
+    # Consulta online
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def preload(cls) -> int:
+        """
+        Carrega todas as listas de vizinhos em memória. Processos criados
+        depois (fork) compartilham o snapshot sem consultar o banco.
+        """
+        cls._preloaded = dict(BookSimilarity.objects.values_list('book_id', 'neighbors'))
+        return len(cls._preloaded)
+
+    @classmethod
+    def clear_preloaded(cls):
+        cls._preloaded = None
+
+    @classmethod
+    def merge_neighbors(
+            cls,
+            seed_ids: Iterable[int],
+            excluded: Iterable[int] = (),
+            limit: int = 20
+    ) -> List[Tuple[int, float]]:
+        """
+        Funde as listas de vizinhos dos livros base somando os scores.
+
+        Returns:
+            Lista [(book_id, score)] ordenada por score, sem os livros excluídos
+        """
+        seed_ids = set(seed_ids)
+        if not seed_ids:
+            return []
+
+        excluded = set(excluded) | seed_ids
+        scores: Dict[int, float] = {}
+
+        if cls._preloaded is not None:
+            neighbor_lists = [cls._preloaded[book_id] for book_id in seed_ids if book_id in cls._preloaded]
+        else:
+            neighbor_lists = BookSimilarity.objects.filter(
+                book_id__in=seed_ids
+            ).values_list('neighbors', flat=True)
+
+        for neighbors in neighbor_lists:
+            for book_id, score in neighbors:
+                if book_id not in excluded:
+                    scores[book_id] = scores.get(book_id, 0.0) + score
+
+        return heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+
+    # ------------------------------------------------------------------
+    # Construção offline
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def last_build() -> Optional[datetime]:
+        """Início da última construção registrada no índice"""
+        return BookSimilarity.objects.aggregate(last=Max('computed_at'))['last']
+
+    @staticmethod
+    def dirty_book_ids(since: datetime) -> Set[int]:
+        """
+        Livros cuja lista de vizinhos precisa ser recalculada desde `since`:
+        livros sem entrada no índice, livros alterados, todos os livros de
+        usuários que mexeram na estante (a co-ocorrência deles mudou) e
+        livros cujo número de leitores mudou (estantes removidas não deixam
+        `updated_at`).
+        """
+        public_books = Book.objects.public()
+
+        dirty = set(public_books.filter(similarity_index__isnull=True).values_list('id', flat=True))
+        dirty.update(public_books.filter(updated_at__gte=since).values_list('id', flat=True))
+
+        changed_users = UserBookShelf.objects.filter(updated_at__gte=since).values('user_id')
+        dirty.update(
+            UserBookShelf.objects.filter(user_id__in=changed_users).values_list('book_id', flat=True)
+        )
+
+        readers = dict(
+            UserBookShelf.objects.order_by().values('book_id').annotate(
+                readers=Count('user_id', distinct=True)
+            ).values_list('book_id', 'readers')
+        )
+        dirty.update(
+            book_id
+            for book_id, shelf_count in BookSimilarity.objects.values_list('book_id', 'shelf_count').iterator()
+            if readers.get(book_id, 0) != shelf_count
+        )
+        return dirty
+
+    def rebuild(self, full: bool = False) -> Dict[str, int]:
+        """
+        Reconstrói o índice.
+
+        Sem `full`, recalcula os livros alterados desde a última construção
+        e as listas de outros livros que eles afetam (ver build). A
+        reconstrução completa recalcula o catálogo inteiro.
+        """
+        since = None if full else self.last_build()
+        if since is None:
+            return self.build()
+        return self.build(self.dirty_book_ids(since))
+
+    def build(self, book_ids: Optional[Iterable[int]] = None) -> Dict[str, int]:
+        """
+        Calcula e grava as listas de vizinhos.
+
+        Com `book_ids`, recalcula esses livros e depois as listas de vizinhos
+        de outros livros que mudam por causa deles (_affected_rows).
+
+        Args:
+            book_ids: Livros alterados; None recalcula o catálogo inteiro
+
+        Returns:
+            Estatísticas da construção (catálogo, livros atualizados e removidos)
+        """
+        started_at = timezone.now()
+        stats = {'catalog': 0, 'updated': 0, 'removed': 0}
+
+        catalog = list(
+            Book.objects.public().order_by('id').values_list('id', *self.CONTENT_FIELDS, 'temas')
+        )
+        stats['catalog'] = len(catalog)
+
+        if book_ids is None:
+            stats['removed'], _ = BookSimilarity.objects.exclude(
+                book_id__in=[row[0] for row in catalog]
+            ).delete()
+
+        if not catalog:
+            return stats
+
+        ids = np.fromiter((row[0] for row in catalog), dtype=np.int64, count=len(catalog))
+        position = {book_id: index for index, book_id in enumerate(ids.tolist())}
+
+        content = [
+            (self.weights.get(field, 0.0), self._feature_matrix([row[i + 1] for row in catalog]))
+            for i, field in enumerate(self.CONTENT_FIELDS)
+        ]
+        themes = self._feature_matrix([row[-1] for row in catalog], split=True)
+        theme_sizes = np.diff(themes.indptr).astype(np.float64)
+
+        shelves = self._shelf_matrix(position)
+        shelves_by_book = shelves.T.tocsr()
+        popularity = np.diff(shelves_by_book.indptr).astype(np.float64)
+        features = (content, themes, theme_sizes, shelves, shelves_by_book, popularity)
+
+        if book_ids is None:
+            stats['updated'], _ = self._write_rows(np.arange(len(ids)), ids, features, started_at)
+        else:
+            dirty_ids = set(book_ids)
+            targets = np.array(sorted(position[b] for b in dirty_ids if b in position), dtype=np.int64)
+            stats['updated'], best = self._write_rows(targets, ids, features, started_at)
+
+            affected, stats['removed'] = self._affected_rows(dirty_ids, best, position)
+            updated, _ = self._write_rows(affected, ids, features, started_at)
+            stats['updated'] += updated
+
+        logger.info(
+            f"Índice de similaridade: {stats['updated']} livros atualizados "
+            f"de {stats['catalog']} em {(timezone.now() - started_at).total_seconds():.1f}s"
+        )
+        return stats
+
+    def _write_rows(
+            self, rows: np.ndarray, ids: np.ndarray, features: tuple, computed_at: datetime
+    ) -> Tuple[int, np.ndarray]:
+        """
+        Calcula e grava as listas de vizinhos das linhas, em lotes. Retorna
+        a quantidade gravada e o maior score de cada livro do catálogo com
+        alguma das linhas (scores são simétricos).
+        """
+        best = np.zeros(len(ids), dtype=np.float64)
+        if not len(rows):
+            return 0, best
+
+        popularity = features[-1]
+        batch_size = max(1, self.MAX_CELLS_PER_BATCH // len(ids))
+        written = 0
+
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            scores = self._score_rows(batch, *features)
+            np.maximum(best, scores.max(axis=0).toarray().ravel(), out=best)
+
+            entries = [
+                BookSimilarity(
+                    book_id=int(ids[row]),
+                    neighbors=self._top_neighbors(scores, offset, row, ids),
+                    computed_at=computed_at,
+                    shelf_count=int(popularity[row])
+                )
+                for offset, row in enumerate(batch)
+            ]
+            BookSimilarity.objects.bulk_create(
+                entries,
+                update_conflicts=True,
+                unique_fields=['book'],
+                update_fields=['neighbors', 'computed_at', 'shelf_count']
+            )
+            written += len(entries)
+
+        return written, best
+
+    def _affected_rows(
+            self, dirty_ids: Set[int], best: np.ndarray, position: Dict[int, int]
+    ) -> Tuple[np.ndarray, int]:
+        """
+        Linhas de livros fora de `dirty_ids` cuja lista de vizinhos muda com
+        eles: listas que contêm um livro alterado ou que saiu do catálogo, e
+        listas em que um livro alterado passa a entrar (score acima do último
+        vizinho, ou lista incompleta). Os demais pares não mudam de score.
+        Entradas de livros que saíram do catálogo são removidas.
+
+        Returns:
+            (linhas afetadas, entradas removidas)
+        """
+        affected, stale = [], []
+        entries = BookSimilarity.objects.order_by().values_list('book_id', 'neighbors').iterator(chunk_size=2000)
+
+        for book_id, neighbors in entries:
+            row = position.get(book_id)
+            if row is None:
+                stale.append(book_id)
+                continue
+            if book_id in dirty_ids:
+                continue
+
+            if any(neighbor not in position or neighbor in dirty_ids for neighbor, _ in neighbors):
+                affected.append(row)
+                continue
+            score = round(float(best[row]), 4)
+            if score >= self.MIN_SCORE and (len(neighbors) < self.top_n or score >= neighbors[-1][1]):
+                affected.append(row)
+
+        removed = 0
+        if stale:
+            removed, _ = BookSimilarity.objects.filter(book_id__in=stale).delete()
+        return np.array(sorted(affected), dtype=np.int64), removed
+
+    def _score_rows(
+            self,
+            rows: np.ndarray,
+            content: List[Tuple[float, sparse.csr_matrix]],
+            themes: sparse.csr_matrix,
+            theme_sizes: np.ndarray,
+            shelves: sparse.csr_matrix,
+            shelves_by_book: sparse.csr_matrix,
+            popularity: np.ndarray
+    ) -> sparse.csr_matrix:
+        """Scores combinados (linhas do lote x catálogo) em formato esparso"""
+        n_books = shelves.shape[1]
+        content_score = sparse.csr_matrix((len(rows), n_books))
+
+        for weight, matrix in content:
+            if weight and matrix.nnz:
+                content_score = content_score + weight * (matrix[rows] @ matrix.T)
+
+        if self.weights.get('temas') and themes.nnz:
+            overlap = (themes[rows] @ themes.T).tocoo()
+            overlap.data = overlap.data / np.maximum(theme_sizes[rows][overlap.row], theme_sizes[overlap.col])
+            content_score = content_score + self.weights['temas'] * overlap.tocsr()
+
+        score = (1.0 - self.cooccurrence_weight) * content_score
+
+        if self.cooccurrence_weight and shelves.nnz:
+            cooccurrence = (shelves_by_book[rows] @ shelves).tocoo()
+            cooccurrence.data = cooccurrence.data / np.sqrt(
+                popularity[rows][cooccurrence.row] * popularity[cooccurrence.col]
+            )
+            score = score + self.cooccurrence_weight * cooccurrence.tocsr()
+
+        score = score.tocsr()
+        score.sum_duplicates()
+        return score
+
+    def _top_neighbors(self, scores: sparse.csr_matrix, offset: int, row: int, ids: np.ndarray) -> List[List]:
+        """Top-N vizinhos de uma linha do lote, do maior para o menor score"""
+        start, end = scores.indptr[offset], scores.indptr[offset + 1]
+        columns = scores.indices[start:end]
+        values = scores.data[start:end]
+
+        mask = (columns != row) & (values >= self.MIN_SCORE)
+        columns, values = columns[mask], values[mask]
+
+        if len(values) > self.top_n:
+            keep = np.argpartition(-values, self.top_n - 1)[:self.top_n]
+            columns, values = columns[keep], values[keep]
+
+        order = np.lexsort((ids[columns], -values))
+        return [
+            [int(ids[column]), round(float(value), 4)]
+            for column, value in zip(columns[order], values[order])
+        ]
+
+    @staticmethod
+    def _feature_matrix(values: List[Optional[str]], split: bool = False) -> sparse.csr_matrix:
+        """Matriz binária livro x valor (one-hot); com `split`, valores separados por vírgula"""
+        vocabulary: Dict[str, int] = {}
+        rows, columns = [], []
+
+        for index, value in enumerate(values):
+            parts = value.split(',') if split and value else [value or '']
+            for token in {part.strip().lower() for part in parts}:
+                if token:
+                    rows.append(index)
+                    columns.append(vocabulary.setdefault(token, len(vocabulary)))
+
+        return sparse.csr_matrix(
+            (np.ones(len(rows)), (rows, columns)),
+            shape=(len(values), max(1, len(vocabulary)))
+        )
+
+    @staticmethod
+    def _shelf_matrix(position: Dict[int, int]) -> sparse.csr_matrix:
+        """Matriz binária usuário x livro a partir das estantes"""
+        users: Dict[int, int] = {}
+        rows, columns = [], []
+
+        pairs = UserBookShelf.objects.order_by().values_list('user_id', 'book_id').distinct().iterator()
+        for user_id, book_id in pairs:
+            column = position.get(book_id)
+            if column is not None:
+                rows.append(users.setdefault(user_id, len(users)))
+                columns.append(column)
+
+        matrix = sparse.csr_matrix(
+            (np.ones(len(rows)), (rows, columns)),
+            shape=(max(1, len(users)), len(position))
+        )
+        matrix.data[:] = 1.0
+        return matrix
@@ -0,0 +1,326 @@
+# cgbookstore/apps/core/recommendations/services/trending_index.py
+
+import heapq
+import logging
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Case, IntegerField, QuerySet, When
+
+from ...models import Book, BookTrendingScore
+
+logger = logging.getLogger(__name__)
+
+# Incrementa o score já escalado pelo marco de tempo do ranking (landmark).
+# KEYS: sorted set, landmark | ARGV: agora, meia-vida (s), livro, peso
+RECORD_SCRIPT = """
+local landmark = tonumber(redis.call('GET', KEYS[2]))
+if not landmark then
+    landmark = tonumber(ARGV[1])
+    redis.call('SET', KEYS[2], ARGV[1])
+end
+local increment = tonumber(ARGV[4]) * math.pow(2, (tonumber(ARGV[1]) - landmark) / tonumber(ARGV[2]))
+return redis.call('ZINCRBY', KEYS[1], string.format('%.17g', increment), ARGV[3])
+"""
+
+# Traz o landmark para "agora" reescalando todos os scores, e poda o ranking.
+# KEYS: sorted set, landmark | ARGV: agora, meia-vida (s), score mínimo, tamanho máximo
+REBASE_SCRIPT = """
+local landmark = tonumber(redis.call('GET', KEYS[2]))
+if not landmark then
+    return 0
+end
+local factor = math.pow(2, (landmark - tonumber(ARGV[1])) / tonumber(ARGV[2]))
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call('ZUNIONSTORE', KEYS[1], 1, KEYS[1], 'WEIGHTS', string.format('%.17g', factor))
+    redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', '(' .. ARGV[3])
+    redis.call('ZREMRANGEBYRANK', KEYS[1], 0, -tonumber(ARGV[4]) - 1)
+end
+redis.call('SET', KEYS[2], ARGV[1])
+return redis.call('ZCARD', KEYS[1])
+"""
+
+
+class _RedisBoards:
+    """Rankings em sorted sets do Redis (operações atômicas via scripts Lua)"""
+
+    def __init__(self, cache):
+        self.cache = cache
+        self.client = cache.client.get_client(write=True)
+        self._record = self.client.register_script(RECORD_SCRIPT)
+        self._rebase = self.client.register_script(REBASE_SCRIPT)
+
+    def keys(self, board: str) -> Tuple[str, str]:
+        return (
+            self.cache.make_key(f'trending:{board}'),
+            self.cache.make_key(f'trending:{board}:landmark')
+        )
+
+    def record(self, increments: Dict[str, float], book_id: int, now: float, half_life: float) -> None:
+        pipe = self.client.pipeline(transaction=False)
+        for board, weight in increments.items():
+            self._record(keys=self.keys(board), args=[now, half_life, book_id, weight], client=pipe)
+        pipe.execute()
+
+    def top(self, board: str, start: int, stop: int) -> Tuple[Optional[float], List[Tuple[int, float]]]:
+        key, landmark_key = self.keys(board)
+        pipe = self.client.pipeline(transaction=False)
+        pipe.get(landmark_key)
+        pipe.zrevrange(key, start, stop - 1, withscores=True)
+        landmark, entries = pipe.execute()
+        return (
+            float(landmark) if landmark is not None else None,
+            [(int(member), float(score)) for member, score in entries]
+        )
+
+    def rebase(self, board: str, now: float, half_life: float, min_score: float, max_size: int) -> int:
+        return int(self._rebase(keys=self.keys(board), args=[now, half_life, min_score, max_size]))
+
+    def load(self, board: str, scores: Dict[int, float], now: float) -> None:
+        key, landmark_key = self.keys(board)
+        pipe = self.client.pipeline(transaction=True)
+        pipe.delete(key)
+        if scores:
+            pipe.zadd(key, scores)
+        pipe.set(landmark_key, now)
+        pipe.execute()
+
+
+class _MemoryBoards:
+    """
+    Rankings no processo, usados quando o alias de cache não é Redis
+    (desenvolvimento e testes com LocMemCache).
+    """
+
+    def __init__(self):
+        self._boards: Dict[str, Dict[int, float]] = {}
+        self._landmarks: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def record(self, increments: Dict[str, float], book_id: int, now: float, half_life: float) -> None:
+        with self._lock:
+            for board, weight in increments.items():
+                landmark = self._landmarks.setdefault(board, now)
+                scores = self._boards.setdefault(board, {})
+                scores[book_id] = scores.get(book_id, 0.0) + weight * 2 ** ((now - landmark) / half_life)
+
+    def top(self, board: str, start: int, stop: int) -> Tuple[Optional[float], List[Tuple[int, float]]]:
+        with self._lock:
+            entries = heapq.nlargest(stop, self._boards.get(board, {}).items(), key=lambda item: item[1])
+            return self._landmarks.get(board), entries[start:]
+
+    def rebase(self, board: str, now: float, half_life: float, min_score: float, max_size: int) -> int:
+        with self._lock:
+            landmark = self._landmarks.get(board)
+            if landmark is None:
+                return 0
+            factor = 2 ** ((landmark - now) / half_life)
+            scores = {book_id: score * factor for book_id, score in self._boards.get(board, {}).items()}
+            kept = heapq.nlargest(
+                max_size, ((b, s) for b, s in scores.items() if s >= min_score), key=lambda item: item[1]
+            )
+            self._boards[board] = dict(kept)
+            self._landmarks[board] = now
+            return len(kept)
+
+    def load(self, board: str, scores: Dict[int, float], now: float) -> None:
+        with self._lock:
+            self._boards[board] = dict(scores)
+            self._landmarks[board] = now
+
+
+class TrendingIndex:
+    """
+    Índice de popularidade recente com decaimento exponencial.
+
+    Cada evento (visualização, clique, adição à estante, compra) soma
+    peso * 2^(-idade / meia-vida) ao score do livro em um ou mais rankings.
+    Para não reescrever todos os scores a cada instante, os incrementos são
+    gravados escalados em relação a um marco de tempo (landmark):
+    peso * 2^((agora - landmark) / meia-vida). A ordem do sorted set é a
+    mesma dos scores decaídos, então o top-K é um ZREVRANGE em O(log n + K).
+
+    O comando maintain_trending_index traz o landmark para o presente
+    (evitando overflow), poda o ranking e grava o snapshot em
+    BookTrendingScore, que serve de fallback quando o Redis está fora.
+    """
+
+    BOARDS = ('trending', 'views', 'sales')
+
+    # Pesos de cada evento por ranking
+    EVENT_WEIGHTS = {
+        'view': {'trending': 1.0, 'views': 1.0},
+        'click': {'trending': 1.0, 'views': 1.0},
+        'shelf_add': {'trending': 3.0},
+        'purchase': {'trending': 5.0, 'sales': 1.0},
+    }
+
+    # Tipos de RecommendationInteraction que contam como evento. 'view' ali é
+    # impressão da recomendação e 'add_shelf' já vem do signal da estante.
+    INTERACTION_EVENTS = {
+        'click': 'click',
+        'purchase': 'purchase',
+    }
+
+    DEFAULT_HALF_LIFE_HOURS = 72.0
+    MAX_SIZE = 10000
+    SNAPSHOT_SIZE = 1000
+    MIN_SCORE = 0.01
+
+    _memory_boards: Optional[_MemoryBoards] = None
+    _memory_lock = threading.Lock()
+
+    def __init__(self, alias: str = 'recommendations', half_life_hours: Optional[float] = None):
+        if half_life_hours is None:
+            half_life_hours = getattr(settings, 'RECOMMENDATION_TRENDING_HALF_LIFE', self.DEFAULT_HALF_LIFE_HOURS)
+        self.alias = alias
+        self.half_life = float(half_life_hours) * 3600
+
+    def _get_boards(self):
+        cache = caches[self.alias]
+        if hasattr(cache, 'client') and hasattr(cache.client, 'get_client'):
+            return _RedisBoards(cache)
+
+        if TrendingIndex._memory_boards is None:
+            with TrendingIndex._memory_lock:
+                if TrendingIndex._memory_boards is None:
+                    TrendingIndex._memory_boards = _MemoryBoards()
+        return TrendingIndex._memory_boards
+
+    @classmethod
+    def reset(cls) -> None:
+        """Descarta os rankings em memória do processo"""
+        cls._memory_boards = None
+
+    # ------------------------------------------------------------------
+    # Escrita
+    # ------------------------------------------------------------------
+
+    def record(self, book_id: int, event: str, now: Optional[float] = None) -> None:
+        """Registra um evento; falhas não interrompem a requisição"""
+        increments = self.EVENT_WEIGHTS.get(event)
+        if not increments or not book_id:
+            return
+
+        try:
+            self._get_boards().record(increments, int(book_id), now or time.time(), self.half_life)
+        except Exception as e:
+            logger.error(f"Erro ao registrar evento '{event}' no índice de tendências: {str(e)}")
+
+    # ------------------------------------------------------------------
+    # Leitura
+    # ------------------------------------------------------------------
+
+    def top(
+            self, board: str = 'trending', limit: int = 20, offset: int = 0, now: Optional[float] = None
+    ) -> List[Tuple[int, float]]:
+        """
+        Top-K do ranking como [(book_id, score decaído até agora)].
+        Usa o snapshot do banco se o Redis estiver indisponível ou vazio.
+        """
+        if limit <= 0:
+            return []
+
+        try:
+            landmark, entries = self._get_boards().top(board, offset, offset + limit)
+        except Exception as e:
+            logger.error(f"Erro ao ler índice de tendências '{board}': {str(e)}")
+            landmark, entries = None, []
+
+        if not entries:
+            return self._snapshot_top(board, limit, offset)
+
+        decay = 2 ** ((landmark - (now or time.time())) / self.half_life) if landmark is not None else 1.0
+        return [(book_id, score * decay) for book_id, score in entries]
+
+    def top_ids(
+            self, board: str = 'trending', limit: int = 20, exclude: Optional[Iterable[int]] = None
+    ) -> List[int]:
+        """IDs de livros públicos e ativos do ranking, na ordem do índice"""
+        exclude = set(exclude or ())
+        # Folga para livros excluídos, inativos ou privados
+        ranked = [book_id for book_id, _ in self.top(board, limit * 2 + len(exclude)) if book_id not in exclude]
+        public_ids = set(Book.objects.public().filter(id__in=ranked).values_list('id', flat=True))
+        return [book_id for book_id in ranked if book_id in public_ids][:limit]
+
+    def top_books(
+            self, board: str = 'trending', limit: int = 20, exclude: Optional[Iterable[int]] = None
+    ) -> List[Book]:
+        """Livros públicos e ativos do ranking, na ordem do índice"""
+        ids = self.top_ids(board, limit, exclude)
+        books = Book.objects.in_bulk(ids)
+        return [books[book_id] for book_id in ids if book_id in books]
+
+    @staticmethod
+    def ordered_queryset(ids: List[int]) -> QuerySet:
+        """QuerySet dos livros na ordem da lista de IDs"""
+        if not ids:
+            return Book.objects.none()
+
+        ranking = Case(*[When(id=book_id, then=position) for position, book_id in enumerate(ids)],
+                       output_field=IntegerField())
+        return Book.objects.filter(id__in=ids).order_by(ranking)
+
+    def _snapshot_top(self, board: str, limit: int, offset: int) -> List[Tuple[int, float]]:
+        try:
+            rows = BookTrendingScore.objects.filter(board=board).order_by('-score')
+            return list(rows.values_list('book_id', 'score')[offset:offset + limit])
+        except Exception as e:
+            logger.error(f"Erro ao ler snapshot de tendências '{board}': {str(e)}")
+            return []
+
+    # ------------------------------------------------------------------
+    # Manutenção (comando maintain_trending_index)
+    # ------------------------------------------------------------------
+
+    def rebase(self, board: str, now: Optional[float] = None) -> int:
+        """Reescala o ranking para o landmark atual e remove o que decaiu demais"""
+        return self._get_boards().rebase(board, now or time.time(), self.half_life, self.MIN_SCORE, self.MAX_SIZE)
+
+    def snapshot(self, board: str, now: Optional[float] = None) -> int:
+        """Grava o top do ranking em BookTrendingScore; retorna o número de linhas"""
+        now = now or time.time()
+        landmark, entries = self._get_boards().top(board, 0, self.SNAPSHOT_SIZE)
+        if not entries:
+            return 0
+
+        decay = 2 ** ((landmark - now) / self.half_life) if landmark is not None else 1.0
+        existing = set(Book.objects.filter(id__in=[book_id for book_id, _ in entries]).values_list('id', flat=True))
+        computed_at = datetime.fromtimestamp(now, tz=dt_timezone.utc)
+
+        with transaction.atomic():
+            BookTrendingScore.objects.filter(board=board).delete()
+            BookTrendingScore.objects.bulk_create([
+                BookTrendingScore(board=board, book_id=book_id, score=score * decay, computed_at=computed_at)
+                for book_id, score in entries if book_id in existing
+            ], batch_size=500)
+        return len(existing)
+
+    def restore(self, board: str, now: Optional[float] = None) -> int:
+        """Repovoa um ranking vazio (ex.: Redis reiniciado) a partir do snapshot"""
+        now = now or time.time()
+        rows = BookTrendingScore.objects.filter(board=board).values_list('book_id', 'score', 'computed_at')
+        scores = {
+            book_id: score * 2 ** (-(now - computed_at.timestamp()) / self.half_life)
+            for book_id, score, computed_at in rows
+        }
+        if scores:
+            self._get_boards().load(board, scores, now)
+        return len(scores)
+
+    def maintain(self) -> Dict[str, Dict[str, int]]:
+        """Rotina periódica: restaura rankings vazios, reescala, poda e grava snapshot"""
+        stats = {}
+        now = time.time()
+        for board in self.BOARDS:
+            restored = 0
+            if not self._get_boards().top(board, 0, 1)[1]:
+                restored = self.restore(board, now)
+            size = self.rebase(board, now)
+            stats[board] = {'restored': restored, 'size': size, 'snapshot': self.snapshot(board, now)}
+        return stats
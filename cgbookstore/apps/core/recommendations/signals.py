@@ -1,5 +1,6 @@
 # cgbookstore/apps/core/recommendations/signals.py
 
+from django.db import transaction
 from django.db.models.signals import post_save, post_delete, pre_save
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
@@ -7,6 +8,10 @@ import logging
 
 from ..models import UserBookShelf, Book, Profile
 from .utils.cache_manager import RecommendationCache
+from .services.catalog_snapshot import CatalogSnapshot
+from .services.exclusion_set import UserExclusionSet
+from .services.trending_index import TrendingIndex
+from ..services.book_counters import BookCounters
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
@@ -55,10 +60,54 @@ def track_shelf_changes(sender, instance, **kwargs):
             if old_instance.shelf_type != instance.shelf_type:
                 # Tipo de prateleira mudou
                 instance._shelf_type_changed = True
+            if old_instance.book_id != instance.book_id:
+                instance._previous_book_id = old_instance.book_id
         except UserBookShelf.DoesNotExist:
             pass
 
 
+@receiver(post_save, sender=UserBookShelf)
+def add_to_exclusion_set(sender, instance, created, **kwargs):
+    """Livro na estante deixa de ser recomendado (após o commit)"""
+    try:
+        user_id, book_id = instance.user_id, instance.book_id
+        previous_book_id = getattr(instance, '_previous_book_id', None)
+
+        def update():
+            try:
+                exclusions = UserExclusionSet()
+                exclusions.add(user_id, [book_id])
+                if previous_book_id:
+                    _discard_if_unshelved(exclusions, user_id, previous_book_id)
+            except Exception as e:
+                logger.error(f"Erro ao atualizar conjunto de exclusão no signal: {str(e)}")
+
+        transaction.on_commit(update)
+
+    except Exception as e:
+        logger.error(f"Erro ao agendar atualização do conjunto de exclusão: {str(e)}")
+
+
+@receiver(post_delete, sender=UserBookShelf)
+def remove_from_exclusion_set(sender, instance, **kwargs):
+    """Livro removido da estante volta a poder ser recomendado (após o commit)"""
+    try:
+        user_id, book_id = instance.user_id, instance.book_id
+        transaction.on_commit(lambda: _discard_if_unshelved(UserExclusionSet(), user_id, book_id))
+
+    except Exception as e:
+        logger.error(f"Erro ao agendar atualização do conjunto de exclusão: {str(e)}")
+
+
+def _discard_if_unshelved(exclusions: UserExclusionSet, user_id: int, book_id: int) -> None:
+    try:
+        # Favoritos podem repetir o livro de outra prateleira
+        if not UserBookShelf.objects.filter(user_id=user_id, book_id=book_id).exists():
+            exclusions.discard(user_id, [book_id])
+    except Exception as e:
+        logger.error(f"Erro ao remover livro {book_id} do conjunto de exclusão: {str(e)}")
+
+
 @receiver(post_save, sender=Profile)
 def invalidate_cache_on_profile_update(sender, instance, created, **kwargs):
     """Invalida cache quando perfil do usuário é atualizado"""
@@ -80,6 +129,38 @@ def invalidate_cache_on_stats_update(sender, instance, **kwargs):
         logger.error(f"Erro ao invalidar cache de estatísticas: {str(e)}")
 
 
+@receiver(post_save, sender=UserBookShelf)
+def record_trending_shelf_add(sender, instance, created, **kwargs):
+    """Conta a adição à estante no índice de tendências"""
+    if created:
+        TrendingIndex().record(instance.book_id, 'shelf_add')
+
+
+@receiver(post_save, sender='core_analytics.RecommendationInteraction')
+def record_trending_interaction(sender, instance, created, **kwargs):
+    """Conta cliques e compras vindos das recomendações no índice de tendências"""
+    event = TrendingIndex.INTERACTION_EVENTS.get(instance.interaction_type)
+    if created and event:
+        TrendingIndex().record(instance.book_id, event)
+
+
+@receiver(post_save, sender='core_analytics.RecommendationInteraction')
+def count_recommendation_purchase(sender, instance, created, **kwargs):
+    """Compras vindas das recomendações entram no contador de vendas do livro"""
+    if created and instance.interaction_type == 'purchase':
+        BookCounters().incr(instance.book_id, 'quantidade_vendida')
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def mark_catalog_snapshot_stale(sender, instance, **kwargs):
+    """Atualiza o snapshot do catálogo deste processo na próxima leitura"""
+    try:
+        CatalogSnapshot.mark_stale()
+    except Exception as e:
+        logger.error(f"Erro ao marcar snapshot do catálogo para atualização: {str(e)}")
+
+
 @receiver(post_save, sender='core.ReadingProgress')
 def update_reading_velocity(sender, instance, created, **kwargs):
     """Atualiza velocidade de leitura quando progresso é atualizado"""
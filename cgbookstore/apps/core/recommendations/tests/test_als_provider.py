@@ -0,0 +1,114 @@
+# cgbookstore/apps/core/recommendations/tests/test_als_provider.py
+
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+import numpy as np
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from cgbookstore.apps.core.models import Book, UserBookShelf
+from cgbookstore.apps.core.recommendations.engine import RecommendationEngine
+from cgbookstore.apps.core.recommendations.providers.collaborative import CollaborativeFilteringProvider
+from cgbookstore.apps.core.recommendations.services.als_model import ALSModel, ALSTrainer, SHELF_WEIGHTS
+from .test_helpers import LOCMEM_CACHES, create_test_user
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ALSProviderTests(TestCase):
+    """Testes do treino ALS e do provider de filtragem colaborativa"""
+
+    @classmethod
+    def setUpTestData(cls):
+        # Dois grupos de leitores com gostos disjuntos
+        cls.group_a = [Book.objects.create(titulo=f'ALS A {i}', autor=f'Autor A{i}') for i in range(6)]
+        cls.group_b = [Book.objects.create(titulo=f'ALS B {i}', autor=f'Autor B{i}') for i in range(6)]
+        shelf_types = list(SHELF_WEIGHTS)
+
+        for n in range(6):
+            for group, prefix in ((cls.group_a, 'a'), (cls.group_b, 'b')):
+                reader = create_test_user(f'als_{prefix}{n}')
+                for i, book in enumerate(group):
+                    if (i + n) % 3:
+                        UserBookShelf.objects.create(user=reader, book=book, shelf_type=shelf_types[i % 4])
+
+        cls.user = create_test_user('als_target')
+        for book in cls.group_a[:2]:
+            UserBookShelf.objects.create(user=cls.user, book=book, shelf_type='favorito')
+
+    def setUp(self):
+        self.model_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.model_dir, ignore_errors=True)
+        override = override_settings(RECOMMENDATION_ALS_DIR=self.model_dir)
+        override.enable()
+        self.addCleanup(override.disable)
+        ALSModel.reset()
+        self.addCleanup(ALSModel.reset)
+
+    def _train(self):
+        # Poucos fatores: o conjunto de teste tem só dois grupos de gosto
+        return ALSTrainer(factors=2, regularization=1.0, iterations=10).train(self.model_dir)
+
+    def test_recommends_books_from_similar_readers(self):
+        """O usuário recebe livros do grupo de leitores com gosto parecido"""
+        self._train()
+
+        recommendations = CollaborativeFilteringProvider().get_recommendations(self.user, limit=4)
+
+        self.assertEqual(len(recommendations), 4)
+        group_a_ids = {book.id for book in self.group_a[2:]}
+        self.assertTrue(all(book.id in group_a_ids for book in recommendations))
+
+    def test_new_user_folded_in(self):
+        """Usuários criados após o treino têm os fatores calculados na hora"""
+        self._train()
+        newcomer = create_test_user('als_newcomer')
+        UserBookShelf.objects.create(user=newcomer, book=self.group_b[0], shelf_type='favorito')
+        UserBookShelf.objects.create(user=newcomer, book=self.group_b[1], shelf_type='lido')
+
+        recommendations = CollaborativeFilteringProvider().get_recommendations(newcomer, limit=3)
+
+        group_b_ids = {book.id for book in self.group_b[2:]}
+        self.assertEqual(len(recommendations), 3)
+        self.assertTrue(all(book.id in group_b_ids for book in recommendations))
+
+    def test_factors_memory_mapped(self):
+        """Os fatores são lidos com mmap, compartilhando páginas entre processos"""
+        stats = self._train()
+        model = ALSModel.current()
+
+        self.assertEqual(model.version, stats['version'])
+        self.assertIsInstance(model.item_factors, np.memmap)
+        self.assertEqual(model.item_factors.shape, (stats['books'], 2))
+
+    def test_duplicate_shelves_keep_highest_weight(self):
+        """Livro em mais de uma estante conta com o maior peso"""
+        UserBookShelf.objects.create(user=self.user, book=self.group_b[0], shelf_type='vou_ler')
+        UserBookShelf.objects.create(user=self.user, book=self.group_b[0], shelf_type='lido')
+
+        matrix, user_ids, book_ids = ALSTrainer().interactions()
+        row = int(np.searchsorted(user_ids, self.user.id))
+        column = int(np.searchsorted(book_ids, self.group_b[0].id))
+
+        self.assertEqual(matrix[row, column], SHELF_WEIGHTS['lido'])
+
+    def test_without_model_provider_is_skipped(self):
+        """Sem modelo publicado o provider fica fora dos pesos do engine"""
+        self.assertFalse(CollaborativeFilteringProvider.is_available())
+        self.assertEqual(CollaborativeFilteringProvider().get_recommendations(self.user), [])
+
+        weights = RecommendationEngine()._calculate_adaptive_weights(
+            self.user, {'portuguese_preference': 0.0}
+        )
+        self.assertNotIn('collaborative', weights)
+
+    def test_command_publishes_new_version(self):
+        """O comando grava uma nova versão e mantém apenas as mais recentes"""
+        for _ in range(3):
+            call_command('train_als_model', factors=4, iterations=2, output=self.model_dir, stdout=StringIO())
+
+        versions = [name for name in os.listdir(self.model_dir) if name.startswith('model-')]
+        self.assertEqual(len(versions), ALSTrainer.KEEP_VERSIONS)
+        self.assertIn(ALSModel.load(self.model_dir).version, versions)
@@ -0,0 +1,131 @@
+# cgbookstore/apps/core/recommendations/tests/test_async_external.py
+
+from unittest.mock import patch
+
+from django.test import TestCase, override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from cgbookstore.apps.core.models import Book, UserBookShelf
+from cgbookstore.apps.core.recommendations.api.endpoints import get_external_recommendations
+from cgbookstore.apps.core.recommendations.context import UserReadingContext
+from cgbookstore.apps.core.recommendations.engine import RecommendationEngine
+from .test_helpers import LOCMEM_CACHES, create_test_user
+
+EXTERNAL_ITEMS = [
+    {'id': f'gb-{i}', 'volumeInfo': {'title': f'Externo {i}', 'authors': ['Autor Externo']}}
+    for i in range(3)
+]
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class AsyncExternalFillTests(TestCase):
+    """Testes do complemento externo calculado em segundo plano"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_test_user('async_external_reader')
+        cls.books = [
+            Book.objects.create(titulo=f'Async Livro {i}', autor='Autor Async', genero='Fantasia', idioma='pt-BR')
+            for i in range(5)
+        ]
+        UserBookShelf.objects.create(user=cls.user, book=cls.books[0], shelf_type='favorito')
+
+    def setUp(self):
+        self.engine = RecommendationEngine()
+        self.engine._cache.clear()
+        self.tasks = []
+
+        patcher = patch.object(
+            RecommendationEngine, '_get_filtered_external_recommendations', return_value=EXTERNAL_ITEMS
+        )
+        self.fetch_external = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _capture_tasks(self):
+        return patch(
+            'cgbookstore.apps.core.recommendations.engine.BackgroundTasks.submit',
+            side_effect=self.tasks.append
+        )
+
+    def test_local_results_returned_without_waiting(self):
+        """A requisição não chama a API externa; o complemento fica pendente"""
+        with self._capture_tasks():
+            recommendations = self.engine.get_recommendations(self.user, limit=10)
+
+        self.fetch_external.assert_not_called()
+        self.assertTrue(recommendations)
+        self.assertFalse(any(isinstance(book, dict) for book in recommendations))
+        self.assertEqual(len(self.tasks), 1)
+        self.assertEqual(self.engine.get_external_recommendations(self.user)['status'], 'pending')
+
+    def test_background_result_served_on_next_request(self):
+        """Concluída a tarefa, o complemento é consultável e entra na lista em cache"""
+        with self._capture_tasks():
+            first = self.engine.get_recommendations(self.user, limit=10)
+        self.tasks[0]()
+
+        polled = self.engine.get_external_recommendations(self.user)
+        self.assertEqual(polled['status'], 'ready')
+        self.assertEqual(polled['external'], EXTERNAL_ITEMS)
+
+        second = RecommendationEngine().get_recommendations(self.user, limit=10)
+        self.assertEqual(second[:len(first)], first)
+        self.assertEqual([book for book in second if isinstance(book, dict)], EXTERNAL_ITEMS)
+        self.assertEqual(self.fetch_external.call_count, 1)
+
+    def test_background_task_builds_its_own_context(self):
+        """A tarefa não reutiliza o contexto de leitura da requisição"""
+        context = UserReadingContext(self.user)
+        with self._capture_tasks():
+            self.engine._compute_recommendations(self.user, 10, context=context, defer_external=True)
+        self.tasks[0]()
+
+        task_context = self.fetch_external.call_args.kwargs['context']
+        self.assertIsInstance(task_context, UserReadingContext)
+        self.assertIsNot(task_context, context)
+        self.assertEqual(task_context.user, self.user)
+
+    def test_pending_fill_scheduled_once(self):
+        """Enquanto o complemento está pendente, novos cálculos não o reagendam"""
+        with self._capture_tasks():
+            self.engine._compute_recommendations(self.user, 10, defer_external=True)
+            self.engine._compute_recommendations(self.user, 10, defer_external=True)
+
+        self.assertEqual(len(self.tasks), 1)
+
+    def test_inline_execution_includes_external(self):
+        """Dentro de uma transação a tarefa roda na hora e o resultado vem completo"""
+        recommendations = self.engine.get_recommendations(self.user, limit=10)
+
+        self.assertEqual([book for book in recommendations if isinstance(book, dict)], EXTERNAL_ITEMS)
+        entry = self.engine._cache.get(self.engine._get_cache_key(self.user))
+        self.assertIsNone(entry['external_key'])
+
+    @override_settings(RECOMMENDATION_ASYNC_EXTERNAL=False)
+    def test_synchronous_mode(self):
+        """Com o modo assíncrono desligado a busca externa acontece na requisição"""
+        with self._capture_tasks():
+            recommendations = RecommendationEngine().get_recommendations(self.user, limit=10)
+
+        self.assertEqual(self.tasks, [])
+        self.assertEqual([book for book in recommendations if isinstance(book, dict)], EXTERNAL_ITEMS)
+
+    def test_poll_endpoint(self):
+        """O endpoint de consulta informa o estado e devolve os itens prontos"""
+        factory = APIRequestFactory()
+
+        def poll():
+            request = factory.get('/api/recommendations/external/')
+            force_authenticate(request, user=self.user)
+            return get_external_recommendations(request).data
+
+        self.assertEqual(poll()['status'], 'none')
+
+        with self._capture_tasks():
+            self.engine.get_recommendations(self.user, limit=10)
+        self.assertEqual(poll()['status'], 'pending')
+
+        self.tasks[0]()
+        data = poll()
+        self.assertEqual(data['status'], 'ready')
+        self.assertEqual([item['id'] for item in data['external']], [item['id'] for item in EXTERNAL_ITEMS])
@@ -0,0 +1,73 @@
+# cgbookstore/apps/core/recommendations/tests/test_batch_precompute.py
+
+import os
+import tempfile
+from unittest.mock import patch
+
+from django.test import TestCase, override_settings
+
+from cgbookstore.apps.core.models import Book, UserBookShelf
+from cgbookstore.apps.core.recommendations.engine import RecommendationEngine
+from cgbookstore.apps.core.recommendations.services.batch_precompute import (
+    BatchPrecompute, PrecomputeCheckpoint
+)
+from cgbookstore.apps.core.recommendations.services.similarity_index import SimilarityIndex
+from cgbookstore.apps.core.recommendations.utils.cache_manager import RecommendationCache
+from .test_helpers import LOCMEM_CACHES, create_test_user
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class BatchPrecomputeTests(TestCase):
+    """Testes do pré-cálculo de recomendações em lote"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [create_test_user(f'batch_reader_{i}') for i in range(3)]
+        cls.books = [
+            Book.objects.create(titulo=f'Lote {i}', autor='Autor L', genero='Fantasia', idioma='pt-BR')
+            for i in range(6)
+        ]
+        for user in cls.users:
+            UserBookShelf.objects.create(user=user, book=cls.books[0], shelf_type='favorito')
+
+    def setUp(self):
+        RecommendationCache.get_cache().clear()
+        fd, self.checkpoint_path = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        os.remove(self.checkpoint_path)
+        self.addCleanup(lambda: os.path.exists(self.checkpoint_path) and os.remove(self.checkpoint_path))
+
+    def test_precomputed_entries_served_from_cache(self):
+        """As entradas gravadas em lote são servidas sem recalcular"""
+        summary = BatchPrecompute(shard_size=2, limit=5).run([user.id for user in self.users])
+
+        self.assertEqual(summary['users'], 3)
+        self.assertEqual(summary['shards'], 2)
+        self.assertIn('compute', summary['timings'])
+        self.assertIsNotNone(RecommendationCache.get_language_profile(self.users[0]))
+
+        with patch.object(RecommendationEngine, '_compute_recommendations') as compute:
+            recommendations = RecommendationEngine().get_recommendations(self.users[0], limit=5)
+
+        compute.assert_not_called()
+        self.assertNotIn(self.books[0], recommendations)
+
+    def test_resume_skips_completed_shards(self):
+        """Usuários registrados no checkpoint não são processados de novo"""
+        checkpoint = PrecomputeCheckpoint(self.checkpoint_path)
+        checkpoint.mark(self.users[0].id, self.users[1].id)
+
+        batch = BatchPrecompute(shard_size=10, limit=5, checkpoint=PrecomputeCheckpoint(self.checkpoint_path).load())
+        summary = batch.run([user.id for user in self.users])
+
+        self.assertEqual(summary['users'], 1)
+        self.assertTrue(batch.checkpoint.is_done(self.users[2].id))
+
+    def test_preloaded_neighbors_avoid_queries(self):
+        """Com o índice em memória, a fusão de vizinhos não consulta o banco"""
+        SimilarityIndex().build()
+        SimilarityIndex.preload()
+        self.addCleanup(SimilarityIndex.clear_preloaded)
+
+        with self.assertNumQueries(0):
+            SimilarityIndex.merge_neighbors([self.books[0].id], limit=5)
@@ -0,0 +1,134 @@
+# cgbookstore/apps/core/recommendations/tests/test_bulk_recommendations.py
+
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from cgbookstore.apps.core.models import Book, UserBookShelf
+from cgbookstore.apps.core.management.commands.bulk_recommendations import Command as BulkCommand
+from cgbookstore.apps.core.recommendations.api.endpoints import get_bulk_recommendations
+from cgbookstore.apps.core.recommendations.engine import RecommendationEngine
+from cgbookstore.apps.core.recommendations.services.catalog_snapshot import CatalogSnapshot
+from cgbookstore.apps.core.recommendations.services.similarity_index import SimilarityIndex
+from cgbookstore.apps.core.recommendations.services.trending_index import TrendingIndex
+from .test_helpers import LOCMEM_CACHES, create_test_user
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class BulkRecommendationsTests(TestCase):
+    """Testes das recomendações em lote (API, endpoint e comando)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.books = [
+            Book.objects.create(
+                titulo=f'Lote {i}', autor=f'Autor {i % 4}', genero=['Fantasia', 'Romance', 'Terror'][i % 3],
+                categoria='Ficção', quantidade_acessos=i
+            )
+            for i in range(20)
+        ]
+        cls.users = [create_test_user(f'bulk_reader_{i}') for i in range(4)]
+        for i, user in enumerate(cls.users):
+            for book in cls.books[i * 3:i * 3 + 3]:
+                UserBookShelf.objects.create(user=user, book=book, shelf_type='lido')
+        cls.staff = create_test_user('bulk_staff', is_staff=True)
+
+    def setUp(self):
+        CatalogSnapshot.reset()
+        TrendingIndex.reset()
+        self.addCleanup(CatalogSnapshot.reset)
+        self.addCleanup(TrendingIndex.reset)
+        self.engine = RecommendationEngine()
+
+    def _bulk(self, user_ids, **kwargs):
+        return dict(self.engine.get_recommendations_bulk(user_ids, limit=5, **kwargs))
+
+    def test_results_follow_requested_order(self):
+        """Uma entrada por usuário existente, na ordem pedida e sem livros já lidos"""
+        ids = [self.users[2].id, 999999, self.users[0].id, self.users[2].id]
+
+        results = list(self.engine.get_recommendations_bulk(ids, limit=5))
+
+        self.assertEqual([user_id for user_id, _ in results], [self.users[2].id, self.users[0].id])
+        for user_id, items in results:
+            read = set(UserBookShelf.objects.filter(user_id=user_id).values_list('book_id', flat=True))
+            self.assertTrue(items)
+            self.assertFalse(read & {book.id for book in items})
+
+    def test_shelf_queries_do_not_grow_with_users(self):
+        """As prateleiras de todos os usuários vêm de uma única consulta"""
+        self._bulk([self.users[0].id])  # aquece o snapshot do catálogo
+
+        with CaptureQueriesContext(connection) as queries:
+            self._bulk([user.id for user in self.users])
+
+        shelf_table = UserBookShelf._meta.db_table
+        shelf_queries = [query for query in queries if f'FROM "{shelf_table}"' in query['sql']]
+        self.assertEqual(len(shelf_queries), 1)
+
+    def test_cached_entries_reused(self):
+        """Usuários com cache válido não passam pelo pipeline"""
+        expected = self.engine.get_recommendations(self.users[1], limit=5)
+
+        with CaptureQueriesContext(connection) as queries:
+            results = self._bulk([self.users[1].id])
+
+        self.assertEqual(results[self.users[1].id], expected)
+        self.assertLessEqual(len(queries), 3)
+
+    def test_staff_endpoint_streams_ndjson(self):
+        """O endpoint devolve uma linha JSON por usuário"""
+        request = APIRequestFactory().post(
+            '/recommendations/bulk/', {'user_ids': [u.id for u in self.users[:2]], 'limit': 3}, format='json'
+        )
+        force_authenticate(request, user=self.staff)
+
+        response = get_bulk_recommendations(request)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        payloads = [json.loads(line) for line in lines]
+        self.assertEqual([payload['user_id'] for payload in payloads], [u.id for u in self.users[:2]])
+        self.assertLessEqual(len(payloads[0]['recommendations']), 3)
+        self.assertIn('titulo', payloads[0]['recommendations'][0])
+
+    def test_endpoint_requires_staff(self):
+        request = APIRequestFactory().post('/recommendations/bulk/', {'user_ids': [1]}, format='json')
+        force_authenticate(request, user=self.users[0])
+
+        self.assertEqual(get_bulk_recommendations(request).status_code, 403)
+
+    def test_command_writes_ndjson(self):
+        """O comando grava uma linha por usuário no arquivo de saída"""
+        handle, path = tempfile.mkstemp(suffix='.ndjson')
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+
+        call_command(
+            'bulk_recommendations', users=','.join(str(u.id) for u in self.users),
+            output=path, stderr=StringIO()
+        )
+
+        with open(path, encoding='utf-8') as output:
+            payloads = [json.loads(line) for line in output]
+        self.assertEqual([payload['user_id'] for payload in payloads], [u.id for u in self.users])
+
+    def test_command_preloads_similarity_index_for_large_batches(self):
+        """Só o comando carrega o índice em memória, e o libera ao terminar"""
+        with patch.object(BulkCommand, 'PRELOAD_THRESHOLD', 1), \
+                patch.object(SimilarityIndex, 'preload', wraps=SimilarityIndex.preload) as preload:
+            call_command(
+                'bulk_recommendations', users=','.join(str(u.id) for u in self.users),
+                output=os.devnull, stderr=StringIO()
+            )
+
+        preload.assert_called_once()
+        self.assertIsNone(SimilarityIndex._preloaded)
@@ -0,0 +1,97 @@
+# cgbookstore/apps/core/recommendations/tests/test_cache_generation.py
+
+from unittest.mock import patch
+
+from django.test import TestCase, override_settings
+
+from cgbookstore.apps.core.models import Book, UserBookShelf
+from cgbookstore.apps.core.recommendations.engine import RecommendationEngine
+from cgbookstore.apps.core.recommendations.utils.cache_manager import RecommendationCache
+from .test_helpers import LOCMEM_CACHES, create_test_user
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CacheGenerationTests(TestCase):
+    """Testes da invalidação por contador de geração"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_test_user('generation_reader')
+        cls.books = [
+            Book.objects.create(titulo=f'Geração {i}', autor='Autor G', categoria='Ficção', idioma='pt-BR')
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        RecommendationCache.get_cache().clear()
+        RecommendationCache.get_books_cache().clear()
+
+    def test_generation_is_stable_until_bumped(self):
+        """A geração só muda quando incrementada"""
+        generation = RecommendationCache.get_generation(self.user.id)
+
+        self.assertEqual(RecommendationCache.get_generation(self.user.id), generation)
+        RecommendationCache.bump_generation(self.user.id)
+        self.assertEqual(RecommendationCache.get_generation(self.user.id), generation + 1)
+
+    def test_bump_without_generation_starts_counter(self):
+        """Incrementar uma geração inexistente não levanta erro"""
+        RecommendationCache.bump_generation(self.user.id, 'behavior')
+        self.assertGreater(RecommendationCache.get_generation(self.user.id, 'behavior'), 0)
+
+    def test_cache_hit_without_database_queries(self):
+        """Uma leitura em cache não consulta o banco"""
+        RecommendationCache.set_recommendations(self.user, [self.books[0]])
+
+        with self.assertNumQueries(0):
+            cached = RecommendationCache.get_recommendations(self.user)
+
+        self.assertEqual(cached['recommendations'][0]['id'], self.books[0].id)
+
+    def test_invalidation_only_bumps_affected_types(self):
+        """O evento incrementa apenas as gerações dos caches afetados"""
+        RecommendationCache.set_recommendations(self.user, [self.books[0]])
+        RecommendationCache.set_language_profile(self.user, {'pt': 5.0})
+        language_generation = RecommendationCache.get_generation(self.user.id, 'language_profile')
+
+        RecommendationCache.invalidate_user_cache(self.user, 'book_added')
+
+        self.assertIsNone(RecommendationCache.get_recommendations(self.user))
+        self.assertEqual(RecommendationCache.get_language_profile(self.user), {'pt': 5.0})
+        self.assertEqual(RecommendationCache.get_generation(self.user.id, 'language_profile'), language_generation)
+
+    def test_shelf_signal_invalidates_recommendations(self):
+        """Adicionar um livro à estante troca a geração das recomendações"""
+        engine = RecommendationEngine()
+        RecommendationCache.set_recommendations(self.user, [self.books[0]])
+        engine._update_cache(self.user, [self.books[0]], limit=1)
+        self.assertIsNotNone(engine._get_cached_entry(self.user, 1))
+
+        UserBookShelf.objects.create(user=self.user, book=self.books[1], shelf_type='lendo')
+
+        self.assertIsNone(RecommendationCache.get_recommendations(self.user))
+        self.assertIsNone(engine._get_cached_entry(self.user, 1))
+
+    def test_typed_cache_hit_is_single_round_trip(self):
+        """Entrada e geração dos caches tipados são lidas com um único get_many"""
+        RecommendationCache.set_language_profile(self.user, {'pt': 5.0})
+        RecommendationCache.set_shelf(self.user, {'lendo': [self.books[0].id]})
+
+        for getter, cache in (
+            (RecommendationCache.get_language_profile, RecommendationCache.get_cache()),
+            (RecommendationCache.get_shelf, RecommendationCache.get_books_cache()),
+        ):
+            with patch.object(cache, 'get_many', wraps=cache.get_many) as get_many, \
+                    patch.object(RecommendationCache, 'get_generation') as get_generation:
+                self.assertIsNotNone(getter(self.user))
+            self.assertEqual(get_many.call_count, 1)
+            self.assertEqual(len(get_many.call_args.args[0]), 2)
+            get_generation.assert_not_called()
+
+    def test_shelf_invalidation_drops_shelf_entry(self):
+        """Incrementar a geração da estante descarta a entrada gravada"""
+        RecommendationCache.set_shelf(self.user, {'lendo': [self.books[0].id]})
+
+        RecommendationCache.invalidate_user_cache(self.user, 'shelf_changed')
+
+        self.assertIsNone(RecommendationCache.get_shelf(self.user))
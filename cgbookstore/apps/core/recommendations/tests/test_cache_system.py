@@ -137,14 +137,11 @@ class CacheSystemTests(TestCase):
         old_timestamp_cache['timestamp'] = (timezone.now() - timedelta(days=2)).isoformat()
         self.assertFalse(RecommendationCache._is_cache_valid(old_timestamp_cache, self.user))
 
-        # Adiciona 2 livros para self.user. Total agora é 3 (setUp) + 2 = 5 livros
-        # A diferença será 5 - 3 = 2.
-        # Com a regra alterada para > 1 (ou >=2) em _is_cache_valid, isso deve invalidar.
+        # Mudanças na estante não são verificadas aqui: elas trocam a geração
+        # da chave (ver test_cache_generation), e a validação não consulta o banco.
         UserBookShelf.objects.create(user=self.user, book=self.books[3], shelf_type='lido')
-        UserBookShelf.objects.create(user=self.user, book=self.books[4], shelf_type='lido')
-
-        self.assertFalse(RecommendationCache._is_cache_valid(valid_cache, self.user),
-                         "Cache deveria ser inválido após adicionar 2 livros.")
+        with self.assertNumQueries(0):
+            self.assertTrue(RecommendationCache._is_cache_valid(valid_cache, self.user))
 
     def test_user_context_extraction(self):
         """Testa extração de contexto do usuário"""
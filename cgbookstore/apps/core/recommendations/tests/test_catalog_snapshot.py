@@ -0,0 +1,78 @@
+# cgbookstore/apps/core/recommendations/tests/test_catalog_snapshot.py
+
+from unittest.mock import patch
+
+from django.test import TestCase
+
+from cgbookstore.apps.core.models import Book
+from cgbookstore.apps.core.recommendations.services.catalog_snapshot import CatalogSnapshot
+
+
+class CatalogSnapshotTests(TestCase):
+    """Testes do snapshot em arrays das features de ranking"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.popular = Book.objects.create(
+            titulo='Popular', autor='Autor A', genero='Fantasia', categoria="['Fiction']",
+            idioma='Português', quantidade_acessos=1000, quantidade_vendida=10, e_destaque=True
+        )
+        cls.plain = Book.objects.create(
+            titulo='Comum', autor='Autor B', genero='fantasia ', categoria='Drama', idioma='en'
+        )
+
+    def setUp(self):
+        CatalogSnapshot.reset()
+        self.addCleanup(CatalogSnapshot.reset)
+
+    def test_features_aligned_with_requested_ids(self):
+        """As features seguem a ordem dos ids pedidos e normalizam os termos"""
+        snapshot = CatalogSnapshot.current()
+        features = snapshot.features([self.plain.id, self.popular.id])
+
+        self.assertEqual(list(features['quantidade_acessos']), [0, 1000])
+        self.assertEqual(list(features['e_destaque']), [False, True])
+        self.assertEqual(features['genero'][0], features['genero'][1])
+        self.assertEqual(features['idioma'][1], snapshot.term_id('idioma', 'pt'))
+        self.assertEqual(features['categoria'][1], snapshot.term_id('categoria', 'fiction'))
+
+    def test_popularity_score(self):
+        """Popularidade combina acessos, vendas e destaque"""
+        features = CatalogSnapshot.current().features([self.popular.id, self.plain.id])
+        popularity = CatalogSnapshot.popularity(features)
+
+        self.assertAlmostEqual(popularity[0], (1000 * 0.001 + 10 * 0.01) * 1.5)
+        self.assertEqual(popularity[1], 0.0)
+
+    def test_incremental_refresh_from_updated_at(self):
+        """Livros alterados ou criados após a carga entram sem reconstrução completa"""
+        snapshot = CatalogSnapshot.current()
+        built_at = snapshot.built_at
+
+        self.plain.quantidade_vendida = 50
+        self.plain.save()
+        new_book = Book.objects.create(titulo='Novo', autor='Autor C', quantidade_acessos=7)
+
+        features = CatalogSnapshot.current().features([self.plain.id, new_book.id])
+
+        self.assertEqual(list(features['quantidade_vendida']), [50, 0])
+        self.assertEqual(features['quantidade_acessos'][1], 7)
+        self.assertEqual(snapshot.built_at, built_at)
+        self.assertEqual(len(snapshot), 3)
+
+    def test_unknown_ids_get_zeroed_features(self):
+        """Ids fora do catálogo não quebram o scoring"""
+        features = CatalogSnapshot.current().features([999999])
+
+        self.assertFalse(features['present'][0])
+        self.assertEqual(features['quantidade_acessos'][0], 0)
+
+    def test_refresh_errors_fall_back_to_current_snapshot(self):
+        """Falha ao atualizar não se propaga: usa o snapshot atual e zera os ausentes"""
+        snapshot = CatalogSnapshot.current()
+
+        with patch.object(snapshot, 'refresh', side_effect=RuntimeError('banco fora')):
+            features = snapshot.features([self.popular.id, 999999])
+
+        self.assertEqual(list(features['present']), [True, False])
+        self.assertEqual(list(features['quantidade_acessos']), [1000, 0])
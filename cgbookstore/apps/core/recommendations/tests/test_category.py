@@ -2,6 +2,7 @@ from django.test import TestCase
 from django.contrib.auth import get_user_model
 from ...models import Book, UserBookShelf
 from ..providers.category import CategoryBasedProvider
+from ..services.catalog_snapshot import CatalogSnapshot
 from unittest.mock import patch
 
 User = get_user_model()
@@ -148,4 +149,26 @@ class CategoryBasedProviderTest(TestCase):
             excluded_books
         )
 
-        self.assertIn(book_related, secondary_recs)
\ No newline at end of file
+        self.assertIn(book_related, secondary_recs)
+
+    def test_primary_recommendations_constant_queries(self):
+        """Testa se o score das recomendações primárias não consulta o banco por livro"""
+        for i in range(10):
+            Book.objects.create(
+                titulo=f'Programming Book {i}',
+                categoria="['Programming']",
+                temas='python, programming'
+            )
+
+        preferences = self.provider._analyze_user_preferences(self.user)
+        CatalogSnapshot.current()
+
+        # Uma consulta para os candidatos e outra para hidratar o resultado
+        with self.assertNumQueries(2):
+            primary_recs = self.provider._get_primary_recommendations(
+                preferences,
+                {self.book_python.id}
+            )
+
+        self.assertEqual(len(primary_recs), 10)
+        self.assertNotIn(self.book_python, primary_recs)
@@ -0,0 +1,122 @@
+# cgbookstore/apps/core/recommendations/tests/test_diversity.py
+
+import time
+from unittest.mock import patch
+
+import numpy as np
+from django.test import TestCase, override_settings
+
+from cgbookstore.apps.core.models import Book
+from cgbookstore.apps.core.recommendations.engine import RecommendationEngine
+from cgbookstore.apps.core.recommendations.services.catalog_snapshot import CatalogSnapshot
+from cgbookstore.apps.core.recommendations.services.diversity import DiversityReranker
+from .test_helpers import LOCMEM_CACHES, create_test_user
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class DiversityRerankerTests(TestCase):
+    """Testes do re-ranking por Maximal Marginal Relevance"""
+
+    @classmethod
+    def setUpTestData(cls):
+        # Relevância decrescente: seis livros do mesmo autor antes dos demais
+        cls.books = [
+            Book.objects.create(titulo=f'Saga {i}', autor='Autor Único', genero='Fantasia', categoria='Épico')
+            for i in range(6)
+        ] + [
+            Book.objects.create(titulo=f'Outro {i}', autor=f'Autor {i}', genero=genero, categoria='Vários')
+            for i, genero in enumerate(['Romance', 'Terror', 'Fantasia'])
+        ]
+        cls.user = create_test_user('diversity_reader')
+
+    def setUp(self):
+        CatalogSnapshot.reset()
+        self.addCleanup(CatalogSnapshot.reset)
+
+    def test_same_author_interleaved(self):
+        """Livros de outros autores sobem para o topo da lista"""
+        reranked = DiversityReranker({'default': 0.5}).rerank(self.books, limit=5)
+
+        self.assertEqual(reranked[0], self.books[0])
+        self.assertEqual(len(reranked), 5)
+        authors = [book.autor for book in reranked]
+        self.assertLessEqual(authors.count('Autor Único'), 2)
+
+    def test_lambda_one_keeps_relevance_order(self):
+        """Com λ = 1 a etapa só corta a lista"""
+        reranked = DiversityReranker({'default': 1.0}).rerank(self.books, limit=4)
+
+        self.assertEqual(reranked, self.books[:4])
+
+    def test_lambda_per_surface(self):
+        """Cada superfície usa o seu λ, e as desconhecidas usam o padrão"""
+        reranker = DiversityReranker({'default': 0.7, 'shelf': 1.0})
+
+        self.assertEqual(reranker.rerank(self.books, surface='shelf'), self.books)
+        self.assertNotEqual(reranker.rerank(self.books, surface='home'), self.books)
+
+    @override_settings(RECOMMENDATION_DIVERSITY_LAMBDA={'default': 0.6, 'widget': 0.3})
+    def test_lambdas_from_settings(self):
+        reranker = DiversityReranker()
+
+        self.assertEqual(reranker.lambda_for('widget'), 0.3)
+        self.assertEqual(reranker.lambda_for('home'), 0.6)
+
+    def test_embedding_vectors(self):
+        """Vetores arbitrários (embeddings) substituem as features do catálogo"""
+        vectors = np.array([[1, 0], [1, 0.01], [0, 1]], dtype=np.float32)
+
+        reranked = DiversityReranker({'default': 0.5}).rerank(self.books[:3], limit=2, vectors=vectors)
+
+        self.assertEqual(reranked, [self.books[0], self.books[2]])
+
+    def test_few_hundred_candidates_fast(self):
+        """O laço vetorizado processa centenas de candidatos em poucos milissegundos"""
+        rng = np.random.default_rng(0)
+        count = 300
+        relevance = np.linspace(1, 0, count, dtype=np.float32)
+        terms = rng.integers(1, 20, size=(count, 3))
+        similarity = sum(
+            weight * (terms[:, None, column] == terms[None, :, column])
+            for column, weight in enumerate(DiversityReranker.FEATURE_WEIGHTS.values())
+        ).astype(np.float32)
+
+        started = time.perf_counter()
+        order = DiversityReranker.mmr(relevance, similarity, 50, 0.7)
+        elapsed = time.perf_counter() - started
+
+        self.assertEqual(len(set(order.tolist())), 50)
+        self.assertLess(elapsed, 0.05)
+
+    def _engine(self, candidates, external=()):
+        engine = RecommendationEngine()
+        engine._cache.clear()
+        engine._reranker = DiversityReranker({'default': 1.0, 'home': 0.5})
+        patcher = patch.object(RecommendationEngine, '_compute_candidates', return_value=(candidates, list(external), False))
+        compute = patcher.start()
+        self.addCleanup(patcher.stop)
+        return engine, compute
+
+    def test_engine_surface_selects_from_candidate_pool(self):
+        """O λ da superfície escolhe quais livros do conjunto em cache são servidos"""
+        engine, compute = self._engine(self.books)
+
+        plain = engine.get_recommendations(self.user, limit=4)
+        home = engine.get_recommendations(self.user, limit=4, surface='home')
+
+        compute.assert_called_once()
+        self.assertEqual(plain, self.books[:4])
+        self.assertEqual(len(home), 4)
+        self.assertTrue(set(home) - set(self.books[:4]))
+
+    def test_engine_keeps_external_books_last(self):
+        """Os externos completam a lista depois dos livros locais escolhidos"""
+        external = {'id': 'gb-1', 'volumeInfo': {'title': 'Externo'}}
+        candidates = self.books[4:]
+        engine, _ = self._engine(candidates, [external])
+
+        home = engine.get_recommendations(self.user, limit=6, surface='home')
+
+        self.assertEqual(home[-1], external)
+        self.assertCountEqual(home[:-1], candidates)
+        self.assertNotEqual(home[:-1], candidates)
@@ -0,0 +1,193 @@
+# cgbookstore/apps/core/recommendations/tests/test_exclusion_set.py
+
+import time
+from unittest.mock import patch
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from cgbookstore.apps.core.models import Book, UserBookShelf
+from cgbookstore.apps.core.recommendations.engine import RecommendationEngine
+from cgbookstore.apps.core.recommendations.providers.category import CategoryBasedProvider
+from cgbookstore.apps.core.recommendations.providers.exclusion import ExclusionProvider
+from cgbookstore.apps.core.recommendations.providers.history import HistoryBasedProvider
+from cgbookstore.apps.core.recommendations.providers.language_preference import LanguagePreferenceProvider
+from cgbookstore.apps.core.recommendations.providers.similarity import SimilarityBasedProvider
+from cgbookstore.apps.core.recommendations.providers.temporal import TemporalProvider
+from cgbookstore.apps.core.recommendations.services.catalog_snapshot import CatalogSnapshot
+from cgbookstore.apps.core.recommendations.services.exclusion_set import UserExclusionSet
+from cgbookstore.apps.core.recommendations.utils.sampling import BookSampler
+from .test_helpers import LOCMEM_CACHES, create_test_user
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class UserExclusionSetTests(TestCase):
+    """Testes do conjunto de exclusão por usuário e da filtragem em memória"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.books = [
+            Book.objects.create(
+                titulo=f'Excluível {i}', autor='Autor E', genero='Fantasia', categoria='Fantasia',
+                quantidade_acessos=100 - i
+            )
+            for i in range(12)
+        ]
+        cls.user = create_test_user('exclusion_reader')
+
+    def setUp(self):
+        UserExclusionSet.reset()
+        CatalogSnapshot.reset()
+        self.addCleanup(UserExclusionSet.reset)
+        self.addCleanup(CatalogSnapshot.reset)
+        self.exclusions = UserExclusionSet()
+
+    def _shelve(self, *books, shelf_type='lido'):
+        with self.captureOnCommitCallbacks(execute=True):
+            return [UserBookShelf.objects.create(user=self.user, book=book, shelf_type=shelf_type) for book in books]
+
+    def test_loaded_once_then_served_from_set(self):
+        self._shelve(*self.books[:3])
+
+        self.assertEqual(self.exclusions.get(self.user.id), {book.id for book in self.books[:3]})
+        with self.assertNumQueries(0):
+            self.assertEqual(len(self.exclusions.get(self.user.id)), 3)
+
+    def test_empty_shelf_set_is_kept(self):
+        """Usuário sem livros não reconstrói o conjunto a cada leitura"""
+        self.assertEqual(self.exclusions.get(self.user.id), set())
+        with self.assertNumQueries(0):
+            self.assertEqual(self.exclusions.get(self.user.id), set())
+
+    def test_signals_keep_set_current(self):
+        """Adições e remoções na estante atualizam o conjunto sem reconstruí-lo"""
+        self.exclusions.get(self.user.id)
+        shelf, favorite, duplicate = self._shelve(self.books[0], self.books[1], self.books[1], shelf_type='favorito')
+
+        self.assertEqual(self.exclusions.get(self.user.id), {self.books[0].id, self.books[1].id})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            shelf.delete()
+            duplicate.delete()  # o mesmo livro continua em outra prateleira
+
+        with self.assertNumQueries(0):
+            self.assertEqual(ExclusionProvider.get_excluded_books(self.user), [self.books[1].id])
+
+    def test_moving_shelf_to_other_book(self):
+        self.exclusions.get(self.user.id)
+        shelf, = self._shelve(self.books[0])
+
+        shelf.book = self.books[2]
+        with self.captureOnCommitCallbacks(execute=True):
+            shelf.save()
+
+        self.assertEqual(self.exclusions.get(self.user.id), {self.books[2].id})
+
+    def test_update_waits_for_commit(self):
+        """O conjunto só muda quando a transação da estante é confirmada"""
+        self.exclusions.get(self.user.id)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            UserBookShelf.objects.create(user=self.user, book=self.books[0], shelf_type='lido')
+            self.assertEqual(UserExclusionSet().get(self.user.id), set())
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.exclusions.get(self.user.id), {self.books[0].id})
+
+    def test_stale_load_does_not_overwrite_concurrent_add(self):
+        """Uma leitura do banco anterior a uma adição não sobrescreve o conjunto"""
+        sets = self.exclusions._get_sets()
+        version = sets.version(self.user.id)
+        stale = UserExclusionSet._load(self.user.id)
+
+        self._shelve(self.books[0])
+
+        self.assertFalse(sets.populate(self.user.id, stale | {UserExclusionSet.SENTINEL}, version, 60))
+        self.assertEqual(self.exclusions.get(self.user.id), {self.books[0].id})
+
+    def test_expired_set_reloaded(self):
+        """O conjunto em memória respeita o TTL"""
+        self.exclusions.get(self.user.id)
+        UserBookShelf.objects.create(user=self.user, book=self.books[0], shelf_type='lido')
+
+        with patch('cgbookstore.apps.core.recommendations.services.exclusion_set.time.monotonic',
+                   return_value=time.monotonic() + UserExclusionSet.TTL + 1):
+            self.assertEqual(self.exclusions.get(self.user.id), {self.books[0].id})
+
+    def test_signal_errors_do_not_break_shelf_delete(self):
+        """Falhas ao atualizar o conjunto são registradas sem interromper a remoção"""
+        shelf, = self._shelve(self.books[0])
+
+        with patch.object(UserExclusionSet, 'discard', side_effect=ConnectionError('redis fora')), \
+                self.captureOnCommitCallbacks(execute=True):
+            shelf.delete()
+
+        self.assertFalse(UserBookShelf.objects.filter(id=shelf.id).exists())
+
+    def test_take_filters_in_memory(self):
+        queryset = Book.objects.order_by('-quantidade_acessos')
+        excluded = {book.id for book in self.books[:5]}
+
+        with CaptureQueriesContext(connection) as queries:
+            picked = UserExclusionSet.take(queryset, excluded, 4)
+
+        self.assertEqual(picked, self.books[5:9])
+        self.assertFalse(any('NOT' in query['sql'] for query in queries))
+
+    def test_sampler_skips_excluded_ids(self):
+        excluded = {book.id for book in self.books[::2]}
+
+        with CaptureQueriesContext(connection) as queries:
+            sample = list(BookSampler.sample(Book.objects.all(), 5, 0.0, exclude=excluded))
+
+        self.assertEqual(len(sample), 5)
+        self.assertFalse(excluded & {book.id for book in sample})
+        self.assertFalse(any('NOT' in query['sql'] for query in queries))
+
+    def test_providers_send_no_not_in(self):
+        """Os providers de categoria e similaridade filtram a estante em memória"""
+        self._shelve(*self.books[:6])
+
+        with CaptureQueriesContext(connection) as queries:
+            recommended = list(CategoryBasedProvider().get_recommendations(self.user, limit=4))
+            recommended += list(SimilarityBasedProvider().get_recommendations(self.user, limit=4))
+
+        self.assertTrue(recommended)
+        self.assertFalse({book.id for book in recommended} & {book.id for book in self.books[:6]})
+        self.assertFalse(any('NOT (' in query['sql'] for query in queries))
+
+    def test_other_providers_and_fallbacks_send_no_not_in(self):
+        """Histórico, temporal, idioma e os fallbacks do engine também filtram em memória"""
+        self._shelve(*self.books[:6])
+        shelf_ids = {book.id for book in self.books[:6]}
+        engine = RecommendationEngine()
+
+        with CaptureQueriesContext(connection) as queries:
+            results = {
+                'history': list(HistoryBasedProvider().get_recommendations(self.user, limit=4)),
+                'temporal': list(TemporalProvider().get_recommendations(self.user, limit=4)),
+                'language': list(LanguagePreferenceProvider().get_recommendations(self.user, limit=4)),
+                'fallback': engine._get_fallback_recommendations(self.user, list(shelf_ids), limit=4),
+            }
+
+        self.assertTrue(results['history'])
+        self.assertEqual(len(results['fallback']), 4)
+        for name, books in results.items():
+            self.assertFalse({book.id for book in books} & shelf_ids, name)
+        self.assertFalse(any('NOT (' in query['sql'] for query in queries))
+
+    def test_queryset_exclusions_use_anti_join(self):
+        """Sem limite para filtrar em memória, a estante sai por NOT EXISTS e não por lista de IDs"""
+        self._shelve(*self.books[:6])
+
+        with CaptureQueriesContext(connection) as queries:
+            available = list(ExclusionProvider.get_available_recommendations(
+                {'all': Book.objects.all()}, self.user
+            )['all'])
+
+        self.assertEqual({book.id for book in available}, {book.id for book in self.books[6:]})
+        sql = queries.captured_queries[-1]['sql']
+        self.assertIn('EXISTS', sql)
+        self.assertNotIn(' IN (', sql)
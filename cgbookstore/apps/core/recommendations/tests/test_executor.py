@@ -0,0 +1,136 @@
+# cgbookstore/apps/core/recommendations/tests/test_executor.py
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+from django.test import SimpleTestCase, TestCase
+
+from cgbookstore.apps.core.recommendations.engine import RecommendationEngine
+from cgbookstore.apps.core.recommendations.executor import ProviderExecutor
+
+
+def slow_task(seconds, value):
+    def task():
+        time.sleep(seconds)
+        return value
+    return task
+
+
+def failing_task():
+    raise ValueError('falha simulada')
+
+
+class ProviderExecutorTests(SimpleTestCase):
+    """Testes da execução paralela dos providers"""
+
+    def setUp(self):
+        ProviderExecutor.reset_metrics()
+        patcher = patch.object(ProviderExecutor, 'can_run_concurrently', return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_runs_in_parallel(self):
+        """O tempo total é próximo do provider mais lento, não da soma"""
+        executor = ProviderExecutor(default_timeout=2.0)
+        tasks = [(f'p{i}', slow_task(0.2, i)) for i in range(3)]
+
+        started = time.monotonic()
+        results = executor.run(tasks)
+        elapsed = time.monotonic() - started
+
+        self.assertEqual(results, {'p0': 0, 'p1': 1, 'p2': 2})
+        self.assertLess(elapsed, 0.5)
+
+    def test_slow_provider_dropped(self):
+        """Providers que excedem o orçamento são descartados e contabilizados"""
+        executor = ProviderExecutor(timeouts={'slow': 0.1}, default_timeout=2.0)
+
+        results = executor.run([('fast', slow_task(0, 'ok')), ('slow', slow_task(0.5, 'late'))])
+
+        self.assertEqual(results, {'fast': 'ok'})
+        metrics = ProviderExecutor.get_metrics()
+        self.assertEqual(metrics['slow']['timeouts'], 1)
+        self.assertEqual(metrics['slow']['dropped'], 1)
+        self.assertEqual(metrics['fast']['completed'], 1)
+
+    def test_failing_provider_dropped(self):
+        """Erros em um provider não afetam os demais"""
+        results = ProviderExecutor().run([('ok', slow_task(0, [1])), ('broken', failing_task)])
+
+        self.assertEqual(results, {'ok': [1]})
+        self.assertEqual(ProviderExecutor.get_metrics()['broken']['errors'], 1)
+
+
+    def test_queue_time_not_counted(self):
+        """O orçamento conta a partir do início no worker, não do tempo na fila"""
+        pool = ThreadPoolExecutor(max_workers=2)
+        self.addCleanup(pool.shutdown)
+        executor = ProviderExecutor(default_timeout=0.3)
+        tasks = [(f'p{i}', slow_task(0.2, i)) for i in range(4)]
+
+        with patch.object(ProviderExecutor, 'get_pool', return_value=pool):
+            results = executor.run(tasks)
+
+        self.assertEqual(results, {'p0': 0, 'p1': 1, 'p2': 2, 'p3': 3})
+        self.assertFalse(any(stats['timeouts'] for stats in ProviderExecutor.get_metrics().values()))
+
+    def test_saturated_pool_drops_queued_providers(self):
+        """Com o pool ocupado por outras requisições, a tarefa é descartada sem rodar na thread da requisição"""
+        pool = ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(pool.shutdown)
+        pool.submit(time.sleep, 0.5)
+        calls = []
+
+        def task(name):
+            def run():
+                calls.append(name)
+                return name
+            return run
+
+        started = time.monotonic()
+        with patch.object(ProviderExecutor, 'get_pool', return_value=pool):
+            results = ProviderExecutor(default_timeout=0.2).run([('a', task('a')), ('b', task('b'))])
+
+        self.assertEqual(results, {})
+        self.assertEqual(calls, [])
+        self.assertLess(time.monotonic() - started, 0.4)
+        metrics = ProviderExecutor.get_metrics()
+        self.assertEqual(metrics['a']['timeouts'], 1)
+        self.assertEqual(metrics['b']['timeouts'], 1)
+
+    def test_worker_checks_connection_before_task(self):
+        """A conexão é validada antes da tarefa e reaproveitada até a idade máxima dos workers"""
+        order = []
+        with patch('cgbookstore.apps.core.recommendations.executor.connection') as conn, \
+                self.settings(RECOMMENDATION_PROVIDER_CONN_MAX_AGE=60):
+            conn.close_if_unusable_or_obsolete.side_effect = lambda: order.append('check')
+            started = time.monotonic()
+            ProviderExecutor._call_in_worker(lambda: order.append('task'))
+
+        self.assertEqual(order, ['check', 'task', 'check'])
+        self.assertGreaterEqual(conn.close_at, started + 60)
+        conn.close.assert_not_called()
+
+
+class ProviderExecutorTransactionTests(TestCase):
+    """Dentro de uma transação aberta a execução é sequencial"""
+
+    def test_sequential_inside_atomic_block(self):
+        executor = ProviderExecutor()
+        self.assertFalse(executor.can_run_concurrently())
+        self.assertEqual(executor.run([('a', lambda: 1), ('b', lambda: 2)]), {'a': 1, 'b': 2})
+
+
+class EngineReweightTests(SimpleTestCase):
+    """Redistribuição de pesos dos providers descartados"""
+
+    def test_reweight_preserves_total(self):
+        engine = RecommendationEngine()
+        weights = {'history': 0.25, 'category': 0.25, 'similarity': 0.5}
+
+        reweighted = engine._reweight(weights, ['history', 'category'])
+
+        self.assertAlmostEqual(reweighted['history'], 0.5)
+        self.assertAlmostEqual(reweighted['category'], 0.5)
+        self.assertEqual(reweighted['similarity'], 0.0)
@@ -0,0 +1,201 @@
+# cgbookstore/apps/core/recommendations/tests/test_external_fanout.py
+
+import json
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+from urllib.parse import parse_qs, urlparse
+
+from django.conf import settings
+from django.core.cache import caches
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from cgbookstore.apps.core.recommendations.executor import ExternalSearchExecutor, SingleFlight
+from cgbookstore.apps.core.recommendations.providers.external_api import ExternalApiProvider
+from cgbookstore.apps.core.utils.tiered_cache import TieredCache
+from .test_helpers import LOCMEM_CACHES, create_test_user
+
+
+class FakeGoogleBooksHandler(BaseHTTPRequestHandler):
+    """Responde /volumes como a API do Google Books, com atraso configurável por query"""
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query).get('q', [''])[0]
+        server = self.server
+        with server.lock:
+            server.calls[query] += 1
+        time.sleep(server.delays.get(query, server.delay))
+
+        items = [
+            {'id': f'{query}-{i}', 'volumeInfo': {'title': f'{query} livro {i}', 'authors': [f'Autor {i}']}}
+            for i in range(3)
+        ]
+        body = json.dumps({'totalItems': len(items), 'items': items}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ExternalFanOutTests(TestCase):
+    """Testes das buscas externas em paralelo contra um servidor local"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), FakeGoogleBooksHandler)
+        cls.server.daemon_threads = True
+        cls.server.lock = threading.Lock()
+        cls.server_thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.server_thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_test_user('fanout_reader')
+
+    def setUp(self):
+        self.server.calls = Counter()
+        self.server.delay = 0.3
+        self.server.delays = {}
+        for alias in settings.CACHES:
+            caches[alias].clear()
+
+        TieredCache.reset()
+        self.addCleanup(TieredCache.reset)
+        self.provider = ExternalApiProvider()
+        self.provider.client.base_url = f'http://127.0.0.1:{self.server.server_port}'
+
+    def test_patterns_searched_concurrently(self):
+        """O tempo total é próximo de uma busca, não da soma de todas"""
+        patterns = ['fiction', 'fantasy', 'thriller', 'romance']
+
+        with patch.object(ExternalApiProvider, '_get_user_patterns', return_value=patterns):
+            started = time.monotonic()
+            results = self.provider.get_recommendations(self.user, limit=20)
+            elapsed = time.monotonic() - started
+
+        self.assertLess(elapsed, 0.3 * len(patterns) * 0.75)
+        self.assertEqual(len(results), 12)
+        self.assertEqual(set(self.server.calls), {f'subject:"{pattern}"' for pattern in patterns})
+
+    @override_settings(RECOMMENDATION_EXTERNAL_SEARCH_DEADLINE=0.6)
+    def test_slow_patterns_dropped_at_deadline(self):
+        """Buscas que excedem o prazo total ficam fora do resultado"""
+        self.server.delays = {'subject:"horror"': 2.0}
+
+        with patch.object(ExternalApiProvider, '_get_user_patterns', return_value=['fiction', 'horror']):
+            started = time.monotonic()
+            results = self.provider.get_recommendations(self.user, limit=20)
+            elapsed = time.monotonic() - started
+
+        self.assertLess(elapsed, 1.5)
+        titles = {book['volumeInfo']['title'] for book in results}
+        self.assertEqual(titles, {f'subject:"fiction" livro {i}' for i in range(3)})
+
+    def test_concurrent_identical_patterns_coalesced(self):
+        """Vários usuários com o mesmo padrão ao mesmo tempo geram uma chamada"""
+        barrier = threading.Barrier(6)
+        results = []
+
+        def search():
+            provider = ExternalApiProvider()
+            provider.client.base_url = self.provider.client.base_url
+            barrier.wait()
+            results.append(provider._search_with_pattern('mystery'))
+
+        threads = [threading.Thread(target=search) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.server.calls['subject:"mystery"'], 1)
+        self.assertEqual(len(results), 6)
+        self.assertTrue(all(result == results[0] and len(result) == 3 for result in results))
+
+
+class ExternalSearchExecutorTests(SimpleTestCase):
+    """Testes do limite de buscas simultâneas por requisição"""
+
+    def _search(self, seconds, calls, active, peak, lock):
+        def search(item):
+            with lock:
+                calls.append(item)
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(seconds)
+            with lock:
+                active[0] -= 1
+            return item
+        return search
+
+    def test_in_flight_bounded_per_request(self):
+        calls, active, peak, lock = [], [0], [0], threading.Lock()
+
+        results = ExternalSearchExecutor(deadline=2.0, max_in_flight=2).map(
+            self._search(0.05, calls, active, peak, lock), range(5)
+        )
+
+        self.assertEqual(results, [(i, i) for i in range(5)])
+        self.assertEqual(peak[0], 2)
+
+    def test_nothing_submitted_after_deadline(self):
+        """Buscas ainda não enviadas quando o prazo acaba não ocupam o pool"""
+        calls, active, peak, lock = [], [0], [0], threading.Lock()
+
+        results = ExternalSearchExecutor(deadline=0.15, max_in_flight=1).map(
+            self._search(0.1, calls, active, peak, lock), range(5)
+        )
+        time.sleep(0.2)
+
+        self.assertEqual(results, [(0, 0)])
+        self.assertEqual(calls, [0, 1])
+
+    @override_settings(RECOMMENDATION_EXTERNAL_SEARCH_DEADLINE=0.6)
+    def test_http_timeout_bounded_by_deadline(self):
+        """O timeout HTTP das buscas não passa do prazo total"""
+        self.assertEqual(ExternalApiProvider().client.default_timeout, 0.6)
+
+
+class SingleFlightTests(SimpleTestCase):
+    """Testes do agrupamento de chamadas concorrentes"""
+
+    def test_error_propagated_to_waiters(self):
+        flight = SingleFlight()
+        started = threading.Event()
+        errors = []
+
+        def failing():
+            started.set()
+            time.sleep(0.2)
+            raise ValueError('falha simulada')
+
+        def follower():
+            started.wait()
+            try:
+                flight.do('chave', lambda: 'não deveria executar')
+            except ValueError as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=follower)
+        thread.start()
+        with self.assertRaises(ValueError):
+            flight.do('chave', failing)
+        thread.join()
+
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(flight.in_flight(), 0)
+        self.assertEqual(flight.do('chave', lambda: 'ok'), 'ok')
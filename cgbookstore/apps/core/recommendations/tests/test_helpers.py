@@ -1,10 +1,18 @@
 # cgbookstore/apps/core/recommendations/tests/test_helpers.py
 
 import uuid
+from django.conf import settings
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
 
+# Caches em memória para todos os aliases, usados com
+# @override_settings(CACHES=LOCMEM_CACHES) (o Redis não roda nos testes)
+LOCMEM_CACHES = {
+    alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': f'test-{alias}'}
+    for alias in settings.CACHES
+}
+
 
 def create_test_user(username, password='testpass123', **kwargs):
     """
@@ -0,0 +1,98 @@
+# cgbookstore/apps/core/recommendations/tests/test_personalized_shelf.py
+
+from unittest.mock import patch
+
+from django.test import TestCase, override_settings
+
+from cgbookstore.apps.core.models import Book, UserBookShelf
+from cgbookstore.apps.core.recommendations.engine import RecommendationEngine
+from cgbookstore.apps.core.recommendations.providers.history import HistoryBasedProvider
+from cgbookstore.apps.core.recommendations.providers.language_preference import LanguagePreferenceProvider
+from cgbookstore.apps.core.recommendations.services.catalog_snapshot import CatalogSnapshot
+from cgbookstore.apps.core.recommendations.services.trending_index import TrendingIndex
+from .test_helpers import LOCMEM_CACHES, create_test_user
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class PersonalizedShelfTests(TestCase):
+    """Testes da prateleira personalizada montada em uma única passada"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.highlights = [
+            Book.objects.create(titulo=f'Destaque {i}', autor='Autor D', e_destaque=True, idioma='pt')
+            for i in range(7)
+        ]
+        cls.portuguese = [
+            Book.objects.create(titulo=f'Nacional {i}', autor=f'Autor N{i}', idioma='pt', categoria='Romance')
+            for i in range(2)
+        ]
+        cls.fantasy = [
+            Book.objects.create(
+                titulo=f'Fantasia {i}', autor='Autor F', idioma='en',
+                categoria='Fantasia, Aventura' if i % 2 else 'Fantasia'
+            )
+            for i in range(7)
+        ]
+        cls.single = Book.objects.create(titulo='Avulso', autor='Autor Único', idioma='en', categoria='Terror')
+        cls.user = create_test_user('shelf_reader')
+        for book in cls.fantasy[:2]:
+            UserBookShelf.objects.create(user=cls.user, book=book, shelf_type='lido')
+
+    def setUp(self):
+        CatalogSnapshot.reset()
+        TrendingIndex.reset()
+        self.addCleanup(CatalogSnapshot.reset)
+        self.addCleanup(TrendingIndex.reset)
+        self.engine = RecommendationEngine()
+
+    def test_bucketing_rules_and_limits(self):
+        """Destaques, idioma e grupos seguem as regras e limites de cada seção"""
+        books = self.highlights + self.portuguese + self.fantasy + [self.single]
+
+        sections = self.engine._bucket_shelf(books, {'portuguese_preference': 0.9})
+
+        self.assertEqual(sections['destaques'], self.highlights[:5])
+        # Destaques excedentes em português caem para a seção de idioma
+        self.assertEqual(sections['seu_idioma'], self.highlights[5:] + self.portuguese)
+        # 'Fantasia, Aventura' e 'Fantasia' formam um único grupo, limitado a 5
+        self.assertEqual(list(sections['por_genero']), ['Fantasia'])
+        self.assertEqual(sections['por_genero']['Fantasia'], self.fantasy[:5])
+        self.assertEqual(sections['por_autor'], {'Autor F': self.fantasy[:3]})
+
+    def test_language_section_needs_preference(self):
+        sections = self.engine._bucket_shelf(self.portuguese, {'portuguese_preference': 0.2})
+
+        self.assertEqual(sections['seu_idioma'], [])
+        self.assertEqual(sections['por_genero'], {'Romance': self.portuguese})
+
+    def test_single_pipeline_pass(self):
+        """O histórico e o perfil de idioma são calculados uma única vez"""
+        with patch.object(
+            HistoryBasedProvider, 'get_recommendations', autospec=True, return_value=self.fantasy[2:5]
+        ) as history, patch.object(
+            LanguagePreferenceProvider, '_build_language_affinity', autospec=True,
+            return_value={'preferred_languages': {'en': 1.0}, 'portuguese_preference': 0.0,
+                          'national_authors_preference': 0.0, 'avoided_languages': {}}
+        ) as affinity:
+            shelf = self.engine.get_personalized_shelf(self.user, shelf_size=10)
+
+        self.assertEqual(history.call_count, 1)
+        self.assertEqual(affinity.call_count, 1)
+        self.assertEqual(shelf['based_on_history'], self.fantasy[2:5])
+
+    def test_serialized_blob_cached(self):
+        """A prateleira serializada é reutilizada do cache enquanto o tamanho pedido for o mesmo"""
+        shelf = self.engine.get_personalized_shelf_data(self.user, shelf_size=10)
+
+        self.assertIn('based_on_history', shelf)
+        self.assertTrue(all(isinstance(item, dict) for item in shelf['destaques']))
+
+        with patch.object(
+            RecommendationEngine, 'get_personalized_shelf', wraps=self.engine.get_personalized_shelf
+        ) as rebuild:
+            self.assertEqual(self.engine.get_personalized_shelf_data(self.user, shelf_size=10), shelf)
+            rebuild.assert_not_called()
+
+            self.engine.get_personalized_shelf_data(self.user, shelf_size=6)
+            rebuild.assert_called_once()
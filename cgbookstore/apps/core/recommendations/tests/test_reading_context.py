@@ -0,0 +1,91 @@
+# cgbookstore/apps/core/recommendations/tests/test_reading_context.py
+
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+
+from cgbookstore.apps.core.models import Book, UserBookShelf
+from cgbookstore.apps.core.recommendations.context import UserReadingContext
+from cgbookstore.apps.core.recommendations.engine import RecommendationEngine
+from cgbookstore.apps.core.recommendations.providers.exclusion import ExclusionProvider
+from cgbookstore.apps.core.recommendations.providers.history import HistoryBasedProvider
+from cgbookstore.apps.core.recommendations.providers.language_preference import LanguagePreferenceProvider
+from .test_helpers import create_test_user
+
+User = get_user_model()
+
+
+class UserReadingContextTests(TestCase):
+    """Testes do contexto de leitura compartilhado entre providers"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_test_user('context_reader')
+        cls.books = [
+            Book.objects.create(
+                titulo=f'Context Livro {i}',
+                autor='Autor A, Autor B' if i % 2 else 'Autor C',
+                genero='Mangá' if i % 2 else 'Ficção',
+                categoria="['Fiction']",
+                idioma='pt-BR' if i % 2 else 'en',
+            )
+            for i in range(6)
+        ]
+        for book, shelf_type in zip(cls.books[:4], ['favorito', 'lido', 'lendo', 'vou_ler']):
+            UserBookShelf.objects.create(user=cls.user, book=book, shelf_type=shelf_type)
+
+    def test_shelves_loaded_with_single_query(self):
+        """Prateleiras e livros são carregados em uma única consulta"""
+        context = UserReadingContext(self.user)
+        with self.assertNumQueries(1):
+            self.assertEqual(len(context.shelves), 4)
+            self.assertEqual(len(context.shelves_of('favorito', 'lido')), 2)
+            self.assertEqual(context.book_ids, {book.id for book in self.books[:4]})
+            self.assertTrue(all(shelf.book.titulo for shelf in context.shelves))
+
+    def test_normalized_values(self):
+        """Gêneros, categorias e autores são normalizados por livro"""
+        context = UserReadingContext(self.user)
+        book = self.books[1]
+
+        self.assertEqual(context.normalized_values(book, 'autor'), ['Autor A', 'Autor B'])
+        self.assertEqual(context.normalized_values(book, 'categoria'), ['fiction'])
+        self.assertEqual(context.normalized_values(book, 'genero'), ['manga'])
+
+    def test_for_user_reuses_matching_context(self):
+        """O mesmo contexto é reaproveitado apenas para o mesmo usuário"""
+        context = UserReadingContext(self.user)
+        other = create_test_user('context_other')
+
+        self.assertIs(UserReadingContext.for_user(self.user, context), context)
+        self.assertIsNot(UserReadingContext.for_user(other, context), context)
+
+    def test_anonymous_context_is_empty(self):
+        """Usuário ausente produz contexto vazio sem consultar o banco"""
+        context = UserReadingContext(None)
+        with self.assertNumQueries(0):
+            self.assertEqual(context.shelves, [])
+            self.assertEqual(context.book_ids, set())
+
+    def test_providers_share_loaded_shelves(self):
+        """Providers não consultam as prateleiras novamente quando recebem o contexto"""
+        context = UserReadingContext(self.user)
+        _ = context.shelves
+        language_provider = LanguagePreferenceProvider()
+
+        with self.assertNumQueries(0):
+            excluded = ExclusionProvider.get_excluded_books(self.user, context=context)
+            history = HistoryBasedProvider()._get_reading_history(self.user, context=context)
+            affinity = language_provider.get_language_affinity(self.user, context=context)
+
+        self.assertEqual(set(excluded), context.book_ids)
+        self.assertEqual(len(history), 4)
+        self.assertIs(language_provider.get_language_affinity(self.user, context=context), affinity)
+
+    def test_engine_results_exclude_shelf_books(self):
+        """O engine continua excluindo livros da estante usando o contexto"""
+        engine = RecommendationEngine()
+        context = UserReadingContext(self.user)
+        recommendations = engine.get_recommendations(self.user, limit=5, context=context)
+
+        local_ids = {book.id for book in recommendations if not engine._is_external(book)}
+        self.assertFalse(local_ids & context.book_ids)
@@ -0,0 +1,82 @@
+# cgbookstore/apps/core/recommendations/tests/test_relevance_ranking.py
+
+from unittest.mock import patch
+
+from django.test import TestCase
+
+from cgbookstore.apps.core.models import Book
+from cgbookstore.apps.core.models.book import normalize_language_code
+from cgbookstore.apps.core.recommendations.context import UserReadingContext
+from cgbookstore.apps.core.recommendations.engine import RecommendationEngine
+from cgbookstore.apps.core.recommendations.services.catalog_snapshot import CatalogSnapshot
+from .test_helpers import create_test_user
+
+
+class LanguageCodeTests(TestCase):
+    """Código de idioma normalizado na escrita"""
+
+    def test_normalize_language_code(self):
+        self.assertEqual(normalize_language_code('Português (Brasil)'), 'pt')
+        self.assertEqual(normalize_language_code(' EN-us'), 'en')
+        self.assertEqual(normalize_language_code(''), '')
+
+    def test_code_updated_on_save(self):
+        book = Book.objects.create(titulo='Idioma', autor='Autor', idioma='pt-BR')
+        self.assertEqual(book.idioma_codigo, 'pt')
+
+        book.idioma = 'Español'
+        book.save(update_fields=['idioma'])
+        book.refresh_from_db()
+        self.assertEqual(book.idioma_codigo, 'es')
+
+
+class RelevanceRankingTests(TestCase):
+    """Ordenação vetorizada por relevância no engine"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_test_user('ranking_reader')
+        cls.english = Book.objects.create(titulo='English', autor='A', idioma='en', quantidade_acessos=1000)
+        cls.portuguese = Book.objects.create(titulo='Português', autor='B', idioma='pt-BR', quantidade_acessos=800)
+        cls.spanish = Book.objects.create(titulo='Español', autor='C', idioma='es', quantidade_vendida=100)
+        cls.featured = Book.objects.create(titulo='Destaque', autor='D', quantidade_acessos=500, e_destaque=True)
+
+    def setUp(self):
+        CatalogSnapshot.reset()
+        self.addCleanup(CatalogSnapshot.reset)
+        self.engine = RecommendationEngine()
+        self.context = UserReadingContext.for_user(self.user)
+
+    def _rank(self, books, profile):
+        with patch.object(UserReadingContext, 'language_profile', profile):
+            return self.engine._sort_by_relevance(books, self.user, context=self.context)
+
+    def test_popularity_and_highlight(self):
+        """Sem preferência de idioma, vale a popularidade com boost de destaque"""
+        profile = {'portuguese_preference': 0.0, 'avoided_languages': {}}
+        ranked = self._rank([self.featured, self.english, self.portuguese], profile)
+
+        self.assertEqual(ranked, [self.english, self.portuguese, self.featured])
+
+    def test_language_boost_and_penalty(self):
+        """Português recebe bônus e idiomas evitados são penalizados"""
+        profile = {'portuguese_preference': 0.9, 'avoided_languages': {'es': 1.0}}
+        ranked = self._rank([self.english, self.spanish, self.portuguese], profile)
+
+        self.assertEqual(ranked, [self.portuguese, self.english, self.spanish])
+
+    def test_ranks_large_candidate_set_without_queries(self):
+        """Milhares de candidatos são ordenados sem consultas ao banco"""
+        Book.objects.bulk_create([
+            Book(titulo=f'Lote {i}', autor='E', idioma_codigo='pt', quantidade_acessos=i)
+            for i in range(2000)
+        ])
+        books = list(Book.objects.order_by('id'))
+        CatalogSnapshot.current()
+        profile = {'portuguese_preference': 0.9, 'avoided_languages': {'en': 1.0}}
+
+        with self.assertNumQueries(0):
+            ranked = self._rank(books, profile)
+
+        self.assertEqual(len(ranked), len(books))
+        self.assertEqual(ranked[0], Book.objects.get(titulo='Lote 1999'))
@@ -0,0 +1,81 @@
+# cgbookstore/apps/core/recommendations/tests/test_sampling.py
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from cgbookstore.apps.core.models import Book, UserBookShelf
+from cgbookstore.apps.core.recommendations.engine import RecommendationEngine
+from cgbookstore.apps.core.recommendations.providers.history import HistoryBasedProvider
+from cgbookstore.apps.core.recommendations.utils.sampling import BookSampler
+from .test_helpers import create_test_user
+
+
+class BookSamplerTests(TestCase):
+    """Testes da amostragem indexada por sample_key"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_test_user('sampler_reader')
+        cls.books = [
+            Book.objects.create(titulo=f'Amostra {i}', autor='Autor S', genero='Fantasia')
+            for i in range(12)
+        ]
+        for i, book in enumerate(cls.books):
+            Book.objects.filter(pk=book.pk).update(sample_key=i / 12)
+
+    def test_seed_is_stable_within_window(self):
+        """O pivô é determinístico por usuário e janela de cache"""
+        now = 1_000_000.0
+        window = BookSampler.WINDOW_SECONDS
+        seed = BookSampler.seed_for(self.user, 'history', now=now)
+
+        self.assertEqual(seed, BookSampler.seed_for(self.user, 'history', now=now + 1))
+        self.assertNotEqual(seed, BookSampler.seed_for(self.user, 'history', now=now + window))
+        self.assertNotEqual(seed, BookSampler.seed_for(self.user, 'temporal', now=now))
+        self.assertTrue(0.0 <= seed < 1.0)
+
+    def test_sample_walks_from_pivot_and_wraps(self):
+        """A amostra segue a ordem das chaves a partir do pivô e volta ao início"""
+        sample = list(BookSampler.sample(Book.objects.all(), 4, seed=10 / 12))
+
+        self.assertEqual(sample, [self.books[10], self.books[11], self.books[0], self.books[1]])
+
+    def test_sample_respects_filters(self):
+        """Livros fora do queryset nunca entram na amostra"""
+        queryset = Book.objects.exclude(id__in=[self.books[5].id, self.books[6].id])
+        sample_ids = set(BookSampler.sample(queryset, 20, seed=0.4).values_list('id', flat=True))
+
+        self.assertEqual(len(sample_ids), 10)
+        self.assertNotIn(self.books[5].id, sample_ids)
+
+    def test_reshuffle_assigns_new_keys(self):
+        """O reembaralhamento sorteia chaves distintas em um único UPDATE"""
+        with self.assertNumQueries(1):
+            BookSampler.reshuffle(Book.objects.all())
+
+        keys = list(Book.objects.values_list('sample_key', flat=True))
+        self.assertEqual(len(set(keys)), len(keys))
+        self.assertTrue(all(0.0 <= key < 1.0 for key in keys))
+
+    def test_provider_results_stable_for_user(self):
+        """Chamadas repetidas do provider retornam a mesma amostra"""
+        UserBookShelf.objects.create(user=self.user, book=self.books[0], shelf_type='favorito')
+        provider = HistoryBasedProvider()
+
+        first = list(provider.get_recommendations(self.user, limit=5))
+        second = list(provider.get_recommendations(self.user, limit=5))
+
+        self.assertEqual(len(first), 5)
+        self.assertEqual(first, second)
+        self.assertNotIn(self.books[0], first)
+
+    def test_popularity_ties_break_by_sample_key(self):
+        """Empates de popularidade seguem a chave aleatória, sem ORDER BY RANDOM()"""
+        engine = RecommendationEngine()
+
+        with CaptureQueriesContext(connection) as queries:
+            fallback = engine._get_fallback_recommendations(self.user, [], limit=4)
+
+        self.assertEqual(fallback, self.books[:4])
+        self.assertFalse(any('RANDOM' in query['sql'].upper() for query in queries.captured_queries))
@@ -0,0 +1,114 @@
+# cgbookstore/apps/core/recommendations/tests/test_similarity_index.py
+
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from cgbookstore.apps.core.models import Book, BookSimilarity, UserBookShelf
+from cgbookstore.apps.core.recommendations.providers.similarity import SimilarityBasedProvider
+from cgbookstore.apps.core.recommendations.services.similarity_index import SimilarityIndex
+from .test_helpers import create_test_user
+
+
+class SimilarityIndexTests(TestCase):
+    """Testes do índice item-item pré-calculado"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_test_user('index_reader')
+        cls.other = create_test_user('index_other')
+
+        cls.base = Book.objects.create(
+            titulo='Base', autor='Autor X', genero='Fantasia', categoria='Aventura', temas='magia, dragões'
+        )
+        cls.same_author = Book.objects.create(
+            titulo='Mesmo Autor', autor='Autor X', genero='Fantasia', categoria='Aventura', temas='magia'
+        )
+        cls.same_genre = Book.objects.create(
+            titulo='Mesmo Gênero', autor='Autor Y', genero='Fantasia', categoria='Drama'
+        )
+        cls.co_shelved = Book.objects.create(
+            titulo='Co-estante', autor='Autor Z', genero='Terror', categoria='Suspense'
+        )
+        cls.unrelated = Book.objects.create(
+            titulo='Sem Relação', autor='Autor W', genero='Biografia', categoria='História'
+        )
+
+        UserBookShelf.objects.create(user=cls.user, book=cls.base, shelf_type='favorito')
+        UserBookShelf.objects.create(user=cls.other, book=cls.base, shelf_type='lido')
+        UserBookShelf.objects.create(user=cls.other, book=cls.co_shelved, shelf_type='lido')
+
+    def test_neighbors_ranked_by_content_and_cooccurrence(self):
+        """Vizinhos combinam conteúdo e co-ocorrência, ordenados por score"""
+        SimilarityIndex().build()
+
+        neighbors = BookSimilarity.objects.get(book=self.base).neighbors
+        ranked_ids = [book_id for book_id, _ in neighbors]
+
+        self.assertEqual(ranked_ids[0], self.same_author.id)
+        self.assertIn(self.same_genre.id, ranked_ids)
+        self.assertIn(self.co_shelved.id, ranked_ids)
+        self.assertNotIn(self.unrelated.id, ranked_ids)
+        self.assertNotIn(self.base.id, ranked_ids)
+        self.assertEqual([score for _, score in neighbors], sorted((s for _, s in neighbors), reverse=True))
+
+    def test_top_n_limits_neighbor_list(self):
+        """Apenas os TOP_N vizinhos são armazenados"""
+        SimilarityIndex(top_n=1).build()
+        self.assertEqual(len(BookSimilarity.objects.get(book=self.base).neighbors), 1)
+
+    def _neighbor_ids(self, book):
+        return [book_id for book_id, _ in BookSimilarity.objects.get(book=book).neighbors]
+
+    def test_incremental_rebuild_refreshes_affected_lists(self):
+        """Um livro novo entra nas listas dos livros parecidos; as demais não são recalculadas"""
+        index = SimilarityIndex()
+        index.build()
+        untouched = BookSimilarity.objects.get(book=self.co_shelved).computed_at
+
+        new_book = Book.objects.create(titulo='Novo', autor='Autor X', genero='Fantasia')
+        stats = index.rebuild()
+
+        # O livro novo, mais base, mesmo autor e mesmo gênero (Fantasia)
+        self.assertEqual(stats['updated'], 4)
+        self.assertIn(new_book.id, self._neighbor_ids(self.base))
+        self.assertIn(new_book.id, self._neighbor_ids(self.same_genre))
+        self.assertEqual(BookSimilarity.objects.get(book=self.co_shelved).computed_at, untouched)
+
+    def test_incremental_rebuild_detects_removed_shelves(self):
+        """Uma estante removida atualiza a co-ocorrência sem reconstrução completa"""
+        index = SimilarityIndex()
+        index.build()
+        self.assertIn(self.co_shelved.id, self._neighbor_ids(self.base))
+
+        UserBookShelf.objects.filter(user=self.other, book=self.co_shelved).delete()
+        index.rebuild()
+
+        self.assertNotIn(self.co_shelved.id, self._neighbor_ids(self.base))
+        self.assertEqual(BookSimilarity.objects.get(book=self.co_shelved).shelf_count, 0)
+
+    def test_incremental_rebuild_drops_removed_books(self):
+        """Livros apagados saem das listas dos vizinhos"""
+        index = SimilarityIndex()
+        index.build()
+
+        self.same_author.delete()
+        index.rebuild()
+
+        self.assertNotIn(self.same_author.id, self._neighbor_ids(self.base))
+
+    def test_provider_merges_neighbor_lists(self):
+        """O provider usa o índice e exclui livros da estante"""
+        SimilarityIndex().build()
+
+        recommendations = list(SimilarityBasedProvider().get_recommendations(self.user, limit=3))
+
+        self.assertEqual(recommendations[0], self.same_author)
+        self.assertNotIn(self.base, recommendations)
+        self.assertLessEqual(len(recommendations), 3)
+
+    def test_command_builds_index(self):
+        """O comando constrói o índice para todo o catálogo"""
+        call_command('build_similarity_index', '--full', stdout=StringIO())
+        self.assertEqual(BookSimilarity.objects.count(), Book.objects.count())
@@ -0,0 +1,167 @@
+# cgbookstore/apps/core/recommendations/tests/test_stale_while_revalidate.py
+
+import time
+from unittest.mock import patch
+
+from django.test import TestCase, override_settings
+
+from cgbookstore.apps.core.models import Book, UserBookShelf
+from cgbookstore.apps.core.recommendations.engine import RecommendationEngine
+from cgbookstore.apps.core.recommendations.utils.cache_manager import RecommendationCache
+from cgbookstore.apps.core.utils.tiered_cache import TieredCache
+from .test_helpers import LOCMEM_CACHES, create_test_user
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class StaleWhileRevalidateTests(TestCase):
+    """Testes do cache stale-while-revalidate do engine"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_test_user('swr_reader')
+        cls.books = [
+            Book.objects.create(titulo=f'SWR Livro {i}', autor='Autor SWR', genero='Fantasia', idioma='pt-BR')
+            for i in range(8)
+        ]
+        UserBookShelf.objects.create(user=cls.user, book=cls.books[0], shelf_type='favorito')
+
+    def setUp(self):
+        TieredCache.reset()
+        self.addCleanup(TieredCache.reset)
+        # Só o caminho local entra nestes testes
+        patcher = patch.object(RecommendationEngine, '_get_filtered_external_recommendations', return_value=[])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.engine = RecommendationEngine()
+        self.engine._cache.clear()
+        self.cache_key = self.engine._get_cache_key(self.user)
+
+    def _store_entry(self, books, computed_at):
+        self.engine._cache.set(self.cache_key, {
+            'local': [book.id for book in books],
+            'external': [],
+            'limit': 5,
+            'generation': RecommendationCache.get_generation(self.user.id),
+            'computed_at': computed_at,
+        })
+
+    def test_fresh_entry_served_without_recompute(self):
+        """Uma entrada dentro do TTL soft é servida sem recalcular"""
+        self._store_entry(self.books[1:4], time.time())
+
+        with patch.object(RecommendationEngine, '_compute_recommendations') as compute, \
+                patch('cgbookstore.apps.core.recommendations.engine.BackgroundTasks.submit') as submit:
+            recommendations = self.engine.get_recommendations(self.user, limit=5)
+
+        compute.assert_not_called()
+        submit.assert_not_called()
+        self.assertEqual(recommendations, self.books[1:4])
+
+    def test_stale_entry_served_and_refreshed_once(self):
+        """Entrada expirada é servida e agenda um único recálculo em segundo plano"""
+        self._store_entry(self.books[1:4], 0)
+
+        with patch('cgbookstore.apps.core.recommendations.engine.BackgroundTasks.submit') as submit:
+            first = self.engine.get_recommendations(self.user, limit=5)
+            second = RecommendationEngine().get_recommendations(self.user, limit=5)
+
+        self.assertEqual(first, self.books[1:4])
+        self.assertEqual(second, self.books[1:4])
+        self.assertEqual(submit.call_count, 1)
+
+    def test_background_refresh_rewrites_entry(self):
+        """O recálculo grava uma nova entrada e libera o lock"""
+        self._store_entry(self.books[1:4], 0)
+
+        # Dentro da transação do teste a tarefa roda de forma síncrona
+        self.engine.get_recommendations(self.user, limit=5)
+
+        entry = self.engine._cache.get(self.cache_key)
+        self.assertGreater(entry['computed_at'], 0)
+        self.assertNotIn(self.books[0].id, entry['local'])
+        self.assertTrue(self.engine._acquire_refresh_lock(self.user))
+
+    def test_cold_miss_computes_and_caches(self):
+        """Sem cache, calcula uma vez e serve as próximas chamadas do cache"""
+        first = self.engine.get_recommendations(self.user, limit=5)
+
+        with patch.object(RecommendationEngine, '_compute_recommendations') as compute:
+            second = self.engine.get_recommendations(self.user, limit=5)
+
+        compute.assert_not_called()
+        self.assertEqual([book.id for book in first], [book.id for book in second])
+
+    def test_single_flight_lock(self):
+        """Apenas um recálculo por usuário pode estar em andamento"""
+        token = self.engine._acquire_refresh_lock(self.user)
+        self.assertTrue(token)
+        self.assertIsNone(self.engine._acquire_refresh_lock(self.user))
+        self.engine._release_refresh_lock(self.user, token)
+        self.assertTrue(self.engine._acquire_refresh_lock(self.user))
+
+    def test_release_keeps_lock_of_next_owner(self):
+        """Um recálculo que passou do TTL não apaga o lock de quem o obteve depois"""
+        expired = self.engine._acquire_refresh_lock(self.user)
+        self.engine._cache.delete(self.engine._get_refresh_lock_key(self.user))
+        current = self.engine._acquire_refresh_lock(self.user)
+
+        self.engine._release_refresh_lock(self.user, expired)
+
+        self.assertIsNone(self.engine._acquire_refresh_lock(self.user))
+        self.engine._release_refresh_lock(self.user, current)
+        self.assertTrue(self.engine._acquire_refresh_lock(self.user))
+
+    def test_lock_fails_closed_on_cache_errors(self):
+        """Com o cache fora, o lock é tratado como ocupado"""
+        with patch.object(self.engine._cache, 'add', side_effect=ConnectionError('redis fora')):
+            self.assertFalse(self.engine._acquire_refresh_lock(self.user))
+
+    def test_cache_errors_skip_wait_and_cache_write(self):
+        """Sem cache, a requisição não espera pelo lock nem grava a entrada"""
+        with patch.object(self.engine._cache, 'add', side_effect=ConnectionError('redis fora')), \
+                patch.object(RecommendationEngine, '_wait_for_cached_entry') as wait, \
+                patch.object(
+                    RecommendationEngine, '_compute_recommendations', return_value=self.books[1:3]
+                ) as compute:
+            self.engine.get_recommendations(self.user, limit=5)
+
+        wait.assert_not_called()
+        self.assertFalse(compute.call_args.kwargs['update_cache'])
+
+    def test_wait_timeout_does_not_write_cache(self):
+        """Esgotada a espera pelo dono do lock, a resposta é calculada sem gravar o cache"""
+        self.engine.REFRESH_WAIT = 0.2
+        self.assertTrue(self.engine._acquire_refresh_lock(self.user))
+
+        with patch.object(
+                RecommendationEngine, '_compute_recommendations', return_value=self.books[1:3]
+        ) as compute:
+            recommendations = self.engine.get_recommendations(self.user, limit=5)
+
+        self.assertEqual(recommendations, self.books[1:3])
+        self.assertFalse(compute.call_args.kwargs['update_cache'])
+        self.assertFalse(compute.call_args.kwargs['include_external'])
+
+    def test_shelf_change_invalidates_entry(self):
+        """Mudanças na estante trocam a geração e a lista antiga deixa de ser servida"""
+        self._store_entry(self.books[1:4], time.time())
+        self.assertIsNotNone(self.engine._get_cached_entry(self.user, 5))
+
+        UserBookShelf.objects.create(user=self.user, book=self.books[1], shelf_type='lido')
+
+        self.assertIsNone(self.engine._get_cached_entry(self.user, 5))
+
+    def test_cache_hit_reads_entry_and_generation_together(self):
+        """Um acerto de cache custa uma única ida ao cache (MGET)"""
+        self._store_entry(self.books[1:4], time.time())
+        cache = self.engine._cache
+
+        with patch.object(RecommendationCache, 'get_generation') as get_generation, \
+                patch.object(cache, 'get_many', wraps=cache.get_many) as get_many:
+            cached = self.engine._get_cached_entry(self.user, 5)
+
+        self.assertEqual(cached['local'], [book.id for book in self.books[1:4]])
+        get_generation.assert_not_called()
+        get_many.assert_called_once()
+        self.assertIn(self.cache_key, get_many.call_args.args[0])
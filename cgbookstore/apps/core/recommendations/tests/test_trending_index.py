@@ -0,0 +1,146 @@
+# cgbookstore/apps/core/recommendations/tests/test_trending_index.py
+
+import time
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from cgbookstore.apps.core.models import Book, BookTrendingScore, HomeSection, UserBookShelf
+from cgbookstore.apps.core.recommendations.analytics.models import RecommendationInteraction
+from cgbookstore.apps.core.recommendations.engine import RecommendationEngine
+from cgbookstore.apps.core.recommendations.providers.temporal import TemporalProvider
+from cgbookstore.apps.core.recommendations.services.trending_index import TrendingIndex
+from .test_helpers import LOCMEM_CACHES, create_test_user
+
+HOUR = 3600
+
+
+@override_settings(CACHES=LOCMEM_CACHES, RECOMMENDATION_TRENDING_HALF_LIFE=24)
+class TrendingIndexTests(TestCase):
+    """Testes do índice de tendências com decaimento exponencial"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.books = [
+            Book.objects.create(titulo=f'Tendência {i}', autor='Autor T', genero='Fantasia', quantidade_acessos=10 - i)
+            for i in range(6)
+        ]
+        cls.user = create_test_user('trending_reader')
+
+    def setUp(self):
+        TrendingIndex.reset()
+        self.addCleanup(TrendingIndex.reset)
+        self.index = TrendingIndex()
+        self.now = time.time()
+
+    def test_recent_events_outrank_old_ones(self):
+        """Três visualizações de dois dias atrás valem menos que uma de agora"""
+        old, recent = self.books[0], self.books[1]
+        for _ in range(3):
+            self.index.record(old.id, 'view', now=self.now - 48 * HOUR)
+        self.index.record(recent.id, 'view', now=self.now)
+
+        ranked = self.index.top('views', 10, now=self.now)
+
+        self.assertEqual([book_id for book_id, _ in ranked], [recent.id, old.id])
+        self.assertAlmostEqual(ranked[0][1], 1.0)
+        self.assertAlmostEqual(ranked[1][1], 0.75)
+
+    def test_rebase_keeps_decayed_scores(self):
+        """Reescalar o landmark não altera ordem nem scores decaídos"""
+        self.index.record(self.books[0].id, 'purchase', now=self.now - 300 * HOUR)
+        self.index.record(self.books[1].id, 'view', now=self.now - 10 * HOUR)
+        before = self.index.top('trending', 10, now=self.now)
+
+        self.index.rebase('trending', now=self.now)
+        after = self.index.top('trending', 10, now=self.now)
+
+        # 5 * 2^(-300/24) fica abaixo do score mínimo e é podado
+        self.assertEqual([book_id for book_id, _ in after], [self.books[1].id])
+        self.assertAlmostEqual(after[0][1], before[0][1])
+
+    def test_snapshot_serves_reads_without_live_index(self):
+        """Sem ranking vivo a leitura vem do snapshot, que também o repovoa"""
+        for book in self.books[:3]:
+            self.index.record(book.id, 'view', now=self.now)
+        self.index.record(self.books[2].id, 'click', now=self.now)
+        self.assertEqual(self.index.snapshot('views', now=self.now), 3)
+
+        TrendingIndex.reset()
+        self.assertEqual(self.index.top('views', 1)[0][0], self.books[2].id)
+
+        self.assertEqual(self.index.restore('views'), 3)
+        self.assertEqual(self.index.top('views', 1)[0][0], self.books[2].id)
+
+    def test_events_recorded_by_signals(self):
+        """Adições à estante e cliques/compras em recomendações alimentam o índice"""
+        UserBookShelf.objects.create(user=self.user, book=self.books[3], shelf_type='vou_ler')
+        RecommendationInteraction.objects.create(
+            user=self.user, book=self.books[4], interaction_type='purchase', source='general'
+        )
+        RecommendationInteraction.objects.create(
+            user=self.user, book=self.books[5], interaction_type='view', source='general'
+        )
+
+        trending = dict(self.index.top('trending', 10))
+        self.assertEqual(set(trending), {self.books[3].id, self.books[4].id})
+        self.assertEqual(self.index.top_ids('sales', 10), [self.books[4].id])
+
+    def test_home_section_reads_index_then_lifetime_counts(self):
+        """'Mais vistos' mostra os livros em alta e completa com o contador acumulado"""
+        self.index.record(self.books[5].id, 'view')
+        section = HomeSection.objects.create(
+            titulo='Mais vistos', tipo='shelf', shelf_behavior='automatic',
+            shelf_filter_field='most_viewed', max_books=3
+        )
+
+        books = list(section.get_books())
+
+        self.assertEqual([book.id for book in books], [self.books[5].id, self.books[0].id, self.books[1].id])
+
+    def test_temporal_provider_puts_trending_first(self):
+        """Entre os candidatos sazonais, os livros em alta vêm primeiro"""
+        UserBookShelf.objects.create(user=self.user, book=self.books[0], shelf_type='lido')
+        self.index.record(self.books[4].id, 'view')
+
+        recommendations = list(TemporalProvider().get_recommendations(self.user, limit=3))
+
+        self.assertEqual(len(recommendations), 3)
+        self.assertEqual(recommendations[0].id, self.books[4].id)
+        self.assertNotIn(self.books[0], recommendations)
+
+    def test_anonymous_visitors_get_trending(self):
+        """Visitantes anônimos recebem o top do índice"""
+        for book in self.books[2:5]:
+            self.index.record(book.id, 'shelf_add')
+        for book in (self.books[3], self.books[3], self.books[2]):
+            self.index.record(book.id, 'view')
+
+        recommendations = RecommendationEngine().get_recommendations(AnonymousUser(), limit=2)
+
+        self.assertEqual([book.id for book in recommendations], [self.books[3].id, self.books[2].id])
+
+    def test_anonymous_completion_skips_cache(self):
+        """Completar a lista de visitantes não grava entrada no cache de recomendações"""
+        self.index.record(self.books[0].id, 'view')
+        engine = RecommendationEngine()
+
+        with patch.object(engine, '_update_cache') as update_cache:
+            recommendations = engine.get_recommendations(AnonymousUser(), limit=3)
+
+        self.assertEqual(recommendations[0].id, self.books[0].id)
+        update_cache.assert_not_called()
+
+    def test_command_writes_snapshot(self):
+        """O comando de manutenção grava o snapshot de cada ranking"""
+        self.index.record(self.books[0].id, 'purchase')
+
+        call_command('maintain_trending_index', stdout=StringIO())
+
+        self.assertEqual(
+            set(BookTrendingScore.objects.values_list('board', 'book_id')),
+            {('trending', self.books[0].id), ('sales', self.books[0].id)}
+        )
@@ -2,13 +2,14 @@
 
 from django.core.cache import caches, InvalidCacheBackendError
 from django.utils import timezone
-from typing import Optional, Dict, List, Any
+from typing import Optional, Dict, List, Any, Tuple
 from django.contrib.auth import get_user_model
 from datetime import datetime, timedelta
 import hashlib
 import json
 import logging
 import re
+import time
 
 logger = logging.getLogger(__name__)
 
@@ -17,6 +18,7 @@ class RecommendationCache:
     SHELF_KEY = 'user_shelf_v2_{user_id}'
     LANGUAGE_KEY = 'user_language_profile_v2_{user_id}'
     BEHAVIOR_KEY = 'user_behavior_v2_{user_id}'
+    GENERATION_KEY = 'user_cache_generation_v2_{cache_type}_{user_id}'
 
     CACHE_TTL = {
         'recommendations': 3600,
@@ -63,6 +65,81 @@ class RecommendationCache:
             sanitized = f"{sanitized[:200]}_{key_hash}"
         return sanitized
 
+    @classmethod
+    def _get_typed_cache(cls, cache_type: str):
+        """Cache onde ficam as entradas do tipo e a geração que as valida"""
+        return cls.get_books_cache() if cache_type == 'shelf' else cls.get_cache()
+
+    @classmethod
+    def _get_generation_key(cls, user_id: int, cache_type: str) -> str:
+        return cls.sanitize_cache_key(cls.GENERATION_KEY.format(cache_type=cache_type, user_id=user_id))
+
+    @classmethod
+    def get_generation(cls, user_id: int, cache_type: str = 'recommendations') -> int:
+        """
+        Geração atual do cache do usuário para o tipo informado.
+
+        Cada entrada guarda a geração com que foi gravada: invalidar é
+        incrementá-la, e as entradas antigas simplesmente deixam de ser
+        aceitas até expirarem pelo TTL. Uma geração ausente (primeiro acesso
+        ou evicção) é iniciada com o timestamp em milissegundos, para nunca
+        voltar a um valor já usado.
+        """
+        try:
+            cache = cls._get_typed_cache(cache_type)
+            key = cls._get_generation_key(user_id, cache_type)
+            generation = cache.get(key)
+            if generation is None:
+                seed = int(time.time() * 1000)
+                generation = seed if cache.add(key, seed, None) else cache.get(key, seed)
+            return int(generation)
+        except Exception as e:
+            logger.error(f"Erro ao obter geração do cache para {user_id}: {e}", exc_info=True)
+            return 0
+
+    @classmethod
+    def get_generations(cls, user_ids: List[int], cache_type: str = 'recommendations') -> Dict[int, int]:
+        """Gerações de vários usuários com um único get_many (MGET)"""
+        try:
+            cache = cls._get_typed_cache(cache_type)
+            keys = {cls._get_generation_key(user_id, cache_type): user_id for user_id in user_ids}
+            found = cache.get_many(list(keys))
+            generations = {keys[key]: int(value) for key, value in found.items()}
+        except Exception as e:
+            logger.error(f"Erro ao obter gerações do cache em lote: {e}", exc_info=True)
+            return dict.fromkeys(user_ids, 0)
+
+        for user_id in user_ids:
+            if user_id not in generations:
+                generations[user_id] = cls.get_generation(user_id, cache_type)
+        return generations
+
+    @classmethod
+    def get_with_generation(cls, key: str, user_id: int, cache_type: str = 'recommendations') -> Tuple[Any, int]:
+        """
+        Lê uma entrada e a geração atual do usuário com um único get_many
+        (MGET), para entradas que guardam a geração com que foram gravadas
+        em vez de tê-la na chave. Sem geração, nenhuma entrada é válida.
+        """
+        cache = cls._get_typed_cache(cache_type)
+        generation_key = cls._get_generation_key(user_id, cache_type)
+        found = cache.get_many([generation_key, key])
+        if found.get(generation_key) is None:
+            return None, cls.get_generation(user_id, cache_type)
+        return found.get(key), int(found[generation_key])
+
+    @classmethod
+    def bump_generation(cls, user_id: int, cache_type: str = 'recommendations') -> None:
+        """Invalida as entradas do tipo informado com um único INCR"""
+        cache = cls._get_typed_cache(cache_type)
+        key = cls._get_generation_key(user_id, cache_type)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Geração ainda não existe: um novo timestamp já é maior que qualquer valor anterior
+            if not cache.add(key, int(time.time() * 1000), None):
+                cache.incr(key)
+
     @classmethod
     def _get_base_key_format(cls, key_template: str, user_id: int) -> str:
         return cls.sanitize_cache_key(key_template.format(user_id=user_id))
@@ -83,10 +160,30 @@ class RecommendationCache:
     def _get_behavior_key(cls, user_id: int) -> str:
         return cls._get_base_key_format(cls.BEHAVIOR_KEY, user_id)
 
+    @classmethod
+    def build_entry(cls, value: Any, generation: int) -> Dict[str, Any]:
+        """Envelope gravado no cache: o valor e a geração com que foi calculado"""
+        return {'generation': generation, 'value': value}
+
+    @classmethod
+    def _get_entry(cls, key: str, user_id: int, cache_type: str) -> Any:
+        """Valor da entrada se ela foi gravada na geração atual; uma ida ao cache"""
+        entry, generation = cls.get_with_generation(key, user_id, cache_type)
+        if isinstance(entry, dict) and entry.get('generation') == generation:
+            return entry.get('value')
+        return None
+
+    @classmethod
+    def _set_entry(cls, key: str, user_id: int, cache_type: str, value: Any) -> None:
+        generation = cls.get_generation(user_id, cache_type)
+        cls._get_typed_cache(cache_type).set(
+            key, cls.build_entry(value, generation), cls.CACHE_TTL[cache_type]
+        )
+
     @classmethod
     def get_recommendations(cls, user) -> Optional[Dict[str, Any]]:
         try:
-            cache_data = cls.get_cache().get(cls._get_general_key(user.id))
+            cache_data = cls._get_entry(cls._get_general_key(user.id), user.id, 'recommendations')
             if cache_data and cls._is_cache_valid(cache_data, user):
                 return cache_data
             return None
@@ -100,22 +197,17 @@ class RecommendationCache:
             cache_data = {
                 'recommendations': cls._serialize_recommendations(recommendations),
                 'timestamp': timezone.now().isoformat(),
-                'user_context': cls._get_user_context(user),
                 'metadata': metadata or {},
                 'version': '2.0'
             }
-            cls.get_cache().set(
-                cls._get_general_key(user.id),
-                cache_data,
-                cls.CACHE_TTL['recommendations']
-            )
+            cls._set_entry(cls._get_general_key(user.id), user.id, 'recommendations', cache_data)
         except Exception as e:
             logger.error(f"Erro ao salvar recomendações no cache para {user.id}: {e}", exc_info=True)
 
     @classmethod
     def get_language_profile(cls, user) -> Optional[Dict]:
         try:
-            return cls.get_cache().get(cls._get_language_key(user.id))
+            return cls._get_entry(cls._get_language_key(user.id), user.id, 'language_profile')
         except Exception as e:
             logger.error(f"Erro ao obter perfil de idioma do cache para {user.id}: {e}", exc_info=True)
             return None
@@ -123,18 +215,14 @@ class RecommendationCache:
     @classmethod
     def set_language_profile(cls, user, profile: Dict) -> None:
         try:
-            cls.get_cache().set(
-                cls._get_language_key(user.id),
-                profile,
-                cls.CACHE_TTL['language_profile']
-            )
+            cls._set_entry(cls._get_language_key(user.id), user.id, 'language_profile', profile)
         except Exception as e:
             logger.error(f"Erro ao salvar perfil de idioma no cache para {user.id}: {e}", exc_info=True)
 
     @classmethod
     def get_user_behavior(cls, user) -> Optional[Dict]:
         try:
-            return cls.get_cache().get(cls._get_behavior_key(user.id))
+            return cls._get_entry(cls._get_behavior_key(user.id), user.id, 'behavior')
         except Exception as e:
             logger.error(f"Erro ao obter comportamento do usuário do cache para {user.id}: {e}", exc_info=True)
             return None
@@ -142,18 +230,14 @@ class RecommendationCache:
     @classmethod
     def set_user_behavior(cls, user, behavior: Dict) -> None:
         try:
-            cls.get_cache().set(
-                cls._get_behavior_key(user.id),
-                behavior,
-                cls.CACHE_TTL['behavior']
-            )
+            cls._set_entry(cls._get_behavior_key(user.id), user.id, 'behavior', behavior)
         except Exception as e:
             logger.error(f"Erro ao salvar comportamento do usuário no cache para {user.id}: {e}", exc_info=True)
 
     @classmethod
     def get_shelf(cls, user) -> Optional[Dict]:
         try:
-            return cls.get_books_cache().get(cls._get_shelf_key(user.id))
+            return cls._get_entry(cls._get_shelf_key(user.id), user.id, 'shelf')
         except Exception as e:
             logger.error(f"Erro ao obter prateleira do cache para {user.id}: {e}", exc_info=True)
             return None
@@ -161,48 +245,33 @@ class RecommendationCache:
     @classmethod
     def set_shelf(cls, user, shelf_data: Dict) -> None:
         try:
-            cls.get_books_cache().set(
-                cls._get_shelf_key(user.id),
-                shelf_data,
-                cls.CACHE_TTL['shelf']
-            )
+            cls._set_entry(cls._get_shelf_key(user.id), user.id, 'shelf', shelf_data)
         except Exception as e:
             logger.error(f"Erro ao salvar prateleira no cache para {user.id}: {e}", exc_info=True)
 
     @classmethod
     def invalidate_user_cache(cls, user, event: str = 'full') -> None:
+        """
+        Invalida os caches afetados pelo evento incrementando suas gerações.
+        Não há deleção de chaves: as entradas antigas expiram pelo TTL.
+        """
         try:
-            caches_to_invalidate_keys = []
             user_id = user if isinstance(user, int) else user.id
             if event == 'full':
-                caches_to_invalidate_keys = [
-                    cls._get_general_key(user_id),
-                    cls._get_language_key(user_id),
-                    cls._get_behavior_key(user_id),
-                    cls._get_shelf_key(user_id)
-                ]
+                affected_cache_types = list(cls.CACHE_TTL.keys())
             else:
                 affected_cache_types = cls.INVALIDATION_EVENTS.get(event, [])
-                for cache_type in affected_cache_types:
-                    if cache_type == 'recommendations':
-                        caches_to_invalidate_keys.append(cls._get_general_key(user_id))
-                    elif cache_type == 'shelf':
-                        caches_to_invalidate_keys.append(cls._get_shelf_key(user_id))
-                    elif cache_type == 'language_profile':
-                        caches_to_invalidate_keys.append(cls._get_language_key(user_id))
-                    elif cache_type == 'behavior':
-                        caches_to_invalidate_keys.append(cls._get_behavior_key(user_id))
-
-            for key in caches_to_invalidate_keys:
-                if cls.SHELF_KEY.format(user_id=user_id) in key:
-                    cls.get_books_cache().delete(key)
-                else:
-                    cls.get_cache().delete(key)
+            for cache_type in affected_cache_types:
+                cls.bump_generation(user_id, cache_type)
         except Exception as e:
             logger.error(f"Erro ao invalidar cache para ID de usuário {user if isinstance(user, int) else user.id}, evento {event}: {e}", exc_info=True)
 
     @classmethod
     def _is_cache_valid(cls, cache_data: Dict, user) -> bool:
+        """
+        Valida versão e idade da entrada. Mudanças na estante e no perfil
+        já a invalidam via geração, sem consultar o banco na leitura.
+        """
         try:
             if not isinstance(cache_data, dict) or cache_data.get('version') != '2.0':
                 return False
@@ -214,12 +283,6 @@ class RecommendationCache:
                 cache_time = timezone.make_aware(cache_time, timezone.utc)
             if timezone.now() - cache_time > timedelta(seconds=cls.CACHE_TTL['recommendations']):
                 return False
-            current_context = cls._get_user_context(user)
-            cached_context = cache_data.get('user_context', {})
-            if abs(current_context.get('total_books', 0) - cached_context.get('total_books', 0)) > 1:
-                return False
-            if current_context.get('favorite_category') != cached_context.get('favorite_category'):
-                return False
             return True
         except Exception as e:
             logger.error(f"Erro ao validar cache para {user.id}: {e}", exc_info=True)
@@ -291,13 +354,13 @@ class RecommendationCache:
     def get_cache_stats(cls, user) -> Dict:
         stats = {'recommendations': False, 'shelf': False, 'language_profile': False, 'behavior': False}
         try:
-            if cls.get_cache().get(cls._get_general_key(user.id)):
+            if cls._get_entry(cls._get_general_key(user.id), user.id, 'recommendations'):
                 stats['recommendations'] = True
-            if cls.get_books_cache().get(cls._get_shelf_key(user.id)):
+            if cls._get_entry(cls._get_shelf_key(user.id), user.id, 'shelf'):
                 stats['shelf'] = True
-            if cls.get_cache().get(cls._get_language_key(user.id)):
+            if cls._get_entry(cls._get_language_key(user.id), user.id, 'language_profile'):
                 stats['language_profile'] = True
-            if cls.get_cache().get(cls._get_behavior_key(user.id)):
+            if cls._get_entry(cls._get_behavior_key(user.id), user.id, 'behavior'):
                 stats['behavior'] = True
             return stats
         except Exception as e:
@@ -5,14 +5,17 @@ from urllib.parse import urlparse, parse_qs, urlencode, urlunparse
 logger = logging.getLogger(__name__)
 
 
-def standardize_google_book_cover(url, size='M'):
+def standardize_google_book_cover(url, size='M', width=None):
     """
     Padroniza URLs de capas do Google Books para melhor qualidade.
     Adiciona tratamento especial para URLs problemáticas.
+    Com `width`, o proxy entrega a capa redimensionada para essa largura.
     """
     if not url:
         return ''
 
+    resize_param = f"&w={int(width)}" if width else ''
+
     # Verificar se é uma URL do Google Books
     if 'books.google.com' in url or 'googleusercontent.com' in url:
         # Extrair o ID do livro
@@ -25,7 +28,7 @@ def standardize_google_book_cover(url, size='M'):
 
             if book_id in problematic_ids:
                 # Usar URL alternativa para estes IDs
-                return f"/image-proxy/?url=https://books.google.com/books/publisher/content/images/frontcover/{book_id}?fife=w600-h900"
+                return f"/image-proxy/?url=https://books.google.com/books/publisher/content/images/frontcover/{book_id}?fife=w600-h900{resize_param}"
 
             # Processar normalmente se não for um ID problemático
             size_param = 'zoom=1'
@@ -34,7 +37,7 @@ def standardize_google_book_cover(url, size='M'):
             elif size == 'XL':
                 size_param = 'zoom=3'
 
-            return f"/image-proxy/?url=https://books.google.com/books/content?id={book_id}&printsec=frontcover&img=1&{size_param}&source=gbs_api"
+            return f"/image-proxy/?url=https://books.google.com/books/content?id={book_id}&printsec=frontcover&img=1&{size_param}&source=gbs_api{resize_param}"
 
     # Se não for uma URL do Google Books, retornar como está
     return url
@@ -0,0 +1,87 @@
+# Arquivo: cgbookstore/apps/core/recommendations/utils/sampling.py
+
+import hashlib
+import time
+from typing import List, Optional, Set
+
+from django.db.models import Case, IntegerField, QuerySet, Value, When
+from django.db.models.functions import Random
+
+from .cache_manager import RecommendationCache
+
+
+class BookSampler:
+    """
+    Amostragem aleatória de livros sem ORDER BY RANDOM().
+
+    Cada livro tem uma chave aleatória indexada (Book.sample_key). A amostra
+    é a janela de `limit` livros a partir de um pivô em [0, 1): o custo
+    depende apenas do tamanho da janela percorrida no índice, e não do
+    tamanho do catálogo. O pivô é derivado do usuário e da janela de cache,
+    então as recomendações ficam estáveis enquanto o cache for válido e
+    mudam na janela seguinte.
+    """
+
+    WINDOW_SECONDS = RecommendationCache.CACHE_TTL['recommendations']
+
+    # Desempate para consultas ordenadas por popularidade: a chave aleatória
+    # indexada varia os empates entre reembaralhamentos sem ORDER BY RANDOM()
+    TIEBREAK = ('sample_key', 'id')
+
+    @classmethod
+    def seed_for(cls, user, namespace: str = '', now: Optional[float] = None) -> float:
+        """Pivô determinístico em [0, 1) para o usuário na janela atual"""
+        window = int((time.time() if now is None else now) // cls.WINDOW_SECONDS)
+        user_id = getattr(user, 'pk', None) or 0
+        digest = hashlib.md5(f"{namespace}:{user_id}:{window}".encode('utf-8')).hexdigest()
+        return int(digest[:13], 16) / float(16 ** 13)
+
+    @classmethod
+    def sample(
+            cls, queryset: QuerySet, limit: int, seed: float, exclude: Optional[Set[int]] = None
+    ) -> QuerySet:
+        """
+        Retorna até `limit` livros do queryset, a partir do pivô `seed`.
+
+        Percorre o índice de sample_key a partir do pivô e, se a janela não
+        completar o limite, continua do início (wrap-around). O resultado é
+        um queryset por chave primária, preservando a ordem da amostra.
+        Os ids em `exclude` são descartados em memória enquanto a janela é
+        percorrida, sem NOT IN na consulta.
+        """
+        if limit <= 0:
+            return queryset.none()
+
+        exclude = exclude or set()
+        sample_ids = cls._window(queryset.filter(sample_key__gte=seed), limit, exclude)
+        if len(sample_ids) < limit:
+            sample_ids += cls._window(queryset.filter(sample_key__lt=seed), limit - len(sample_ids), exclude)
+
+        if not sample_ids:
+            return queryset.none()
+
+        preserved_order = Case(
+            *[When(id=book_id, then=Value(pos)) for pos, book_id in enumerate(sample_ids)],
+            output_field=IntegerField()
+        )
+        return queryset.model.objects.filter(id__in=sample_ids).order_by(preserved_order)
+
+    @staticmethod
+    def _window(queryset: QuerySet, limit: int, exclude: Set[int]) -> List[int]:
+        """Até `limit` ids em ordem de sample_key, paginando pela própria chave"""
+        ids: List[int] = []
+        chunk = limit + len(exclude) if len(exclude) < limit else limit * 2
+        queryset = queryset.order_by('sample_key', 'id').values_list('id', 'sample_key').distinct()
+        while len(ids) < limit:
+            rows = list(queryset[:chunk])
+            ids.extend(book_id for book_id, _ in rows if book_id not in exclude and book_id not in ids)
+            if len(rows) < chunk:
+                break
+            last_key = rows[-1][1]
+            queryset = queryset.filter(sample_key__gt=last_key)
+        return ids[:limit]
+
+    @staticmethod
+    def reshuffle(queryset: QuerySet) -> int:
+        """Sorteia novas chaves para os livros informados em um único UPDATE"""
+        return queryset.update(sample_key=Random())
@@ -0,0 +1,246 @@
+# cgbookstore/apps/core/services/book_counters.py
+
+import logging
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from ..models import Book
+
+logger = logging.getLogger(__name__)
+
+
+class _RedisBuffer:
+    """Incrementos pendentes em hashes do Redis (HINCRBY por livro)"""
+
+    def __init__(self, cache):
+        self.cache = cache
+        self.client = cache.client.get_client(write=True)
+
+    def key(self, field: str, suffix: str = '') -> str:
+        return self.cache.make_key(f'book_counters:{field}{suffix}')
+
+    def incr(self, field: str, book_id: int, amount: int) -> None:
+        self.client.hincrby(self.key(field), book_id, amount)
+
+    def pending(self, field: str) -> Dict[int, int]:
+        return {int(book_id): int(amount) for book_id, amount in self.client.hgetall(self.key(field)).items()}
+
+    def take(self, field: str) -> Dict[int, int]:
+        """
+        Move o hash para uma chave de trabalho (RENAME é atômico: incrementos
+        chegando durante o flush vão para um hash novo). Uma chave de trabalho
+        que sobrou de um flush interrompido é processada primeiro.
+        """
+        working = self.key(field, ':flushing')
+        if not self.client.exists(working):
+            try:
+                self.client.rename(self.key(field), working)
+            except Exception as e:
+                # Hash inexistente: nada a gravar
+                if 'no such key' in str(e).lower():
+                    return {}
+                raise
+        return {int(book_id): int(amount) for book_id, amount in self.client.hgetall(working).items()}
+
+    def done(self, field: str) -> None:
+        self.client.delete(self.key(field, ':flushing'))
+
+    def restore(self, field: str, deltas: Dict[int, int]) -> None:
+        pipe = self.client.pipeline(transaction=False)
+        for book_id, amount in deltas.items():
+            pipe.hincrby(self.key(field), book_id, amount)
+        pipe.delete(self.key(field, ':flushing'))
+        pipe.execute()
+
+
+class _MemoryBuffer:
+    """Incrementos pendentes no processo (alias de cache que não é Redis)"""
+
+    def __init__(self):
+        self._pending: Dict[str, Dict[int, int]] = {}
+        self._flushing: Dict[str, Dict[int, int]] = {}
+        self._lock = threading.Lock()
+
+    def incr(self, field: str, book_id: int, amount: int) -> None:
+        with self._lock:
+            counters = self._pending.setdefault(field, {})
+            counters[book_id] = counters.get(book_id, 0) + amount
+
+    def pending(self, field: str) -> Dict[int, int]:
+        with self._lock:
+            return dict(self._pending.get(field, {}))
+
+    def take(self, field: str) -> Dict[int, int]:
+        with self._lock:
+            if field not in self._flushing:
+                self._flushing[field] = self._pending.pop(field, {})
+            return dict(self._flushing[field])
+
+    def done(self, field: str) -> None:
+        with self._lock:
+            self._flushing.pop(field, None)
+
+    def restore(self, field: str, deltas: Dict[int, int]) -> None:
+        with self._lock:
+            self._flushing.pop(field, None)
+            counters = self._pending.setdefault(field, {})
+            for book_id, amount in deltas.items():
+                counters[book_id] = counters.get(book_id, 0) + amount
+
+
+class BookCounters:
+    """
+    Contadores de acessos e vendas de Book com escrita em buffer.
+
+    Cada incremento é um HINCRBY em um hash do Redis por campo, em vez de um
+    UPDATE na linha do livro (que disputa lock nos livros populares). O
+    comando flush_book_counters grava os deltas acumulados em lotes com um
+    único UPDATE ... FROM (VALUES ...) por lote e marca `counters_updated_at`,
+    para que o CatalogSnapshot pegue os novos valores na atualização
+    incremental. `updated_at` não é tocado: um acesso não é uma edição do
+    livro (SimilarityIndex e o admin dependem dele).
+
+    Entre um flush e outro, quem precisa do valor atual soma o pendente do
+    buffer ao valor do banco (pending / fresh_values). O hash inteiro é lido
+    de uma vez e guardado no processo por PENDING_TTL segundos.
+    """
+
+    FIELDS = ('quantidade_acessos', 'quantidade_vendida')
+    BATCH_SIZE = 1000
+    PENDING_TTL = 5.0
+    FLUSH_LOCK_TTL = 300
+
+    _memory_buffer: Optional[_MemoryBuffer] = None
+    _buffer_lock = threading.Lock()
+    _pending_cache: Dict[str, Tuple[float, Dict[int, int]]] = {}
+
+    def __init__(self, alias: str = 'default'):
+        self.alias = alias
+
+    def _get_buffer(self):
+        cache = caches[self.alias]
+        if hasattr(cache, 'client') and hasattr(cache.client, 'get_client'):
+            return _RedisBuffer(cache)
+
+        if BookCounters._memory_buffer is None:
+            with BookCounters._buffer_lock:
+                if BookCounters._memory_buffer is None:
+                    BookCounters._memory_buffer = _MemoryBuffer()
+        return BookCounters._memory_buffer
+
+    @classmethod
+    def reset(cls) -> None:
+        """Descarta o buffer em memória e as leituras guardadas no processo"""
+        cls._memory_buffer = None
+        cls._pending_cache = {}
+
+    # ------------------------------------------------------------------
+    # Escrita
+    # ------------------------------------------------------------------
+
+    def incr(self, book_id: int, field: str = 'quantidade_acessos', amount: int = 1) -> None:
+        """Soma ao contador; sem Redis, cai para um UPDATE direto na linha"""
+        if field not in self.FIELDS:
+            raise ValueError(f"Contador desconhecido: {field}")
+        if not book_id:
+            return
+
+        try:
+            self._get_buffer().incr(field, int(book_id), amount)
+        except Exception as e:
+            logger.error(f"Erro ao bufferizar contador {field} do livro {book_id}: {str(e)}")
+            Book.objects.filter(id=book_id).update(**{field: F(field) + amount})
+
+    # ------------------------------------------------------------------
+    # Leitura
+    # ------------------------------------------------------------------
+
+    def pending(self, field: str = 'quantidade_acessos') -> Dict[int, int]:
+        """Deltas ainda não gravados no banco ({book_id: delta})"""
+        cached = self._pending_cache.get(field)
+        if cached is not None and time.monotonic() - cached[0] < self.PENDING_TTL:
+            return cached[1]
+
+        try:
+            pending = self._get_buffer().pending(field)
+        except Exception as e:
+            logger.error(f"Erro ao ler buffer de contadores {field}: {str(e)}")
+            pending = {}
+
+        BookCounters._pending_cache[field] = (time.monotonic(), pending)
+        return pending
+
+    def fresh_values(self, book_ids: List[int], field: str = 'quantidade_acessos') -> Dict[int, int]:
+        """Valor do banco somado ao delta pendente de cada livro"""
+        pending = self.pending(field)
+        stored = dict(Book.objects.filter(id__in=book_ids).values_list('id', field))
+        return {book_id: value + pending.get(book_id, 0) for book_id, value in stored.items()}
+
+    # ------------------------------------------------------------------
+    # Flush (comando flush_book_counters)
+    # ------------------------------------------------------------------
+
+    def flush(self) -> Dict[str, int]:
+        """Grava os deltas acumulados em Book; retorna livros atualizados por campo"""
+        cache = caches[self.alias]
+        lock_key = 'book_counters:flush_lock'
+        if not cache.add(lock_key, 1, self.FLUSH_LOCK_TTL):
+            logger.info("Flush de contadores já em andamento em outro processo")
+            return {}
+
+        try:
+            buffer = self._get_buffer()
+            stats = {}
+            for field in self.FIELDS:
+                deltas = {book_id: amount for book_id, amount in buffer.take(field).items() if amount}
+                try:
+                    self._apply(field, deltas)
+                except Exception:
+                    # Devolve os deltas ao buffer para o próximo flush
+                    buffer.restore(field, deltas)
+                    raise
+                buffer.done(field)
+                stats[field] = len(deltas)
+            BookCounters._pending_cache = {}
+            return stats
+        finally:
+            cache.delete(lock_key)
+
+    def _apply(self, field: str, deltas: Dict[int, int]) -> None:
+        items = list(deltas.items())
+        now = timezone.now()
+        table = connection.ops.quote_name(Book._meta.db_table)
+        column = connection.ops.quote_name(Book._meta.get_field(field).column)
+        stamp = connection.ops.quote_name(Book._meta.get_field('counters_updated_at').column)
+
+        with transaction.atomic():
+            for start in range(0, len(items), self.BATCH_SIZE):
+                batch = items[start:start + self.BATCH_SIZE]
+                if connection.vendor not in ('postgresql', 'sqlite'):
+                    for book_id, amount in batch:
+                        Book.objects.filter(id=book_id).update(
+                            **{field: F(field) + amount, 'counters_updated_at': now}
+                        )
+                    continue
+
+                values = ', '.join(['(%s, %s)'] * len(batch))
+                params = [now] + [value for pair in batch for value in pair]
+                if connection.vendor == 'postgresql':
+                    sql = (
+                        f"UPDATE {table} AS b SET {column} = b.{column} + v.delta, {stamp} = %s "
+                        f"FROM (VALUES {values}) AS v(id, delta) WHERE b.id = v.id"
+                    )
+                else:
+                    # SQLite não aceita nomes de coluna no alias do VALUES (column1, column2)
+                    sql = (
+                        f"UPDATE {table} SET {column} = {column} + v.column2, {stamp} = %s "
+                        f"FROM (VALUES {values}) AS v WHERE {table}.id = v.column1"
+                    )
+                with connection.cursor() as cursor:
+                    cursor.execute(sql, params)
@@ -0,0 +1,418 @@
+# cgbookstore/apps/core/services/cover_store.py
+
+import hashlib
+import logging
+import os
+import tempfile
+import time
+from datetime import datetime
+from io import BytesIO
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import FileResponse, HttpResponse
+from django.utils import timezone
+from django.utils.http import http_date
+from PIL import ExifTags, Image, ImageOps, features
+
+logger = logging.getLogger(__name__)
+
+
+class CoverStore:
+    """
+    Armazém de capas do proxy de imagens, endereçado pelo conteúdo.
+
+    Os bytes ficam em disco, em arquivos nomeados pelo sha256 da imagem
+    (<raiz>/ab/cd/<sha256>); capas iguais vindas de URLs diferentes ocupam
+    um único arquivo. No alias de cache 'image_proxy' fica apenas um
+    registro pequeno de metadados por URL (sha256, content type, tamanho,
+    URL de origem).
+
+    Na entrega os bytes não passam pelo Python: FileResponse usa o
+    wsgi.file_wrapper do servidor (sendfile), ou a resposta vazia leva
+    X-Accel-Redirect (nginx) / X-Sendfile (Apache), conforme
+    IMAGE_PROXY_SERVE_MODE.
+
+    O tamanho total é limitado por IMAGE_PROXY_STORE_MAX_BYTES: o comando
+    gc_cover_store apaga os arquivos menos acessados (atime) até caber no
+    limite. Como sistemas montados com relatime/noatime não atualizam o
+    atime a cada leitura, o próprio armazém o atualiza nos acertos, no
+    máximo uma vez a cada TOUCH_INTERVAL.
+
+    Derivadas (capa redimensionada e/ou convertida para WebP/AVIF) ficam em
+    <raiz>/derived/, nomeadas por (sha256 da original, tamanho, ajuste,
+    formato); o próprio arquivo é o cache e o GC as trata como qualquer
+    outro arquivo do armazém.
+    """
+
+    TOUCH_INTERVAL = 60 * 60
+    TEMP_PREFIX = '.tmp-'
+    TEMP_MAX_AGE = 60 * 60
+    DERIVED_DIR = 'derived'
+
+    # Formatos de saída das derivadas: content type e opções do encoder
+    FORMATS = {
+        'avif': ('image/avif', {'quality': 50, 'speed': 8}),
+        'webp': ('image/webp', {'quality': 80, 'method': 4}),
+        'jpeg': ('image/jpeg', {'quality': 82, 'optimize': True, 'progressive': True}),
+        'png': ('image/png', {'optimize': True}),
+    }
+    FITS = ('contain', 'cover')
+
+    def __init__(self, root: Optional[str] = None, alias: str = 'image_proxy'):
+        self.root = root or getattr(
+            settings, 'IMAGE_PROXY_STORE_DIR', os.path.join(settings.MEDIA_ROOT, 'covers')
+        )
+        self.alias = alias
+        self.max_bytes = getattr(settings, 'IMAGE_PROXY_STORE_MAX_BYTES', 2 * 1024 ** 3)
+        self.serve_mode = getattr(settings, 'IMAGE_PROXY_SERVE_MODE', 'file')
+        self.accel_prefix = getattr(settings, 'IMAGE_PROXY_ACCEL_PREFIX', '/protected/covers/')
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    # ------------------------------------------------------------------
+    # Arquivos
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def digest(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    @staticmethod
+    def relative_path(digest: str) -> str:
+        return os.path.join(digest[:2], digest[2:4], digest)
+
+    def path(self, digest: str) -> str:
+        return os.path.join(self.root, self.relative_path(digest))
+
+    def write(self, data: bytes) -> str:
+        """Grava os bytes (se ainda não existirem) e retorna o sha256"""
+        digest = self.digest(data)
+        path = self.path(digest)
+        if os.path.exists(path):
+            self.touch(path, force=True)
+            return digest
+
+        self._write_file(path, data)
+        return digest
+
+    def _write_file(self, path: str, data: bytes) -> None:
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        # Escrita atômica: leitores concorrentes nunca veem um arquivo parcial
+        handle, temp_path = tempfile.mkstemp(prefix=self.TEMP_PREFIX, dir=directory)
+        try:
+            with os.fdopen(handle, 'wb') as temp_file:
+                temp_file.write(data)
+            os.replace(temp_path, path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def touch(self, path: str, force: bool = False) -> None:
+        """Atualiza o atime usado pelo LRU (no máximo a cada TOUCH_INTERVAL)"""
+        try:
+            stat = os.stat(path)
+            now = time.time()
+            if force or now - stat.st_atime > self.TOUCH_INTERVAL:
+                os.utime(path, (now, stat.st_mtime))
+        except OSError as e:
+            logger.warning(f"Erro ao atualizar atime de {path}: {str(e)}")
+
+    # ------------------------------------------------------------------
+    # Metadados (cache 'image_proxy')
+    # ------------------------------------------------------------------
+
+    def put(self, cache_key: str, content_type: str, data: bytes, timeout: int, **extra) -> Dict:
+        """Grava a imagem em disco e o registro de metadados da URL"""
+        record = {
+            'sha256': self.write(data),
+            'content_type': content_type,
+            'size': len(data),
+            'timestamp': timezone.now().isoformat(),
+            **extra,
+        }
+        self.cache.set(cache_key, record, timeout=timeout)
+        return record
+
+    def get(self, cache_key: str) -> Optional[Dict]:
+        """
+        Registro da URL, se o arquivo ainda existir. Entradas no formato
+        antigo (tupla com os bytes) são migradas para o disco na leitura.
+        """
+        try:
+            record = self.cache.get(cache_key)
+        except Exception as e:
+            logger.warning(f"Erro ao recuperar do cache {cache_key}: {str(e)}")
+            self.cache.delete(cache_key)
+            return None
+
+        if isinstance(record, tuple) and len(record) in (2, 3):
+            content_type, data = record[0], record[1]
+            extra = record[2] if len(record) == 3 and isinstance(record[2], dict) else {}
+            return self.put(cache_key, content_type, data, self.cache.default_timeout, **extra)
+
+        if not isinstance(record, dict) or 'sha256' not in record:
+            return None
+
+        path = self.path(record['sha256'])
+        if not os.path.exists(path):
+            # Arquivo removido pelo GC: trata como miss
+            self.cache.delete(cache_key)
+            return None
+
+        self.touch(path)
+        return record
+
+    def delete(self, cache_key: str) -> None:
+        """Remove o registro da URL (o arquivo fica para o GC)"""
+        try:
+            self.cache.delete(cache_key)
+        except Exception as e:
+            logger.warning(f"Erro ao remover do cache {cache_key}: {str(e)}")
+
+    # ------------------------------------------------------------------
+    # Derivadas (redimensionamento e conversão de formato)
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def supported_formats(cls) -> Tuple[str, ...]:
+        """Formatos de saída que o Pillow instalado consegue gravar"""
+        return tuple(fmt for fmt in cls.FORMATS if fmt not in ('avif', 'webp') or features.check(fmt))
+
+    @classmethod
+    def derivative_name(cls, record: Dict, width: int = 0, height: int = 0,
+                        fit: str = 'contain', fmt: Optional[str] = None) -> Tuple[str, str, str]:
+        """(nome do arquivo, ajuste, formato) da derivada, sem gerá-la"""
+        fmt = fmt or cls._format_of(record.get('content_type'))
+        fit = fit if fit in cls.FITS else 'contain'
+        return f"{record['sha256']}-{width}x{height}-{fit}.{fmt}", fit, fmt
+
+    @classmethod
+    def derivative_relative_path(cls, digest: str, filename: str) -> str:
+        return os.path.join(cls.DERIVED_DIR, digest[:2], digest[2:4], filename)
+
+    def derivative(self, record: Dict, width: int = 0, height: int = 0,
+                   fit: str = 'contain', fmt: Optional[str] = None) -> Dict:
+        """
+        Registro da derivada da capa em (largura, altura, ajuste, formato),
+        gerada na primeira vez e reaproveitada do disco depois. Dimensões 0
+        mantêm a proporção; a capa nunca é ampliada.
+        """
+        digest = record['sha256']
+        filename, fit, fmt = self.derivative_name(record, width, height, fit, fmt)
+        relative_path = self.derivative_relative_path(digest, filename)
+        path = os.path.join(self.root, relative_path)
+
+        if os.path.exists(path):
+            self.touch(path)
+        else:
+            self._write_file(path, self._render(self.path(digest), width, height, fit, fmt))
+
+        return {
+            'sha256': digest,
+            'relative_path': relative_path,
+            'content_type': self.FORMATS[fmt][0],
+            'size': os.path.getsize(path),
+            'timestamp': record.get('timestamp'),
+            'etag': f'"{filename}"',
+        }
+
+    def _render(self, source_path: str, width: int, height: int, fit: str, fmt: str) -> bytes:
+        with Image.open(source_path) as image:
+            # Orientação EXIF de 90°/270°: a caixa é calculada sobre o tamanho já girado
+            rotated = image.getexif().get(ExifTags.Base.Orientation, 1) in (5, 6, 7, 8)
+            box = self._target_box(image.size[::-1] if rotated else image.size, width, height, fit)
+            # JPEG: decodifica já reduzido por 1/2, 1/4 ou 1/8 (escala DCT), na orientação gravada
+            image.draft('RGB', box[::-1] if rotated else box)
+            image = ImageOps.exif_transpose(image)
+
+            if fit == 'cover' and width and height:
+                image = self._reduce(image, box)
+                image = ImageOps.fit(image, box, method=Image.Resampling.LANCZOS)
+            elif box != image.size:
+                image = self._reduce(image, box)
+                image = image.resize(box, Image.Resampling.LANCZOS)
+
+            if fmt == 'jpeg' and image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+            elif image.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+                image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+
+            output = BytesIO()
+            image.save(output, format=fmt.upper(), **self.FORMATS[fmt][1])
+            return output.getvalue()
+
+    @staticmethod
+    def _target_box(size: Tuple[int, int], width: int, height: int, fit: str) -> Tuple[int, int]:
+        """Tamanho final da derivada, sem ampliar a original"""
+        source_width, source_height = size
+        if not width and not height:
+            return size
+        if width and height and fit == 'cover':
+            # Caixa exata (a capa é recortada), reduzida se a original for menor
+            scale = min(1.0, source_width / width, source_height / height)
+            return max(1, round(width * scale)), max(1, round(height * scale))
+        scales = [value / source for value, source in ((width, source_width), (height, source_height)) if value]
+        scale = min([1.0] + scales)
+        return max(1, round(source_width * scale)), max(1, round(source_height * scale))
+
+    @staticmethod
+    def _reduce(image: Image.Image, box: Tuple[int, int]) -> Image.Image:
+        """Redução inteira rápida (Image.reduce) até perto do tamanho final"""
+        factor = min(image.width // max(1, box[0]), image.height // max(1, box[1]))
+        if factor >= 2:
+            return image.reduce(factor)
+        return image
+
+    @classmethod
+    def _format_of(cls, content_type: Optional[str]) -> str:
+        subtype = (content_type or '').split('/')[-1].split(';')[0].strip().lower()
+        subtype = 'jpeg' if subtype in ('jpg', 'pjpeg') else subtype
+        return subtype if subtype in cls.FORMATS else 'jpeg'
+
+    # ------------------------------------------------------------------
+    # Validadores HTTP (ETag / Last-Modified)
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def etag(cls, record: Dict, variant: Optional[Dict] = None) -> str:
+        """
+        ETag forte derivado do conteúdo: o sha256 da original, ou o nome da
+        derivada (sha256 + tamanho + ajuste + formato). Calculado só com os
+        metadados, sem ler nem gerar o arquivo.
+        """
+        if record.get('etag'):
+            return record['etag']
+        if variant:
+            return f'"{cls.derivative_name(record, **variant)[0]}"'
+        return f'"{record["sha256"]}"'
+
+    @staticmethod
+    def last_modified(record: Dict) -> Optional[int]:
+        # Segundos inteiros, como em If-Modified-Since
+        try:
+            return int(datetime.fromisoformat(record['timestamp']).timestamp())
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    def file_validators(self, path: str) -> Tuple[str, int]:
+        """
+        (ETag, Last-Modified) de um arquivo local fora do armazém (mídia
+        enviada pelo admin). O sha256 é calculado uma vez por versão do
+        arquivo (mtime + tamanho) e guardado no cache; revalidações seguintes
+        só fazem stat.
+        """
+        stat = os.stat(path)
+        path_hash = hashlib.md5(path.encode()).hexdigest()
+        cache_key = f'media_etag:{path_hash}:{stat.st_mtime_ns}:{stat.st_size}'
+
+        digest = self.cache.get(cache_key)
+        if digest is None:
+            hasher = hashlib.sha256()
+            with open(path, 'rb') as media_file:
+                for chunk in iter(lambda: media_file.read(64 * 1024), b''):
+                    hasher.update(chunk)
+            digest = hasher.hexdigest()
+            self.cache.set(cache_key, digest)
+
+        return f'"{digest}"', int(stat.st_mtime)
+
+    # ------------------------------------------------------------------
+    # Entrega
+    # ------------------------------------------------------------------
+
+    def response(self, record: Dict) -> HttpResponse:
+        """Resposta que entrega o arquivo sem copiar os bytes pelo Python"""
+        relative_path = record.get('relative_path') or self.relative_path(record['sha256'])
+        content_type = record.get('content_type') or 'image/jpeg'
+
+        if self.serve_mode == 'x-accel':
+            response = HttpResponse(content_type=content_type)
+            response['X-Accel-Redirect'] = self.accel_prefix.rstrip('/') + '/' + relative_path.replace(os.sep, '/')
+        elif self.serve_mode == 'x-sendfile':
+            response = HttpResponse(content_type=content_type)
+            response['X-Sendfile'] = os.path.join(self.root, relative_path)
+        else:
+            response = FileResponse(open(os.path.join(self.root, relative_path), 'rb'), content_type=content_type)
+
+        if record.get('size'):
+            response['Content-Length'] = str(record['size'])
+        response['ETag'] = self.etag(record)
+        last_modified = self.last_modified(record)
+        if last_modified:
+            response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    # ------------------------------------------------------------------
+    # Coleta de lixo (comando gc_cover_store)
+    # ------------------------------------------------------------------
+
+    def usage(self) -> Dict[str, int]:
+        files, total = 0, 0
+        for entry in self._scan():
+            files += 1
+            total += entry[2]
+        return {'files': files, 'bytes': total}
+
+    def gc(self, max_bytes: Optional[int] = None, dry_run: bool = False) -> Dict[str, int]:
+        """
+        Apaga os arquivos menos acessados até o total caber em `max_bytes`,
+        e temporários abandonados por gravações interrompidas. Registros de
+        metadados que apontam para arquivos apagados viram miss na leitura.
+        """
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        stats = {'files': 0, 'bytes': 0, 'removed': 0, 'freed': 0, 'temp_removed': 0}
+
+        entries = []
+        now = time.time()
+        for path, atime, size, is_temp, mtime in self._scan(include_temp=True):
+            if is_temp:
+                if now - mtime > self.TEMP_MAX_AGE:
+                    stats['temp_removed'] += 1
+                    if not dry_run:
+                        self._remove(path)
+                continue
+            entries.append((atime, path, size))
+            stats['files'] += 1
+            stats['bytes'] += size
+
+        total = stats['bytes']
+        for atime, path, size in sorted(entries):
+            if total <= max_bytes:
+                break
+            if dry_run or self._remove(path):
+                total -= size
+                stats['removed'] += 1
+                stats['freed'] += size
+
+        return stats
+
+    def _scan(self, include_temp: bool = False):
+        """(caminho, atime, tamanho, temporário, mtime) de cada arquivo do armazém"""
+        if not os.path.isdir(self.root):
+            return
+        for directory, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                is_temp = filename.startswith(self.TEMP_PREFIX)
+                if is_temp and not include_temp:
+                    continue
+                path = os.path.join(directory, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield path, stat.st_atime, stat.st_size, is_temp, stat.st_mtime
+
+    @staticmethod
+    def _remove(path: str) -> bool:
+        try:
+            os.remove(path)
+            return True
+        except OSError as e:
+            logger.warning(f"Erro ao remover {path}: {str(e)}")
+            return False
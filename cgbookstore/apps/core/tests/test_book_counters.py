@@ -0,0 +1,114 @@
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from cgbookstore.apps.core.models import Book
+from cgbookstore.apps.core.recommendations.services.catalog_snapshot import CatalogSnapshot
+from cgbookstore.apps.core.recommendations.tests.test_helpers import LOCMEM_CACHES
+from cgbookstore.apps.core.services.book_counters import BookCounters
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class BookCountersTest(TestCase):
+    """
+    Testes dos contadores de acessos/vendas com escrita em buffer.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.books = [
+            Book.objects.create(titulo=f'Contador {i}', autor='Autor C', quantidade_acessos=10)
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        BookCounters.reset()
+        CatalogSnapshot.reset()
+        self.addCleanup(BookCounters.reset)
+        self.addCleanup(CatalogSnapshot.reset)
+        self.counters = BookCounters()
+
+    def test_increments_do_not_touch_rows(self):
+        """Incrementos ficam no buffer, sem UPDATE em Book"""
+        with CaptureQueriesContext(connection) as queries:
+            for _ in range(5):
+                self.counters.incr(self.books[0].id)
+
+        self.assertEqual(len(queries), 0)
+        self.books[0].refresh_from_db()
+        self.assertEqual(self.books[0].quantidade_acessos, 10)
+        self.assertEqual(self.counters.fresh_values([self.books[0].id]), {self.books[0].id: 15})
+
+    def test_flush_applies_deltas_in_one_statement(self):
+        """O flush grava todos os livros do campo com um único UPDATE ... FROM (VALUES)"""
+        for book in self.books:
+            self.counters.incr(book.id, amount=book.id)
+        self.counters.incr(self.books[1].id, 'quantidade_vendida', 2)
+
+        with CaptureQueriesContext(connection) as queries:
+            stats = self.counters.flush()
+
+        updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 2)
+        self.assertIn('VALUES', updates[0])
+        self.assertEqual(stats, {'quantidade_acessos': 3, 'quantidade_vendida': 1})
+
+        for book in self.books:
+            book.refresh_from_db()
+            self.assertEqual(book.quantidade_acessos, 10 + book.id)
+        self.assertEqual(self.books[1].quantidade_vendida, 2)
+        self.assertEqual(self.counters.pending('quantidade_acessos'), {})
+
+    def test_failed_flush_keeps_deltas(self):
+        """Se a gravação falha, os deltas voltam ao buffer"""
+        self.counters.incr(self.books[0].id, amount=3)
+
+        with patch.object(BookCounters, '_apply', side_effect=RuntimeError('db down')):
+            with self.assertRaises(RuntimeError):
+                self.counters.flush()
+
+        self.assertEqual(self.counters.pending('quantidade_acessos'), {self.books[0].id: 3})
+
+    def test_snapshot_reads_buffered_values(self):
+        """O scoring enxerga os acessos ainda não gravados no banco"""
+        snapshot = CatalogSnapshot.current()
+        self.counters.incr(self.books[2].id, amount=7)
+
+        features = snapshot.features([self.books[2].id, self.books[0].id])
+
+        self.assertEqual(list(features['quantidade_acessos']), [17, 10])
+
+    def test_command_flushes(self):
+        """O comando grava o buffer no banco"""
+        self.counters.incr(self.books[0].id, 'quantidade_vendida', 4)
+
+        call_command('flush_book_counters', stdout=StringIO())
+
+        self.books[0].refresh_from_db()
+        self.assertEqual(self.books[0].quantidade_vendida, 4)
+
+    def test_flush_keeps_updated_at(self):
+        """O flush marca counters_updated_at sem tocar updated_at"""
+        book = self.books[0]
+        updated_at = Book.objects.get(id=book.id).updated_at
+        self.counters.incr(book.id, amount=2)
+
+        self.counters.flush()
+
+        book.refresh_from_db()
+        self.assertEqual(book.updated_at, updated_at)
+        self.assertIsNotNone(book.counters_updated_at)
+
+    def test_snapshot_refresh_picks_up_flushed_counters(self):
+        """A atualização incremental do snapshot encontra os livros do flush"""
+        snapshot = CatalogSnapshot.current()
+        self.counters.incr(self.books[1].id, amount=5)
+        self.counters.flush()
+
+        snapshot.refresh()
+
+        self.assertEqual(list(snapshot.features([self.books[1].id])['quantidade_acessos']), [15])
@@ -0,0 +1,351 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from io import BytesIO, StringIO
+from unittest.mock import patch
+
+from django.core.cache import caches
+from django.core.management import call_command
+from django.http import FileResponse
+from django.test import RequestFactory, TestCase, override_settings
+from PIL import ExifTags, Image
+
+from cgbookstore.apps.core.recommendations.tests.test_helpers import LOCMEM_CACHES
+from cgbookstore.apps.core.services.cover_store import CoverStore
+from cgbookstore.apps.core.views import image_proxy
+
+
+def make_cover(color='red'):
+    buffer = BytesIO()
+    Image.new('RGB', (120, 180), color).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def make_photo(size=(400, 600), orientation=None):
+    buffer = BytesIO()
+    image = Image.effect_noise(size, 60).convert('RGB')
+    exif = Image.Exif()
+    if orientation:
+        exif[ExifTags.Base.Orientation] = orientation
+    image.save(buffer, format='JPEG', quality=95, exif=exif)
+    return buffer.getvalue()
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CoverStoreTest(TestCase):
+    """
+    Testes do armazém de capas em disco do proxy de imagens.
+    """
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix='covers-')
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.store = CoverStore(root=self.root)
+        self.cover = make_cover()
+        caches['image_proxy'].clear()
+
+    def _read(self, response):
+        content = b''.join(response.streaming_content)
+        response.close()
+        return content
+
+    def test_identical_covers_share_one_file(self):
+        first = self.store.put('url-a', 'image/png', self.cover, 60)
+        second = self.store.put('url-b', 'image/png', self.cover, 60)
+
+        self.assertEqual(first['sha256'], second['sha256'])
+        self.assertEqual(self.store.usage(), {'files': 1, 'bytes': len(self.cover)})
+
+    def test_cache_keeps_only_metadata(self):
+        self.store.put('url-a', 'image/png', self.cover, 60, original_url='https://books.google.com/x')
+
+        record = caches['image_proxy'].get('url-a')
+        self.assertNotIn(self.cover, [value for value in record.values()])
+        self.assertEqual(record['size'], len(self.cover))
+        self.assertEqual(record['original_url'], 'https://books.google.com/x')
+
+    def test_file_response_streams_from_disk(self):
+        record = self.store.put('url-a', 'image/png', self.cover, 60)
+
+        response = self.store.response(self.store.get('url-a'))
+
+        self.assertIsInstance(response, FileResponse)
+        self.assertEqual(response['Content-Length'], str(len(self.cover)))
+        self.assertEqual(self._read(response), self.cover)
+        self.assertEqual(record['content_type'], response['Content-Type'])
+
+    def test_x_accel_redirect(self):
+        with self.settings(IMAGE_PROXY_SERVE_MODE='x-accel', IMAGE_PROXY_ACCEL_PREFIX='/protected/covers/'):
+            store = CoverStore(root=self.root)
+        record = store.put('url-a', 'image/png', self.cover, 60)
+
+        response = store.response(record)
+
+        sha = record['sha256']
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected/covers/{sha[:2]}/{sha[2:4]}/{sha}')
+        self.assertEqual(response.content, b'')
+
+    def test_legacy_tuple_migrated_to_disk(self):
+        """Entradas antigas com os bytes no cache passam a apontar para o disco"""
+        caches['image_proxy'].set('url-a', ('image/png', self.cover, {'original_url': 'x'}))
+
+        record = self.store.get('url-a')
+
+        self.assertEqual(record['sha256'], CoverStore.digest(self.cover))
+        self.assertIsInstance(caches['image_proxy'].get('url-a'), dict)
+        self.assertTrue(os.path.exists(self.store.path(record['sha256'])))
+
+    def test_missing_file_is_a_miss(self):
+        record = self.store.put('url-a', 'image/png', self.cover, 60)
+        os.remove(self.store.path(record['sha256']))
+
+        self.assertIsNone(self.store.get('url-a'))
+        self.assertIsNone(caches['image_proxy'].get('url-a'))
+
+    def test_gc_removes_least_recently_accessed(self):
+        covers = [make_cover(color) for color in ('red', 'green', 'blue')]
+        records = [self.store.put(f'url-{i}', 'image/png', cover, 60) for i, cover in enumerate(covers)]
+        now = time.time()
+        # green é o menos acessado, depois red
+        for record, age in zip(records, (200, 300, 100)):
+            os.utime(self.store.path(record['sha256']), (now - age, now - age))
+
+        stats = self.store.gc(max_bytes=len(covers[2]))
+
+        self.assertEqual(stats['removed'], 2)
+        remaining = [os.path.exists(self.store.path(record['sha256'])) for record in records]
+        self.assertEqual(remaining, [False, False, True])
+
+    def test_gc_removes_stale_temp_files(self):
+        directory = os.path.join(self.root, 'ab', 'cd')
+        os.makedirs(directory)
+        temp_path = os.path.join(directory, CoverStore.TEMP_PREFIX + 'abandonado')
+        with open(temp_path, 'wb') as temp_file:
+            temp_file.write(b'x')
+        old = time.time() - CoverStore.TEMP_MAX_AGE - 10
+        os.utime(temp_path, (old, old))
+
+        self.assertEqual(self.store.gc()['temp_removed'], 1)
+        self.assertFalse(os.path.exists(temp_path))
+
+    def test_gc_command(self):
+        self.store.put('url-a', 'image/png', self.cover, 60)
+        out = StringIO()
+
+        with self.settings(IMAGE_PROXY_STORE_DIR=self.root):
+            call_command('gc_cover_store', max_bytes=0, dry_run=True, stdout=out)
+
+        self.assertIn('1 capas removidas', out.getvalue())
+        self.assertEqual(self.store.usage()['files'], 1)
+
+    def test_proxy_serves_hits_from_disk(self):
+        """Primeira requisição grava no armazém; a segunda não busca a fonte"""
+        url = 'https://books.google.com/books/content?id=abc123&printsec=frontcover&img=1'
+        request = RequestFactory().get('/image-proxy/', {'url': url})
+        fetched = ('image/png', self.cover, url)
+
+        with patch.object(image_proxy, 'cover_store', self.store), \
+                patch.object(image_proxy, 'try_fetch_image', return_value=fetched) as fetch:
+            first = image_proxy.google_books_image_proxy(request)
+            second = image_proxy.google_books_image_proxy(request)
+
+        self.assertEqual(fetch.call_count, 1)
+        self.assertIsInstance(second, FileResponse)
+        self.assertEqual(self._read(first), self.cover)
+        self.assertEqual(self._read(second), self.cover)
+
+    def test_file_removed_after_lookup_is_refetched(self):
+        """Arquivo apagado pelo GC entre o registro e a entrega: busca de novo, sem marcar a URL"""
+        url = 'https://books.google.com/books/content?id=gone123&printsec=frontcover&img=1'
+        request = RequestFactory().get('/image-proxy/', {'url': url})
+        cache_key = image_proxy.generate_cache_key(image_proxy.normalize_image_url(url))
+        record = self.store.put(cache_key, 'image/png', self.cover, 60)
+        fetched = ('image/png', make_cover('blue'), url)
+
+        def lookup_then_gc(key):
+            found = self.store.get(key)
+            if found and found['sha256'] == record['sha256']:
+                os.remove(self.store.path(record['sha256']))
+            return found
+
+        with patch.object(image_proxy, 'cover_store', self.store), \
+                patch.object(image_proxy, 'get_cached_image', side_effect=lookup_then_gc), \
+                patch.object(image_proxy, 'try_fetch_image', return_value=fetched) as fetch:
+            response = image_proxy.google_books_image_proxy(request)
+
+        fetch.assert_called_once()
+        self.assertEqual(self._read(response), fetched[1])
+        self.assertFalse(image_proxy.is_url_recently_failed(url))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CoverDerivativeTest(TestCase):
+    """
+    Testes das derivadas (redimensionamento e formato negociado) das capas.
+    """
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix='covers-')
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.store = CoverStore(root=self.root)
+        self.photo = make_photo()
+        self.record = self.store.put('url-a', 'image/jpeg', self.photo, 60)
+        self.addCleanup(image_proxy.FAILED_URLS_CACHE.clear)
+
+    def _open(self, derived):
+        return Image.open(os.path.join(self.root, derived['relative_path']))
+
+    def test_resize_keeps_aspect_ratio(self):
+        derived = self.store.derivative(self.record, width=120)
+
+        self.assertEqual(self._open(derived).size, (120, 180))
+        self.assertEqual(derived['content_type'], 'image/jpeg')
+        self.assertLess(derived['size'], len(self.photo))
+
+    def test_resize_follows_exif_orientation(self):
+        """A caixa é calculada sobre a imagem já girada pela orientação EXIF"""
+        record = self.store.put('url-rotated', 'image/jpeg', make_photo((400, 200), orientation=6), 60)
+
+        derived = self.store.derivative(record, width=100)
+
+        self.assertEqual(self._open(derived).size, (100, 200))
+
+    def test_cover_fit_crops_to_box(self):
+        derived = self.store.derivative(self.record, width=120, height=120, fit='cover')
+
+        self.assertEqual(self._open(derived).size, (120, 120))
+
+    def test_never_upscales(self):
+        derived = self.store.derivative(self.record, width=1000)
+
+        self.assertEqual(self._open(derived).size, (400, 600))
+
+    def test_format_conversion(self):
+        derived = self.store.derivative(self.record, width=120, fmt='webp')
+
+        self.assertEqual(derived['content_type'], 'image/webp')
+        self.assertEqual(self._open(derived).format, 'WEBP')
+
+    def test_derivative_reused_from_disk(self):
+        first = self.store.derivative(self.record, width=120, fmt='webp')
+
+        with patch.object(CoverStore, '_render') as render:
+            second = self.store.derivative(self.record, width=120, fmt='webp')
+
+        render.assert_not_called()
+        self.assertEqual(first, second)
+
+    def test_variant_parsing(self):
+        request = RequestFactory().get(
+            '/image-proxy/', {'w': '121', 'h': '9999', 'fit': 'stretch'},
+            HTTP_ACCEPT='image/avif;q=0,image/webp,*/*;q=0.8'
+        )
+
+        self.assertEqual(
+            image_proxy.parse_variant(request),
+            {'width': 140, 'height': 1200, 'fit': 'contain', 'fmt': 'webp'}
+        )
+        self.assertIsNone(image_proxy.parse_variant(RequestFactory().get('/image-proxy/', HTTP_ACCEPT='image/*')))
+
+    def test_proxy_serves_negotiated_thumbnail(self):
+        url = 'https://books.google.com/books/content?id=thumb123&printsec=frontcover&img=1'
+        request = RequestFactory().get('/image-proxy/', {'url': url, 'w': '120'}, HTTP_ACCEPT='image/webp,*/*')
+
+        with patch.object(image_proxy, 'cover_store', self.store), \
+                patch.object(image_proxy, 'try_fetch_image', return_value=('image/jpeg', self.photo, url)):
+            response = image_proxy.google_books_image_proxy(request)
+
+        content = b''.join(response.streaming_content)
+        response.close()
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertIn('Accept', response['Vary'])
+        self.assertEqual(Image.open(BytesIO(content)).size, (120, 180))
+        self.assertLess(len(content), len(self.photo) / 5)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ConditionalRequestTest(TestCase):
+    """
+    Testes dos validadores HTTP (ETag/Last-Modified) e das respostas 304.
+    """
+
+    URL = 'https://books.google.com/books/content?id=etag123&printsec=frontcover&img=1'
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix='covers-')
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.store = CoverStore(root=self.root)
+        self.store.cache.clear()
+        self.photo = make_photo()
+        patcher = patch.object(image_proxy, 'cover_store', self.store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(image_proxy.FAILED_URLS_CACHE.clear)
+
+    def _get(self, params=None, **headers):
+        request = RequestFactory().get('/image-proxy/', {'url': self.URL, **(params or {})}, **headers)
+        with patch.object(image_proxy, 'try_fetch_image', return_value=('image/jpeg', self.photo, self.URL)):
+            response = image_proxy.google_books_image_proxy(request)
+        if hasattr(response, 'close'):
+            response.close()
+        return response
+
+    def test_strong_etag_from_content_hash(self):
+        response = self._get()
+
+        self.assertEqual(response['ETag'], f'"{CoverStore.digest(self.photo)}"')
+        self.assertIn('Last-Modified', response)
+
+    def test_if_none_match_skips_file(self):
+        etag = self._get()['ETag']
+
+        with patch.object(CoverStore, 'response') as build_response:
+            response = self._get(HTTP_IF_NONE_MATCH=etag)
+
+        build_response.assert_not_called()
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertIn('Accept', response['Vary'])
+
+    def test_if_modified_since(self):
+        last_modified = self._get()['Last-Modified']
+
+        self.assertEqual(self._get(HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+    def test_derivative_revalidated_without_rendering(self):
+        params = {'w': '120'}
+        first = self._get(params, HTTP_ACCEPT='image/webp')
+
+        self.assertNotEqual(first['ETag'], f'"{CoverStore.digest(self.photo)}"')
+        with patch.object(CoverStore, '_render') as render:
+            response = self._get(params, HTTP_ACCEPT='image/webp', HTTP_IF_NONE_MATCH=first['ETag'])
+
+        render.assert_not_called()
+        self.assertEqual(response.status_code, 304)
+        # Outro formato é outra representação: o ETag antigo não vale
+        self.assertEqual(self._get(params, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 200)
+
+    def test_local_media_etag(self):
+        """Mídia local ganha ETag do conteúdo; o hash é calculado uma vez por versão do arquivo"""
+        media_root = tempfile.mkdtemp(prefix='media-')
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        os.makedirs(os.path.join(media_root, 'livros', 'capas'))
+        with open(os.path.join(media_root, 'livros', 'capas', 'capa.jpg'), 'wb') as media_file:
+            media_file.write(self.photo)
+
+        def serve(**headers):
+            request = RequestFactory().get('/media/livros/capas/capa.jpg', **headers)
+            response = image_proxy.serve_media(request, 'livros/capas/capa.jpg', document_root=media_root)
+            if hasattr(response, 'close'):
+                response.close()
+            return response
+
+        with patch('cgbookstore.apps.core.services.cover_store.hashlib.sha256', wraps=hashlib.sha256) as sha256:
+            first = serve()
+            second = serve(HTTP_IF_NONE_MATCH=first['ETag'])
+
+        self.assertEqual(first['ETag'], f'"{CoverStore.digest(self.photo)}"')
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(sha256.call_count, 1)
@@ -0,0 +1,230 @@
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from unittest.mock import patch
+
+from django.http import FileResponse, HttpResponseRedirect
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from PIL import Image
+
+from cgbookstore.apps.core.recommendations.tests.test_helpers import LOCMEM_CACHES
+from cgbookstore.apps.core.services.cover_store import CoverStore
+from cgbookstore.apps.core.views import image_proxy
+
+
+def make_cover():
+    image = Image.effect_noise((200, 300), 80).convert('RGB')
+    buffer = BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+class FakeResponse:
+    def __init__(self, data, status_code=200, content_type='image/png', chunk_delay=0.0, chunks=4):
+        self.data = data
+        self.status_code = status_code
+        self.headers = {'Content-Type': content_type}
+        self.chunk_delay = chunk_delay
+        self.chunks = chunks
+        self.chunks_read = 0
+
+    def iter_content(self, chunk_size=1):
+        size = max(1, len(self.data) // self.chunks + 1)
+        for start in range(0, len(self.data), size):
+            time.sleep(self.chunk_delay)
+            self.chunks_read += 1
+            yield self.data[start:start + size]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class HedgedFetchTest(SimpleTestCase):
+    """
+    Testes da busca paralela (hedged) das URLs candidatas do proxy de imagens.
+    """
+
+    def setUp(self):
+        self.cover = make_cover()
+
+    def _serve(self, responses):
+        """Simula requests.get devolvendo a resposta configurada para cada URL"""
+        calls = []
+        lock = threading.Lock()
+
+        def fake_get(url, **kwargs):
+            with lock:
+                calls.append(url)
+            response = responses[url]
+            if isinstance(response, Exception):
+                raise response
+            return response
+
+        return patch.object(image_proxy.requests, 'get', side_effect=fake_get), calls
+
+    def test_first_valid_candidate_wins(self):
+        """Uma URL lenta não segura a resposta; o download dela é abandonado"""
+        slow = FakeResponse(self.cover, chunk_delay=0.5)
+        responses = {'slow': slow, 'fast': FakeResponse(self.cover)}
+        mock_get, calls = self._serve(responses)
+
+        started = time.monotonic()
+        with mock_get:
+            result = image_proxy.try_fetch_image(['slow', 'fast'])
+        elapsed = time.monotonic() - started
+
+        self.assertEqual(result, ('image/png', self.cover, 'fast'))
+        self.assertLess(elapsed, 0.5)
+        time.sleep(0.6)
+        self.assertLess(slow.chunks_read, slow.chunks)
+
+    def test_failures_release_next_candidates_without_sleep(self):
+        """Falhas liberam as próximas candidatas imediatamente, sem esperas entre tentativas"""
+        responses = {f'bad-{i}': FakeResponse(b'', status_code=404) for i in range(6)}
+        responses['good'] = FakeResponse(self.cover)
+        mock_get, calls = self._serve(responses)
+
+        started = time.monotonic()
+        with mock_get:
+            result = image_proxy.try_fetch_image([f'bad-{i}' for i in range(6)] + ['good'])
+
+        self.assertEqual(result[2], 'good')
+        self.assertEqual(len(calls), 7)
+        self.assertLess(time.monotonic() - started, 0.5)
+
+    def test_invalid_images_are_skipped(self):
+        responses = {
+            'html': FakeResponse(b'<html>', content_type='text/html'),
+            'tiny': FakeResponse(b'x' * 10),
+            'error': image_proxy.requests.exceptions.ConnectionError('falhou'),
+        }
+        mock_get, calls = self._serve(responses)
+
+        with mock_get:
+            self.assertIsNone(image_proxy.try_fetch_image(list(responses)))
+        self.assertEqual(sorted(calls), sorted(responses))
+
+    def test_overall_deadline(self):
+        """Candidatas que não terminam no prazo não seguram o worker"""
+        responses = {f'hang-{i}': FakeResponse(self.cover, chunk_delay=1.0) for i in range(3)}
+        mock_get, calls = self._serve(responses)
+
+        started = time.monotonic()
+        with mock_get, self.assertRaises(image_proxy.FetchDeadlineExceeded):
+            image_proxy.try_fetch_image(list(responses), deadline=0.3)
+
+        self.assertLess(time.monotonic() - started, 0.6)
+
+    def test_queued_candidates_do_not_hedge(self):
+        """Com o pool ocupado, candidatas na fila não disparam hedges e o prazo só conta ao começar"""
+        pool = ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(pool.shutdown)
+        pool.submit(time.sleep, 0.5)
+        responses = {f'url-{i}': FakeResponse(self.cover) for i in range(5)}
+        mock_get, calls = self._serve(responses)
+
+        with patch.object(image_proxy, 'get_fetch_pool', return_value=pool), \
+                patch.object(pool, 'submit', wraps=pool.submit) as submit, \
+                patch.dict(image_proxy.CONFIG, hedge_width=1, hedge_delay=0.05), mock_get:
+            result = image_proxy.try_fetch_image(list(responses), deadline=0.3)
+
+        self.assertEqual(result[2], 'url-0')
+        self.assertEqual(submit.call_count, 1)
+
+    def test_hedges_after_delay(self):
+        """Sem resposta no intervalo de hedge, mais uma candidata é disparada"""
+        responses = {f'slow-{i}': FakeResponse(self.cover, chunk_delay=0.3) for i in range(5)}
+        mock_get, calls = self._serve(responses)
+
+        with patch.dict(image_proxy.CONFIG, hedge_width=1, hedge_delay=0.05, hedge_max_in_flight=3), mock_get:
+            result = image_proxy.try_fetch_image(list(responses))
+
+        self.assertEqual(result[2], 'slow-0')
+        self.assertEqual(len(calls), 3)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class SingleFlightTest(TestCase):
+    """
+    Testes da coalescência de requisições concorrentes para a mesma capa.
+    """
+
+    URL = 'https://books.google.com/books/content?id=singleflight&printsec=frontcover&img=1'
+
+    def setUp(self):
+        root = tempfile.mkdtemp(prefix='covers-')
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        store = CoverStore(root=root)
+        store.cache.clear()
+        patcher = patch.object(image_proxy, 'cover_store', store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(image_proxy.FAILED_URLS_CACHE.clear)
+        self.cover = make_cover()
+
+    def _concurrent_requests(self, fetch, count=5):
+        calls = []
+
+        def slow_fetch(urls):
+            calls.append(urls[0])
+            time.sleep(0.3)
+            return fetch(urls)
+
+        responses = [None] * count
+
+        def worker(index):
+            request = RequestFactory().get('/image-proxy/', {'url': self.URL})
+            responses[index] = image_proxy.google_books_image_proxy(request)
+
+        with patch.object(image_proxy, 'try_fetch_image', side_effect=slow_fetch):
+            threads = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        return responses, calls
+
+    def test_concurrent_misses_fetch_once(self):
+        responses, calls = self._concurrent_requests(lambda urls: ('image/png', self.cover, urls[0]))
+
+        self.assertEqual(len(calls), 1)
+        for response in responses:
+            self.assertIsInstance(response, FileResponse)
+            self.assertEqual(b''.join(response.streaming_content), self.cover)
+            response.close()
+
+    def test_waiters_fall_back_when_leader_fails(self):
+        with patch.object(image_proxy, 'redirect', side_effect=HttpResponseRedirect):
+            responses, calls = self._concurrent_requests(lambda urls: None)
+
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(response.status_code == 302 for response in responses))
+
+    def test_deadline_does_not_mark_url_failed(self):
+        """Prazo esgotado serve a capa padrão sem marcar a URL como falhada por uma hora"""
+        request = RequestFactory().get('/image-proxy/', {'url': self.URL})
+
+        with patch.object(image_proxy, 'try_fetch_image', side_effect=image_proxy.FetchDeadlineExceeded('prazo')), \
+                patch.object(image_proxy, 'redirect', side_effect=HttpResponseRedirect):
+            response = image_proxy.google_books_image_proxy(request)
+
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(image_proxy.is_url_recently_failed(self.URL))
+
+    def test_lock_errors_do_not_block_fetch(self):
+        """Sem o cache para o lock, a requisição busca por conta própria"""
+        request = RequestFactory().get('/image-proxy/', {'url': self.URL})
+
+        with patch.object(image_proxy.cover_store.cache, 'add', side_effect=ConnectionError('redis fora')), \
+                patch.object(image_proxy, 'try_fetch_image', return_value=('image/png', self.cover, self.URL)) as fetch:
+            response = image_proxy.google_books_image_proxy(request)
+
+        fetch.assert_called_once()
+        self.assertIsInstance(response, FileResponse)
+        response.close()
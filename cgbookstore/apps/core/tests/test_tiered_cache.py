@@ -0,0 +1,87 @@
+import zlib
+from unittest.mock import patch
+
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+
+from cgbookstore.apps.core.recommendations.providers.external_api import ExternalApiProvider
+from cgbookstore.apps.core.recommendations.tests.test_helpers import LOCMEM_CACHES
+from cgbookstore.apps.core.utils.tiered_cache import TieredCache
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class TieredCacheTest(SimpleTestCase):
+    """
+    Testes do cache em dois níveis (LRU local + cache compartilhado).
+    """
+
+    def setUp(self):
+        caches['google_books'].clear()
+        TieredCache.reset()
+        self.addCleanup(TieredCache.reset)
+        self.cache = TieredCache('test_tiered', max_entries=2, local_ttl=60)
+
+    def test_local_hit_after_set(self):
+        """Leituras repetidas são servidas pelo LRU local"""
+        self.cache.set('a', [{'id': 1}])
+
+        self.assertEqual(self.cache.get('a'), [{'id': 1}])
+        self.assertEqual(self.cache.stats()['local_hits'], 1)
+
+    def test_remote_tier_shared_between_processes(self):
+        """Outro processo (outro LRU) encontra o valor no cache compartilhado"""
+        self.cache.set('a', {'books': ['x']})
+        other_worker = TieredCache('test_tiered', max_entries=2)
+
+        self.assertEqual(other_worker.get('a'), {'books': ['x']})
+        self.assertEqual(other_worker.stats()['remote_hits'], 1)
+        self.assertEqual(other_worker.get('a'), {'books': ['x']})
+        self.assertEqual(other_worker.stats()['local_hits'], 1)
+
+    def test_remote_values_compressed(self):
+        """Valores no cache compartilhado são JSON comprimido"""
+        self.cache.set('a', {'title': 'Livro'})
+        payload = caches['google_books'].get(self.cache._remote_key('a'))
+
+        self.assertEqual(zlib.decompress(payload), b'{"title": "Livro"}')
+
+    def test_lru_bounded_by_size(self):
+        """O LRU descarta a entrada menos usada ao exceder o limite"""
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+        self.cache.get('a')
+        self.cache.set('c', 3)
+
+        self.assertEqual(list(self.cache._local), ['a', 'c'])
+        self.assertEqual(self.cache.stats()['evictions'], 1)
+
+    def test_local_entries_expire(self):
+        """Entradas locais expiram pelo TTL e voltam a ser lidas do Redis"""
+        self.cache.set('a', 1)
+
+        with patch('cgbookstore.apps.core.utils.tiered_cache.time.monotonic', return_value=10 ** 9):
+            self.assertEqual(self.cache.get('a'), 1)
+
+        stats = self.cache.stats()
+        self.assertEqual(stats['expirations'], 1)
+        self.assertEqual(stats['remote_hits'], 1)
+
+    def test_provider_instances_share_cache(self):
+        """Instâncias do provider compartilham o cache do processo"""
+        first, second = ExternalApiProvider(), ExternalApiProvider()
+        self.assertIs(first._results_cache, second._results_cache)
+        self.assertIn('external_recommendations', TieredCache.get_stats())
+
+    def test_pattern_search_uses_cache(self):
+        """Um padrão já buscado não chama a API de novo"""
+        provider = ExternalApiProvider()
+        provider._results_cache.clear_local()
+        api_result = {'books': [{'id': 'g1', 'volumeInfo': {'title': 'Livro'}}]}
+
+        with patch.object(provider.client, 'search_books', return_value=api_result) as search:
+            provider._search_with_pattern('tiered-fantasy')
+            provider._results_cache.clear_local()
+            results = ExternalApiProvider()._search_with_pattern('tiered-fantasy')
+
+        search.assert_called_once()
+        self.assertEqual(results[0]['id'], 'g1')
@@ -6,6 +6,8 @@ from django.core.cache import caches, cache
 from django.conf import settings
 import redis
 
+from .tiered_cache import TieredCache
+
 logger = logging.getLogger(__name__)
 
 
@@ -374,7 +376,9 @@ class RedisHelper:
             'recommendation_keys': 0,
             'google_books_keys': 0,
             'memory_usage': 'N/A',
-            'connection_info': {}
+            'connection_info': {},
+            # Contadores do cache em dois níveis (LRU local + Redis) deste processo
+            'tiered_caches': TieredCache.get_stats()
         }
 
         try:
@@ -0,0 +1,172 @@
+"""
+Cache em dois níveis: LRU em memória do processo + Redis compartilhado
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+
+class TieredCache:
+    """
+    Cache em dois níveis para resultados de APIs externas.
+
+    Nível 1: LRU no processo, limitado em entradas e TTL, para evitar ida ao
+    Redis em chamadas repetidas. Nível 2: alias de cache compartilhado entre
+    os workers (por padrão 'google_books'), com valores JSON comprimidos
+    com zlib.
+
+    Há uma instância por namespace em cada processo (for_namespace), de modo
+    que todas as instâncias dos providers compartilham o mesmo LRU.
+    """
+
+    DEFAULT_MAX_ENTRIES = 512
+    DEFAULT_LOCAL_TTL = 300
+    DEFAULT_REMOTE_TTL = 60 * 60 * 24
+
+    _registry: Dict[str, 'TieredCache'] = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(
+            self,
+            namespace: str,
+            alias: str = 'google_books',
+            max_entries: int = DEFAULT_MAX_ENTRIES,
+            local_ttl: int = DEFAULT_LOCAL_TTL,
+            remote_ttl: int = DEFAULT_REMOTE_TTL
+    ):
+        self.namespace = namespace
+        self.alias = alias
+        self.max_entries = max_entries
+        self.local_ttl = local_ttl
+        self.remote_ttl = remote_ttl
+        self._local: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = dict.fromkeys(
+            ('local_hits', 'remote_hits', 'misses', 'sets', 'evictions', 'expirations', 'errors'), 0
+        )
+
+    @classmethod
+    def for_namespace(cls, namespace: str, **kwargs) -> 'TieredCache':
+        """Instância compartilhada pelo processo para o namespace"""
+        if namespace not in cls._registry:
+            with cls._registry_lock:
+                if namespace not in cls._registry:
+                    cls._registry[namespace] = cls(namespace, **kwargs)
+        return cls._registry[namespace]
+
+    @classmethod
+    def get_stats(cls) -> Dict[str, Dict[str, int]]:
+        """Contadores de todos os namespaces registrados neste processo"""
+        return {namespace: instance.stats() for namespace, instance in list(cls._registry.items())}
+
+    @classmethod
+    def reset(cls) -> None:
+        """Descarta os LRUs e contadores de todos os namespaces (usado entre testes)"""
+        with cls._registry_lock:
+            instances = list(cls._registry.values())
+            cls._registry.clear()
+        for instance in instances:
+            instance.clear_local()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['local_size'] = len(self._local)
+        lookups = stats['local_hits'] + stats['remote_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['local_hits'] + stats['remote_hits']) / lookups, 4) if lookups else 0.0
+        return stats
+
+    # ------------------------------------------------------------------
+    # Operações
+    # ------------------------------------------------------------------
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self._get_local(key)
+        if value is not None:
+            self._count('local_hits')
+            return value
+
+        value = self._get_remote(key)
+        if value is not None:
+            self._count('remote_hits')
+            self._set_local(key, value, self.local_ttl)
+            return value
+
+        self._count('misses')
+        return None
+
+    def set(self, key: str, value: Any, timeout: Optional[int] = None) -> None:
+        timeout = self.remote_ttl if timeout is None else timeout
+        self._set_local(key, value, min(self.local_ttl, timeout))
+        self._count('sets')
+        try:
+            payload = zlib.compress(json.dumps(value).encode('utf-8'))
+            caches[self.alias].set(self._remote_key(key), payload, timeout)
+        except Exception as e:
+            self._count('errors')
+            logger.error(f"Erro ao gravar cache compartilhado {self.namespace}: {str(e)}")
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._local.pop(key, None)
+        try:
+            caches[self.alias].delete(self._remote_key(key))
+        except Exception as e:
+            self._count('errors')
+            logger.error(f"Erro ao remover do cache compartilhado {self.namespace}: {str(e)}")
+
+    def clear_local(self) -> None:
+        with self._lock:
+            self._local.clear()
+
+    # ------------------------------------------------------------------
+    # Níveis
+    # ------------------------------------------------------------------
+
+    def _get_local(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._local[key]
+                self._stats['expirations'] += 1
+                return None
+            self._local.move_to_end(key)
+            return value
+
+    def _set_local(self, key: str, value: Any, ttl: int) -> None:
+        with self._lock:
+            self._local[key] = (time.monotonic() + ttl, value)
+            self._local.move_to_end(key)
+            while len(self._local) > self.max_entries:
+                self._local.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def _get_remote(self, key: str) -> Optional[Any]:
+        try:
+            payload = caches[self.alias].get(self._remote_key(key))
+            if payload is None:
+                return None
+            return json.loads(zlib.decompress(payload).decode('utf-8'))
+        except Exception as e:
+            self._count('errors')
+            logger.error(f"Erro ao ler cache compartilhado {self.namespace}: {str(e)}")
+            return None
+
+    def _remote_key(self, key: str) -> str:
+        return f"{self.namespace}:{hashlib.md5(key.encode('utf-8')).hexdigest()}"
+
+    def _count(self, event: str) -> None:
+        with self._lock:
+            self._stats[event] += 1
@@ -37,6 +37,8 @@ from django.core.paginator import Paginator
 
 from cgbookstore.apps.core.models import UserBookShelf, Book
 from ..services.google_books_service import GoogleBooksClient
+from ..recommendations.services.trending_index import TrendingIndex
+from ..services.book_counters import BookCounters
 
 logger = logging.getLogger(__name__)
 
@@ -1260,6 +1262,11 @@ class BookDetailView(LoginRequiredMixin, DetailView):
             # Registrar acesso para análise de uso
             logger.info(f"Usuário {user.username} (ID: {user.id}) acessou o livro {book.titulo} (ID: {book.id})")
 
+            # Conta a visualização no índice de tendências (apenas livros públicos) e no contador de acessos
+            if book.visibility == Book.Visibility.PUBLIC:
+                TrendingIndex().record(book.id, 'view')
+            BookCounters().incr(book.id, 'quantidade_acessos')
+
         except Exception as e:
             # Em caso de erro, configurar para valores seguros
             logger.error(f"Erro ao obter informações da prateleira: {str(e)}", exc_info=True)
@@ -68,12 +68,13 @@ class IndexView(TemplateView):
             if self.request.user.is_authenticated:
                 print('[DIAGNÓSTICO INDEX] Carregando recomendações para usuário autenticado')
                 engine = RecommendationEngine()
-                mixed_recommendations = engine.get_mixed_recommendations(self.request.user, limit=12)
+                mixed_recommendations = engine.get_mixed_recommendations(self.request.user, limit=12, surface='home')
                 context.update({
                     'external_recommendations': mixed_recommendations.get('external'),
                     'local_recommendations': mixed_recommendations.get('local'),
                     'has_mixed_recommendations': mixed_recommendations.get('has_external') or bool(
-                        mixed_recommendations.get('local'))
+                        mixed_recommendations.get('local')),
+                    'external_recommendations_pending': mixed_recommendations.get('external_pending', False)
                 })
 
             processed_sections = []
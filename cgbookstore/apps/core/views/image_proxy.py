@@ -8,14 +8,19 @@ from django.templatetags.static import static
 from io import BytesIO
 from PIL import Image
 import urllib.parse
-from django.core.cache import caches
 import re
 import os
 import sys
 import json
 import time
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from django.utils import timezone
-from django.utils.cache import patch_response_headers
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_response_headers, patch_vary_headers
+from django.views.static import serve as static_serve
+
+from ..services.cover_store import CoverStore
 
 # Configurar logging mais detalhado
 logger = logging.getLogger(__name__)
@@ -26,8 +31,8 @@ handler.setFormatter(formatter)
 logger.addHandler(handler)
 logger.setLevel(logging.DEBUG)
 
-# Usar o cache específico para imagens
-image_cache = caches['image_proxy']
+# Capas em disco (endereçadas pelo sha256); no cache fica só o registro de metadados
+cover_store = CoverStore()
 
 # Configurações globais melhoradas
 CONFIG = {
@@ -51,11 +56,31 @@ CONFIG = {
         'lh4.googleusercontent.com',
         'lh5.googleusercontent.com'
     ],
-    'retry_count': 4,  # Aumentado de 3 para 4 tentativas
-    'request_timeout': 15,  # Aumentado de 10 para 15 segundos
+    'request_timeout': 15,  # Timeout de cada requisição (limitado pelo prazo total)
+    'fetch_deadline': 6.0,  # Prazo total (segundos) da busca, contado do início da primeira candidata
+    'fetch_queue_wait': 6.0,  # Espera máxima por uma thread livre antes da primeira candidata começar
+    'hedge_width': 3,  # URLs candidatas disparadas juntas no início
+    'hedge_delay': 0.3,  # Sem resposta nesse intervalo, dispara mais uma candidata
+    'hedge_max_in_flight': 6,  # Máximo de buscas simultâneas por requisição
+    'fetch_workers': 32,  # Threads compartilhadas para as buscas de capas
+    'fetch_chunk_size': 16384,
+    'single_flight_lock_ttl': 15,  # Lock de busca por chave (maior que fetch_deadline)
+    'single_flight_wait': 8.0,  # Espera máxima das requisições que aguardam a busca em andamento
+    'single_flight_poll': 0.05,  # Intervalo entre verificações do lock
+    'resize_max_dimension': 1200,  # Maior largura/altura aceita em w/h
+    'resize_step': 20,  # w/h arredondados para cima em múltiplos disso (limita as derivadas)
+    'negotiated_formats': ['avif', 'webp'],  # Em ordem de preferência, se o Accept permitir
     'cache_version': '2.0',  # Versão do cache para invalidação
 }
 
+# Pool das buscas de capas, criado no primeiro uso
+_fetch_pool = None
+_fetch_pool_lock = threading.Lock()
+
+
+class FetchDeadlineExceeded(Exception):
+    """A busca esgotou o prazo (ou a espera pelo pool) sem que as candidatas falhassem"""
+
 # Cache para URLs que falharam (evita retry desnecessário)
 FAILED_URLS_CACHE = {}
 FAILED_URL_TIMEOUT = 3600  # 1 hora
@@ -68,6 +93,7 @@ def google_books_image_proxy(request):
     """
     image_url = request.GET.get('url', '')
     force_refresh = request.GET.get('refresh', '').lower() == 'true'
+    variant = parse_variant(request)
 
     logger.debug(f"Proxy de imagem solicitado para URL: {image_url}")
     logger.debug(f"Force refresh: {force_refresh}")
@@ -103,59 +129,141 @@ def google_books_image_proxy(request):
 
         # Verificar cache (a menos que seja force refresh)
         if not force_refresh:
-            cached_result = get_cached_image(cache_key)
-            if cached_result:
-                content_type, image_data, cache_info = cached_result
+            cached_record = get_cached_image(cache_key)
+            if cached_record:
                 logger.info(f"Retornando imagem em cache para: {image_url[:60]}...")
 
-                # Adicionar headers de cache para o navegador
-                response = HttpResponse(image_data, content_type=content_type)
-                add_cache_headers(response)
+                # Arquivo entregue direto do disco, com headers de cache para o navegador
+                response = serve_cover(request, cached_record, variant, cache_key)
+                if response is not None:
+                    return response
+
+        # Single-flight: só uma requisição por chave busca na fonte; as demais aguardam o resultado
+        if not acquire_fetch_lock(cache_key):
+            logger.info(f"Busca em andamento por outra requisição, aguardando: {image_url[:60]}...")
+            cached_record = wait_for_fetch(cache_key)
+            response = serve_cover(request, cached_record, variant, cache_key) if cached_record else None
+            if response is not None:
                 return response
+            logger.warning(f"Busca concorrente não produziu imagem para: {image_url[:60]}...")
+            return redirect(static(CONFIG['default_fallback']))
 
-        logger.debug("Cache miss ou refresh forçado. Buscando imagem da fonte...")
+        try:
+            # Outra requisição pode ter concluído a busca entre o miss e o lock
+            if not force_refresh:
+                cached_record = get_cached_image(cache_key)
+                response = serve_cover(request, cached_record, variant, cache_key) if cached_record else None
+                if response is not None:
+                    return response
 
-        # Gerar lista de URLs para tentar
-        urls_to_try = generate_candidate_urls(image_url, book_id)
-        logger.debug(f"Tentando {len(urls_to_try)} URLs diferentes")
+            return fetch_and_store_image(request, image_url, book_id, cache_key, variant)
+        finally:
+            release_fetch_lock(cache_key)
 
-        # Tentar cada URL com estratégia melhorada
-        result = try_fetch_image(urls_to_try)
+    except Exception as e:
+        logger.error(f"Erro crítico no proxy de imagem: {str(e)}")
+        traceback.print_exc()
+        mark_url_as_failed(image_url)
+        return redirect(static(CONFIG['default_fallback']))
 
-        if result:
-            content_type, image_data, successful_url = result
 
-            # Armazenar no cache com metadados
-            cache_data = (content_type, image_data, {
-                'timestamp': timezone.now().isoformat(),
-                'successful_url': successful_url,
-                'original_url': image_url
-            })
+def fetch_and_store_image(request, image_url, book_id, cache_key, variant=None):
+    """
+    Busca a imagem na fonte, grava no armazém de capas e retorna a resposta
+    (ou o redirect para a capa padrão se todas as candidatas falharem).
+    """
+    logger.debug("Cache miss ou refresh forçado. Buscando imagem da fonte...")
 
-            image_cache.set(cache_key, cache_data, timeout=CONFIG['cache_timeout'])
+    # Gerar lista de URLs para tentar
+    urls_to_try = generate_candidate_urls(image_url, book_id)
+    logger.debug(f"Tentando {len(urls_to_try)} URLs diferentes")
 
-            # Remover da lista de URLs falhadas se estava lá
-            remove_failed_url(image_url)
+    # Tentar cada URL com estratégia melhorada
+    try:
+        result = try_fetch_image(urls_to_try)
+    except FetchDeadlineExceeded as e:
+        # Prazo esgotado não é falha da URL: não fixa a capa padrão por uma hora
+        logger.warning(f"Busca não concluída no prazo para {image_url[:60]}...: {str(e)}")
+        return redirect(static(CONFIG['default_fallback']))
+
+    if result:
+        content_type, image_data, successful_url = result
+
+        # Remover da lista de URLs falhadas se estava lá
+        remove_failed_url(image_url)
 
-            logger.info(f"Sucesso! Retornando imagem de: {successful_url[:60]}...")
+        logger.info(f"Sucesso! Retornando imagem de: {successful_url[:60]}...")
 
-            # Retornar resposta com headers de cache
+        # Gravar a imagem no armazém em disco e os metadados no cache
+        try:
+            record = cover_store.put(
+                cache_key, content_type, image_data, CONFIG['cache_timeout'],
+                successful_url=successful_url,
+                original_url=image_url
+            )
+        except Exception as e:
+            logger.error(f"Erro ao gravar imagem no armazém de capas: {str(e)}")
+            record = None
+
+        response = serve_cover(request, record, variant, cache_key) if record else None
+        if response is None:
             response = HttpResponse(image_data, content_type=content_type)
             add_cache_headers(response)
-            return response
-        else:
-            # Marcar URL como falhada
-            mark_url_as_failed(image_url)
-            logger.error(f"Todas as tentativas falharam para: {image_url}")
-            return redirect(static(CONFIG['default_fallback']))
-
-    except Exception as e:
-        logger.error(f"Erro crítico no proxy de imagem: {str(e)}")
-        traceback.print_exc()
+        return response
+    else:
+        # Marcar URL como falhada
         mark_url_as_failed(image_url)
+        logger.error(f"Todas as tentativas falharam para: {image_url}")
         return redirect(static(CONFIG['default_fallback']))
 
 
+def get_fetch_lock_key(cache_key):
+    return f"{cache_key}:fetch_lock"
+
+
+def acquire_fetch_lock(cache_key):
+    """
+    Tenta obter o lock de busca da chave. Se o cache falhar, a requisição
+    busca por conta própria (sem coalescer).
+    """
+    try:
+        return bool(cover_store.cache.add(
+            get_fetch_lock_key(cache_key), 1, timeout=CONFIG['single_flight_lock_ttl']
+        ))
+    except Exception as e:
+        logger.error(f"Erro ao obter lock de busca {cache_key}: {str(e)}")
+        return True
+
+
+def release_fetch_lock(cache_key):
+    try:
+        cover_store.cache.delete(get_fetch_lock_key(cache_key))
+    except Exception as e:
+        logger.error(f"Erro ao liberar lock de busca {cache_key}: {str(e)}")
+
+
+def wait_for_fetch(cache_key):
+    """
+    Aguarda a requisição dona do lock terminar (lock liberado ou expirado)
+    e então lê o registro do cache. Retorna None se a busca falhou ou se o
+    tempo de espera acabou.
+    """
+    lock_key = get_fetch_lock_key(cache_key)
+    deadline_at = time.monotonic() + CONFIG['single_flight_wait']
+
+    try:
+        while time.monotonic() < deadline_at:
+            if cover_store.cache.get(lock_key) is None:
+                break
+            time.sleep(CONFIG['single_flight_poll'])
+        else:
+            logger.warning(f"Tempo de espera esgotado aguardando busca de {cache_key}")
+    except Exception as e:
+        logger.error(f"Erro ao aguardar busca de {cache_key}: {str(e)}")
+
+    return get_cached_image(cache_key)
+
+
 def normalize_image_url(url):
     """
     Normaliza e limpa a URL da imagem.
@@ -202,27 +310,154 @@ def generate_cache_key(url):
 
 def get_cached_image(cache_key):
     """
-    Recupera imagem do cache com validação.
+    Recupera o registro da imagem em cache (metadados + sha256 do arquivo em disco).
+    Entradas antigas com os bytes no cache são migradas para o disco.
     """
     try:
-        cached_data = image_cache.get(cache_key)
-        if cached_data:
-            if len(cached_data) == 3:
-                # Formato novo com metadados
-                content_type, image_data, cache_info = cached_data
-                return cached_data
-            elif len(cached_data) == 2:
-                # Formato antigo sem metadados
-                content_type, image_data = cached_data
-                return (content_type, image_data, {})
+        return cover_store.get(cache_key)
     except Exception as e:
         logger.warning(f"Erro ao recuperar do cache {cache_key}: {str(e)}")
-        # Remover entrada corrompida
-        image_cache.delete(cache_key)
+        return None
+
+
+def parse_variant(request):
+    """
+    Variante pedida pelo cliente: tamanho (w/h), ajuste (fit=contain|cover)
+    e formato negociado pelo Accept. None quando a original serve.
+    """
+    width = parse_dimension(request.GET.get('w'))
+    height = parse_dimension(request.GET.get('h'))
+    fit = request.GET.get('fit', 'contain')
+    fmt = negotiate_format(request.META.get('HTTP_ACCEPT', ''))
 
+    if not width and not height and not fmt:
+        return None
+    return {
+        'width': width,
+        'height': height,
+        'fit': fit if fit in CoverStore.FITS else 'contain',
+        'fmt': fmt,
+    }
+
+
+def parse_dimension(value):
+    """
+    Converte w/h em pixels, limitado a resize_max_dimension e arredondado
+    para cima em múltiplos de resize_step. 0 quando ausente ou inválido.
+    """
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return 0
+    if value <= 0:
+        return 0
+
+    step = CONFIG['resize_step']
+    value = -(-value // step) * step
+    return min(value, CONFIG['resize_max_dimension'])
+
+
+def negotiate_format(accept):
+    """
+    Primeiro formato de negotiated_formats aceito pelo cliente (q > 0) e
+    suportado pelo Pillow instalado, ou None para manter o formato original.
+    """
+    accepted = set()
+    for item in accept.split(','):
+        media_type, _, params = item.strip().partition(';')
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            accepted.add(media_type.strip().lower())
+
+    supported = CoverStore.supported_formats()
+    for fmt in CONFIG['negotiated_formats']:
+        if f'image/{fmt}' in accepted and fmt in supported:
+            return fmt
     return None
 
 
+def serve_cover(request, record, variant=None, cache_key=None):
+    """
+    Entrega a capa do armazém, ou a derivada pedida (gerada na primeira vez
+    e reaproveitada do disco). Se a derivada falhar, entrega a original.
+
+    Revalidações (If-None-Match / If-Modified-Since) são respondidas com 304
+    usando apenas os metadados do registro, sem abrir nem gerar o arquivo.
+
+    Retorna None se o arquivo sumiu do disco depois da leitura do registro
+    (GC concorrente): o registro é removido e o chamador trata como miss.
+    """
+    not_modified = get_conditional_response(
+        request,
+        etag=cover_store.etag(record, variant),
+        last_modified=cover_store.last_modified(record)
+    )
+    if not_modified is not None:
+        not_modified['ETag'] = cover_store.etag(record, variant)
+        return add_cover_headers(not_modified)
+
+    if variant:
+        try:
+            record = cover_store.derivative(record, **variant)
+        except Exception as e:
+            logger.error(f"Erro ao gerar derivada {variant} da capa {record.get('sha256')}: {str(e)}")
+
+    try:
+        response = cover_store.response(record)
+    except FileNotFoundError:
+        logger.warning(f"Arquivo da capa {record.get('sha256')} removido do armazém, tratando como miss")
+        if cache_key:
+            cover_store.delete(cache_key)
+        return None
+
+    return add_cover_headers(response)
+
+
+def add_cover_headers(response):
+    """
+    Headers de cache das respostas de capa; o formato entregue depende do
+    Accept do cliente.
+    """
+    add_cache_headers(response)
+    patch_vary_headers(response, ['Accept'])
+    return response
+
+
+def serve_media(request, path, document_root=None, show_indexes=False):
+    """
+    Serve arquivos de MEDIA_ROOT (capas enviadas pelo admin, usadas por
+    Book.get_display_cover_url) com ETag forte do conteúdo e 304 nas
+    revalidações. Substitui django.views.static.serve no urls.py.
+    """
+    try:
+        full_path = safe_join(document_root, path)
+        if os.path.isfile(full_path):
+            etag, last_modified = cover_store.file_validators(full_path)
+        else:
+            etag, last_modified = None, None
+    except Exception as e:
+        logger.warning(f"Erro ao calcular validadores de {path}: {str(e)}")
+        etag, last_modified = None, None
+
+    if etag:
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            not_modified['ETag'] = etag
+            return not_modified
+
+    response = static_serve(request, path, document_root=document_root, show_indexes=show_indexes)
+    if etag:
+        response['ETag'] = etag
+    return response
+
+
 def add_cache_headers(response):
     """
     Adiciona headers de cache otimizados para o navegador.
@@ -237,67 +472,177 @@ def add_cache_headers(response):
     return response
 
 
-def try_fetch_image(urls_to_try):
+def get_fetch_pool():
     """
-    Tenta buscar imagem de uma lista de URLs com estratégia melhorada.
+    Pool compartilhado das buscas de capas (apenas I/O de rede, sem banco).
     """
-    for i, url in enumerate(urls_to_try):
-        logger.debug(f"Tentando URL {i + 1}/{len(urls_to_try)}: {url[:60]}...")
+    global _fetch_pool
+    if _fetch_pool is None:
+        with _fetch_pool_lock:
+            if _fetch_pool is None:
+                _fetch_pool = ThreadPoolExecutor(
+                    max_workers=CONFIG['fetch_workers'],
+                    thread_name_prefix='image-proxy-fetch'
+                )
+    return _fetch_pool
 
-        for attempt in range(CONFIG['retry_count']):
-            try:
-                # Delay progressivo entre tentativas
-                if attempt > 0:
-                    delay = attempt * 0.5
-                    logger.debug(f"Aguardando {delay}s antes da tentativa {attempt + 1}")
-                    time.sleep(delay)
 
-                headers = get_request_headers(url, attempt)
+def try_fetch_image(urls_to_try, deadline=None):
+    """
+    Busca a imagem disparando as URLs candidatas em paralelo (hedging).
 
-                # Fazer requisição com timeout aumentado
-                response = requests.get(
-                    url,
-                    headers=headers,
-                    timeout=CONFIG['request_timeout'],
-                    stream=True  # Stream para grandes imagens
-                )
+    As primeiras `hedge_width` URLs partem juntas e cada falha libera a
+    próxima candidata. Mais uma é disparada (até `hedge_max_in_flight`)
+    somente quando nenhuma está na fila do pool e a última a começar passou
+    `hedge_delay` segundos sem responder: com o pool saturado, a requisição
+    não empilha mais tarefas. A primeira imagem válida vence e as demais
+    buscas são canceladas.
 
-                if response.status_code != 200:
-                    logger.warning(f"Status {response.status_code} para URL: {url[:50]}...")
-                    continue
+    O prazo total (`fetch_deadline`) conta a partir do início da primeira
+    candidata; a espera por uma thread livre é limitada por
+    `fetch_queue_wait`. Retorna None se todas as candidatas falharem e
+    levanta FetchDeadlineExceeded se o prazo acabar antes disso.
+    """
+    if not urls_to_try:
+        return None
 
-                # Verificar content-type
-                content_type = response.headers.get('Content-Type', '')
-                if not content_type.startswith('image/'):
-                    logger.warning(f"Content-type não é imagem: {content_type}")
-                    continue
+    budget = deadline or CONFIG['fetch_deadline']
+    queued_until = time.monotonic() + CONFIG['fetch_queue_wait']
+    cancelled = threading.Event()
+    pool = get_fetch_pool()
+    candidates = iter(enumerate(urls_to_try))
+    pending = {}
+    started_at = {}
+    state = {'deadline_at': None}
+    state_lock = threading.Lock()
+
+    def run(url, index):
+        now = time.monotonic()
+        with state_lock:
+            if state['deadline_at'] is None:
+                state['deadline_at'] = now + budget
+            started_at[index] = now
+            deadline_at = state['deadline_at']
+        return fetch_candidate(url, index, deadline_at, cancelled)
+
+    def launch():
+        for index, url in candidates:
+            logger.debug(f"Disparando URL {index + 1}/{len(urls_to_try)}: {url[:60]}...")
+            future = pool.submit(run, url, index)
+            pending[future] = (index, url)
+            return True
+        return False
 
-                # Ler conteúdo
-                image_data = response.content
+    for _ in range(CONFIG['hedge_width']):
+        if not launch():
+            break
 
-                # Verificar tamanho mínimo
-                if len(image_data) < CONFIG['min_image_size']:
-                    logger.warning(f"Imagem muito pequena: {len(image_data)} bytes")
-                    continue
+    try:
+        while pending:
+            now = time.monotonic()
+            with state_lock:
+                deadline_at = state['deadline_at']
+                starts = [started_at.get(index) for index, _ in pending.values()]
+            if deadline_at is None:
+                remaining = queued_until - now
+            else:
+                remaining = deadline_at - now
+            if remaining <= 0:
+                raise FetchDeadlineExceeded(
+                    f"prazo de {budget}s esgotado" if deadline_at is not None
+                    else f"nenhuma thread livre em {CONFIG['fetch_queue_wait']}s"
+                )
 
-                # Validar imagem
-                if validate_image(image_data):
-                    logger.info(f"Sucesso na URL: {url[:50]}... (tentativa {attempt + 1})")
-                    return (content_type, image_data, url)
-                else:
-                    logger.warning(f"Imagem inválida de: {url[:50]}...")
+            # Hedge só quando todas as candidatas já começaram e a mais recente não respondeu
+            hedge_in = CONFIG['hedge_delay']
+            if None not in starts:
+                hedge_in = max(0.0, max(starts) + CONFIG['hedge_delay'] - now)
+                if hedge_in == 0.0 and len(pending) < CONFIG['hedge_max_in_flight'] and launch():
                     continue
 
-            except requests.exceptions.Timeout:
-                logger.warning(f"Timeout na URL: {url[:50]}... (tentativa {attempt + 1})")
-                continue
-            except requests.exceptions.RequestException as e:
-                logger.warning(f"Erro de requisição para {url[:50]}...: {str(e)}")
-                continue
-            except Exception as e:
-                logger.warning(f"Erro inesperado para {url[:50]}...: {str(e)}")
-                continue
+            done, _ = wait(pending, timeout=min(hedge_in or CONFIG['hedge_delay'], remaining),
+                           return_when=FIRST_COMPLETED)
+            for future in done:
+                _, url = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.warning(f"Erro inesperado para {url[:50]}...: {str(e)}")
+                    result = None
+                if result:
+                    return result
+                launch()
+
+        with state_lock:
+            deadline_at = state['deadline_at']
+        if deadline_at is not None and time.monotonic() >= deadline_at:
+            # As últimas candidatas foram interrompidas pelo prazo, não falharam
+            raise FetchDeadlineExceeded(f"prazo de {budget}s esgotado")
+        return None
+    finally:
+        # Cancela buscas em fila e interrompe as que ainda estão baixando
+        cancelled.set()
+        for future in pending:
+            future.cancel()
 
+
+def fetch_candidate(url, attempt, deadline_at, cancelled):
+    """
+    Uma tentativa de busca de uma URL candidata. Retorna
+    (content_type, image_data, url) se a imagem for válida, senão None.
+    """
+    remaining = deadline_at - time.monotonic()
+    if cancelled.is_set() or remaining <= 0:
+        return None
+
+    try:
+        headers = get_request_headers(url, attempt)
+
+        response = requests.get(
+            url,
+            headers=headers,
+            timeout=min(CONFIG['request_timeout'], remaining),
+            stream=True  # Permite abandonar o download quando outra URL vencer
+        )
+
+        with response:
+            if response.status_code != 200:
+                logger.warning(f"Status {response.status_code} para URL: {url[:50]}...")
+                return None
+
+            # Verificar content-type
+            content_type = response.headers.get('Content-Type', '')
+            if not content_type.startswith('image/'):
+                logger.warning(f"Content-type não é imagem: {content_type}")
+                return None
+
+            # Ler conteúdo, abandonando se outra URL vencer ou o prazo acabar
+            chunks = []
+            for chunk in response.iter_content(chunk_size=CONFIG['fetch_chunk_size']):
+                if cancelled.is_set() or time.monotonic() > deadline_at:
+                    return None
+                chunks.append(chunk)
+            image_data = b''.join(chunks)
+
+        # Verificar tamanho mínimo
+        if len(image_data) < CONFIG['min_image_size']:
+            logger.warning(f"Imagem muito pequena: {len(image_data)} bytes")
+            return None
+
+        # Validar imagem
+        if validate_image(image_data):
+            logger.info(f"Sucesso na URL: {url[:50]}...")
+            return (content_type, image_data, url)
+
+        logger.warning(f"Imagem inválida de: {url[:50]}...")
+        return None
+
+    except requests.exceptions.Timeout:
+        logger.warning(f"Timeout na URL: {url[:50]}...")
+    except requests.exceptions.RequestException as e:
+        logger.warning(f"Erro de requisição para {url[:50]}...: {str(e)}")
+    except Exception as e:
+        logger.warning(f"Erro inesperado para {url[:50]}...: {str(e)}")
     return None
 
 
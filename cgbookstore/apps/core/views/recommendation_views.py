@@ -284,15 +284,84 @@ def import_external_book(request):
             'message': f'Erro ao importar livro: {str(e)}'
         }, status=500)
 
+
+def _serialize_external_books(books):
+    """Converte recomendações externas (dicts do Google Books ou Books temporários) para o formato JSON"""
+    external_books = []
+    for book in books:
+        try:
+            # Verificar se o livro é um dicionário ou um objeto Book
+            if isinstance(book, dict):
+                if 'volumeInfo' in book:
+                    info = book.get('volumeInfo', {})
+                    external_books.append({
+                        'titulo': info.get('title', 'Sem título'),
+                        'autor': ', '.join(info.get('authors', ['Autor desconhecido'])) if isinstance(
+                            info.get('authors', []), list) else str(info.get('authors', 'Autor desconhecido')),
+                        'genero': info.get('categories', [''])[0] if info.get('categories') and isinstance(
+                            info.get('categories'), list) else '',
+                        'capa_url': info.get('imageLinks', {}).get('thumbnail', ''),
+                        'external_id': book.get('id', ''),
+                        'origem': 'Google Books',
+                        'is_external': True
+                    })
+                else:
+                    # Formato diferente do padrão volumeInfo
+                    external_books.append({
+                        'titulo': book.get('title', book.get('titulo', 'Sem título')),
+                        'autor': book.get('author', book.get('autor', 'Autor desconhecido')),
+                        'genero': book.get('category', book.get('genero', '')),
+                        'capa_url': book.get('thumbnail', book.get('capa_url', '')),
+                        'external_id': book.get('id', book.get('external_id', '')),
+                        'origem': 'Google Books',
+                        'is_external': True
+                    })
+            elif hasattr(book, 'external_id') or hasattr(book, 'external_data'):
+                # Livro do modelo com dados externos
+                external_data = {}
+
+                # Tenta carregar dados externos se disponíveis
+                if hasattr(book, 'external_data') and book.external_data:
+                    try:
+                        external_data = json.loads(book.external_data)
+                    except (json.JSONDecodeError, TypeError):
+                        external_data = {}
+
+                external_books.append({
+                    'titulo': book.titulo if hasattr(book, 'titulo') else 'Sem título',
+                    'autor': book.autor if hasattr(book, 'autor') else 'Autor desconhecido',
+                    'genero': book.genero if hasattr(book, 'genero') else '',
+                    'capa_url': book.capa_url if hasattr(book, 'capa_url') else '',
+                    'external_id': book.external_id if hasattr(book,
+                        'external_id') else f"temp_{book.id}" if hasattr(
+                        book, 'id') else '',
+                    'origem': 'Google Books',
+                    'is_external': True
+                })
+        except Exception as book_error:
+            logger.warning(f"Erro ao processar livro externo para JSON: {str(book_error)}")
+            continue
+    return external_books
+
 @login_required
 @require_GET
 def get_recommendations_json(request):
     """
-    Endpoint JSON para recomendações mistas
+    Endpoint JSON para recomendações mistas.
+
+    Com ?external=1 retorna apenas o complemento externo calculado em
+    segundo plano ('status' pending/ready/none), para consulta periódica.
     """
     try:
         engine = RecommendationEngine()
-        mixed_data = engine.get_mixed_recommendations(request.user)
+        if request.GET.get('external') == '1':
+            external_data = engine.get_external_recommendations(request.user)
+            return JsonResponse({
+                'status': external_data['status'],
+                'external': _serialize_external_books(external_data['external']),
+            })
+
+        mixed_data = engine.get_mixed_recommendations(request.user, surface='widget')
 
         # Converte QuerySet para lista de dicionários
         local_books = []
@@ -313,66 +382,14 @@ def get_recommendations_json(request):
                 continue
 
         # Organiza os livros externos no mesmo formato
-        external_books = []
-        for book in mixed_data.get('external', []):
-            try:
-                # Verificar se o livro é um dicionário ou um objeto Book
-                if isinstance(book, dict):
-                    if 'volumeInfo' in book:
-                        info = book.get('volumeInfo', {})
-                        external_books.append({
-                            'titulo': info.get('title', 'Sem título'),
-                            'autor': ', '.join(info.get('authors', ['Autor desconhecido'])) if isinstance(
-                                info.get('authors', []), list) else str(info.get('authors', 'Autor desconhecido')),
-                            'genero': info.get('categories', [''])[0] if info.get('categories') and isinstance(
-                                info.get('categories'), list) else '',
-                            'capa_url': info.get('imageLinks', {}).get('thumbnail', ''),
-                            'external_id': book.get('id', ''),
-                            'origem': 'Google Books',
-                            'is_external': True
-                        })
-                    else:
-                        # Formato diferente do padrão volumeInfo
-                        external_books.append({
-                            'titulo': book.get('title', book.get('titulo', 'Sem título')),
-                            'autor': book.get('author', book.get('autor', 'Autor desconhecido')),
-                            'genero': book.get('category', book.get('genero', '')),
-                            'capa_url': book.get('thumbnail', book.get('capa_url', '')),
-                            'external_id': book.get('id', book.get('external_id', '')),
-                            'origem': 'Google Books',
-                            'is_external': True
-                        })
-                elif hasattr(book, 'external_id') or hasattr(book, 'external_data'):
-                    # Livro do modelo com dados externos
-                    external_data = {}
-
-                    # Tenta carregar dados externos se disponíveis
-                    if hasattr(book, 'external_data') and book.external_data:
-                        try:
-                            external_data = json.loads(book.external_data)
-                        except (json.JSONDecodeError, TypeError):
-                            external_data = {}
-
-                    external_books.append({
-                        'titulo': book.titulo if hasattr(book, 'titulo') else 'Sem título',
-                        'autor': book.autor if hasattr(book, 'autor') else 'Autor desconhecido',
-                        'genero': book.genero if hasattr(book, 'genero') else '',
-                        'capa_url': book.capa_url if hasattr(book, 'capa_url') else '',
-                        'external_id': book.external_id if hasattr(book,
-                            'external_id') else f"temp_{book.id}" if hasattr(
-                            book, 'id') else '',
-                        'origem': 'Google Books',
-                        'is_external': True
-                    })
-            except Exception as book_error:
-                logger.warning(f"Erro ao processar livro externo para JSON: {str(book_error)}")
-                continue
+        external_books = _serialize_external_books(mixed_data.get('external', []))
 
         # Combina os resultados
         response_data = {
             'local': local_books,
             'external': external_books,
             'has_external': mixed_data.get('has_external', False),
+            'external_pending': mixed_data.get('external_pending', False),
             'total': len(local_books) + len(external_books)
         }
 
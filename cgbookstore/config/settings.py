@@ -320,6 +320,51 @@ GOOGLE_BOOKS_RECOMMENDATIONS_CACHE_TIMEOUT = 60 * 60 * 24  # 24 horas
 # API Key do Google Books
 GOOGLE_BOOKS_API_KEY = env('GOOGLE_BOOKS_API_KEY', default='')
 
+# Configurações do motor de recomendações
+# Requisições de recomendação simultâneas esperadas por processo (threads do servidor WSGI)
+RECOMMENDATION_CONCURRENT_REQUESTS = env.int('RECOMMENDATION_CONCURRENT_REQUESTS', default=4)
+# Threads compartilhadas para executar os providers em paralelo (cada uma mantém uma conexão com o banco);
+# o padrão comporta os 6 providers de cada requisição simultânea
+RECOMMENDATION_PROVIDER_WORKERS = env.int(
+    'RECOMMENDATION_PROVIDER_WORKERS', default=RECOMMENDATION_CONCURRENT_REQUESTS * 6
+)
+# Idade máxima (segundos) da conexão reaproveitada por cada thread de provider
+RECOMMENDATION_PROVIDER_CONN_MAX_AGE = env.int('RECOMMENDATION_PROVIDER_CONN_MAX_AGE', default=300)
+# Threads para recalcular recomendações expiradas em segundo plano (stale-while-revalidate)
+RECOMMENDATION_REFRESH_WORKERS = env.int('RECOMMENDATION_REFRESH_WORKERS', default=2)
+# Processos do pré-cálculo em lote (warm_recommendation_cache --batch)
+RECOMMENDATION_BATCH_WORKERS = env.int('RECOMMENDATION_BATCH_WORKERS', default=4)
+# Buscas na API externa em paralelo: buscas simultâneas por requisição, threads do processo
+# e prazo total (segundos) para todas as buscas de uma requisição
+RECOMMENDATION_EXTERNAL_SEARCH_MAX_IN_FLIGHT = env.int('RECOMMENDATION_EXTERNAL_SEARCH_MAX_IN_FLIGHT', default=4)
+RECOMMENDATION_EXTERNAL_SEARCH_WORKERS = env.int(
+    'RECOMMENDATION_EXTERNAL_SEARCH_WORKERS',
+    default=RECOMMENDATION_CONCURRENT_REQUESTS * RECOMMENDATION_EXTERNAL_SEARCH_MAX_IN_FLIGHT
+)
+RECOMMENDATION_EXTERNAL_SEARCH_DEADLINE = env.float('RECOMMENDATION_EXTERNAL_SEARCH_DEADLINE', default=3.0)
+# Complemento externo calculado em segundo plano; a página consulta /api/recommendations/external/ depois
+RECOMMENDATION_ASYNC_EXTERNAL = env.bool('RECOMMENDATION_ASYNC_EXTERNAL', default=True)
+# Pasta dos fatores ALS gerados por train_als_model (lidos com mmap pelos workers)
+RECOMMENDATION_ALS_DIR = env('RECOMMENDATION_ALS_DIR', default=os.path.join(BASE_DIR, 'recommendation_models'))
+# Meia-vida (em horas) dos eventos no índice de tendências (TrendingIndex)
+RECOMMENDATION_TRENDING_HALF_LIFE = env.float('RECOMMENDATION_TRENDING_HALF_LIFE', default=72.0)
+# λ do re-ranking por diversidade (MMR) por superfície: 1.0 = só relevância, valores menores = mais variedade
+RECOMMENDATION_DIVERSITY_LAMBDA = {
+    'default': 0.7,
+    'home': 0.7,
+    'shelf': 0.6,
+    'widget': 0.8,
+}
+
+# Armazém em disco das capas do proxy de imagens (arquivos nomeados pelo sha256)
+IMAGE_PROXY_STORE_DIR = env('IMAGE_PROXY_STORE_DIR', default=os.path.join(MEDIA_ROOT, 'covers'))
+# Tamanho máximo do armazém; gc_cover_store remove as capas menos acessadas acima disso
+IMAGE_PROXY_STORE_MAX_BYTES = env.int('IMAGE_PROXY_STORE_MAX_BYTES', default=2 * 1024 ** 3)
+# Entrega das capas: 'file' (FileResponse/sendfile), 'x-accel' (nginx) ou 'x-sendfile' (Apache)
+IMAGE_PROXY_SERVE_MODE = env('IMAGE_PROXY_SERVE_MODE', default='file')
+# Location interna do nginx que aponta para IMAGE_PROXY_STORE_DIR (modo 'x-accel')
+IMAGE_PROXY_ACCEL_PREFIX = env('IMAGE_PROXY_ACCEL_PREFIX', default='/protected/covers/')
+
 # Configurações de Autenticação
 LOGIN_REDIRECT_URL = reverse_lazy('core:index')
 LOGIN_URL = 'core:login'
@@ -38,6 +38,8 @@ except ImportError as e:
 
 # URLs de desenvolvimento (apenas em DEBUG)
 if settings.DEBUG:
-    # Servir arquivos de mídia em desenvolvimento
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    from cgbookstore.apps.core.views.image_proxy import serve_media
+
+    # Servir arquivos de mídia em desenvolvimento (com ETag e 304 nas revalidações)
+    urlpatterns += static(settings.MEDIA_URL, view=serve_media, document_root=settings.MEDIA_ROOT)
     urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
\ No newline at end of file